@@ -0,0 +1,229 @@
+# backend/app/core/admission.py
+"""
+Admission control and staged degradation for /api/predict.
+
+Every request is admitted against one pressure value, the largest of:
+- in-flight /api/predict requests / ADMISSION_MAX_IN_FLIGHT
+- scoring jobs queued for the model executor / ADMISSION_MAX_QUEUE
+- recent DB pool checkout wait (decaying average, worst shard) / ADMISSION_MAX_POOL_WAIT_MS
+- ledger entries waiting in the deferred backlog / ADMISSION_MAX_BACKLOG
+
+ADMISSION_STAGES holds four ascending pressure thresholds. Each stage
+keeps the ones before it:
+1. no_recs         recommendations are not generated or stored
+2. ledger_deferred the ledger entry is written to ledger_pending in the
+                   decision's transaction (app/ledger/pending.py). That
+                   backlog is sealed into one block every
+                   ADMISSION_LEDGER_FLUSH_MS, so there is no per-request
+                   chain append, and it survives a restart
+3. rules_only      only the rules agent runs, on the event loop, so no
+                   model time and no executor queue
+4. shed            503 with Retry-After, before any work is done
+
+A degraded response carries "degraded": [stages], as does the
+X-FinFraud-Degraded header and the stored reason_codes. Its "block" is
+null while the ledger entry is deferred.
+
+Model scoring runs on a dedicated executor (ADMISSION_SCORING_THREADS)
+rather than on the event loop, so queued work is visible and bounded.
+"""
+import asyncio
+import contextvars
+import logging
+import math
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from typing import Any, Callable, Dict, Iterator, List, Optional, Tuple
+
+from fastapi import HTTPException
+
+from app.core import metrics
+from app.core.config import settings
+
+logger = logging.getLogger(__name__)
+
+NO_RECS = "no_recs"
+LEDGER_DEFERRED = "ledger_deferred"
+RULES_ONLY = "rules_only"
+SHED = "shed"
+STAGES = (NO_RECS, LEDGER_DEFERRED, RULES_ONLY, SHED)
+DEGRADED_HEADER = "X-FinFraud-Degraded"
+
+admitted_total = metrics.counter(
+    "finfraud_admission_total", "/api/predict admissions by degradation stage (normal, no_recs, ..., shed).", "stage"
+)
+
+
+def _thresholds() -> Tuple[float, ...]:
+    values = tuple(float(v) for v in settings.admission_stages.split(","))
+    if len(values) != len(STAGES):
+        raise ValueError(f"ADMISSION_STAGES needs {len(STAGES)} thresholds, got {settings.admission_stages!r}")
+    return values
+
+
+class AdmissionController:
+    def __init__(self):
+        self.in_flight = 0
+        self.queued = 0  # scoring jobs submitted but not started
+        self._executor: Optional[ThreadPoolExecutor] = None
+        self._thresholds = _thresholds()
+
+    # ------------------------------
+    # Pressure
+    # ------------------------------
+    def signals(self) -> Dict[str, float]:
+        from app.db import sharding
+
+        # the slowest shard: a request may need any of them
+        wait = max(
+            (e.pool.recent_wait() for e in sharding.engines() if hasattr(e.pool, "recent_wait")), default=0.0
+        )
+        return {
+            "in_flight": self.in_flight / settings.admission_max_in_flight,
+            "queue": self.queued / settings.admission_max_queue,
+            "pool_wait": wait * 1000.0 / settings.admission_max_pool_wait_ms,
+            "backlog": len(ledger_backlog) / settings.admission_max_backlog,
+        }
+
+    def pressure(self) -> float:
+        return max(self.signals().values())
+
+    def stage_for(self, pressure: float) -> int:
+        """Number of degradation stages in effect (0 = normal, len(STAGES) = shed)."""
+        n = 0
+        for threshold in self._thresholds:
+            if pressure >= threshold:
+                n += 1
+        return n
+
+    @contextmanager
+    def admit(self) -> Iterator[List[str]]:
+        """Count the request in flight; yields the degradations to apply, or raises 503 when shedding."""
+        if not settings.admission_control:
+            yield []
+            return
+        n = self.stage_for(self.pressure())
+        if n >= len(STAGES):
+            admitted_total.inc(SHED)
+            raise HTTPException(
+                status_code=503,
+                detail="Overloaded, retry later",
+                headers={"Retry-After": str(max(1, math.ceil(settings.admission_retry_after_seconds))),
+                         DEGRADED_HEADER: SHED},
+            )
+        degraded = list(STAGES[:n])
+        admitted_total.inc(degraded[-1] if degraded else "normal")
+        self.in_flight += 1
+        try:
+            yield degraded
+        finally:
+            self.in_flight -= 1
+
+    # ------------------------------
+    # Scoring executor
+    # ------------------------------
+    async def run(self, fn: Callable[..., Any], *args) -> Any:
+        """fn(*args) on the scoring executor, with this task's context (stage timers)."""
+        if self._executor is None:
+            self._executor = ThreadPoolExecutor(settings.admission_scoring_threads, thread_name_prefix="scoring")
+        ctx = contextvars.copy_context()
+        loop = asyncio.get_running_loop()
+        pending = [True]
+
+        def release() -> None:
+            # on the loop thread only; once, whether the job started or was cancelled first
+            if pending:
+                pending.pop()
+                self.queued -= 1
+
+        def job():
+            loop.call_soon_threadsafe(release)
+            return ctx.run(fn, *args)
+
+        self.queued += 1
+        try:
+            return await loop.run_in_executor(self._executor, job)
+        finally:
+            release()
+
+    def snapshot(self) -> Dict[str, Any]:
+        signals = self.signals()
+        pressure = max(signals.values())
+        n = self.stage_for(pressure)
+        return {
+            "enabled": settings.admission_control,
+            "pressure": round(pressure, 4),
+            "stage": STAGES[n - 1] if n else "normal",
+            "signals": {k: round(v, 4) for k, v in signals.items()},
+            "in_flight": self.in_flight,
+            "queued": self.queued,
+            "backlog": len(ledger_backlog),
+            "thresholds": dict(zip(STAGES, self._thresholds)),
+        }
+
+
+# ------------------------------
+# Deferred ledger appends
+# ------------------------------
+class LedgerBacklog:
+    """
+    Count of ledger_pending rows (committed decisions whose ledger append was
+    deferred); flush() seals them from the table in batches. The rows are the
+    backlog: the count only feeds admission, and starts unknown so the first
+    flush after a restart seals what the last process left.
+    """
+
+    def __init__(self):
+        self._count: Optional[int] = None
+        self.sealed_blocks = 0
+        self.sealed_entries = 0
+
+    def __len__(self) -> int:
+        return self._count or 0
+
+    def add(self, n: int = 1) -> None:
+        self._count = (self._count or 0) + n
+
+    async def flush(self, max_entries: int = 5000) -> int:
+        """Seal up to max_entries pending entries per shard into one block; returns how many."""
+        from app.db.sharding import ledger_lock
+        from app.ledger import pending
+
+        if self._count == 0:
+            return 0
+        async with ledger_lock:
+            _, sealed, drained = await pending.seal(None, max_entries)
+        if sealed:
+            self.sealed_blocks += 1
+            self.sealed_entries += sealed
+        self._count = 0 if drained else max(1, (self._count or 0) - sealed)
+        return sealed
+
+    async def drain(self) -> None:
+        while self._count is None or self._count:
+            await self.flush()  # each pass claims rows, or finds every shard empty
+
+
+ledger_backlog = LedgerBacklog()
+controller = AdmissionController()
+
+
+async def backlog_loop(interval_s: float) -> None:
+    while True:
+        await asyncio.sleep(interval_s)
+        try:
+            await ledger_backlog.flush()
+        except Exception:
+            logger.exception("Deferred ledger flush failed; %d entries kept", len(ledger_backlog))
+
+
+metrics.register_gauge(
+    "finfraud_admission_pressure",
+    "Admission pressure per signal (1.0 = its configured limit).",
+    lambda: {f'signal="{k}"': v for k, v in controller.signals().items()},
+)
+metrics.register_gauge(
+    "finfraud_ledger_backlog_entries",
+    "Ledger entries deferred under load, not sealed yet.",
+    lambda: float(len(ledger_backlog)),
+)
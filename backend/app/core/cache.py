@@ -0,0 +1,113 @@
+# backend/app/core/cache.py
+"""
+Size-bounded LRU caches with TTL expiry for hot read endpoints.
+
+/api/predict writes entries as soon as a decision is committed, so the
+dashboard's follow-up reads don't touch MySQL; status changes invalidate.
+Hit/miss counts are exported on /metrics.
+"""
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Dict, Hashable, Optional
+from app.core import metrics
+from app.core.config import settings
+
+_MISSING = object()
+
+cache_hits = metrics.counter("finfraud_cache_hits_total", "Read-through cache hits.", "cache")
+cache_misses = metrics.counter("finfraud_cache_misses_total", "Read-through cache misses (absent or expired).", "cache")
+
+
+class TTLCache:
+    def __init__(self, name: str, maxsize: int, ttl: float):
+        self.name = name
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._data: "OrderedDict[Hashable, tuple[float, Any]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key: Hashable, default: Any = None) -> Any:
+        now = time.monotonic()
+        with self._lock:
+            item = self._data.get(key, _MISSING)
+            if item is not _MISSING and item[0] > now:
+                self._data.move_to_end(key)
+                self.hits += 1
+                value = item[1]
+            else:
+                if item is not _MISSING:
+                    del self._data[key]
+                self.misses += 1
+                value = _MISSING
+        if value is _MISSING:
+            cache_misses.inc(self.name)
+            return default
+        cache_hits.inc(self.name)
+        return value
+
+    def set(self, key: Hashable, value: Any, ttl: Optional[float] = None) -> None:
+        if self.maxsize <= 0:
+            return
+        expires = time.monotonic() + (self.ttl if ttl is None else ttl)
+        with self._lock:
+            self._data[key] = (expires, value)
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+    def invalidate(self, key: Hashable) -> None:
+        with self._lock:
+            self._data.pop(key, None)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._data.clear()
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+    def stats(self) -> Dict[str, float]:
+        total = self.hits + self.misses
+        return {
+            "entries": len(self._data),
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_ratio": self.hits / total if total else 0.0,
+        }
+
+
+_caches: Dict[str, TTLCache] = {}
+
+
+def get_cache(name: str, maxsize: Optional[int] = None, ttl: Optional[float] = None) -> TTLCache:
+    c = _caches.get(name)
+    if c is None:
+        c = _caches.setdefault(name, TTLCache(
+            name,
+            settings.cache_max_entries if maxsize is None else maxsize,
+            settings.cache_ttl_seconds if ttl is None else ttl,
+        ))
+    return c
+
+
+metrics.register_gauge(
+    "finfraud_cache_entries", "Entries currently held per cache.",
+    lambda: {f'cache="{n}"': len(c) for n, c in _caches.items()},
+)
+metrics.register_gauge(
+    "finfraud_cache_hit_ratio", "Hits / (hits + misses) since start, per cache.",
+    lambda: {f'cache="{n}"': c.stats()["hit_ratio"] for n, c in _caches.items()},
+)
+
+# Caches for the fraud read endpoints, keyed by transaction id / user external id
+transactions = get_cache("transactions")
+recommendations = get_cache("recommendations")
+user_risk = get_cache("user_risk")
+
+
+def invalidate_transaction(txn_id: int) -> None:
+    transactions.invalidate(txn_id)
+    recommendations.invalidate(txn_id)
@@ -1,5 +1,6 @@
 from pydantic import BaseModel
 from dotenv import load_dotenv
+import logging
 import os
 
 load_dotenv()
@@ -10,12 +11,121 @@ class Settings(BaseModel):
     db_name: str = os.getenv("DB_NAME", "frauddb")
     db_user: str = os.getenv("DB_USER", "frauduser")
     db_password: str = os.getenv("DB_PASSWORD", "fraudpass")
+    # full SQLAlchemy async URL; overrides the MySQL settings above when set
+    # (e.g. sqlite+aiosqlite:///bench.db for local benchmarks)
+    database_url: str = os.getenv("DATABASE_URL", "")
+    # connection pool (per worker process)
+    db_pool_size: int = int(os.getenv("DB_POOL_SIZE", "10"))
+    db_max_overflow: int = int(os.getenv("DB_MAX_OVERFLOW", "20"))
+    db_pool_timeout: float = float(os.getenv("DB_POOL_TIMEOUT", "30"))
+    db_pool_recycle: int = int(os.getenv("DB_POOL_RECYCLE", "1800"))
+    # pre-ping costs a round trip per checkout; prefer the idle ping below
+    db_pool_pre_ping: bool = os.getenv("DB_POOL_PRE_PING", "0") == "1"
+    # ping connections idle longer than this on checkout (-1 disables)
+    db_pool_idle_ping_seconds: float = float(os.getenv("DB_POOL_IDLE_PING_SECONDS", "300"))
+    # hash-sharded transaction storage (app/db/sharding.py): comma-separated async URLs, empty = one database.
+    # The LEDGER_SHARD entry is also the primary engine (ledger, auth, entity lists) and overrides DATABASE_URL
+    db_shard_urls: str = os.getenv("DB_SHARD_URLS", "")
+    ledger_shard: int = int(os.getenv("LEDGER_SHARD", "0"))
+    # row format for new decisions (app/db/slim.py): "full" JSON copies or "slim" typed columns + compressed rest
+    storage_format: str = os.getenv("STORAGE_FORMAT", "full")
     app_env: str = os.getenv("APP_ENV", "dev")
     app_port: int = int(os.getenv("APP_PORT", "8000"))
     ledger_hmac_key: str = os.getenv("LEDGER_HMAC_KEY", "")
+    # ledger storage: "mysql", "segments" (binary segment files) or "both" (files + MySQL mirror)
+    ledger_backend: str = os.getenv("LEDGER_BACKEND", "mysql")
+    ledger_dir: str = os.getenv("LEDGER_DIR", "ledger")
+    ledger_segment_max_bytes: int = int(os.getenv("LEDGER_SEGMENT_MAX_BYTES", str(64 * 1024 * 1024)))
+    ledger_fsync: bool = os.getenv("LEDGER_FSYNC", "1") == "1"
+    # single-writer sequencer (app/ledger/sequencer.py): workers submit over this Unix socket when set
+    ledger_sequencer_socket: str = os.getenv("LEDGER_SEQUENCER_SOCKET", "")
+    ledger_sequencer_max_batch: int = int(os.getenv("LEDGER_SEQUENCER_MAX_BATCH", "256"))
+    ledger_sequencer_timeout: float = float(os.getenv("LEDGER_SEQUENCER_TIMEOUT", "10"))
+    # serialization: "auto" (orjson if installed), "orjson" or "stdlib"
+    json_backend: str = os.getenv("JSON_BACKEND", "auto")
+    # fraction of /api/predict payloads logged at DEBUG (0 = never)
+    debug_payload_sample_rate: float = float(os.getenv("DEBUG_PAYLOAD_SAMPLE_RATE", "0"))
+    # honour the X-Debug-Timing request header (Server-Timing stage breakdown)
+    debug_timing_header: bool = os.getenv("DEBUG_TIMING_HEADER", "1") == "1"
+    # import the ML stack and load models in a background thread at startup (else on first use)
+    warm_up_models: bool = os.getenv("WARM_UP_MODELS", "1") == "1"
+    # per-feature reason codes computed alongside RF/XGB scoring (app/ml/explain.py)
+    explain_reason_codes: bool = os.getenv("EXPLAIN_REASON_CODES", "1") == "1"
+    explain_top_k: int = int(os.getenv("EXPLAIN_TOP_K", "3"))
+    # latency tier (app/ml/distill.py): small, low-risk transactions scored by the distilled fast agent
+    fast_tier: bool = os.getenv("FAST_TIER", "0") == "1"
+    fast_tier_max_amount: float = float(os.getenv("FAST_TIER_MAX_AMOUNT", "5000"))
+    fast_tier_max_device_risk: float = float(os.getenv("FAST_TIER_MAX_DEVICE_RISK", "0.5"))
+    # entity block / allow lists (app/ml/entity_lists.py), checked before any model
+    entity_lists: bool = os.getenv("ENTITY_LISTS", "1") == "1"
+    entity_lists_dir: str = os.getenv("ENTITY_LISTS_DIR", "")  # block_device.txt, allow_user.txt, ...
+    entity_lists_reload_seconds: float = float(os.getenv("ENTITY_LISTS_RELOAD_SECONDS", "0"))  # 0 = admin reload only
+    entity_lists_bloom_bits: int = int(os.getenv("ENTITY_LISTS_BLOOM_BITS", "10"))  # per entry; 10 ~ 1% false positives
+    entity_lists_block_short_circuit: bool = os.getenv("ENTITY_LISTS_BLOCK_SHORT_CIRCUIT", "1") == "1"
+    entity_lists_allow_short_circuit: bool = os.getenv("ENTITY_LISTS_ALLOW_SHORT_CIRCUIT", "0") == "1"
+    # fraud-ring graph (app/ml/graph.py): union-find over users / devices, consulted as a consensus agent
+    graph_agent: bool = os.getenv("GRAPH_AGENT", "0") == "1"
+    graph_link_merchants: bool = os.getenv("GRAPH_LINK_MERCHANTS", "0") == "1"
+    graph_min_users: int = int(os.getenv("GRAPH_MIN_USERS", "2"))
+    graph_min_fraud: int = int(os.getenv("GRAPH_MIN_FRAUD", "2"))
+    graph_fraud_ratio: float = float(os.getenv("GRAPH_FRAUD_RATIO", "0.3"))
+    # reload the graph from the transactions table in the background at startup
+    graph_rebuild_on_startup: bool = os.getenv("GRAPH_REBUILD_ON_STARTUP", "1") == "1"
+    # similar-transaction index (app/ml/similarity.py) behind /api/transactions/{id}/similar
+    similar_index: bool = os.getenv("SIMILAR_INDEX", "0") == "1"
+    similar_velocity: bool = os.getenv("SIMILAR_VELOCITY", "0") == "1"  # add 1h / 24h per-user counts
+    similar_refresh_seconds: float = float(os.getenv("SIMILAR_REFRESH_SECONDS", "5"))
+    similar_rescan_ids: int = int(os.getenv("SIMILAR_RESCAN_IDS", "1000"))  # IDs re-read per refresh (late commits)
+    similar_max_lists: int = int(os.getenv("SIMILAR_MAX_LISTS", "1024"))
+    similar_nprobe: int = int(os.getenv("SIMILAR_NPROBE", "8"))
+    # analyst feedback (app/ml/feedback.py): labels buffered to Parquet, XGB boosting continued on them
+    feedback_dir: str = os.getenv("FEEDBACK_DIR", "feedback")
+    feedback_flush_rows: int = int(os.getenv("FEEDBACK_FLUSH_ROWS", "500"))
+    feedback_flush_seconds: float = float(os.getenv("FEEDBACK_FLUSH_SECONDS", "60"))
+    feedback_update_seconds: float = float(os.getenv("FEEDBACK_UPDATE_SECONDS", "0"))  # 0 = admin / CLI only
+    feedback_min_rows: int = int(os.getenv("FEEDBACK_MIN_ROWS", "200"))
+    feedback_xgb_rounds: int = int(os.getenv("FEEDBACK_XGB_ROUNDS", "20"))
+    # swap in a replaced xgb_model.joblib, checked this often (0 = never)
+    model_reload_seconds: float = float(os.getenv("MODEL_RELOAD_SECONDS", "30"))
+    # input / score drift sketches vs the training reference (app/ml/drift.py)
+    drift_monitoring: bool = os.getenv("DRIFT_MONITORING", "1") == "1"
+    drift_window_seconds: float = float(os.getenv("DRIFT_WINDOW_SECONDS", "3600"))
+    drift_min_count: int = int(os.getenv("DRIFT_MIN_COUNT", "200"))
+    # admission control for /api/predict (app/core/admission.py): pressure = max(signal / limit)
+    admission_control: bool = os.getenv("ADMISSION_CONTROL", "1") == "1"
+    admission_max_in_flight: int = int(os.getenv("ADMISSION_MAX_IN_FLIGHT", "256"))
+    admission_max_queue: int = int(os.getenv("ADMISSION_MAX_QUEUE", "64"))  # scoring jobs waiting for a thread
+    admission_max_pool_wait_ms: float = float(os.getenv("ADMISSION_MAX_POOL_WAIT_MS", "500"))
+    admission_max_backlog: int = int(os.getenv("ADMISSION_MAX_BACKLOG", "50000"))  # deferred ledger entries
+    # pressure at which each stage starts: no_recs, ledger_deferred, rules_only, shed (503)
+    admission_stages: str = os.getenv("ADMISSION_STAGES", "0.5,0.7,0.85,1.0")
+    admission_retry_after_seconds: float = float(os.getenv("ADMISSION_RETRY_AFTER_SECONDS", "1"))
+    admission_scoring_threads: int = int(os.getenv("ADMISSION_SCORING_THREADS", "4"))
+    admission_ledger_flush_ms: float = float(os.getenv("ADMISSION_LEDGER_FLUSH_MS", "250"))
+    # read-through cache for transaction / recommendation / user risk lookups
+    cache_max_entries: int = int(os.getenv("CACHE_MAX_ENTRIES", "10000"))
+    cache_ttl_seconds: float = float(os.getenv("CACHE_TTL_SECONDS", "60"))
+    # streaming ingest (/api/ingest): micro-batch closes at this many records or after this long
+    ingest_batch_size: int = int(os.getenv("INGEST_BATCH_SIZE", "32"))
+    ingest_batch_ms: float = float(os.getenv("INGEST_BATCH_MS", "50"))
+    ingest_max_record_bytes: int = int(os.getenv("INGEST_MAX_RECORD_BYTES", "65536"))
+    # change feed (/stream/decisions): per-subscriber buffer, replay ring, keep-alive
+    stream_queue_size: int = int(os.getenv("STREAM_QUEUE_SIZE", "256"))
+    stream_replay_events: int = int(os.getenv("STREAM_REPLAY_EVENTS", "2000"))
+    stream_heartbeat_seconds: float = float(os.getenv("STREAM_HEARTBEAT_SECONDS", "15"))
+    # monthly partitions / archival (app/db/partitioning.py)
+    partition_maintenance: bool = os.getenv("PARTITION_MAINTENANCE", "0") == "1"
+    partition_months_ahead: int = int(os.getenv("PARTITION_MONTHS_AHEAD", "3"))
+    archive_after_months: int = int(os.getenv("ARCHIVE_AFTER_MONTHS", "0"))  # 0 = never auto-archive
+    archive_dir: str = os.getenv("ARCHIVE_DIR", "archive")
     # auth
     secret_key: str = os.getenv("SECRET_KEY", "dev-secret-change-me")
     access_token_expire_minutes: int = int(os.getenv("ACCESS_TOKEN_EXPIRE_MINUTES", "60"))
+    # bcrypt runs on this many threads, off the event loop
+    auth_hash_workers: int = int(os.getenv("AUTH_HASH_WORKERS", "4"))
+    # validated token -> user cache (0 entries disables); role changes apply after the TTL
+    auth_token_cache_size: int = int(os.getenv("AUTH_TOKEN_CACHE_SIZE", "10000"))
+    auth_token_cache_ttl: float = float(os.getenv("AUTH_TOKEN_CACHE_TTL", "30"))
 
 
     @property
@@ -25,12 +135,21 @@ class Settings(BaseModel):
             f"@{self.db_host}:{self.db_port}/{self.db_name}"
         )
 
+    @property
+    def shard_urls(self) -> list:
+        return [u.strip() for u in self.db_shard_urls.split(",") if u.strip()]
+
+    @property
+    def sqlalchemy_url(self) -> str:
+        urls = self.shard_urls
+        if urls and 0 <= self.ledger_shard < len(urls):
+            return urls[self.ledger_shard]
+        return self.database_url or self.async_mysql_url
+
 settings = Settings()
 
-# --- DEBUG PRINTS ---
-masked_pw = "*" * len(settings.db_password) if settings.db_password else "(empty)"
-print(
-    f"🔧 Loaded DB Config -> host={settings.db_host}, port={settings.db_port}, "
-    f"user={settings.db_user}, password={masked_pw}, db={settings.db_name}"
+logger = logging.getLogger(__name__)
+logger.debug(
+    "Loaded DB config -> host=%s, port=%s, user=%s, db=%s",
+    settings.db_host, settings.db_port, settings.db_user, settings.db_name,
 )
-print(f"🔧 Full async_mysql_url: {settings.async_mysql_url.replace(settings.db_password, '****')}")
@@ -0,0 +1,164 @@
+# backend/app/core/events.py
+"""
+In-process pub/sub hub for the decision change feed.
+
+Sealing a ledger block publishes one "decision" per entry (the entry payload
+already holds txn id, verdict, scores and user) followed by the "block"
+itself, as one batch. Every event carries its block index, but only block
+events set the SSE id, so Last-Event-ID always names the last complete block.
+A client reconnecting with it (or ?since_block=) gets a replay, from the
+in-memory ring when it reaches back far enough and from the ledger otherwise,
+then the live tail.
+
+Each subscriber has its own bounded queue. A consumer that falls
+STREAM_QUEUE_SIZE events behind is cut off with an "overflow" event and
+resumes from its last id; publishers never block and the hub never buffers
+without bound.
+"""
+import asyncio
+from collections import deque
+from typing import Any, Deque, Dict, Iterable, List, Optional, Set
+from app.core import metrics
+from app.core.config import settings
+from app.core.serialization import dumps
+
+DECISION = "decision"
+BLOCK = "block"
+OVERFLOW = "overflow"
+
+events_published = metrics.counter("finfraud_stream_events_total", "Events published to the change feed.", "event")
+subscribers_dropped = metrics.counter(
+    "finfraud_stream_overflows_total", "Subscribers disconnected for falling behind.", "event"
+)
+
+
+class Event:
+    __slots__ = ("id", "kind", "data")
+
+    def __init__(self, id: int, kind: str, data: Dict[str, Any]):
+        self.id = id
+        self.kind = kind
+        self.data = data
+
+
+class Subscription:
+    def __init__(
+        self,
+        kinds: Iterable[str] = (DECISION, BLOCK),
+        verdicts: Optional[Iterable[str]] = None,
+        user: Optional[str] = None,
+        maxsize: int = 256,
+    ):
+        self.kinds = set(kinds)
+        self.verdicts = {v.lower() for v in verdicts} if verdicts else None
+        self.user = user
+        self.queue: "asyncio.Queue[Event]" = asyncio.Queue(maxsize=maxsize)
+        self.overflowed = False
+
+    def wants(self, ev: Event) -> bool:
+        if ev.kind not in self.kinds:
+            return False
+        if ev.kind == DECISION:
+            if self.verdicts is not None and str(ev.data.get("verdict", "")).lower() not in self.verdicts:
+                return False
+            if self.user is not None and ev.data.get("user_external_id") != self.user:
+                return False
+        return True
+
+    def offer(self, ev: Event) -> bool:
+        """Non-blocking enqueue; False once the subscriber has overflowed."""
+        if self.overflowed:
+            return False
+        try:
+            self.queue.put_nowait(ev)
+            return True
+        except asyncio.QueueFull:
+            self.overflowed = True
+            # drop the backlog; the reader resumes after its last delivered block
+            while not self.queue.empty():
+                self.queue.get_nowait()
+            self.queue.put_nowait(Event(ev.id, OVERFLOW, {}))
+            return False
+
+
+class Hub:
+    def __init__(self, replay_size: int = 1000):
+        self._subs: Set[Subscription] = set()
+        self._recent: Deque[Event] = deque(maxlen=replay_size)
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+
+    def subscribe(self, sub: Subscription) -> Subscription:
+        self._loop = asyncio.get_running_loop()
+        self._subs.add(sub)
+        return sub
+
+    def unsubscribe(self, sub: Subscription) -> None:
+        self._subs.discard(sub)
+
+    def __len__(self) -> int:
+        return len(self._subs)
+
+    def publish(self, batch: List[Event]) -> None:
+        """Fan out a batch atomically; safe to call from the event loop or a worker thread."""
+        loop = self._loop
+        if loop is not None and loop.is_running():
+            try:
+                running = asyncio.get_running_loop()
+            except RuntimeError:
+                running = None
+            if running is not loop:
+                loop.call_soon_threadsafe(self._publish, batch)
+                return
+        self._publish(batch)
+
+    def _publish(self, batch: List[Event]) -> None:
+        self._recent.extend(batch)
+        for ev in batch:
+            events_published.inc(ev.kind)
+        for sub in list(self._subs):
+            for ev in batch:
+                # blocks always go through: filtered ones still advance the client's resume point
+                if (ev.kind == BLOCK or sub.wants(ev)) and not sub.offer(ev):
+                    subscribers_dropped.inc(ev.kind)
+                    self._subs.discard(sub)
+                    break
+
+    def recent_since(self, since: int) -> Optional[List[Event]]:
+        """Buffered events after block `since`, or None if the ring no longer reaches back that far."""
+        if not self._recent or self._recent[0].id > since:
+            return None  # the oldest buffered block may be partial, so it must predate the resume point
+        return [ev for ev in self._recent if ev.id > since]
+
+
+hub = Hub(settings.stream_replay_events)
+
+metrics.register_gauge("finfraud_stream_subscribers", "Connected change-feed subscribers.", lambda: len(hub))
+
+
+# ------------------------------
+# Feed helpers
+# ------------------------------
+def block_events(block: Dict[str, Any], payloads: Iterable[Dict[str, Any]]) -> List[Event]:
+    """A sealed block as feed events: its decisions first, the block last."""
+    bi = int(block["block_index"])
+    batch = [Event(bi, DECISION, {**p, "block_index": bi}) for p in payloads]
+    batch.append(Event(bi, BLOCK, {k: block[k] for k in ("block_index", "block_hash", "merkle_root", "entries_count")}))
+    return batch
+
+
+def publish_block(block: Dict[str, Any], payloads: Iterable[Dict[str, Any]]) -> None:
+    hub.publish(block_events(block, payloads))
+
+
+def ledger_events(blocks: Iterable[Dict[str, Any]]) -> Iterable[Event]:
+    """
+    Rebuild feed events from ledger blocks (dicts with the block header fields
+    and 'entries' holding parsed payloads), for resumes older than the ring.
+    """
+    for b in blocks:
+        yield from block_events(b, b["entries"])
+
+
+def sse_format(ev: Event) -> bytes:
+    head = f"id: {ev.id}\n" if ev.kind in (BLOCK, OVERFLOW) else ""
+    return f"{head}event: {ev.kind}\ndata: {dumps(ev.data)}\n\n".encode("utf-8")
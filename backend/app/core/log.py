@@ -0,0 +1,9 @@
+# backend/app/core/log.py
+import random
+from app.core.config import settings
+
+
+def payload_sampled() -> bool:
+    """Whether to log this request's payload (DEBUG_PAYLOAD_SAMPLE_RATE, 0 disables)."""
+    rate = settings.debug_payload_sample_rate
+    return rate > 0 and (rate >= 1 or random.random() < rate)
@@ -0,0 +1,150 @@
+# backend/app/core/metrics.py
+"""
+In-process metrics with Prometheus text exposition.
+
+Histograms use fixed buckets, so observe() is a bisect plus a few integer
+increments under a lock; cheap enough to leave on in production. Gauges are
+callbacks evaluated at scrape time.
+"""
+import bisect
+import threading
+from typing import Callable, Dict, Iterable, List, Tuple
+
+# seconds; covers sub-millisecond rules up to multi-second DB stalls
+DEFAULT_BUCKETS = (
+    0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05,
+    0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0,
+)
+
+
+class Histogram:
+    def __init__(self, buckets: Iterable[float] = DEFAULT_BUCKETS):
+        self.buckets = tuple(buckets)
+        self.counts = [0] * (len(self.buckets) + 1)  # last slot is +Inf
+        self.sum = 0.0
+        self.count = 0
+        self._lock = threading.Lock()
+
+    def observe(self, value: float) -> None:
+        i = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            self.counts[i] += 1
+            self.sum += value
+            self.count += 1
+
+    def snapshot(self) -> Tuple[List[int], float, int]:
+        with self._lock:
+            return list(self.counts), self.sum, self.count
+
+
+class HistogramFamily:
+    """A named histogram split by a single label."""
+
+    def __init__(self, name: str, help: str, label: str, buckets: Iterable[float] = DEFAULT_BUCKETS):
+        self.name = name
+        self.help = help
+        self.label = label
+        self.buckets = tuple(buckets)
+        self.children: Dict[str, Histogram] = {}
+        self._lock = threading.Lock()
+
+    def labels(self, value: str) -> Histogram:
+        h = self.children.get(value)
+        if h is None:
+            with self._lock:
+                h = self.children.setdefault(value, Histogram(self.buckets))
+        return h
+
+    def observe(self, value: str, seconds: float) -> None:
+        self.labels(value).observe(seconds)
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} histogram"]
+        for value, h in sorted(self.children.items()):
+            counts, total, count = h.snapshot()
+            cumulative = 0
+            for le, c in zip(self.buckets, counts):
+                cumulative += c
+                lines.append(f'{self.name}_bucket{{{self.label}="{value}",le="{le}"}} {cumulative}')
+            lines.append(f'{self.name}_bucket{{{self.label}="{value}",le="+Inf"}} {count}')
+            lines.append(f'{self.name}_sum{{{self.label}="{value}"}} {total}')
+            lines.append(f'{self.name}_count{{{self.label}="{value}"}} {count}')
+        return lines
+
+
+class CounterFamily:
+    """A monotonically increasing count, optionally split by one label."""
+
+    def __init__(self, name: str, help: str, label: str | None = None):
+        self.name = name
+        self.help = help
+        self.label = label
+        self.values: Dict[str, float] = {}
+        self._lock = threading.Lock()
+
+    def inc(self, value: str = "", amount: float = 1.0) -> None:
+        with self._lock:
+            self.values[value] = self.values.get(value, 0.0) + amount
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} counter"]
+        with self._lock:
+            items = sorted(self.values.items())
+        for value, v in items:
+            if self.label:
+                lines.append(f'{self.name}{{{self.label}="{value}"}} {v}')
+            else:
+                lines.append(f"{self.name} {v}")
+        return lines
+
+
+_families: Dict[str, HistogramFamily | CounterFamily] = {}
+_gauges: Dict[str, Tuple[str, Callable[[], Dict[str, float] | float]]] = {}
+
+
+def histogram(name: str, help: str, label: str, buckets: Iterable[float] = DEFAULT_BUCKETS) -> HistogramFamily:
+    fam = _families.get(name)
+    if fam is None:
+        fam = _families.setdefault(name, HistogramFamily(name, help, label, buckets))
+    return fam
+
+
+def counter(name: str, help: str, label: str | None = None) -> CounterFamily:
+    fam = _families.get(name)
+    if fam is None:
+        fam = _families.setdefault(name, CounterFamily(name, help, label))
+    return fam
+
+
+def register_gauge(name: str, help: str, fn: Callable[[], Dict[str, float] | float]) -> None:
+    """fn returns a number, or {label_string: number} for labelled series (e.g. 'state="idle"')."""
+    _gauges[name] = (help, fn)
+
+
+def render_prometheus() -> str:
+    lines: List[str] = []
+    for fam in list(_families.values()):
+        lines.extend(fam.render())
+    for name, (help, fn) in list(_gauges.items()):
+        try:
+            value = fn()
+        except Exception:
+            continue  # a broken gauge must not break the scrape
+        lines.append(f"# HELP {name} {help}")
+        lines.append(f"# TYPE {name} gauge")
+        if isinstance(value, dict):
+            for labels, v in value.items():
+                lines.append(f"{name}{{{labels}}} {v}")
+        else:
+            lines.append(f"{name} {value}")
+    return "\n".join(lines) + "\n"
+
+
+# Shared families ------------------------------------------------------------
+
+stage_seconds = histogram(
+    "finfraud_stage_seconds", "Latency of pipeline stages (model load, encode, inference, db, ledger, recs).", "stage"
+)
+db_statement_seconds = histogram(
+    "finfraud_db_statement_seconds", "Latency of individual SQL statements, by verb and table.", "statement"
+)
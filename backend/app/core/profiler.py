@@ -0,0 +1,125 @@
+# backend/app/core/profiler.py
+"""
+Time-bounded sampling profiler for a live worker.
+
+A background thread snapshots every thread's Python stack with
+sys._current_frames() at a fixed interval, so the event loop thread and the
+executor/threadpool threads are covered without tracing overhead. Only one
+profile runs per process at a time and duration/interval are clamped, which
+keeps it safe to run under production load.
+
+Output is either collapsed stacks ("thread;outer;inner count", the input
+format of flamegraph.pl / speedscope / inferno) or speedscope JSON.
+"""
+import os
+import sys
+import threading
+import time
+from collections import Counter, defaultdict
+from typing import Dict, List, Tuple
+
+MAX_DURATION_S = 60.0
+MIN_INTERVAL_S = 0.001
+MAX_DEPTH = 128
+
+# leaf frames that mean "thread is parked", dropped unless idle=True
+_IDLE_LEAVES = {
+    ("selectors.py", "select"),
+    ("threading.py", "wait"),
+    ("threading.py", "_wait_for_tstate_lock"),
+    ("queue.py", "get"),
+    ("thread.py", "_worker"),
+}
+
+_lock = threading.Lock()
+
+
+class ProfilerBusy(RuntimeError):
+    pass
+
+
+def _frame_label(code) -> str:
+    return f"{code.co_qualname} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})"
+
+
+def _is_idle(frame) -> bool:
+    code = frame.f_code
+    return (os.path.basename(code.co_filename), code.co_name) in _IDLE_LEAVES
+
+
+def sample_stacks(duration: float, interval: float, idle: bool = False) -> Tuple[Counter, int]:
+    """
+    Sample all threads (except the caller) for `duration` seconds.
+    Returns (Counter of root->leaf tuples prefixed with the thread name, number of sampling ticks).
+    Raises ProfilerBusy if another profile is already running.
+    """
+    if not _lock.acquire(blocking=False):
+        raise ProfilerBusy("a profile is already running in this worker")
+    try:
+        duration = min(max(duration, 0.0), MAX_DURATION_S)
+        interval = max(interval, MIN_INTERVAL_S)
+        me = threading.get_ident()
+        stacks: Counter = Counter()
+        ticks = 0
+        deadline = time.monotonic() + duration
+        while time.monotonic() < deadline:
+            names = {t.ident: t.name for t in threading.enumerate()}
+            for ident, frame in sys._current_frames().items():
+                if ident == me or (not idle and _is_idle(frame)):
+                    continue
+                labels: List[str] = []
+                f = frame
+                while f is not None and len(labels) < MAX_DEPTH:
+                    labels.append(_frame_label(f.f_code))
+                    f = f.f_back
+                labels.append(names.get(ident, f"thread-{ident}"))
+                labels.reverse()
+                stacks[tuple(labels)] += 1
+            ticks += 1
+            time.sleep(interval)
+        return stacks, ticks
+    finally:
+        _lock.release()
+
+
+def to_collapsed(stacks: Counter) -> str:
+    return "".join(f"{';'.join(s)} {n}\n" for s, n in stacks.most_common())
+
+
+def to_speedscope(stacks: Counter, interval: float, name: str = "finfraud worker") -> Dict:
+    """Speedscope 'sampled' profile, one profile per thread."""
+    frames: List[Dict] = []
+    index: Dict[str, int] = {}
+    per_thread: Dict[str, Tuple[List[List[int]], List[float]]] = defaultdict(lambda: ([], []))
+
+    for stack, count in stacks.items():
+        thread, rest = stack[0], stack[1:]
+        ids = []
+        for label in rest:
+            if label not in index:
+                index[label] = len(frames)
+                frames.append({"name": label})
+            ids.append(index[label])
+        samples, weights = per_thread[thread]
+        samples.append(ids)
+        weights.append(count * interval)
+
+    profiles = [
+        {
+            "type": "sampled",
+            "name": thread,
+            "unit": "seconds",
+            "startValue": 0,
+            "endValue": sum(weights),
+            "samples": samples,
+            "weights": weights,
+        }
+        for thread, (samples, weights) in sorted(per_thread.items())
+    ]
+    return {
+        "$schema": "https://www.speedscope.app/file-format-schema.json",
+        "name": name,
+        "exporter": "finfraud",
+        "shared": {"frames": frames},
+        "profiles": profiles,
+    }
@@ -1,29 +1,49 @@
+import asyncio
+import time
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime, timedelta
 from fastapi import Depends, HTTPException, status
 from fastapi.security import OAuth2PasswordBearer
 from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy import select
 import jwt
+from passlib.context import CryptContext
 
+from app.core import cache
 from app.core.config import settings
 from app.db.database import get_db
 from app.db.user import User
 
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl="/auth/login")
+pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
+
+# bcrypt releases the GIL, so a few threads hash in parallel without
+# stalling the event loop; the pool size caps CPU spent on logins
+_hash_pool = ThreadPoolExecutor(max_workers=settings.auth_hash_workers, thread_name_prefix="pwhash")
+
+# validated token -> user column snapshot
+token_cache = cache.get_cache("auth_tokens", settings.auth_token_cache_size, settings.auth_token_cache_ttl)
+_USER_FIELDS = ("id", "name", "email", "hashed_password", "role")
 
 
 def hash_password(password: str) -> str:
-    from passlib.context import CryptContext
-    pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
     return pwd_context.hash(password)
 
 
 def verify_password(plain_password: str, hashed_password: str) -> bool:
-    from passlib.context import CryptContext
-    pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
     return pwd_context.verify(plain_password, hashed_password)
 
 
+async def hash_password_async(password: str) -> str:
+    return await asyncio.get_running_loop().run_in_executor(_hash_pool, hash_password, password)
+
+
+async def verify_password_async(plain_password: str, hashed_password: str) -> bool:
+    return await asyncio.get_running_loop().run_in_executor(
+        _hash_pool, verify_password, plain_password, hashed_password
+    )
+
+
 def create_access_token(data: dict, expires_minutes: int | None = None):
     to_encode = data.copy()
     expire = datetime.utcnow() + timedelta(
@@ -38,7 +58,11 @@ async def get_current_user(
     token: str = Depends(oauth2_scheme),
     db: AsyncSession = Depends(get_db),
 ) -> User:
-    """Decode JWT and return the current user from DB"""
+    """Decode JWT and return the current user (briefly cached per token, else from DB)"""
+    cached = token_cache.get(token)
+    if cached is not None:
+        return User(**cached)
+
     try:
         payload = jwt.decode(token, settings.secret_key, algorithms=["HS256"])
         user_id: str = payload.get("sub")
@@ -66,4 +90,23 @@ async def get_current_user(
             headers={"WWW-Authenticate": "Bearer"},
         )
 
+    # never cache past the token's own expiry
+    ttl = min(token_cache.ttl, float(payload.get("exp", 0)) - time.time())
+    if ttl > 0:
+        token_cache.set(token, {f: getattr(user, f) for f in _USER_FIELDS}, ttl=ttl)
     return user
+
+
+def require_role(*roles: str):
+    """Dependency factory: the current user must have one of `roles`."""
+    async def checker(user: User = Depends(get_current_user)) -> User:
+        if user.role not in roles:
+            raise HTTPException(
+                status_code=status.HTTP_403_FORBIDDEN,
+                detail="Insufficient permissions",
+            )
+        return user
+    return checker
+
+
+require_admin = require_role("admin")
@@ -0,0 +1,105 @@
+# backend/app/core/serialization.py
+"""
+Pluggable JSON serialization.
+
+Uses orjson when it is installed (and JSON_BACKEND allows it), falling back to
+the stdlib json module otherwise. The canonical encoder is byte-identical to
+the ledger's historical `json.dumps(sort_keys=True, separators=(",", ":"),
+ensure_ascii=False)` output, so existing chains keep verifying.
+"""
+import json
+from typing import Any
+
+from starlette.responses import JSONResponse
+
+from app.core.config import settings
+
+try:
+    import orjson
+except ImportError:  # optional dependency
+    orjson = None
+
+BACKEND = "orjson" if orjson is not None and settings.json_backend in ("auto", "orjson") else "stdlib"
+
+_SCALARS = (str, int, bool, type(None))
+
+
+def _orjson_canonical_safe(obj: Any) -> bool:
+    """
+    True when orjson's output for obj matches the stdlib canonical form.
+    orjson differs for exponent floats (1e-05 vs 0.00001), non-finite floats,
+    non-str keys and non-JSON types; those go through the stdlib path.
+    """
+    t = type(obj)
+    if t in _SCALARS:
+        return True
+    if t is float:
+        a = abs(obj)
+        return a == 0.0 or (1e-4 <= a < 1e16)
+    if t is dict:
+        for k, v in obj.items():
+            if type(k) is not str or not _orjson_canonical_safe(v):
+                return False
+        return True
+    if t is list or t is tuple:
+        return all(_orjson_canonical_safe(v) for v in obj)
+    return False
+
+
+def _stdlib_canonical(obj: Any) -> str:
+    return json.dumps(obj, separators=(",", ":"), sort_keys=True, ensure_ascii=False)
+
+
+def canonical_bytes(obj: Any) -> bytes:
+    """Sorted-key, compact, UTF-8 JSON. Used for hashing and ledger storage."""
+    if BACKEND == "orjson" and _orjson_canonical_safe(obj):
+        try:
+            return orjson.dumps(obj, option=orjson.OPT_SORT_KEYS)
+        except orjson.JSONEncodeError:
+            pass  # e.g. ints wider than 64 bits
+    return _stdlib_canonical(obj).encode("utf-8")
+
+
+def canonical_str(obj: Any) -> str:
+    return canonical_bytes(obj).decode("utf-8")
+
+
+def dumps_bytes(obj: Any) -> bytes:
+    """Compact JSON for storage/transport where key order doesn't matter."""
+    if BACKEND == "orjson":
+        try:
+            return orjson.dumps(obj)
+        except orjson.JSONEncodeError:
+            pass
+    return json.dumps(obj, separators=(",", ":")).encode("utf-8")
+
+
+def dumps(obj: Any) -> str:
+    return dumps_bytes(obj).decode("utf-8")
+
+
+def loads(data: str | bytes | bytearray | memoryview) -> Any:
+    if BACKEND == "orjson":
+        return orjson.loads(data)
+    if isinstance(data, memoryview):
+        data = data.tobytes()
+    return json.loads(data)
+
+
+def loads_json_column(value: Any) -> Any:
+    """JSON columns come back as str from aiomysql; tolerate already-decoded values and NULL."""
+    if value is None or isinstance(value, (dict, list)):
+        return value
+    return loads(value)
+
+
+class FastJSONResponse(JSONResponse):
+    """Default response class: renders with the active backend."""
+
+    def render(self, content: Any) -> bytes:
+        if BACKEND == "orjson":
+            try:
+                return orjson.dumps(content, option=orjson.OPT_NON_STR_KEYS | orjson.OPT_SERIALIZE_NUMPY)
+            except orjson.JSONEncodeError:
+                pass
+        return json.dumps(content, ensure_ascii=False, allow_nan=False, separators=(",", ":")).encode("utf-8")
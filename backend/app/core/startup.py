@@ -0,0 +1,91 @@
+# backend/app/core/startup.py
+"""
+Cold-start bookkeeping and background model warm-up.
+
+Workers start serving without the ML stack: pandas / numpy / sklearn /
+xgboost and the model files are loaded by warm_up() in a thread once the
+lifespan has run. Requests that need a model before that await the same
+warm-up instead of importing on the event loop.
+
+Every step records its wall-clock seconds in `phases`. The breakdown is
+logged when the worker is ready and served on GET /health/startup.
+bench/startup.py reports the per-module import-time breakdown.
+"""
+import asyncio
+import logging
+import time
+from contextlib import contextmanager
+from typing import Any, Dict, Iterator, Optional
+
+logger = logging.getLogger(__name__)
+
+_t0 = time.perf_counter()
+phases: Dict[str, float] = {}
+info: Dict[str, Any] = {"ready": False, "warm": False}
+_warm_task: Optional[asyncio.Future] = None
+
+
+def mark(name: str, seconds: float) -> None:
+    phases[name] = round(seconds, 4)
+
+
+@contextmanager
+def phase(name: str) -> Iterator[None]:
+    t0 = time.perf_counter()
+    try:
+        yield
+    finally:
+        mark(name, time.perf_counter() - t0)
+
+
+def since_import() -> float:
+    """Seconds since this module was first imported (first line of app.main)."""
+    return time.perf_counter() - _t0
+
+
+def ready() -> None:
+    mark("ready", since_import())
+    info["ready"] = True
+    logger.info("Startup: %s", ", ".join(f"{k} {v:.3f}s" for k, v in phases.items()))
+
+
+# ------------------------------
+# Background warm-up
+# ------------------------------
+def warm_up() -> None:
+    """Import the ML stack and load the models (runs in a worker thread)."""
+    from app.core.config import settings
+
+    t0 = time.perf_counter()
+    try:
+        with phase("import_ml"):
+            from app.ml import predictor
+        with phase("model_load"):
+            predictor.load_models()
+            if settings.fast_tier:
+                predictor.load_fast_model()
+    except Exception as exc:
+        info["warm_up_error"] = f"{type(exc).__name__}: {exc}"
+        logger.exception("Model warm-up failed; requests will retry the load")
+    finally:
+        mark("warm_up", time.perf_counter() - t0)
+        info["warm"] = True
+        logger.info("Warm-up finished in %.3fs", phases["warm_up"])
+
+
+def start_warm_up() -> asyncio.Future:
+    global _warm_task
+    loop = asyncio.get_running_loop()
+    if _warm_task is None or _warm_task.get_loop() is not loop:
+        _warm_task = loop.create_task(asyncio.to_thread(warm_up))
+    return _warm_task
+
+
+async def ensure_warm() -> None:
+    """Wait for (or start) the warm-up without blocking the event loop."""
+    if not info["warm"]:
+        await asyncio.shield(start_warm_up())
+
+
+def snapshot() -> Dict[str, Any]:
+    return {**info, "phases": dict(phases), "uptime_s": round(since_import(), 3)}
@@ -0,0 +1,91 @@
+# backend/app/core/timing.py
+"""
+Per-stage timers for the predict -> ledger pipeline.
+
+`stage(name)` measures a block with the monotonic clock, feeds the
+finfraud_stage_seconds histogram and adds the elapsed seconds to the collector
+opened by `collect_stages()` for the current request/task (if any).
+"""
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Dict, Iterator, Optional
+from starlette.datastructures import MutableHeaders
+from app.core.config import settings
+from app.core.metrics import stage_seconds
+
+# Stage names used across the app
+MODEL_LOAD = "model_load"
+ENCODE = "encode"
+RF = "rf"
+XGB = "xgb"
+RULES = "rules"
+DB = "db"
+LEDGER = "ledger"
+RECS = "recs"
+EXPLAIN = "explain"
+FAST = "fast"
+GRAPH = "graph"
+LISTS = "lists"
+
+_collector: ContextVar[Optional[Dict[str, float]]] = ContextVar("stage_collector", default=None)
+
+
+def record(name: str, seconds: float) -> None:
+    stage_seconds.observe(name, seconds)
+    stages = _collector.get()
+    if stages is not None:
+        stages[name] = stages.get(name, 0.0) + seconds
+
+
+@contextmanager
+def stage(name: str) -> Iterator[None]:
+    t0 = time.perf_counter()
+    try:
+        yield
+    finally:
+        record(name, time.perf_counter() - t0)
+
+
+@contextmanager
+def collect_stages() -> Iterator[Dict[str, float]]:
+    """Collect stage timings (seconds, summed per stage) for everything run inside the block."""
+    stages: Dict[str, float] = {}
+    token = _collector.set(stages)
+    try:
+        yield stages
+    finally:
+        _collector.reset(token)
+
+
+def server_timing(stages: Dict[str, float]) -> str:
+    """Format as a Server-Timing header value (durations in ms)."""
+    return ", ".join(f"{name};dur={seconds * 1000:.3f}" for name, seconds in stages.items())
+
+
+class StageTimingMiddleware:
+    """
+    Per-request opt-in stage breakdown: send `X-Debug-Timing: 1` and the
+    response carries a Server-Timing header (browser devtools render it).
+    """
+
+    HEADER = b"x-debug-timing"
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or not settings.debug_timing_header or not any(
+            k == self.HEADER and v not in (b"", b"0") for k, v in scope["headers"]
+        ):
+            return await self.app(scope, receive, send)
+
+        t0 = time.perf_counter()
+        with collect_stages() as stages:
+            async def send_with_timing(message):
+                if message["type"] == "http.response.start":
+                    stages["total"] = time.perf_counter() - t0
+                    MutableHeaders(scope=message).append("Server-Timing", server_timing(stages))
+                await send(message)
+
+            await self.app(scope, receive, send_with_timing)
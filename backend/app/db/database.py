@@ -1,19 +1,161 @@
+import math
+import re
+import time
 from collections.abc import AsyncGenerator
-from sqlalchemy.ext.asyncio import create_async_engine, AsyncSession, async_sessionmaker
+from functools import lru_cache
+from contextlib import asynccontextmanager
+from sqlalchemy import event, exc
+from sqlalchemy.ext.asyncio import create_async_engine, AsyncEngine, AsyncSession, async_sessionmaker
 from sqlalchemy.orm import declarative_base
+from sqlalchemy.pool import AsyncAdaptedQueuePool
 from app.core.config import settings
+from app.core import metrics, timing
 
 # ✅ Add declarative base
 Base = declarative_base()
 
+pool_checkout_seconds = metrics.histogram(
+    "finfraud_db_pool_checkout_seconds", "Time to obtain a pooled connection (wait + connect).", "pool"
+)
+pool_timeouts = metrics.counter(
+    "finfraud_db_pool_timeouts_total", "Checkouts that gave up after DB_POOL_TIMEOUT.", "pool"
+)
+pool_liveness_failures = metrics.counter(
+    "finfraud_db_pool_liveness_failures_total", "Idle connections found dead on checkout and replaced.", "pool"
+)
+
+
+class InstrumentedPool(AsyncAdaptedQueuePool):
+    """Queue pool that records checkout waits, waiters and timeouts."""
+
+    WAIT_DECAY_S = 1.0  # recent_wait() time constant
+
+    def __init__(self, *args, name: str = "primary", **kw):
+        super().__init__(*args, **kw)
+        self.name = name
+        self.waiting = 0
+        self._wait_avg = 0.0
+        self._wait_at = time.perf_counter()
+
+    def _do_get(self):
+        self.waiting += 1
+        t0 = time.perf_counter()
+        try:
+            return super()._do_get()
+        except exc.TimeoutError:
+            pool_timeouts.inc(self.name)
+            raise
+        finally:
+            self.waiting -= 1
+            now = time.perf_counter()
+            pool_checkout_seconds.observe(self.name, now - t0)
+            self._wait_avg = self._decayed(now) * 0.8 + (now - t0) * 0.2
+            self._wait_at = now
+
+    def _decayed(self, now: float) -> float:
+        return self._wait_avg * math.exp(-(now - self._wait_at) / self.WAIT_DECAY_S)
+
+    def recent_wait(self) -> float:
+        """Moving average of checkout waits (seconds), decaying while nothing checks out."""
+        return self._decayed(time.perf_counter())
+
+    def recreate(self):
+        pool = super().recreate()
+        pool.name = self.name
+        return pool
+
+
+_STATEMENT_RE = re.compile(
+    r"^\s*(?:(SELECT|DELETE)\b.*?\bFROM|(INSERT|REPLACE)\s+INTO|(UPDATE))\s+`?(\w+)",
+    re.IGNORECASE | re.DOTALL,
+)
+
+
+@lru_cache(maxsize=512)
+def _statement_label(statement: str) -> str:
+    """'INSERT transactions', 'SELECT chain_blocks', ... (bounded by the set of distinct statements)."""
+    m = _STATEMENT_RE.match(statement)
+    if not m:
+        return statement.split(None, 1)[0].upper() if statement.strip() else "OTHER"
+    verb = m.group(1) or m.group(2) or m.group(3)
+    return f"{verb.upper()} {m.group(4)}"
+
+
+def _instrument(engine: AsyncEngine) -> None:
+    sync_engine = engine.sync_engine
+
+    # Time every statement into the "db" stage and the per-statement histogram
+    @event.listens_for(sync_engine, "before_cursor_execute")
+    def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        conn.info.setdefault("query_start", []).append(time.perf_counter())
+
+    @event.listens_for(sync_engine, "after_cursor_execute")
+    def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        elapsed = time.perf_counter() - conn.info["query_start"].pop()
+        timing.record(timing.DB, elapsed)
+        metrics.db_statement_seconds.observe(_statement_label(statement), elapsed)
+
+    # Liveness: instead of pre-pinging every checkout, only ping connections that
+    # sat idle longer than DB_POOL_IDLE_PING_SECONDS. A dead one is discarded and
+    # the pool transparently retries with a fresh connection.
+    @event.listens_for(sync_engine, "checkin")
+    def _on_checkin(dbapi_connection, connection_record):
+        connection_record.info["last_used"] = time.monotonic()
+
+    @event.listens_for(sync_engine, "checkout")
+    def _on_checkout(dbapi_connection, connection_record, connection_proxy):
+        threshold = settings.db_pool_idle_ping_seconds
+        last = connection_record.info.get("last_used")
+        if threshold < 0 or last is None or time.monotonic() - last < threshold:
+            return
+        try:
+            sync_engine.dialect.do_ping(dbapi_connection)
+        except Exception:
+            pool_liveness_failures.inc(getattr(sync_engine.pool, "name", "primary"))
+            raise exc.DisconnectionError("idle connection failed liveness ping")
+
+
+def create_engine_for(url: str, name: str = "primary") -> AsyncEngine:
+    """Engine with the pool settings from Settings and the app's instrumentation."""
+    eng = create_async_engine(
+        url,
+        poolclass=InstrumentedPool,
+        pool_size=settings.db_pool_size,
+        max_overflow=settings.db_max_overflow,
+        pool_timeout=settings.db_pool_timeout,
+        pool_recycle=settings.db_pool_recycle,
+        pool_pre_ping=settings.db_pool_pre_ping,
+        pool_use_lifo=True,  # hot connections get reused; idle ones age out via recycle
+        echo=False,
+    )
+    eng.pool.name = name
+    _instrument(eng)
+    return eng
+
+
+def pool_status(eng: AsyncEngine | None = None) -> dict:
+    pool = (eng or engine).pool
+    if not hasattr(pool, "checkedout"):
+        return {}
+    capacity = pool.size() + max(pool._max_overflow, 0)
+    return {
+        "size": pool.size(),
+        "checked_in": pool.checkedin(),
+        "checked_out": pool.checkedout(),
+        "overflow": pool.overflow(),
+        "waiting": getattr(pool, "waiting", 0),
+        "recent_wait_ms": pool.recent_wait() * 1000.0 if hasattr(pool, "recent_wait") else 0.0,
+        "saturation": pool.checkedout() / capacity if capacity else 0.0,
+    }
+
+
 # Create engine once at import time
-engine = create_async_engine(
-    settings.async_mysql_url,
-    pool_pre_ping=True,
-    pool_recycle=1800,
-    echo=False,
-    pool_size=10,
-    max_overflow=20,
+engine = create_engine_for(settings.sqlalchemy_url)
+
+metrics.register_gauge(
+    "finfraud_db_pool_connections",
+    "SQLAlchemy pool state for the primary engine (saturation = checked_out / (size + max_overflow)).",
+    lambda: {f'state="{k}"': v for k, v in pool_status().items()},
 )
 
 # Session factory (SQLAlchemy 2.0 style)
@@ -25,8 +167,9 @@ AsyncSessionLocal = async_sessionmaker(
     class_=AsyncSession,
 )
 
-# FastAPI dependency
-async def get_db() -> AsyncGenerator[AsyncSession, None]:
+@asynccontextmanager
+async def session_scope() -> AsyncGenerator[AsyncSession, None]:
+    """Unit of work: commit on success, roll back on error, release the connection on exit."""
     async with AsyncSessionLocal() as session:
         try:
             yield session
@@ -36,5 +179,10 @@ async def get_db() -> AsyncGenerator[AsyncSession, None]:
             raise
         # session closes automatically
 
+# FastAPI dependency
+async def get_db() -> AsyncGenerator[AsyncSession, None]:
+    async with session_scope() as session:
+        yield session
+
 # ✅ Alias for legacy imports
 get_session = get_db
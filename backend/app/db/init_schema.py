@@ -1,12 +1,42 @@
+import hashlib
 import pathlib
+from sqlalchemy.exc import DBAPIError, IntegrityError
 from sqlalchemy.ext.asyncio import AsyncEngine
 from sqlalchemy import text
 
 SCHEMA_PATH = pathlib.Path(__file__).resolve().parents[3] / "database" / "schema.sql"
 
-async def init_schema(engine: AsyncEngine):
+
+def schema_version(sql: str) -> str:
+    """Checksum of schema.sql; any edit to the file is a new version."""
+    return hashlib.sha256(sql.replace("\r\n", "\n").encode("utf-8")).hexdigest()[:16]
+
+
+async def init_schema(engine: AsyncEngine) -> bool:
+    """
+    Apply schema.sql unless schema_version already records this file's
+    checksum (one indexed lookup on a warm database). Returns True if the
+    statements were executed.
+    """
     sql = SCHEMA_PATH.read_text(encoding="utf-8")
+    version = schema_version(sql)
+    try:
+        async with engine.connect() as conn:
+            row = (await conn.execute(
+                text("SELECT 1 FROM schema_version WHERE version = :v"), {"v": version}
+            )).first()
+        if row is not None:
+            return False
+    except DBAPIError:
+        pass  # fresh database: no schema_version table yet
+
     async with engine.begin() as conn:
         # Split on semicolons cautiously; MySQL driver can run multi statements with text()
         for stmt in [s.strip() for s in sql.split(";") if s.strip()]:
             await conn.execute(text(stmt))
+    try:
+        async with engine.begin() as conn:
+            await conn.execute(text("INSERT INTO schema_version (version) VALUES (:v)"), {"v": version})
+    except IntegrityError:
+        pass  # another worker recorded it first
+    return True
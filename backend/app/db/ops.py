@@ -0,0 +1,361 @@
+# backend/app/db/ops.py
+"""
+SQL for the fraud pipeline, kept out of the routers so handlers only hold a
+session for the persistence phase.
+"""
+from typing import Any, Dict, List, Optional
+from sqlalchemy import bindparam, text
+from sqlalchemy.ext.asyncio import AsyncSession
+from app.core import cache
+from app.core.config import settings
+from app.core.serialization import dumps, loads_json_column
+from app.db import slim
+
+
+# ------------------------------
+# Writes
+# ------------------------------
+async def insert_transaction(db: AsyncSession, payload: Dict[str, Any]) -> int:
+    if settings.storage_format == slim.SLIM:
+        cols, extra = slim.encode_payload(payload)
+        res = await db.execute(text("""
+            INSERT INTO transactions (
+                external_txn_id, amount, currency, merchant_id, device_id, location,
+                user_external_id, device_risk_score, payload_z
+            )
+            VALUES (:external_txn_id, :amount, :currency, :merchant_id, :device_id, :location,
+                    :user_external_id, :device_risk_score, :payload_z)
+        """), {**cols, "payload_z": extra})
+        return res.lastrowid
+
+    res = await db.execute(text("""
+        INSERT INTO transactions (
+            external_txn_id, amount, currency, merchant_id, device_id, location, payload
+        )
+        VALUES (:external_txn_id, :amount, :currency, :merchant_id, :device_id, :location, :payload)
+    """), {
+        "external_txn_id": payload.get("external_txn_id"),
+        "amount": payload["amount"],
+        "currency": payload.get("currency"),
+        "merchant_id": payload.get("merchant_id"),
+        "device_id": payload.get("device_id"),
+        "location": payload.get("location"),
+        "payload": dumps(payload)
+    })
+    return res.lastrowid
+
+
+async def insert_fraud_result(
+    db: AsyncSession,
+    txn_id: int,
+    verdict: str,
+    fraud_score: float,
+    consensus_score: float,
+    reason_codes: Any,
+    decided_by: str = "consensus",
+) -> None:
+    if settings.storage_format == slim.SLIM:
+        scores, blob = slim.encode_reason_codes(reason_codes)
+        await db.execute(text(f"""
+            INSERT INTO fraudresults (
+                transaction_id, verdict, fraud_score, consensus_score, decided_by, {", ".join(scores)}, reason_z
+            )
+            VALUES (:transaction_id, :verdict, :fraud_score, :consensus_score, :decided_by,
+                    {", ".join(":" + c for c in scores)}, :reason_z)
+        """), {
+            "transaction_id": txn_id,
+            "verdict": verdict,
+            "fraud_score": fraud_score,
+            "consensus_score": consensus_score,
+            "decided_by": decided_by,
+            "reason_z": blob,
+            **scores,
+        })
+        return
+
+    await db.execute(text("""
+        INSERT INTO fraudresults (
+            transaction_id, verdict, fraud_score, consensus_score, reason_codes, decided_by
+        )
+        VALUES (:transaction_id, :verdict, :fraud_score, :consensus_score, :reason_codes, :decided_by)
+    """), {
+        "transaction_id": txn_id,
+        "verdict": verdict,
+        "fraud_score": fraud_score,
+        "consensus_score": consensus_score,
+        "reason_codes": dumps(reason_codes),
+        "decided_by": decided_by
+    })
+
+
+async def update_user_risk(db: AsyncSession, user_external_id: str, consensus_score: float) -> Dict[str, Any]:
+    """
+    Cumulative user risk with decay; creates the user row on first sight.
+    Returns the same shape as fetch_user_risk (created_at is None for a new row).
+    """
+    u = await db.execute(
+        text("SELECT id, risk_score, created_at FROM users WHERE external_id=:eid"),
+        {"eid": user_external_id}
+    )
+    row = u.first()
+    created_at = None
+    if row:
+        uid, current, created_at = row
+        new_risk = float((current or 0.0) * 0.8 + consensus_score * 0.2)
+        await db.execute(
+            text("UPDATE users SET risk_score=:rs WHERE id=:id"),
+            {"rs": new_risk, "id": uid}
+        )
+    else:
+        new_risk = consensus_score
+        await db.execute(
+            text("INSERT INTO users (external_id, risk_score) VALUES (:eid, :rs)"),
+            {"eid": user_external_id, "rs": new_risk}
+        )
+    return {
+        "external_id": user_external_id,
+        "risk_score": new_risk,
+        "created_at": str(created_at) if created_at is not None else None,
+    }
+
+
+async def update_transaction_status(db: AsyncSession, txn_id: int, status: str) -> None:
+    await db.execute(
+        text("UPDATE transactions SET status=:status WHERE id=:id"),
+        {"status": status, "id": txn_id}
+    )
+    cache.invalidate_transaction(txn_id)
+
+
+async def insert_feedback(db: AsyncSession, txn_id: int, label: str, labelled_by: str) -> Optional[Dict[str, Any]]:
+    """
+    Record an analyst-confirmed label against the transaction's latest
+    decision and make it the transaction's status. Returns the label with
+    the model inputs (for the feedback buffer), or None if the transaction
+    has no decision.
+    """
+    res = await db.execute(text("""
+        SELECT f.id, f.verdict, t.payload, t.payload_z, t.amount, t.location, t.device_risk_score
+        FROM transactions t
+        JOIN fraudresults f ON f.transaction_id = t.id
+        WHERE t.id = :txid
+        ORDER BY f.id DESC
+        LIMIT 1
+    """), {"txid": txn_id})
+    row = res.first()
+    if not row:
+        return None
+    fraudresult_id, verdict, payload, payload_z, amount, location, device_risk_score = row
+    res = await db.execute(text("""
+        INSERT INTO feedback_labels (fraudresult_id, transaction_id, label, model_verdict, labelled_by)
+        VALUES (:fid, :txid, :label, :verdict, :by)
+    """), {"fid": fraudresult_id, "txid": txn_id, "label": label, "verdict": verdict, "by": labelled_by})
+    await update_transaction_status(db, txn_id, label)
+    payload = slim.payload_of(
+        payload, {"amount": amount, "location": location, "device_risk_score": device_risk_score}, payload_z
+    )
+    return {
+        "feedback_id": res.lastrowid,
+        "transaction_id": txn_id,
+        "fraudresult_id": fraudresult_id,
+        "label": label,
+        "model_verdict": verdict,
+        "labelled_by": labelled_by,
+        "amount": float(payload.get("amount", amount) or 0.0),
+        "device_risk_score": float(payload.get("device_risk_score") or 0.0),
+        "location": payload.get("location", location),
+    }
+
+
+async def insert_recommendations(
+    db: AsyncSession, txn_id: int, recs: List[Dict[str, Any]], agents: Optional[List[Dict[str, Any]]] = None
+) -> None:
+    """agents: the decision's, which slim rows leave out of each rec's meta."""
+    if settings.storage_format == slim.SLIM:
+        await db.execute(text("""
+            INSERT INTO recommendations (transaction_id, recs_z, confidence)
+            VALUES (:txid, :recs_z, :conf)
+        """), {
+            "txid": txn_id,
+            "recs_z": slim.encode_recs(recs, agents),
+            "conf": max((r["confidence"] for r in recs), default=0.0)
+        })
+        return
+
+    await db.execute(text("""
+        INSERT INTO recommendations (transaction_id, recs, confidence)
+        VALUES (:txid, :recs, :conf)
+    """), {
+        "txid": txn_id,
+        "recs": dumps(recs),
+        "conf": max((r["confidence"] for r in recs), default=0.0)
+    })
+
+
+# ------------------------------
+# Reads
+# ------------------------------
+async def fetch_recommendations(db: AsyncSession, txn_id: int) -> Optional[Dict[str, Any]]:
+    res = await db.execute(
+        text("SELECT recs, recs_z, confidence, created_at FROM recommendations WHERE transaction_id=:txid"),
+        {"txid": txn_id}
+    )
+    row = res.first()
+    if not row:
+        return None
+
+    recs, recs_z, confidence, created_at = row
+    if recs is not None:
+        recs = loads_json_column(recs)
+    else:
+        agents = await slim.fetch_agents(db, [txn_id])
+        recs = slim.decode_recs(recs_z, agents.get(txn_id))
+    return {
+        "transaction_id": txn_id,
+        "recommendations": recs,
+        "confidence": confidence,
+        "created_at": str(created_at),
+    }
+
+
+async def fetch_transaction(db: AsyncSession, txn_id: int) -> Optional[Dict[str, Any]]:
+    res = await db.execute(text("""
+        SELECT t.id, t.external_txn_id, t.amount, t.currency, t.status, t.created_at,
+               f.verdict, f.fraud_score, f.consensus_score, f.reason_codes,
+               f.rf_score, f.xgb_score, f.rules_score, f.fast_score, f.reason_z,
+               r.recs, r.recs_z, r.confidence
+        FROM transactions t
+        LEFT JOIN fraudresults f ON t.id = f.transaction_id
+        LEFT JOIN recommendations r ON t.id = r.transaction_id
+        WHERE t.id = :txid
+    """), {"txid": txn_id})
+    row = res.first()
+    if not row:
+        return None
+
+    (
+        id, external_txn_id, amount, currency, status, created_at,
+        verdict, fraud_score, consensus_score, reason_codes,
+        rf_score, xgb_score, rules_score, fast_score, reason_z,
+        recs, recs_z, confidence
+    ) = row
+    if reason_codes is not None:
+        reason_codes = loads_json_column(reason_codes)
+    else:
+        scores = dict(zip(slim.SCORE_COLUMNS.values(), (rf_score, xgb_score, rules_score, fast_score)))
+        reason_codes = slim.decode_reason_codes(scores, reason_z)
+    if recs is not None:
+        recs = loads_json_column(recs)
+    else:
+        recs = slim.decode_recs(recs_z, (reason_codes or {}).get("agents"))
+
+    return {
+        "transaction_id": id,
+        "external_txn_id": external_txn_id,
+        "amount": float(amount),
+        "currency": currency,
+        "status": status,
+        "created_at": str(created_at),
+        "verdict": verdict,
+        "fraud_score": fraud_score,
+        "consensus_score": consensus_score,
+        "reason_codes": reason_codes or None,
+        "recommendations": recs or None,
+        "confidence": confidence,
+    }
+
+
+async def fetch_user_risk(db: AsyncSession, external_id: str) -> Optional[Dict[str, Any]]:
+    res = await db.execute(
+        text("SELECT external_id, risk_score, created_at FROM users WHERE external_id=:eid"),
+        {"eid": external_id}
+    )
+    row = res.first()
+    if not row:
+        return None
+
+    return {
+        "external_id": row[0],
+        "risk_score": row[1],
+        "created_at": str(row[2]),
+    }
+
+
+async def fetch_transaction_labels(db: AsyncSession, txn_ids: List[int]) -> Dict[int, Dict[str, Any]]:
+    """Current status and model verdict for a handful of transactions (similar-transaction lookups)."""
+    if not txn_ids:
+        return {}
+    res = await db.execute(text("""
+        SELECT t.id, t.external_txn_id, t.amount, t.location, t.status, t.created_at,
+               f.verdict, f.fraud_score
+        FROM transactions t
+        LEFT JOIN fraudresults f ON t.id = f.transaction_id
+        WHERE t.id IN :ids
+    """).bindparams(bindparam("ids", expanding=True)), {"ids": list(txn_ids)})
+    return {
+        id: {
+            "transaction_id": id,
+            "external_txn_id": external_txn_id,
+            "amount": float(amount),
+            "location": location,
+            "status": status,
+            "created_at": str(created_at),
+            "verdict": verdict,
+            "fraud_score": fraud_score,
+        }
+        for id, external_txn_id, amount, location, status, created_at, verdict, fraud_score in res.all()
+    }
+
+
+async def fetch_transaction_payload(db: AsyncSession, txn_id: int) -> Optional[Dict[str, Any]]:
+    """The raw /api/predict payload stored with the transaction."""
+    res = await db.execute(
+        text(f"SELECT payload, payload_z, {', '.join(slim.TXN_FIELDS)} FROM transactions WHERE id=:txid"),
+        {"txid": txn_id}
+    )
+    row = res.first()
+    if not row:
+        return None
+    return slim.payload_of(row[0], dict(zip(slim.TXN_FIELDS, row[2:])), row[1])
+
+
+async def fetch_review_queue(
+    db: AsyncSession, verdict: str, limit: int, before: Optional[str] = None, before_id: int = 0
+) -> List[Dict[str, Any]]:
+    """
+    Newest decisions with this verdict and no analyst label yet (one shard's
+    part of the queue). Pages continue after (before, before_id), the last
+    (created_at, transaction_id) seen.
+    """
+    res = await db.execute(text(f"""
+        SELECT t.id, t.external_txn_id, t.amount, t.currency, t.location, t.device_id, t.merchant_id,
+               t.status, f.verdict, f.fraud_score, f.consensus_score, f.created_at
+        FROM fraudresults f
+        JOIN transactions t ON t.id = f.transaction_id
+        WHERE f.verdict = :verdict
+          {"AND (f.created_at < :before OR (f.created_at = :before AND f.transaction_id < :before_id))"
+           if before else ""}
+          AND NOT EXISTS (SELECT 1 FROM feedback_labels l WHERE l.transaction_id = f.transaction_id)
+        ORDER BY f.created_at DESC, f.transaction_id DESC
+        LIMIT :limit
+    """), {"verdict": verdict, "before": before, "before_id": before_id, "limit": limit})
+    return [
+        {
+            "transaction_id": id,
+            "external_txn_id": external_txn_id,
+            "amount": float(amount),
+            "currency": currency,
+            "location": location,
+            "device_id": device_id,
+            "merchant_id": merchant_id,
+            "status": status,
+            "verdict": verdict,
+            "fraud_score": fraud_score,
+            "consensus_score": consensus_score,
+            "created_at": str(created_at),
+        }
+        for (
+            id, external_txn_id, amount, currency, location, device_id, merchant_id,
+            status, verdict, fraud_score, consensus_score, created_at,
+        ) in res.all()
+    ]
@@ -0,0 +1,434 @@
+# backend/app/db/partitioning.py
+"""
+Monthly range partitioning and Parquet archival (MySQL).
+
+transactions, fraudresults and chain_entries are partitioned by
+RANGE (UNIX_TIMESTAMP(created_at)) into one partition per month plus a
+catch-all `pmax`. MySQL doesn't allow foreign keys on (or pointing at)
+partitioned tables, and every unique key must include the partition column,
+so `setup` drops those FKs, widens the primary keys to (id, created_at) and
+turns chain_entries' unique (block_index, entry_index) into a plain index.
+Referential integrity is then an application-level check (`check_references`);
+the write path already inserts parents before children in one unit of work.
+
+Old months are archived to zstd-compressed Parquet and dropped with
+ALTER TABLE ... DROP PARTITION, which is metadata-only (no long table locks
+like DELETE). chain_entries archives carry their chain_blocks rows and the
+HMAC / block-hash anchors, so `verify` can check them offline.
+
+    cd backend
+    python -m app.db.partitioning setup [--months-ahead 3]    # one-time table rebuild
+    python -m app.db.partitioning roll                        # add upcoming months
+    python -m app.db.partitioning archive --before 2025-01    # archive + drop closed months
+    python -m app.db.partitioning verify archive/chain_entries/p202412.parquet
+    python -m app.db.partitioning check                       # orphan / duplicate audit
+"""
+import argparse
+import asyncio
+import hashlib
+import json
+import logging
+import pathlib
+from datetime import datetime, timezone
+from decimal import Decimal
+from typing import Any, Dict, List, Optional, Tuple
+from sqlalchemy import text
+from sqlalchemy.ext.asyncio import AsyncConnection, AsyncEngine
+from app.core.config import settings
+from app.core.serialization import dumps
+
+logger = logging.getLogger(__name__)
+
+PARTITIONED_TABLES = ("transactions", "fraudresults", "chain_entries")
+# every FK on these tables (and FKs pointing at them) has to go
+FK_TABLES = ("transactions", "fraudresults", "recommendations", "chain_entries")
+ARCHIVE_CHUNK_ROWS = 50_000
+
+# column lists archived per table (explicit, so schema additions don't break old readers)
+ARCHIVE_COLUMNS = {
+    "transactions": [
+        "id", "external_txn_id", "user_id", "amount", "currency", "occurred_at", "location",
+        "device_id", "merchant_id", "status", "payload", "created_at",
+        "user_external_id", "device_risk_score", "payload_z",  # slim format (app/db/slim.py)
+    ],
+    "fraudresults": [
+        "id", "transaction_id", "verdict", "fraud_score", "consensus_score", "reason_codes",
+        "decided_by", "created_at",
+        "rf_score", "xgb_score", "rules_score", "fast_score", "reason_z",
+    ],
+    "chain_entries": [
+        "id", "block_index", "entry_index", "tx_reference", "entry_payload", "entry_hash",
+        "hmac_chain", "created_at",
+    ],
+    "chain_blocks": [
+        "id", "block_index", "prev_block_hash", "merkle_root", "block_hash", "entries_count", "created_at",
+    ],
+}
+
+
+# ------------------------------
+# Month arithmetic
+# ------------------------------
+def _month_start(year: int, month: int) -> datetime:
+    return datetime(year, month, 1, tzinfo=timezone.utc)
+
+
+def _add_months(d: datetime, n: int) -> datetime:
+    m = d.month - 1 + n
+    return _month_start(d.year + m // 12, m % 12 + 1)
+
+
+def partition_name(month: datetime) -> str:
+    return f"p{month.year:04d}{month.month:02d}"
+
+
+def partition_month(name: str) -> Optional[datetime]:
+    if len(name) != 7 or not name[1:].isdigit():
+        return None  # pmax
+    return _month_start(int(name[1:5]), int(name[5:7]))
+
+
+def _partition_clause(month: datetime) -> str:
+    upper = int(_add_months(month, 1).timestamp())
+    return f"PARTITION {partition_name(month)} VALUES LESS THAN ({upper})"
+
+
+# ------------------------------
+# Introspection
+# ------------------------------
+async def list_partitions(conn: AsyncConnection, table: str) -> List[Tuple[str, Optional[int]]]:
+    res = await conn.execute(text("""
+        SELECT PARTITION_NAME, TABLE_ROWS FROM information_schema.PARTITIONS
+        WHERE TABLE_SCHEMA = DATABASE() AND TABLE_NAME = :t AND PARTITION_NAME IS NOT NULL
+        ORDER BY PARTITION_ORDINAL_POSITION
+    """), {"t": table})
+    return [(r[0], r[1]) for r in res]
+
+
+async def _foreign_keys(conn: AsyncConnection, table: str) -> List[str]:
+    res = await conn.execute(text("""
+        SELECT CONSTRAINT_NAME FROM information_schema.REFERENTIAL_CONSTRAINTS
+        WHERE CONSTRAINT_SCHEMA = DATABASE() AND TABLE_NAME = :t
+    """), {"t": table})
+    return [r[0] for r in res]
+
+
+async def _has_index(conn: AsyncConnection, table: str, index: str) -> bool:
+    res = await conn.execute(text("""
+        SELECT 1 FROM information_schema.STATISTICS
+        WHERE TABLE_SCHEMA = DATABASE() AND TABLE_NAME = :t AND INDEX_NAME = :i LIMIT 1
+    """), {"t": table, "i": index})
+    return res.first() is not None
+
+
+# ------------------------------
+# Setup / roll-forward
+# ------------------------------
+async def setup_partitioning(engine: AsyncEngine, months_ahead: int = 3) -> None:
+    """One-time conversion. Rebuilds each table, so run it in a maintenance window."""
+    now = _month_start(datetime.now(timezone.utc).year, datetime.now(timezone.utc).month)
+    async with engine.begin() as conn:
+        for table in FK_TABLES:
+            for fk in await _foreign_keys(conn, table):
+                logger.info("Dropping foreign key %s.%s", table, fk)
+                await conn.execute(text(f"ALTER TABLE {table} DROP FOREIGN KEY {fk}"))
+
+        for table in PARTITIONED_TABLES:
+            if await list_partitions(conn, table):
+                logger.info("%s is already partitioned", table)
+                continue
+            first = (await conn.execute(text(f"SELECT MIN(created_at) FROM {table}"))).scalar()
+            start = _month_start(first.year, first.month) if first else now
+            alter = [
+                "MODIFY created_at TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP",
+                "DROP PRIMARY KEY",
+                "ADD PRIMARY KEY (id, created_at)",
+            ]
+            if table == "chain_entries" and await _has_index(conn, table, "uq_block_entry"):
+                alter += ["DROP INDEX uq_block_entry", "ADD KEY idx_entries_block (block_index, entry_index)"]
+            await conn.execute(text(f"ALTER TABLE {table} " + ", ".join(alter)))
+
+            months, m = [], start
+            while m <= _add_months(now, months_ahead):
+                months.append(_partition_clause(m))
+                m = _add_months(m, 1)
+            months.append("PARTITION pmax VALUES LESS THAN MAXVALUE")
+            logger.info("Partitioning %s into %d partitions", table, len(months))
+            await conn.execute(text(
+                f"ALTER TABLE {table} PARTITION BY RANGE (UNIX_TIMESTAMP(created_at)) ({', '.join(months)})"
+            ))
+
+
+async def ensure_partitions(engine: AsyncEngine, months_ahead: int = 3) -> Dict[str, List[str]]:
+    """
+    Split upcoming months out of pmax. pmax is kept empty, so REORGANIZE is
+    instant. Tables that aren't partitioned are skipped. Returns what was added.
+    """
+    now = datetime.now(timezone.utc)
+    target = _add_months(_month_start(now.year, now.month), months_ahead)
+    added: Dict[str, List[str]] = {}
+    async with engine.begin() as conn:
+        for table in PARTITIONED_TABLES:
+            parts = [p for p, _ in await list_partitions(conn, table)]
+            if not parts:
+                continue
+            months = [partition_month(p) for p in parts if partition_month(p)]
+            m = _add_months(max(months), 1) if months else _month_start(now.year, now.month)
+            new = []
+            while m <= target:
+                new.append(m)
+                m = _add_months(m, 1)
+            if not new:
+                continue
+            clauses = [_partition_clause(m) for m in new] + ["PARTITION pmax VALUES LESS THAN MAXVALUE"]
+            await conn.execute(text(f"ALTER TABLE {table} REORGANIZE PARTITION pmax INTO ({', '.join(clauses)})"))
+            added[table] = [partition_name(m) for m in new]
+            logger.info("Added partitions to %s: %s", table, added[table])
+    return added
+
+
+# ------------------------------
+# Archival
+# ------------------------------
+def _arrow_value(v: Any) -> Any:
+    # JSON columns arrive as text; DECIMAL amounts become float, datetimes stay datetimes
+    if isinstance(v, (dict, list)):
+        return dumps(v)
+    if isinstance(v, Decimal):
+        return float(v)
+    return v
+
+
+def _null_type(column: str):
+    import pyarrow as pa
+
+    if column.endswith("_z"):
+        return pa.binary()  # slim-format blobs
+    if column.endswith("_score"):
+        return pa.float64()
+    return pa.string()
+
+
+async def _export(conn: AsyncConnection, sql: str, params: Dict[str, Any], columns: List[str], path: pathlib.Path) -> int:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+
+    path.parent.mkdir(parents=True, exist_ok=True)
+    writer = None
+    rows = 0
+    result = await conn.stream(text(sql), params)
+    try:
+        async for chunk in result.partitions(ARCHIVE_CHUNK_ROWS):
+            data = {c: [_arrow_value(r[i]) for r in chunk] for i, c in enumerate(columns)}
+            table = pa.table(data)
+            if writer is None:
+                # an all-NULL column in the first chunk would pin the type to null
+                schema = pa.schema([f.with_type(_null_type(f.name)) if pa.types.is_null(f.type) else f
+                                    for f in table.schema])
+                writer = pq.ParquetWriter(path, schema, compression="zstd")
+            writer.write_table(table.cast(writer.schema))
+            rows += len(chunk)
+    finally:
+        if writer is not None:
+            writer.close()
+    return rows
+
+
+def _sha256_file(path: pathlib.Path) -> str:
+    h = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1 << 20), b""):
+            h.update(block)
+    return h.hexdigest()
+
+
+async def archive_partition(engine: AsyncEngine, table: str, partition: str, out_dir: pathlib.Path, drop: bool = True) -> Dict[str, Any]:
+    """Export one partition to Parquet (+ manifest), then drop it."""
+    cols = ARCHIVE_COLUMNS[table]
+    path = out_dir / table / f"{partition}.parquet"
+    manifest: Dict[str, Any] = {"table": table, "partition": partition, "archived_at": datetime.now(timezone.utc).isoformat()}
+
+    async with engine.connect() as conn:
+        manifest["rows"] = await _export(
+            conn, f"SELECT {', '.join(cols)} FROM {table} PARTITION ({partition}) ORDER BY id", {}, cols, path
+        )
+        if table == "chain_entries" and manifest["rows"]:
+            lo, hi, first_id = (await conn.execute(text(
+                f"SELECT MIN(block_index), MAX(block_index), MIN(id) FROM chain_entries PARTITION ({partition})"
+            ))).first()
+            bcols = ARCHIVE_COLUMNS["chain_blocks"]
+            blocks_path = out_dir / table / f"{partition}.blocks.parquet"
+            manifest["blocks_rows"] = await _export(
+                conn, f"SELECT {', '.join(bcols)} FROM chain_blocks WHERE block_index BETWEEN :lo AND :hi ORDER BY block_index",
+                {"lo": lo, "hi": hi}, bcols, blocks_path,
+            )
+            manifest["blocks_file"] = blocks_path.name
+            manifest["blocks_sha256"] = _sha256_file(blocks_path)
+            # anchors: what precedes this run, so it verifies on its own
+            prev_hmac = (await conn.execute(text(
+                "SELECT hmac_chain FROM chain_entries WHERE id < :id ORDER BY id DESC LIMIT 1"
+            ), {"id": first_id})).scalar()
+            prev_block_hash = (await conn.execute(text(
+                "SELECT block_hash FROM chain_blocks WHERE block_index = :bi"
+            ), {"bi": lo - 1})).scalar()
+            manifest.update({
+                "first_block_index": lo,
+                "last_block_index": hi,
+                "anchor_prev_hmac": prev_hmac,
+                "anchor_prev_block_hash": prev_block_hash,
+            })
+
+    if manifest["rows"]:
+        manifest["sha256"] = _sha256_file(path)
+    path.with_suffix(".manifest.json").write_text(json.dumps(manifest, indent=2, default=str), encoding="utf-8")
+
+    if drop:
+        async with engine.begin() as conn:
+            await conn.execute(text(f"ALTER TABLE {table} DROP PARTITION {partition}"))
+    logger.info("Archived %s.%s (%s rows) to %s", table, partition, manifest["rows"], path)
+    return manifest
+
+
+async def archive_before(engine: AsyncEngine, before: datetime, out_dir: pathlib.Path, drop: bool = True) -> List[Dict[str, Any]]:
+    """Archive every closed month strictly before `before` (and never the current month)."""
+    now = datetime.now(timezone.utc)
+    cutoff = min(_month_start(before.year, before.month), _month_start(now.year, now.month))
+    done = []
+    for table in PARTITIONED_TABLES:
+        async with engine.connect() as conn:
+            parts = [p for p, _ in await list_partitions(conn, table)]
+        for p in parts:
+            month = partition_month(p)
+            if month is not None and month < cutoff:
+                done.append(await archive_partition(engine, table, p, out_dir, drop=drop))
+    return done
+
+
+def verify_ledger_archive(entries_path: pathlib.Path, key: Optional[bytes] = None) -> List[str]:
+    """Offline check of an archived chain_entries partition against its blocks and anchors."""
+    import pyarrow.parquet as pq
+    from app.ledger.ledger import verify_chain
+
+    entries_path = pathlib.Path(entries_path)
+    manifest = json.loads(entries_path.with_suffix(".manifest.json").read_text(encoding="utf-8"))
+    problems = []
+    if manifest.get("sha256") and _sha256_file(entries_path) != manifest["sha256"]:
+        problems.append("entries file checksum mismatch")
+    blocks_path = entries_path.with_name(manifest["blocks_file"])
+    if _sha256_file(blocks_path) != manifest["blocks_sha256"]:
+        problems.append("blocks file checksum mismatch")
+
+    entries = pq.read_table(entries_path).to_pylist()
+    blocks = pq.read_table(blocks_path).to_pylist()
+    problems += verify_chain(
+        blocks,
+        entries,
+        prev_block_hash=manifest.get("anchor_prev_block_hash"),
+        prev_hmac=manifest.get("anchor_prev_hmac"),
+        key=key,
+    )
+    return problems
+
+
+# ------------------------------
+# Application-level referential checks (replace the dropped FKs)
+# ------------------------------
+REFERENCE_CHECKS = {
+    "fraudresults_without_transaction": """
+        SELECT COUNT(*) FROM fraudresults c LEFT JOIN transactions p ON p.id = c.transaction_id
+        WHERE p.id IS NULL AND c.created_at >= (SELECT MIN(created_at) FROM transactions)
+    """,
+    "recommendations_without_transaction": """
+        SELECT COUNT(*) FROM recommendations c LEFT JOIN transactions p ON p.id = c.transaction_id
+        WHERE p.id IS NULL AND c.created_at >= (SELECT MIN(created_at) FROM transactions)
+    """,
+    "chain_entries_without_block": """
+        SELECT COUNT(*) FROM chain_entries c LEFT JOIN chain_blocks p ON p.block_index = c.block_index
+        WHERE p.block_index IS NULL
+    """,
+    "duplicate_chain_entries": """
+        SELECT COUNT(*) FROM (
+            SELECT block_index, entry_index FROM chain_entries
+            GROUP BY block_index, entry_index HAVING COUNT(*) > 1
+        ) d
+    """,
+    "transactions_without_user": """
+        SELECT COUNT(*) FROM transactions c LEFT JOIN users p ON p.id = c.user_id
+        WHERE c.user_id IS NOT NULL AND p.id IS NULL
+    """,
+}
+
+
+async def check_references(engine: AsyncEngine) -> Dict[str, int]:
+    """Orphan/duplicate counts; children older than the oldest retained parent are archived, not orphans."""
+    out = {}
+    async with engine.connect() as conn:
+        for name, sql in REFERENCE_CHECKS.items():
+            out[name] = int((await conn.execute(text(sql))).scalar() or 0)
+    return out
+
+
+# ------------------------------
+# Background maintenance (lifespan)
+# ------------------------------
+async def maintenance_loop(engine: AsyncEngine, interval_s: float = 6 * 3600) -> None:
+    """Roll partitions forward and, if ARCHIVE_AFTER_MONTHS > 0, archive closed months."""
+    while True:
+        try:
+            await ensure_partitions(engine, settings.partition_months_ahead)
+            if settings.archive_after_months > 0:
+                now = datetime.now(timezone.utc)
+                cutoff = _add_months(_month_start(now.year, now.month), -settings.archive_after_months)
+                await archive_before(engine, cutoff, pathlib.Path(settings.archive_dir))
+        except Exception:
+            logger.exception("Partition maintenance failed")
+        await asyncio.sleep(interval_s)
+
+
+# ------------------------------
+# CLI
+# ------------------------------
+def main():
+    parser = argparse.ArgumentParser(description="Partition and archive ledger/transaction tables")
+    sub = parser.add_subparsers(dest="cmd", required=True)
+    p = sub.add_parser("setup")
+    p.add_argument("--months-ahead", type=int, default=settings.partition_months_ahead)
+    p = sub.add_parser("roll")
+    p.add_argument("--months-ahead", type=int, default=settings.partition_months_ahead)
+    p = sub.add_parser("archive")
+    p.add_argument("--before", required=True, help="YYYY-MM; months strictly before are archived")
+    p.add_argument("--out", default=settings.archive_dir)
+    p.add_argument("--keep", action="store_true", help="export only, don't drop partitions")
+    p = sub.add_parser("verify")
+    p.add_argument("path", help="archived chain_entries .parquet file")
+    sub.add_parser("check")
+    args = parser.parse_args()
+
+    if args.cmd == "verify":
+        problems = verify_ledger_archive(pathlib.Path(args.path))
+        print("✅ archive verifies" if not problems else "❌ " + "\n❌ ".join(problems))
+        raise SystemExit(1 if problems else 0)
+
+    from app.db.database import engine
+
+    async def run():
+        try:
+            if args.cmd == "setup":
+                await setup_partitioning(engine, args.months_ahead)
+            elif args.cmd == "roll":
+                print(await ensure_partitions(engine, args.months_ahead))
+            elif args.cmd == "archive":
+                before = datetime.strptime(args.before, "%Y-%m").replace(tzinfo=timezone.utc)
+                for m in await archive_before(engine, before, pathlib.Path(args.out), drop=not args.keep):
+                    print(f"📦 {m['table']}.{m['partition']}: {m['rows']} rows")
+            elif args.cmd == "check":
+                print(await check_references(engine))
+        finally:
+            await engine.dispose()
+
+    logging.basicConfig(level=logging.INFO)
+    asyncio.run(run())
+
+
+if __name__ == "__main__":
+    main()
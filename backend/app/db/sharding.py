@@ -0,0 +1,263 @@
+# backend/app/db/sharding.py
+"""
+Hash-sharded storage for the per-transaction tables.
+
+DB_SHARD_URLS lists N async database URLs. Rows of transactions,
+fraudresults, recommendations, feedback_labels and the user-risk rows
+in users go to shard blake2b(user_external_id) mod N. Each shard has its
+own engine and pool, named "shard<i>" in the pool metrics.
+
+The shard at index LEDGER_SHARD is also the primary engine
+(app.db.database.engine). The ledger, auth users, entity lists and
+everything else that is not routed here stay on it.
+
+Transaction IDs stay globally unique because each shard allocates from
+its own range: shard i gets [i * 2**40 + 1, (i + 1) * 2**40]. So the
+shard of an ID is (id - 1) >> 40, and ID lookups need no directory.
+ensure_id_ranges() moves an empty shard's AUTO_INCREMENT (the
+sqlite_sequence row on SQLite) to the start of its range. Shard 0's
+range starts at 1, so an existing single database becomes shard 0
+unchanged.
+
+With more than one shard, a decision commits on its shard first, with
+its ledger entry in that shard's ledger_pending table. The entry is then
+sealed on the ledger shard (fraud.store_decisions, app/ledger/pending.py),
+so the ledger only ever references committed rows and none is lost if the
+seal fails.
+
+Reads that span shards (the analyst queue) run on every shard at once
+and merge the results (scatter / gather). The fraud-ring graph and the
+similarity index load every shard in turn, and the DB backtest streams
+them in shard order, which is global ID order. The partition tools
+still work on one engine, the primary.
+
+The hash is taken mod N, so changing the number of shards moves users
+between them. That needs an offline copy and is not done here.
+
+With DB_SHARD_URLS empty there is a single shard, the primary engine,
+and nothing changes.
+"""
+import asyncio
+import hashlib
+import logging
+from collections.abc import AsyncGenerator
+from contextlib import asynccontextmanager
+from typing import Any, Awaitable, Callable, Dict, Iterable, List, Optional, Sequence
+
+from fastapi import HTTPException
+from sqlalchemy import text
+from sqlalchemy.ext.asyncio import AsyncEngine, AsyncSession, async_sessionmaker
+
+from app.core import metrics
+from app.core.config import settings
+from app.db import database
+
+logger = logging.getLogger(__name__)
+
+SHARD_ID_BITS = 40  # ~1.1e12 transactions per shard
+
+
+class Shard:
+    def __init__(self, index: int, engine: AsyncEngine, sessionmaker: async_sessionmaker):
+        self.index = index
+        self.engine = engine
+        self.sessionmaker = sessionmaker
+
+    @property
+    def id_range(self) -> tuple:
+        return (self.index << SHARD_ID_BITS) + 1, (self.index + 1) << SHARD_ID_BITS
+
+
+def _build() -> List[Shard]:
+    urls = settings.shard_urls
+    if not urls:
+        return [Shard(0, database.engine, database.AsyncSessionLocal)]
+    if not 0 <= settings.ledger_shard < len(urls):
+        raise ValueError(f"LEDGER_SHARD={settings.ledger_shard} but DB_SHARD_URLS has {len(urls)} entries")
+    shards = []
+    for i, url in enumerate(urls):
+        if i == settings.ledger_shard:
+            shards.append(Shard(i, database.engine, database.AsyncSessionLocal))
+            continue
+        eng = database.create_engine_for(url, name=f"shard{i}")
+        shards.append(Shard(i, eng, async_sessionmaker(
+            bind=eng, expire_on_commit=False, autoflush=False, autocommit=False, class_=AsyncSession,
+        )))
+    return shards
+
+
+shards = _build()
+LEDGER = settings.ledger_shard if settings.shard_urls else 0
+
+# Appends made in a session of their own start by reading the chain head, so two
+# of them in this worker would race for the next block_index. Serialized here;
+# across workers, LEDGER_SEQUENCER_SOCKET makes one process the only writer.
+ledger_lock = asyncio.Lock()
+
+
+def is_sharded() -> bool:
+    return len(shards) > 1
+
+
+# ------------------------------
+# Routing
+# ------------------------------
+def shard_for_key(key: Optional[str]) -> int:
+    """Shard of a user (stable across processes, unlike hash())."""
+    if len(shards) == 1:
+        return 0
+    digest = hashlib.blake2b((key or "").encode("utf-8"), digest_size=8).digest()
+    return int.from_bytes(digest, "big") % len(shards)
+
+
+def routing_key(payload: Dict[str, Any]) -> str:
+    # anonymous transactions spread by their own reference rather than piling onto one shard
+    return payload.get("user_external_id") or payload.get("external_txn_id") or ""
+
+
+def shard_for_payload(payload: Dict[str, Any]) -> int:
+    return shard_for_key(routing_key(payload))
+
+
+def shard_for_id(txn_id: int) -> Optional[int]:
+    """Shard that allocated a transaction ID, or None when no shard owns that range."""
+    if len(shards) == 1:
+        return 0
+    shard = (txn_id - 1) >> SHARD_ID_BITS
+    return shard if 0 <= shard < len(shards) else None
+
+
+def group_by_shard(payloads: Sequence[Dict[str, Any]]) -> Dict[int, List[int]]:
+    """Positions of payloads per shard, in input order."""
+    groups: Dict[int, List[int]] = {}
+    for i, payload in enumerate(payloads):
+        groups.setdefault(shard_for_payload(payload), []).append(i)
+    return groups
+
+
+# ------------------------------
+# Sessions
+# ------------------------------
+@asynccontextmanager
+async def session_scope(shard: int) -> AsyncGenerator[AsyncSession, None]:
+    """database.session_scope() on one shard."""
+    async with shards[shard].sessionmaker() as session:
+        try:
+            yield session
+            await session.commit()
+        except Exception:
+            await session.rollback()
+            raise
+
+
+# FastAPI dependencies: the path parameter picks the shard
+async def get_txn_session(txn_id: int) -> AsyncGenerator[AsyncSession, None]:
+    shard = shard_for_id(txn_id)
+    if shard is None:
+        raise HTTPException(status_code=404, detail=f"No transaction found for txn_id={txn_id}")
+    async with session_scope(shard) as session:
+        yield session
+
+
+async def get_user_session(external_id: str) -> AsyncGenerator[AsyncSession, None]:
+    async with session_scope(shard_for_key(external_id)) as session:
+        yield session
+
+
+# ------------------------------
+# Scatter / gather
+# ------------------------------
+async def gather(fn: Callable[..., Awaitable[Any]], *args, shard_ids: Optional[Iterable[int]] = None) -> List[Any]:
+    """fn(db, *args) on every shard (or shard_ids) concurrently, one session each; results in shard order."""
+    async def one(shard: int):
+        async with session_scope(shard) as db:
+            return await fn(db, *args)
+
+    ids = list(range(len(shards)) if shard_ids is None else shard_ids)
+    return list(await asyncio.gather(*(one(s) for s in ids)))
+
+
+async def gather_by_id(fn: Callable[..., Awaitable[Dict[int, Any]]], txn_ids: Iterable[int]) -> Dict[int, Any]:
+    """fn(db, ids) once per shard holding any of txn_ids; the per-shard dicts merged."""
+    groups: Dict[int, List[int]] = {}
+    for txn_id in txn_ids:
+        shard = shard_for_id(txn_id)
+        if shard is not None:
+            groups.setdefault(shard, []).append(txn_id)
+    if len(groups) == 1:
+        (shard, ids), = groups.items()
+        async with session_scope(shard) as db:
+            return await fn(db, ids)
+
+    async def one(shard: int, ids: List[int]):
+        async with session_scope(shard) as db:
+            return await fn(db, ids)
+
+    merged: Dict[int, Any] = {}
+    for part in await asyncio.gather(*(one(s, ids) for s, ids in groups.items())):
+        merged.update(part)
+    return merged
+
+
+# ------------------------------
+# Setup
+# ------------------------------
+def engines() -> List[AsyncEngine]:
+    return [s.engine for s in shards]
+
+
+async def ensure_id_ranges() -> Dict[int, Optional[int]]:
+    """
+    Point each empty shard's transaction IDs at its range; refuse a shard
+    whose rows fall outside it (e.g. the old primary configured as shard 2).
+    Returns the current top ID per shard.
+    """
+    tops = {}
+    for shard in shards:
+        lo, hi = shard.id_range
+        async with shard.engine.begin() as conn:
+            top = (await conn.execute(text("SELECT MAX(id) FROM transactions"))).scalar()
+            if top is not None and not lo <= top <= hi:
+                raise RuntimeError(
+                    f"shard {shard.index}: transactions.id {top} is outside its range [{lo}, {hi}]; "
+                    "check the order of DB_SHARD_URLS"
+                )
+            if top is None and lo > 1:
+                if conn.dialect.name == "sqlite":
+                    seq = (await conn.execute(
+                        text("SELECT seq FROM sqlite_sequence WHERE name = 'transactions'")
+                    )).scalar()
+                    if seq is None:
+                        await conn.execute(
+                            text("INSERT INTO sqlite_sequence (name, seq) VALUES ('transactions', :s)"), {"s": lo - 1}
+                        )
+                    elif seq < lo - 1:
+                        await conn.execute(
+                            text("UPDATE sqlite_sequence SET seq = :s WHERE name = 'transactions'"), {"s": lo - 1}
+                        )
+                else:
+                    await conn.execute(text(f"ALTER TABLE transactions AUTO_INCREMENT = {int(lo)}"))
+        tops[shard.index] = top
+    return tops
+
+
+async def dispose() -> None:
+    for shard in shards:
+        if shard.index != LEDGER:
+            await shard.engine.dispose()
+
+
+def _pool_gauge() -> Dict[str, float]:
+    out = {}
+    for shard in shards:
+        for k, v in database.pool_status(shard.engine).items():
+            out[f'shard="{shard.index}",state="{k}"'] = v
+    return out
+
+
+if is_sharded():
+    metrics.register_gauge(
+        "finfraud_db_shard_pool_connections",
+        "SQLAlchemy pool state per shard (the ledger shard is also the primary engine).",
+        _pool_gauge,
+    )
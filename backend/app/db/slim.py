@@ -0,0 +1,428 @@
+# backend/app/db/slim.py
+"""
+Slim row format (STORAGE_FORMAT=slim): each scored transaction stores its
+data once.
+
+Full format:
+- transactions.payload    the whole TxnIn JSON, typed columns included
+- fraudresults.reason_codes  every agent dict ({"name","verdict","score",...})
+- recommendations.recs    every rec carrying meta {"agents": [...], "txn": {}}
+
+Slim format:
+- transactions: user_external_id and device_risk_score become columns.
+  payload is NULL. Only fields the columns can't reproduce exactly go to
+  payload_z (e.g. an amount with more than 2 decimals).
+- fraudresults: rf / xgb / rules / fast scores become DOUBLE columns.
+  reason_codes is NULL. reason_z holds the rest, with those agents as bare
+  names. A name expands back to the same dict: verdict fraud at score
+  >= 0.5, and the rules agent's reasons come from reason_codes["rules"].
+  An agent that doesn't fit that shape stays whole.
+- recommendations: a rec's meta is dropped when it is exactly the
+  decision's agents (fetch_* restores it from fraudresults). recs is NULL
+  and recs_z holds the list.
+
+*_z blobs are a format byte (1) followed by zlib with a preset dictionary
+of this schema's keys and recommendation texts. Short JSON is mostly keys
+and repeated text, so the dictionary does most of the work. _ZDICT_V1 is
+part of the stored format: changing it needs a new format byte.
+
+chain_entries.entry_payload is left as it is. Entries are hashed as
+stored, and rebuilding them from mutable tables would defeat the ledger.
+The segment ledger (LEDGER_BACKEND=segments) is the compact option there.
+
+Readers accept both formats, row by row, so tables can be converted in
+place while serving:
+
+    cd backend
+    python -m app.db.slim migrate [--to slim|full] [--batch 1000]   # every shard
+    python -m app.db.slim report                                    # bytes per transaction
+"""
+import argparse
+import asyncio
+import logging
+import zlib
+from typing import Any, Dict, List, Optional, Tuple
+
+from sqlalchemy import bindparam, text
+from sqlalchemy.exc import DBAPIError
+from sqlalchemy.ext.asyncio import AsyncEngine
+
+from app.core.serialization import dumps, dumps_bytes, loads, loads_json_column
+
+logger = logging.getLogger(__name__)
+
+FULL, SLIM = "full", "slim"
+FORMAT_V1 = b"\x01"
+
+# TxnIn fields with a column of their own (everything else goes to payload_z)
+TXN_FIELDS = (
+    "external_txn_id", "user_external_id", "amount", "currency",
+    "merchant_id", "device_id", "location", "device_risk_score",
+)
+SCORE_COLUMNS = {"rf": "rf_score", "xgb": "xgb_score", "rules": "rules_score", "fast": "fast_score"}
+AGENT_THRESHOLD = 0.5  # placeholder expansion rule of format 1 (predictor.VERDICT_THRESHOLD at the time)
+
+COLUMNS = {
+    "transactions": [("user_external_id", "VARCHAR(64) NULL"), ("device_risk_score", "DOUBLE NULL"),
+                     ("payload_z", "BLOB NULL")],
+    "fraudresults": [("rf_score", "DOUBLE NULL"), ("xgb_score", "DOUBLE NULL"), ("rules_score", "DOUBLE NULL"),
+                     ("fast_score", "DOUBLE NULL"), ("reason_z", "BLOB NULL")],
+    "recommendations": [("recs_z", "BLOB NULL")],
+}
+
+_ZDICT_V1 = b"".join([
+    b'"reason_codes":["high_amount","device_risk","consensus_fraud","escalation_rule","mixed_agent_votes"]',
+    b'"category":"analyst_action","text":"Analyst suggestions: check device fingerprint, '
+    b'confirm recent account changes, verify merchant."',
+    b'"category":"escalation","text":"Escalate to fraud operations team for investigation; '
+    b'correlated patterns detected."',
+    b'"category":"remediation_user","text":"Require step-up authentication (2FA) before completing '
+    b'high-risk transaction."',
+    b'"category":"block","text":"Block the transaction and notify the customer. High probability of fraud."',
+    b'"category":"education","text":"Send user education tips: enable 2FA, avoid unknown devices/merchants."',
+    b'"category":"monitoring","text":"Allow transaction but increase monitoring for the customer and device."',
+    b'{"name":"lists","verdict":"legit","score":0.0,"reasons":["allowed_user"]}',
+    b'{"name":"graph","verdict":"fraud","score":0.',
+    b'"Mumbai""Delhi""Bangalore""Chennai""Kolkata""Hyderabad""Pune"',
+    b'{"feature":"location","value":"',
+    b'{"feature":"device_risk_score","value":0.',
+    b'{"feature":"amount","value":',
+    b',"contribution":-0.0',
+    b',"contribution":0.',
+    b'"features":{"rf":[',
+    b'],"xgb":[',
+    b'"tier":"full","lists":{"block":[],"allow":[]},"degraded":["no_recs"]',
+    b'{"agents":["rf","xgb","rules"],"rules":[]',
+    b'{"id":"monitor_17',
+    b'{"id":"edu_17',
+    b'{"id":"analyst_17',
+    b',"confidence":0.',
+])
+
+
+# ------------------------------
+# Blobs
+# ------------------------------
+def pack(obj: Any) -> bytes:
+    c = zlib.compressobj(6, zdict=_ZDICT_V1)
+    return FORMAT_V1 + c.compress(dumps_bytes(obj)) + c.flush()
+
+
+def unpack(blob: Optional[bytes]) -> Any:
+    if blob is None:
+        return None
+    blob = bytes(blob)
+    if blob[:1] != FORMAT_V1:
+        raise ValueError(f"unknown slim blob format {blob[:1]!r}")
+    d = zlib.decompressobj(zdict=_ZDICT_V1)
+    return loads(d.decompress(blob[1:]) + d.flush())
+
+
+# ------------------------------
+# transactions
+# ------------------------------
+def encode_payload(payload: Dict[str, Any]) -> Tuple[Dict[str, Any], Optional[bytes]]:
+    """(column values, payload_z or None) for one TxnIn payload."""
+    cols = {k: payload.get(k) for k in TXN_FIELDS}
+    extra = {k: v for k, v in payload.items() if k not in TXN_FIELDS}
+    amount = payload.get("amount")
+    if amount is not None and round(float(amount), 2) != amount:
+        extra["amount"] = amount  # DECIMAL(14,2) would round it
+    return cols, pack(extra) if extra else None
+
+
+def decode_payload(cols: Dict[str, Any], payload_z: Optional[bytes]) -> Dict[str, Any]:
+    payload = {k: cols.get(k) for k in TXN_FIELDS}
+    if payload["amount"] is not None:
+        payload["amount"] = float(payload["amount"])
+    if payload_z is not None:
+        payload.update(unpack(payload_z))
+    return payload
+
+
+def payload_of(payload_json: Any, cols: Dict[str, Any], payload_z: Optional[bytes]) -> Dict[str, Any]:
+    """The stored TxnIn payload of either format."""
+    if payload_json is not None:
+        return loads_json_column(payload_json)
+    return decode_payload(cols, payload_z)
+
+
+# ------------------------------
+# fraudresults
+# ------------------------------
+def _expand(name: str, score: float, rules: List[str]) -> Dict[str, Any]:
+    if name == "rules":
+        return {"name": "rules", "verdict": "fraud" if score == 1.0 else "legit", "score": score, "reasons": rules}
+    return {"name": name, "verdict": "fraud" if score >= AGENT_THRESHOLD else "legit", "score": score}
+
+
+def encode_reason_codes(reason_codes: Dict[str, Any]) -> Tuple[Dict[str, Optional[float]], bytes]:
+    """(score columns, reason_z) for one decision's reason_codes."""
+    scores = {col: None for col in SCORE_COLUMNS.values()}
+    rules = reason_codes.get("rules", [])
+    agents = []
+    for agent in reason_codes.get("agents", []):
+        name = agent.get("name")
+        if name in SCORE_COLUMNS and isinstance(agent.get("score"), float):
+            scores[SCORE_COLUMNS[name]] = agent["score"]
+            if agent == _expand(name, agent["score"], rules):
+                agents.append(name)
+                continue
+        agents.append(agent)
+    return scores, pack({**reason_codes, "agents": agents})
+
+
+def decode_reason_codes(scores: Dict[str, Optional[float]], reason_z: Optional[bytes]) -> Optional[Dict[str, Any]]:
+    rest = unpack(reason_z)
+    if rest is None:
+        return None
+    rules = rest.get("rules", [])
+    rest["agents"] = [
+        _expand(a, scores[SCORE_COLUMNS[a]], rules) if isinstance(a, str) else a
+        for a in rest.get("agents", [])
+    ]
+    return rest
+
+
+# ------------------------------
+# recommendations
+# ------------------------------
+def encode_recs(recs: List[Dict[str, Any]], agents: Optional[List[Dict[str, Any]]]) -> bytes:
+    slim = []
+    for rec in recs:
+        if agents is not None and rec.get("meta") == {"agents": agents, "txn": {}}:
+            rec = {k: v for k, v in rec.items() if k != "meta"}
+        slim.append(rec)
+    return pack(slim)
+
+
+def decode_recs(recs_z: Optional[bytes], agents: Optional[List[Dict[str, Any]]]) -> Optional[List[Dict[str, Any]]]:
+    recs = unpack(recs_z)
+    if recs is None:
+        return None
+    for rec in recs:
+        if "meta" not in rec:
+            rec["meta"] = {"agents": agents or [], "txn": {}}
+    return recs
+
+
+# ------------------------------
+# Schema
+# ------------------------------
+async def ensure_columns(engine: AsyncEngine) -> List[str]:
+    """Add the slim columns to tables created before them; returns what was added."""
+    added = []
+    for table, columns in COLUMNS.items():
+        for name, ddl in columns:
+            try:
+                async with engine.connect() as conn:
+                    await conn.execute(text(f"SELECT {name} FROM {table} WHERE 1 = 0"))
+                continue
+            except DBAPIError:
+                pass
+            async with engine.begin() as conn:
+                await conn.execute(text(f"ALTER TABLE {table} ADD COLUMN {name} {ddl}"))
+            added.append(f"{table}.{name}")
+    if engine.dialect.name == "mysql":
+        async with engine.begin() as conn:
+            nullable = (await conn.execute(text("""
+                SELECT IS_NULLABLE FROM information_schema.COLUMNS
+                WHERE TABLE_SCHEMA = DATABASE() AND TABLE_NAME = 'recommendations' AND COLUMN_NAME = 'recs'
+            """))).scalar()
+            if nullable == "NO":  # schemas older than the slim format
+                await conn.execute(text("ALTER TABLE recommendations MODIFY recs JSON NULL"))
+                added.append("recommendations.recs NULL")
+    return added
+
+
+# ------------------------------
+# Migration (batched, either direction)
+# ------------------------------
+async def _batch_transactions(conn, to: str, after: int, batch: int) -> Tuple[int, int]:
+    where = "payload IS NOT NULL" if to == SLIM else "payload IS NULL"
+    rows = (await conn.execute(text(f"""
+        SELECT id, payload, {", ".join(TXN_FIELDS)}, payload_z FROM transactions
+        WHERE id > :after AND {where} ORDER BY id LIMIT :n
+    """), {"after": after, "n": batch})).all()
+    for r in rows:
+        cols = dict(zip(TXN_FIELDS, r[2:2 + len(TXN_FIELDS)]))
+        payload = payload_of(r[1], cols, r[-1])
+        if to == SLIM:
+            values, extra = encode_payload(payload)
+            await conn.execute(text("""
+                UPDATE transactions SET user_external_id = :uid, device_risk_score = :risk,
+                       payload_z = :z, payload = NULL WHERE id = :id
+            """), {"uid": values["user_external_id"], "risk": values["device_risk_score"], "z": extra, "id": r[0]})
+        else:
+            await conn.execute(text("""
+                UPDATE transactions SET payload = :p, payload_z = NULL,
+                       user_external_id = NULL, device_risk_score = NULL WHERE id = :id
+            """), {"p": dumps(payload), "id": r[0]})
+    return len(rows), rows[-1][0] if rows else after
+
+
+async def _batch_fraudresults(conn, to: str, after: int, batch: int) -> Tuple[int, int]:
+    cols = list(SCORE_COLUMNS.values())
+    where = "reason_codes IS NOT NULL" if to == SLIM else "reason_z IS NOT NULL"
+    rows = (await conn.execute(text(f"""
+        SELECT id, reason_codes, {", ".join(cols)}, reason_z FROM fraudresults
+        WHERE id > :after AND {where} ORDER BY id LIMIT :n
+    """), {"after": after, "n": batch})).all()
+    for r in rows:
+        if to == SLIM:
+            scores, blob = encode_reason_codes(loads_json_column(r[1]))
+            await conn.execute(text(f"""
+                UPDATE fraudresults SET {", ".join(f"{c} = :{c}" for c in cols)},
+                       reason_z = :z, reason_codes = NULL WHERE id = :id
+            """), {**scores, "z": blob, "id": r[0]})
+        else:
+            reason_codes = decode_reason_codes(dict(zip(cols, r[2:2 + len(cols)])), r[-1])
+            await conn.execute(text(f"""
+                UPDATE fraudresults SET reason_codes = :rc, reason_z = NULL,
+                       {", ".join(f"{c} = NULL" for c in cols)} WHERE id = :id
+            """), {"rc": dumps(reason_codes), "id": r[0]})
+    return len(rows), rows[-1][0] if rows else after
+
+
+async def _batch_recommendations(conn, to: str, after: int, batch: int) -> Tuple[int, int]:
+    where = "r.recs IS NOT NULL" if to == SLIM else "r.recs_z IS NOT NULL"
+    rows = (await conn.execute(text(f"""
+        SELECT r.id, r.transaction_id, r.recs, r.recs_z FROM recommendations r
+        WHERE r.id > :after AND {where} ORDER BY r.id LIMIT :n
+    """), {"after": after, "n": batch})).all()
+    agents = await fetch_agents(conn, [r[1] for r in rows])
+    for r in rows:
+        if to == SLIM:
+            blob = encode_recs(loads_json_column(r[2]), agents.get(r[1]))
+            await conn.execute(text("UPDATE recommendations SET recs_z = :z, recs = NULL WHERE id = :id"),
+                               {"z": blob, "id": r[0]})
+        else:
+            recs = decode_recs(r[3], agents.get(r[1]))
+            await conn.execute(text("UPDATE recommendations SET recs = :recs, recs_z = NULL WHERE id = :id"),
+                               {"recs": dumps(recs), "id": r[0]})
+    return len(rows), rows[-1][0] if rows else after
+
+
+async def fetch_agents(conn, txn_ids: List[int]) -> Dict[int, List[Dict[str, Any]]]:
+    """Decision agents per transaction, from either fraudresults format."""
+    if not txn_ids:
+        return {}
+    cols = list(SCORE_COLUMNS.values())
+    res = await conn.execute(text(f"""
+        SELECT transaction_id, reason_codes, {", ".join(cols)}, reason_z FROM fraudresults
+        WHERE transaction_id IN :ids
+    """).bindparams(bindparam("ids", expanding=True)), {"ids": list(txn_ids)})
+    out = {}
+    for r in res.all():
+        if r[1] is not None:
+            reason_codes = loads_json_column(r[1])
+        else:
+            reason_codes = decode_reason_codes(dict(zip(cols, r[2:2 + len(cols)])), r[-1])
+        out[r[0]] = (reason_codes or {}).get("agents")
+    return out
+
+
+# fetch_agents reads either fraudresults format, so the order doesn't matter
+_TABLES = (
+    ("transactions", _batch_transactions),
+    ("recommendations", _batch_recommendations),
+    ("fraudresults", _batch_fraudresults),
+)
+
+
+async def migrate(engine: AsyncEngine, to: str = SLIM, batch: int = 1000) -> Dict[str, int]:
+    """Convert every row to `to`, one committed batch at a time; safe to stop and rerun."""
+    await ensure_columns(engine)
+    done = {}
+    for table, convert in _TABLES:
+        after, total = 0, 0
+        while True:
+            async with engine.begin() as conn:
+                n, after = await convert(conn, to, after, batch)
+            total += n
+            if n < batch:
+                break
+        done[table] = total
+        logger.info("%s: %d rows converted to %s", table, total, to)
+    return done
+
+
+# ------------------------------
+# Bytes report
+# ------------------------------
+async def report(engine: AsyncEngine) -> Dict[str, Any]:
+    """
+    Stored bytes of the per-transaction data columns (JSON, blobs and the
+    typed columns that replace them), per table and per transaction. Row
+    headers and indexes are not counted. MySQL JSON is measured with
+    JSON_STORAGE_SIZE (its binary format), SQLite by text length.
+    """
+    json_size = "JSON_STORAGE_SIZE" if engine.dialect.name == "mysql" else "LENGTH"
+    columns = {
+        "transactions": [("payload", json_size), ("payload_z", "LENGTH"),
+                         ("user_external_id", "LENGTH"), ("device_risk_score", 8)],
+        "fraudresults": [("reason_codes", json_size), ("reason_z", "LENGTH")]
+                        + [(c, 8) for c in SCORE_COLUMNS.values()],
+        "recommendations": [("recs", json_size), ("recs_z", "LENGTH")],
+        "chain_entries": [("entry_payload", json_size)],
+    }
+    out: Dict[str, Any] = {}
+    async with engine.connect() as conn:
+        n_txn = (await conn.execute(text("SELECT COUNT(*) FROM transactions"))).scalar() or 0
+        for table, cols in columns.items():
+            exprs = [
+                f"SUM(CASE WHEN {c} IS NULL THEN 0 ELSE 8 END)" if size == 8
+                else f"SUM(COALESCE({size}({c}), 0))"
+                for c, size in cols
+            ]
+            try:
+                row = (await conn.execute(text(f"SELECT COUNT(*), {', '.join(exprs)} FROM {table}"))).first()
+            except DBAPIError:
+                # full-format schema without the slim columns
+                cols = cols[:1]
+                row = (await conn.execute(text(f"SELECT COUNT(*), {exprs[0]} FROM {table}"))).first()
+            by_column = {c: int(v or 0) for (c, _), v in zip(cols, row[1:])}
+            out[table] = {"rows": int(row[0]), "bytes": sum(by_column.values()), "columns": by_column}
+    total = sum(t["bytes"] for t in out.values())
+    out["transactions_count"] = n_txn
+    out["bytes_per_transaction"] = total / n_txn if n_txn else 0.0
+    out["bytes_per_transaction_excl_ledger"] = (total - out["chain_entries"]["bytes"]) / n_txn if n_txn else 0.0
+    return out
+
+
+# ------------------------------
+# CLI
+# ------------------------------
+def main():
+    parser = argparse.ArgumentParser(description="Convert stored rows between the full and slim formats")
+    sub = parser.add_subparsers(dest="cmd", required=True)
+    p = sub.add_parser("migrate")
+    p.add_argument("--to", choices=(SLIM, FULL), default=SLIM)
+    p.add_argument("--batch", type=int, default=1000, help="rows per committed batch")
+    sub.add_parser("report")
+    args = parser.parse_args()
+
+    from app.db import sharding
+
+    async def run():
+        try:
+            for shard in sharding.shards:
+                if args.cmd == "migrate":
+                    print(f"shard {shard.index}: {await migrate(shard.engine, args.to, args.batch)}")
+                else:
+                    r = await report(shard.engine)
+                    print(f"shard {shard.index}: {r['transactions_count']} transactions, "
+                          f"{r['bytes_per_transaction']:.0f} bytes each "
+                          f"({r['bytes_per_transaction_excl_ledger']:.0f} without the ledger)")
+                    for table in ("transactions", "fraudresults", "recommendations", "chain_entries"):
+                        print(f"   {table:<16}{r[table]['bytes']:>12} bytes  {r[table]['columns']}")
+        finally:
+            await sharding.dispose()
+            await sharding.shards[sharding.LEDGER].engine.dispose()
+
+    logging.basicConfig(level=logging.INFO)
+    asyncio.run(run())
+
+
+if __name__ == "__main__":
+    main()
@@ -1,15 +1,19 @@
 # backend/app/ledger/ledger.py
+import asyncio
 import hashlib
 import hmac
-import json
 import time
-from typing import List, Dict, Any
+from typing import List, Dict, Any, Iterable, Optional
 from sqlalchemy import text
 from sqlalchemy.ext.asyncio import AsyncSession
+from app.core import events
 from app.core.config import settings  # for hmac key
+from app.core.serialization import canonical_bytes, loads
+
+GENESIS_HASH = "0" * 64
 
 def stable_json(obj: Any) -> str:
-    return json.dumps(obj, separators=(",", ":"), sort_keys=True, ensure_ascii=False)
+    return canonical_bytes(obj).decode("utf-8")
 
 def sha256_hex(data: bytes) -> str:
     return hashlib.sha256(data).hexdigest()
@@ -19,79 +23,234 @@ def compute_hmac(prev_hmac: str, payload: dict) -> str:
     Compute chained HMAC: HMAC(secret, prev_hmac || payload_json)
     """
     key = settings.ledger_hmac_key.encode()
-    data = (prev_hmac or "").encode() + stable_json(payload).encode()
+    data = (prev_hmac or "").encode() + canonical_bytes(payload)
     return hmac.new(key, data, hashlib.sha256).hexdigest()
 
+def entry_hmac_key() -> bytes:
+    return settings.ledger_hmac_key.encode("utf-8") if settings.ledger_hmac_key else b"secret-default-key"
+
+def chain_hmac(key: bytes, entry_hash: str, prev_hmac: str) -> str:
+    """Running entry HMAC: HMAC(k, entry_hash || prev_hmac)."""
+    return hmac.new(key, (entry_hash + prev_hmac).encode("utf-8"), hashlib.sha256).hexdigest()
+
+def merkle_root_of(entry_hashes: List[str]) -> str:
+    # simple merkle-like root = sha256(concat hashes)
+    return sha256_hex("".join(entry_hashes).encode("utf-8")) if entry_hashes else sha256_hex(b"")
+
+def verify_chain(
+    blocks: Iterable[Dict[str, Any]],
+    entries: Iterable[Dict[str, Any]],
+    prev_block_hash: Optional[str] = None,
+    prev_hmac: Optional[str] = None,
+    key: Optional[bytes] = None,
+) -> List[str]:
+    """
+    Offline verification of a contiguous run of the ledger.
+    blocks: dicts with block_index, prev_block_hash, block_hash, merkle_root, entries_count
+    entries: dicts with block_index, entry_index, entry_payload (JSON text or dict), entry_hash, hmac_chain
+    prev_block_hash / prev_hmac anchor the run to what precedes it (genesis when None).
+    Returns a list of problems; empty means the run is gap-free and intact.
+    Block hashes themselves can't be recomputed (the header timestamp isn't stored).
+    """
+    key = key or entry_hmac_key()
+    problems: List[str] = []
+    by_block: Dict[int, List[Dict[str, Any]]] = {}
+    for e in entries:
+        by_block.setdefault(int(e["block_index"]), []).append(e)
+
+    expected_prev = prev_block_hash
+    running_hmac = prev_hmac if prev_hmac is not None else GENESIS_HASH
+    last_index = None
+    for b in sorted(blocks, key=lambda b: int(b["block_index"])):
+        bi = int(b["block_index"])
+        if last_index is not None and bi != last_index + 1:
+            problems.append(f"gap: block {last_index} followed by {bi}")
+        if expected_prev is not None and b["prev_block_hash"] != expected_prev:
+            problems.append(f"block {bi}: prev_block_hash does not link to previous block")
+        block_entries = sorted(by_block.pop(bi, []), key=lambda e: int(e["entry_index"]))
+        if [int(e["entry_index"]) for e in block_entries] != list(range(1, len(block_entries) + 1)):
+            problems.append(f"block {bi}: entry indexes are not 1..n")
+        if len(block_entries) != int(b["entries_count"]):
+            problems.append(f"block {bi}: {len(block_entries)} entries, header says {b['entries_count']}")
+        hashes = []
+        for e in block_entries:
+            payload = e["entry_payload"]
+            if not isinstance(payload, (dict, list)):
+                payload = loads(payload)
+            h = sha256_hex(canonical_bytes(payload))
+            if h != e["entry_hash"]:
+                problems.append(f"block {bi} entry {e['entry_index']}: payload hash mismatch")
+            running_hmac = chain_hmac(key, e["entry_hash"], running_hmac)
+            if running_hmac != e["hmac_chain"]:
+                problems.append(f"block {bi} entry {e['entry_index']}: hmac chain mismatch")
+                running_hmac = e["hmac_chain"]  # resync to report later breaks independently
+            hashes.append(e["entry_hash"])
+        if merkle_root_of(hashes) != b["merkle_root"]:
+            problems.append(f"block {bi}: merkle root mismatch")
+        expected_prev = b["block_hash"]
+        last_index = bi
+    for bi in sorted(by_block):
+        problems.append(f"entries reference missing block {bi}")
+    return problems
+
 async def get_last_block(db: AsyncSession):
     q = text("SELECT block_index, block_hash FROM chain_blocks ORDER BY block_index DESC LIMIT 1")
     res = await db.execute(q)
     row = res.first()
     if not row:
-        return -1, "0"*64
+        return -1, GENESIS_HASH
     return int(row[0]), row[1]
 
 async def get_last_hmac(db: AsyncSession) -> str:
     r = await db.execute(text("SELECT hmac_chain FROM chain_entries ORDER BY id DESC LIMIT 1"))
     row = r.first()
     if not row:
-        return "0"*64
+        return GENESIS_HASH
     return row[0]
 
-async def append_block(db: AsyncSession, entries: List[Dict[str,Any]]):
+def block_header_bytes(block_index: int, prev_hash: str, merkle_root: str, entries_count: int, timestamp: int) -> bytes:
+    return canonical_bytes({
+        "block_index": block_index,
+        "prev_block_hash": prev_hash,
+        "merkle_root": merkle_root,
+        "entries_count": entries_count,
+        "timestamp": timestamp
+    })
+
+def seal_block(
+    block_index: int,
+    prev_hash: str,
+    prev_hmac: str,
+    entries: List[Dict[str, Any]],
+    key: Optional[bytes] = None,
+    timestamp: Optional[int] = None,
+) -> Dict[str, Any]:
     """
+    Pure block sealing shared by every ledger backend.
     entries: list of dicts with tx_reference and payload (minimal, non-PII)
     """
-    last_index, prev_hash = await get_last_block(db)
-    block_index = last_index + 1
+    # serialize each payload once; the same bytes are hashed and stored
+    entry_bytes = [canonical_bytes(e["payload"]) for e in entries]
+    entry_hashes = [sha256_hex(b) for b in entry_bytes]
 
-    entry_hashes = []
-    for e in entries:
-        h = sha256_hex(stable_json(e["payload"]).encode("utf-8"))
-        entry_hashes.append(h)
+    merkle_root = merkle_root_of(entry_hashes)
+    timestamp = int(time.time()) if timestamp is None else timestamp
+    block_hash = sha256_hex(block_header_bytes(block_index, prev_hash, merkle_root, len(entries), timestamp))
 
-    # simple merkle-like root = sha256(concat hashes)
-    merkle_root = sha256_hex("".join(entry_hashes).encode("utf-8")) if entry_hashes else sha256_hex(b"")
+    key = key or entry_hmac_key()
+    sealed_entries = []
+    for idx, (entry, ebytes, ehash) in enumerate(zip(entries, entry_bytes, entry_hashes), start=1):
+        # compute running hmac: HMAC(k, entry_hash || prev_hmac)
+        hm = chain_hmac(key, ehash, prev_hmac)
+        sealed_entries.append({
+            "entry_index": idx,
+            "tx_reference": str(entry.get("tx_reference")),
+            "payload_bytes": ebytes,
+            "entry_hash": ehash,
+            "hmac_chain": hm,
+        })
+        prev_hmac = hm
 
-    header = stable_json({
+    return {
         "block_index": block_index,
         "prev_block_hash": prev_hash,
         "merkle_root": merkle_root,
+        "block_hash": block_hash,
         "entries_count": len(entries),
-        "timestamp": int(time.time())
-    }).encode("utf-8")
-    block_hash = sha256_hex(header)
+        "timestamp": timestamp,
+        "entries": sealed_entries,
+    }
 
+async def insert_sealed_block(db: AsyncSession, sealed: Dict[str, Any]) -> None:
     # persist block
     await db.execute(text("""
         INSERT INTO chain_blocks (block_index, prev_block_hash, block_hash, merkle_root, entries_count)
         VALUES (:block_index, :prev, :block_hash, :merkle_root, :entries_count)
     """), {
-        "block_index": block_index,
-        "prev": prev_hash,
-        "block_hash": block_hash,
-        "merkle_root": merkle_root,
-        "entries_count": len(entries)
+        "block_index": sealed["block_index"],
+        "prev": sealed["prev_block_hash"],
+        "block_hash": sealed["block_hash"],
+        "merkle_root": sealed["merkle_root"],
+        "entries_count": sealed["entries_count"]
     })
-
-    # compute HMAC chain
-    prev_hmac = await get_last_hmac(db)
-    key = settings.ledger_hmac_key.encode("utf-8") if settings.ledger_hmac_key else b"secret-default-key"
-
-    for idx, (entry, ehash) in enumerate(zip(entries, entry_hashes), start=1):
-        # compute running hmac: HMAC(k, entry_hash || prev_hmac)
-        hm = hmac.new(key, (ehash + prev_hmac).encode("utf-8"), hashlib.sha256).hexdigest()
+    for e in sealed["entries"]:
         await db.execute(text("""
             INSERT INTO chain_entries (block_index, entry_index, tx_reference, entry_payload, entry_hash, hmac_chain)
             VALUES (:block_index, :entry_index, :tx_reference, :entry_payload, :entry_hash, :hmac_chain)
         """), {
-            "block_index": block_index,
-            "entry_index": idx,
-            "tx_reference": str(entry.get("tx_reference")),
-            "entry_payload": stable_json(entry["payload"]),
-            "entry_hash": ehash,
-            "hmac_chain": hm
+            "block_index": sealed["block_index"],
+            "entry_index": e["entry_index"],
+            "tx_reference": e["tx_reference"],
+            "entry_payload": e["payload_bytes"].decode("utf-8"),
+            "entry_hash": e["entry_hash"],
+            "hmac_chain": e["hmac_chain"]
         })
-        prev_hmac = hm
 
+def block_meta(sealed: Dict[str, Any]) -> Dict[str, Any]:
+    return {"block_index": sealed["block_index"], "block_hash": sealed["block_hash"], "merkle_root": sealed["merkle_root"]}
+
+async def fetch_blocks_since(db: AsyncSession, since_block: int, limit: int = 500) -> List[Dict[str, Any]]:
+    """Blocks after since_block with their parsed entry payloads, oldest first."""
+    res = await db.execute(text("""
+        SELECT block_index, block_hash, merkle_root, entries_count
+        FROM chain_blocks WHERE block_index > :since ORDER BY block_index LIMIT :lim
+    """), {"since": since_block, "lim": limit})
+    blocks = [
+        {"block_index": int(r[0]), "block_hash": r[1], "merkle_root": r[2], "entries_count": r[3], "entries": []}
+        for r in res.all()
+    ]
+    if not blocks:
+        return blocks
+    by_index = {b["block_index"]: b for b in blocks}
+    res = await db.execute(text("""
+        SELECT block_index, entry_payload FROM chain_entries
+        WHERE block_index BETWEEN :lo AND :hi ORDER BY block_index, entry_index
+    """), {"lo": blocks[0]["block_index"], "hi": blocks[-1]["block_index"]})
+    for bi, payload in res.all():
+        by_index[int(bi)]["entries"].append(loads(payload))
+    return blocks
+
+async def append_block(db: Optional[AsyncSession], entries: List[Dict[str,Any]], retry: bool = False):
+    """
+    entries: list of dicts with tx_reference and payload (minimal, non-PII)
+
+    LEDGER_BACKEND selects where the chain lives:
+      mysql    - chain_blocks / chain_entries only (default)
+      segments - append-only segment files (app/ledger/segments.py); db may be None
+      both     - segment files own the chain head, rows are mirrored to MySQL
+
+    The caller's session is committed in every mode before the block is
+    published to the change feed (app/core/events.py).
+
+    With LEDGER_SEQUENCER_SOCKET set, sealing is delegated to the single
+    writer process (app/ledger/sequencer.py): the session is committed first,
+    then the entries are submitted and this waits for the receipt. Callers
+    pass their ledger_pending claims out of that session (pending.seal), so
+    a failed or timed-out submit leaves the entries pending; retry=True
+    has the writer drop the ones it sealed anyway.
+    """
+    if settings.ledger_sequencer_socket:
+        from app.ledger.sequencer import get_client
+        if db is not None:
+            await db.commit()
+        receipt = await get_client().submit(entries, retry)
+        return {k: receipt[k] for k in ("block_index", "block_hash", "merkle_root")}
+
+    if settings.ledger_backend in ("segments", "both"):
+        from app.ledger.segments import get_store
+        # file write + fsync: off the event loop, and concurrent appends share one fsync
+        sealed = await asyncio.to_thread(get_store().append_block, entries)
+        if settings.ledger_backend == "both" and db is not None:
+            await insert_sealed_block(db, sealed)
+        if db is not None:
+            await db.commit()
+        events.publish_block({**block_meta(sealed), "entries_count": sealed["entries_count"]}, [e["payload"] for e in entries])
+        return block_meta(sealed)
+
+    last_index, prev_hash = await get_last_block(db)
+    prev_hmac = await get_last_hmac(db)
+    sealed = seal_block(last_index + 1, prev_hash, prev_hmac, entries)
+    await insert_sealed_block(db, sealed)
     await db.commit()
-    return {"block_index": block_index, "block_hash": block_hash, "merkle_root": merkle_root}
+    events.publish_block({**block_meta(sealed), "entries_count": sealed["entries_count"]}, [e["payload"] for e in entries])
+    return block_meta(sealed)
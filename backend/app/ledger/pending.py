@@ -0,0 +1,133 @@
+# backend/app/ledger/pending.py
+"""
+Durable outbox for ledger entries that are not sealed with their decision.
+
+Every decision writes its entry to ledger_pending on its own shard, in
+the decision's transaction (fraud.store_decisions), so an entry exists
+exactly when its decision does, crash or not. The rows are sealed right
+after that commit; when the append is deferred (admission stage
+ledger_deferred) or that seal fails, they wait for the backlog flush.
+
+seal() claims pending rows (locks and deletes them in a session per
+shard), seals them as one block and then commits the claims:
+- unsharded with LEDGER_BACKEND=mysql, the claim and the block share the
+  ledger session, so sealing and removal are one transaction
+- otherwise the block is written first and the claims commit afterwards.
+  A crash in between leaves rows that are already sealed. The batch flush
+  (claims=None) drops entries whose tx_reference is already in the chain:
+  the segment index, or the last DEDUPE_BLOCKS blocks of chain_entries.
+  Behind LEDGER_SEQUENCER_SOCKET the claims commit only after the receipt,
+  and a flush is submitted with retry=True: the sequencer, which owns the
+  chain, runs that check (a receipt lost to a timeout)
+
+Claims use SELECT ... FOR UPDATE (SKIP LOCKED for the batch flush) on
+MySQL, so workers sealing at the same time never take the same row.
+Callers hold sharding.ledger_lock, which orders appends in this worker.
+"""
+import logging
+from contextlib import AsyncExitStack
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+from sqlalchemy import bindparam, text
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.core.config import settings
+from app.core.serialization import dumps, loads_json_column
+
+logger = logging.getLogger(__name__)
+
+DEDUPE_BLOCKS = 10000
+
+
+async def add(db: AsyncSession, entries: Sequence[Dict[str, Any]]) -> None:
+    """Stage ledger entries in the caller's transaction (the one that stores their decisions)."""
+    if entries:
+        await db.execute(
+            text("INSERT INTO ledger_pending (tx_reference, entry_payload) VALUES (:ref, :payload)"),
+            [{"ref": str(e["tx_reference"]), "payload": dumps(e["payload"])} for e in entries],
+        )
+
+
+async def _claim(db: AsyncSession, refs: Optional[List[str]], limit: int) -> List[Dict[str, Any]]:
+    """Lock and delete pending rows (refs, or the oldest `limit`); uncommitted until the caller's session ends."""
+    mysql = db.bind.dialect.name == "mysql"
+    if refs is None:
+        sql = "SELECT id, tx_reference, entry_payload FROM ledger_pending ORDER BY id LIMIT :n"
+        stmt, params = text(sql + (" FOR UPDATE SKIP LOCKED" if mysql else "")), {"n": limit}
+    else:
+        sql = "SELECT id, tx_reference, entry_payload FROM ledger_pending WHERE tx_reference IN :refs"
+        stmt = text(sql + (" FOR UPDATE" if mysql else "")).bindparams(bindparam("refs", expanding=True))
+        params = {"refs": refs}
+    rows = (await db.execute(stmt, params)).all()
+    if not rows:
+        return []
+    deleted = (await db.execute(
+        text("DELETE FROM ledger_pending WHERE id IN :ids").bindparams(bindparam("ids", expanding=True)),
+        {"ids": [r[0] for r in rows]},
+    )).rowcount
+    if deleted != len(rows):
+        raise RuntimeError(f"{len(rows) - deleted} pending ledger entries were claimed by another worker")
+    entries = {r[1]: {"tx_reference": r[1], "payload": loads_json_column(r[2])} for r in rows}
+    # the caller's order (its block), else oldest first
+    order = refs if refs is not None else [r[1] for r in rows]
+    return [entries[ref] for ref in order if ref in entries]
+
+
+async def drop_sealed(ledger_db: Optional[AsyncSession], entries: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    """Entries whose tx_reference is not in the chain yet (rows left by a crash after their block was written)."""
+    refs = [str(e["tx_reference"]) for e in entries]
+    if settings.ledger_backend in ("segments", "both"):
+        # the segment files own the chain (a "both" mirror may lag)
+        from app.ledger.segments import get_store
+        store = get_store()
+        sealed = {ref for ref in refs if store.find_tx(ref) is not None}
+    else:
+        if ledger_db is None:
+            return entries
+        head = (await ledger_db.execute(text("SELECT MAX(block_index) FROM chain_blocks"))).scalar()
+        if head is None:
+            return entries
+        sealed = set((await ledger_db.execute(
+            text(
+                "SELECT tx_reference FROM chain_entries WHERE block_index > :since AND tx_reference IN :refs"
+            ).bindparams(bindparam("refs", expanding=True)),
+            {"since": head - DEDUPE_BLOCKS, "refs": refs},
+        )).scalars())
+    if sealed:
+        logger.warning("%d pending ledger entries were already sealed; dropped", len(sealed))
+    return [e for e in entries if str(e["tx_reference"]) not in sealed]
+
+
+async def seal(claims: Optional[Dict[int, List[Any]]], limit: int = 5000) -> Tuple[Optional[Dict[str, Any]], int, bool]:
+    """
+    Seal pending entries as one block: claims maps shard -> tx_references
+    (in block order), or None for the oldest `limit` rows of every shard.
+    Returns (block meta or None, entries sealed, whether every claimed shard
+    is now empty). On error nothing is removed. Call under ledger_lock.
+    """
+    from app.db import sharding
+    from app.ledger.ledger import append_block
+
+    by_shard = {s: None for s in range(len(sharding.shards))} if claims is None else {
+        s: [str(ref) for ref in refs] for s, refs in claims.items()
+    }
+    async with AsyncExitStack() as stack:
+        sessions: Dict[int, AsyncSession] = {}
+        for shard in sorted(by_shard, key=lambda s: s != sharding.LEDGER):  # ledger shard first: its claim is the shortest wait
+            sessions[shard] = await stack.enter_async_context(sharding.session_scope(shard))
+        entries: List[Dict[str, Any]] = []
+        drained = True
+        for shard, refs in by_shard.items():
+            claimed = await _claim(sessions[shard], refs, limit)
+            drained &= refs is not None or len(claimed) < limit
+            entries += claimed
+        # the sequencer commits the session it is given before sealing: give it none
+        ledger_db = None
+        if not settings.ledger_sequencer_socket:
+            ledger_db = sessions.get(sharding.LEDGER)
+            if ledger_db is None:
+                ledger_db = await stack.enter_async_context(sharding.session_scope(sharding.LEDGER))
+        if claims is None and entries and not settings.ledger_sequencer_socket:
+            entries = await drop_sealed(ledger_db, entries)
+        meta = await append_block(ledger_db, entries, retry=claims is None) if entries else None
+    return meta, len(entries), drained
@@ -0,0 +1,497 @@
+# backend/app/ledger/segments.py
+"""
+Append-only binary segment files for the audit ledger.
+
+Layout of a segment (`ledger-<first block index>.seg`):
+
+    file header  : magic "FFLSEG01", u32 version, u64 first block index
+    block record : u8 kind=1, u64 block_index, u64 timestamp, u32 entries_count,
+                   32B prev_block_hash, 32B merkle_root, 32B block_hash, u32 crc32
+    entry record : u8 kind=2, u64 block_index, u32 entry_index, u16 tx_ref_len,
+                   u32 payload_len, 32B entry_hash, 32B hmac_chain, u32 crc32,
+                   then tx_reference bytes and the canonical JSON payload
+
+Hashes are stored raw (32 bytes) rather than hex, every header is fixed width
+and payloads are length-prefixed, so a reader walks the file with
+struct.unpack_from over an mmap and hashes payload slices through memoryview
+without copying. The crc32 covers the header fields plus variable bytes and
+lets recovery cut off a torn tail after a crash.
+
+An in-memory index maps every INDEX_EVERY-th block index (sparse) and every
+tx_reference to (segment, offset); it is persisted next to the segments as
+`ledger.idx` and caught up from the tail on open.
+
+With fsync on, appends group-commit: a block is written under the store lock
+and the fsync happens outside it, so one fsync covers every block written
+before it started and concurrent appenders (threads) share it.
+"""
+import hashlib
+import mmap
+import os
+import pathlib
+import struct
+import threading
+import zlib
+from bisect import bisect_right
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+from app.core.config import settings
+from app.core.serialization import dumps_bytes, loads
+from app.ledger.ledger import (
+    GENESIS_HASH, block_header_bytes, chain_hmac, entry_hmac_key, merkle_root_of, seal_block, sha256_hex,
+)
+
+MAGIC = b"FFLSEG01"
+VERSION = 1
+FILE_HEADER = struct.Struct("<8sIQ")
+BLOCK = struct.Struct("<BQQI32s32s32sI")
+ENTRY = struct.Struct("<BQIHI32s32sI")
+KIND_BLOCK = 1
+KIND_ENTRY = 2
+INDEX_EVERY = 64
+
+
+def _crc(header_without_crc: bytes, *extra) -> int:
+    c = zlib.crc32(header_without_crc)
+    for e in extra:
+        c = zlib.crc32(e, c)
+    return c
+
+
+class LedgerCorruption(RuntimeError):
+    pass
+
+
+class SegmentStore:
+    def __init__(self, directory: str | os.PathLike, segment_max_bytes: int = 64 * 1024 * 1024, fsync: bool = True):
+        self.dir = pathlib.Path(directory)
+        self.dir.mkdir(parents=True, exist_ok=True)
+        self.segment_max_bytes = segment_max_bytes
+        self.fsync = fsync
+        self._lock = threading.Lock()
+        self._sync_lock = threading.Lock()
+        self._written = 0  # blocks appended by this process ...
+        self._synced = 0  # ... and how many of them are known to be on disk
+        # sparse: block_index -> (segment name, offset) every INDEX_EVERY blocks
+        self.block_index: Dict[int, Tuple[str, int]] = {}
+        # dense: tx_reference -> (segment name, offset of entry record)
+        self.tx_index: Dict[str, Tuple[str, int]] = {}
+        self.head_index = -1
+        self.head_hash = GENESIS_HASH
+        self.head_hmac = GENESIS_HASH
+        self._file = None
+        self._segment: Optional[pathlib.Path] = None
+        self._open()
+
+    # ------------------------------
+    # Opening / recovery
+    # ------------------------------
+    def segments(self) -> List[pathlib.Path]:
+        return sorted(self.dir.glob("ledger-*.seg"))
+
+    def _index_path(self) -> pathlib.Path:
+        return self.dir / "ledger.idx"
+
+    def _open(self) -> None:
+        saved = self._load_index()
+        segs = self.segments()
+        scan_from: Dict[str, int] = {}
+        if saved:
+            self.block_index = {int(k): tuple(v) for k, v in saved["blocks"].items()}
+            self.tx_index = {k: tuple(v) for k, v in saved["tx"].items()}
+            self.head_index, self.head_hash, self.head_hmac = saved["head"]
+            scan_from[saved["segment"]] = saved["offset"]
+            segs = [s for s in segs if s.name >= saved["segment"]]
+        for seg in segs:
+            good_end = self._scan(seg, scan_from.get(seg.name, FILE_HEADER.size))
+            if good_end == 0:
+                seg.unlink()  # crashed while writing the file header
+                continue
+            if good_end < seg.stat().st_size:
+                # torn tail from a crash mid-append: drop the incomplete block
+                with open(seg, "r+b") as f:
+                    f.truncate(good_end)
+        segs = [s for s in segs if s.exists()]
+        if segs:
+            self._segment = segs[-1]
+            self._file = open(self._segment, "ab")
+
+    def _load_index(self) -> Optional[Dict[str, Any]]:
+        path = self._index_path()
+        if not path.exists():
+            return None
+        try:
+            saved = loads(path.read_bytes())
+        except Exception:
+            return None
+        seg = self.dir / saved.get("segment", "")
+        if not seg.exists() or seg.stat().st_size < saved.get("offset", 0):
+            return None  # segments changed underneath; rebuild by full scan
+        return saved
+
+    def save_index(self) -> None:
+        if self._segment is None:
+            return
+        with self._lock:
+            doc = {
+                "segment": self._segment.name,
+                "offset": self._segment.stat().st_size,
+                "head": [self.head_index, self.head_hash, self.head_hmac],
+                "blocks": {str(k): list(v) for k, v in self.block_index.items()},
+                "tx": {k: list(v) for k, v in self.tx_index.items()},
+            }
+        tmp = self._index_path().with_suffix(".tmp")
+        tmp.write_bytes(dumps_bytes(doc))
+        os.replace(tmp, self._index_path())
+
+    def _scan(self, seg: pathlib.Path, start: int) -> int:
+        """Index records from `start`; returns the offset after the last complete block."""
+        size = seg.stat().st_size
+        if size <= FILE_HEADER.size:
+            return FILE_HEADER.size if size == FILE_HEADER.size else 0
+        with open(seg, "rb") as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+            mv = memoryview(mm)
+            try:
+                magic, _version, _first = FILE_HEADER.unpack_from(mv, 0)
+                if magic != MAGIC:
+                    raise LedgerCorruption(f"{seg.name}: bad magic")
+                good_end = start
+                pending: List[Tuple[str, int]] = []
+                remaining = 0
+                head = None
+                last_hmac = None
+                for kind, off, end, rec in _records(mv, start):
+                    if kind == KIND_BLOCK:
+                        if remaining:
+                            break  # previous block lost entries: treat as torn
+                        bi = rec[1]
+                        head = (bi, rec[6].hex())
+                        remaining = rec[3]
+                        pending = []
+                        if bi % INDEX_EVERY == 0:
+                            self.block_index[bi] = (seg.name, off)
+                    else:
+                        remaining -= 1
+                        pending.append((bytes(mv[end - rec[4] - rec[3]:end - rec[4]]).decode("utf-8"), off))
+                        last_hmac = rec[6].hex()
+                    if remaining == 0 and head is not None:
+                        for tx, o in pending:
+                            self.tx_index[tx] = (seg.name, o)
+                        self.head_index, self.head_hash = head
+                        if pending:
+                            self.head_hmac = last_hmac
+                        pending = []
+                        good_end = end
+                return good_end
+            finally:
+                mv.release()
+
+    # ------------------------------
+    # Appending
+    # ------------------------------
+    def _roll_if_needed(self, next_block: int) -> None:
+        if self._file is not None and self._file.tell() < self.segment_max_bytes:
+            return
+        if self._file is not None:
+            if self.fsync:
+                os.fsync(self._file.fileno())  # a pending group fsync only covers the new segment
+            self._file.close()
+        self._segment = self.dir / f"ledger-{next_block:012d}.seg"
+        self._file = open(self._segment, "ab")
+        self._file.write(FILE_HEADER.pack(MAGIC, VERSION, next_block))
+        self._file.flush()
+
+    def append_block(self, entries: List[Dict[str, Any]], key: Optional[bytes] = None) -> Dict[str, Any]:
+        """
+        Seal and durably append one block; returns the sealed block (see
+        ledger.seal_block). Blocks on disk I/O: async callers run it in a thread.
+        """
+        with self._lock:
+            sealed = seal_block(self.head_index + 1, self.head_hash, self.head_hmac, entries, key=key)
+            bi = sealed["block_index"]
+            self._roll_if_needed(bi)
+            f = self._file
+            block_off = f.tell()
+
+            head = BLOCK.pack(
+                KIND_BLOCK, bi, sealed["timestamp"], sealed["entries_count"],
+                bytes.fromhex(sealed["prev_block_hash"]), bytes.fromhex(sealed["merkle_root"]),
+                bytes.fromhex(sealed["block_hash"]), 0,
+            )[:-4]
+            buf = [head, struct.pack("<I", _crc(head))]
+            offsets = []
+            pos = block_off + BLOCK.size
+            for e in sealed["entries"]:
+                tx = e["tx_reference"].encode("utf-8")
+                payload = e["payload_bytes"]
+                eh = ENTRY.pack(
+                    KIND_ENTRY, bi, e["entry_index"], len(tx), len(payload),
+                    bytes.fromhex(e["entry_hash"]), bytes.fromhex(e["hmac_chain"]), 0,
+                )[:-4]
+                buf += [eh, struct.pack("<I", _crc(eh, tx, payload)), tx, payload]
+                offsets.append((e["tx_reference"], pos))
+                pos += ENTRY.size + len(tx) + len(payload)
+
+            f.write(b"".join(buf))
+            f.flush()
+            self._written += 1
+            ticket = self._written
+
+            seg = self._segment.name
+            if bi % INDEX_EVERY == 0:
+                self.block_index[bi] = (seg, block_off)
+            for tx, off in offsets:
+                self.tx_index[tx] = (seg, off)
+            self.head_index, self.head_hash = bi, sealed["block_hash"]
+            if sealed["entries"]:
+                self.head_hmac = sealed["entries"][-1]["hmac_chain"]
+        if self.fsync:
+            self._sync(ticket)
+        return sealed
+
+    def _sync(self, ticket: int) -> None:
+        """Return once block `ticket` is on disk; one fsync serves every appender waiting for it."""
+        with self._sync_lock:
+            with self._lock:
+                if self._synced >= ticket or self._file is None:  # close() synced it
+                    return
+                # a dup survives a concurrent roll / close of the segment file
+                fd, upto = os.dup(self._file.fileno()), self._written
+            try:
+                os.fsync(fd)
+            finally:
+                os.close(fd)
+            self._synced = max(self._synced, upto)
+
+    def close(self) -> None:
+        if self._file is not None:
+            self.save_index()
+            with self._lock:
+                if self.fsync:
+                    os.fsync(self._file.fileno())
+                    self._synced = self._written
+                self._file.close()
+                self._file = None
+
+    # ------------------------------
+    # Reading (mmap, zero-copy)
+    # ------------------------------
+    def iter_blocks(self, start_block: int = 0) -> Iterator[Dict[str, Any]]:
+        """Yield blocks (with entries, payloads as bytes) from start_block on."""
+        segs = self.segments()
+        first_seg, first_off = self._locate_block(start_block)
+        for seg in segs:
+            if first_seg is not None and seg.name < first_seg:
+                continue
+            start = first_off if seg.name == first_seg else FILE_HEADER.size
+            if seg.stat().st_size <= start:
+                continue
+            with open(seg, "rb") as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+                mv = memoryview(mm)
+                try:
+                    block = None
+                    for kind, off, end, rec in _records(mv, start):
+                        if kind == KIND_BLOCK:
+                            if block is not None and block["block_index"] >= start_block:
+                                yield block
+                            block = _block_dict(rec)
+                        else:
+                            block["entries"].append(_entry_dict(mv, end, rec))
+                    if block is not None and block["block_index"] >= start_block:
+                        yield block
+                finally:
+                    mv.release()
+
+    def _locate_block(self, block_index: int) -> Tuple[Optional[str], int]:
+        keys = sorted(self.block_index)
+        i = bisect_right(keys, block_index)
+        if i == 0:
+            return None, FILE_HEADER.size
+        return self.block_index[keys[i - 1]]
+
+    def get_block(self, block_index: int) -> Optional[Dict[str, Any]]:
+        for b in self.iter_blocks(block_index):
+            return b if b["block_index"] == block_index else None
+        return None
+
+    def find_tx(self, tx_reference: str) -> Optional[Tuple[str, int]]:
+        return self.tx_index.get(str(tx_reference))
+
+    def proof(self, tx_reference: str) -> Optional[Dict[str, Any]]:
+        """
+        Inclusion proof for one entry: its payload, the sibling entry hashes of
+        its block and the block header fields needed to recompute the block hash.
+        """
+        loc = self.find_tx(tx_reference)
+        if loc is None:
+            return None
+        seg, off = loc
+        with open(self.dir / seg, "rb") as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+            mv = memoryview(mm)
+            try:
+                rec = ENTRY.unpack_from(mv, off)
+                block_index = rec[1]
+            finally:
+                mv.release()
+        block = self.get_block(block_index)
+        entry = next(e for e in block["entries"] if e["tx_reference"] == str(tx_reference))
+        return {
+            "tx_reference": str(tx_reference),
+            "entry_index": entry["entry_index"],
+            "entry_payload": loads(entry["payload_bytes"]),
+            "entry_hash": entry["entry_hash"],
+            "hmac_chain": entry["hmac_chain"],
+            "entry_hashes": [e["entry_hash"] for e in block["entries"]],
+            "block": {k: block[k] for k in (
+                "block_index", "prev_block_hash", "merkle_root", "block_hash", "entries_count", "timestamp"
+            )},
+        }
+
+    # ------------------------------
+    # Verification
+    # ------------------------------
+    def verify(self, key: Optional[bytes] = None) -> List[str]:
+        """
+        Full-chain check over mmap: record CRCs, payload hashes, HMAC chain,
+        merkle roots, recomputed block hashes and block linkage.
+        """
+        key = key or entry_hmac_key()
+        problems: List[str] = []
+        prev_hash, prev_hmac, expected = GENESIS_HASH, GENESIS_HASH, 0
+        for seg in self.segments():
+            if seg.stat().st_size <= FILE_HEADER.size:
+                continue
+            with open(seg, "rb") as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+                mv = memoryview(mm)
+                try:
+                    block = None
+                    hashes: List[str] = []
+                    for kind, off, end, rec in _records(mv, FILE_HEADER.size, check_crc=True, problems=problems):
+                        if kind == KIND_BLOCK:
+                            if block is not None:
+                                _check_block(block, hashes, problems)
+                            block, hashes = rec, []
+                            bi, ts, count, prev, root, bhash = rec[1], rec[2], rec[3], rec[4].hex(), rec[5].hex(), rec[6].hex()
+                            if bi != expected:
+                                problems.append(f"gap: expected block {expected}, found {bi}")
+                            if prev != prev_hash:
+                                problems.append(f"block {bi}: prev_block_hash does not link")
+                            if sha256_hex(block_header_bytes(bi, prev, root, count, ts)) != bhash:
+                                problems.append(f"block {bi}: block hash mismatch")
+                            prev_hash, expected = bhash, bi + 1
+                        else:
+                            ehash = rec[5].hex()
+                            with mv[end - rec[4]:end] as payload:
+                                digest = hashlib.sha256(payload).hexdigest()
+                            if digest != ehash:
+                                problems.append(f"block {rec[1]} entry {rec[2]}: payload hash mismatch")
+                            prev_hmac = chain_hmac(key, ehash, prev_hmac)
+                            if prev_hmac != rec[6].hex():
+                                problems.append(f"block {rec[1]} entry {rec[2]}: hmac chain mismatch")
+                                prev_hmac = rec[6].hex()
+                            hashes.append(ehash)
+                    if block is not None:
+                        _check_block(block, hashes, problems)
+                finally:
+                    mv.release()
+        return problems
+
+
+def verify_proof(proof: Dict[str, Any]) -> bool:
+    """Check an inclusion proof without access to the ledger."""
+    from app.core.serialization import canonical_bytes
+
+    b = proof["block"]
+    return (
+        sha256_hex(canonical_bytes(proof["entry_payload"])) == proof["entry_hash"]
+        and proof["entry_hashes"][proof["entry_index"] - 1] == proof["entry_hash"]
+        and merkle_root_of(proof["entry_hashes"]) == b["merkle_root"]
+        and sha256_hex(block_header_bytes(
+            b["block_index"], b["prev_block_hash"], b["merkle_root"], b["entries_count"], b["timestamp"]
+        )) == b["block_hash"]
+    )
+
+
+# ------------------------------
+# Record helpers
+# ------------------------------
+def _records(mv: memoryview, start: int, check_crc: bool = False, problems: Optional[List[str]] = None):
+    """Yield (kind, offset, end, unpacked header) until the end or the first torn/unknown record."""
+    off, size = start, len(mv)
+    while off < size:
+        kind = mv[off]
+        if kind == KIND_BLOCK:
+            if off + BLOCK.size > size:
+                return
+            rec = BLOCK.unpack_from(mv, off)
+            end = off + BLOCK.size
+            if check_crc and _crc(mv[off:end - 4]) != rec[-1]:
+                problems.append(f"block record at {off}: crc mismatch")
+        elif kind == KIND_ENTRY:
+            if off + ENTRY.size > size:
+                return
+            rec = ENTRY.unpack_from(mv, off)
+            end = off + ENTRY.size + rec[3] + rec[4]
+            if end > size:
+                return
+            if check_crc and _crc(mv[off:off + ENTRY.size - 4], mv[off + ENTRY.size:end]) != rec[-1]:
+                problems.append(f"entry record at {off}: crc mismatch")
+        else:
+            if problems is not None:
+                problems.append(f"unknown record kind {kind} at {off}")
+            return
+        yield kind, off, end, rec
+        off = end
+
+
+def _block_dict(rec) -> Dict[str, Any]:
+    return {
+        "block_index": rec[1],
+        "timestamp": rec[2],
+        "entries_count": rec[3],
+        "prev_block_hash": rec[4].hex(),
+        "merkle_root": rec[5].hex(),
+        "block_hash": rec[6].hex(),
+        "entries": [],
+    }
+
+
+def _entry_dict(mv: memoryview, end: int, rec) -> Dict[str, Any]:
+    tx_len, payload_len = rec[3], rec[4]
+    return {
+        "entry_index": rec[2],
+        "tx_reference": bytes(mv[end - payload_len - tx_len:end - payload_len]).decode("utf-8"),
+        "payload_bytes": bytes(mv[end - payload_len:end]),
+        "entry_hash": rec[5].hex(),
+        "hmac_chain": rec[6].hex(),
+    }
+
+
+def _check_block(rec, hashes: List[str], problems: List[str]) -> None:
+    bi, count, root = rec[1], rec[3], rec[5].hex()
+    if len(hashes) != count:
+        problems.append(f"block {bi}: {len(hashes)} entries, header says {count}")
+    if merkle_root_of(hashes) != root:
+        problems.append(f"block {bi}: merkle root mismatch")
+
+
+# ------------------------------
+# Process-wide store
+# ------------------------------
+_store: Optional[SegmentStore] = None
+_store_lock = threading.Lock()
+
+
+def get_store() -> SegmentStore:
+    global _store
+    if _store is None:
+        with _store_lock:
+            if _store is None:
+                _store = SegmentStore(settings.ledger_dir, settings.ledger_segment_max_bytes, settings.ledger_fsync)
+    return _store
+
+
+def close_store() -> None:
+    global _store
+    if _store is not None:
+        _store.close()
+        _store = None
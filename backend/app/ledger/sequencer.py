@@ -0,0 +1,309 @@
+# backend/app/ledger/sequencer.py
+"""
+Single-writer ledger sequencer.
+
+With several uvicorn workers (or replicas on one host) every process used to
+read the chain head and seal its own block, so they raced on block_index.
+In sequencer mode (LEDGER_SEQUENCER_SOCKET set) one writer process owns the
+head and all sealing; API workers submit entries over a Unix socket and await
+a receipt.
+
+    python -m app.ledger.sequencer --socket /run/finfraud/ledger.sock
+    LEDGER_SEQUENCER_SOCKET=/run/finfraud/ledger.sock uvicorn app.main:app --workers 4
+
+Submissions that queue up while a block is being written are sealed together
+into the next block (group commit, capped at LEDGER_SEQUENCER_MAX_BATCH
+entries), so throughput scales with load instead of one block per request.
+Every sealed block is also broadcast to all connected workers, which feed it
+into their local change-feed hub (app/core/events.py).
+
+A submission marked "retry" (a backlog flush of ledger_pending rows, whose
+earlier submit may have been sealed after its receipt was lost) first drops
+entries already in the chain (pending.drop_sealed). The writer is the only
+one that can check that without a race.
+
+Wire format: 4-byte big-endian length + JSON document.
+    worker -> writer : {"id": n, "entries": [{tx_reference, payload}, ...], "retry": bool}
+    writer -> worker : {"id": n, "receipt": {block_index, block_hash, merkle_root, entry_indexes}}
+                       (block fields null when every entry was already sealed)
+                       {"id": n, "error": "..."}
+                       {"block": {...}, "payloads": [...]}            (broadcast)
+"""
+import argparse
+import asyncio
+import itertools
+import logging
+import os
+import struct
+from typing import Any, Dict, List, Optional, Set
+from app.core import events
+from app.core.config import settings
+from app.core.serialization import dumps_bytes, loads
+
+logger = logging.getLogger(__name__)
+
+FRAME = struct.Struct(">I")
+MAX_FRAME = 64 * 1024 * 1024
+# a worker that stops reading broadcasts is skipped rather than buffered for
+BROADCAST_HIGH_WATER = 8 * 1024 * 1024
+
+
+class SequencerError(RuntimeError):
+    pass
+
+
+async def _read_frame(reader: asyncio.StreamReader) -> Optional[Dict[str, Any]]:
+    try:
+        head = await reader.readexactly(FRAME.size)
+    except asyncio.IncompleteReadError:
+        return None
+    (size,) = FRAME.unpack(head)
+    if size > MAX_FRAME:
+        raise SequencerError(f"frame of {size} bytes exceeds limit")
+    return loads(await reader.readexactly(size))
+
+
+def _frame(doc: Dict[str, Any]) -> bytes:
+    body = dumps_bytes(doc)
+    return FRAME.pack(len(body)) + body
+
+
+# ------------------------------
+# Writer process
+# ------------------------------
+class _Pending:
+    __slots__ = ("id", "entries", "writer", "retry")
+
+    def __init__(self, id: int, entries: List[Dict[str, Any]], writer: asyncio.StreamWriter, retry: bool = False):
+        self.id = id
+        self.entries = entries
+        self.writer = writer
+        self.retry = retry
+
+
+class Sequencer:
+    def __init__(self, max_batch: int = 256):
+        self.max_batch = max_batch
+        self.queue: "asyncio.Queue[_Pending]" = asyncio.Queue()
+        self.clients: Set[asyncio.StreamWriter] = set()
+        self.head_index = -1
+        self.head_hash = ""
+        self.head_hmac = ""
+
+    async def load_head(self) -> None:
+        """Read the chain head from the configured backend (the writer is its only mutator)."""
+        if settings.ledger_backend in ("segments", "both"):
+            from app.ledger.segments import get_store
+            store = get_store()
+            self.head_index, self.head_hash, self.head_hmac = store.head_index, store.head_hash, store.head_hmac
+            return
+        from app.db.database import session_scope
+        from app.ledger.ledger import get_last_block, get_last_hmac
+        async with session_scope() as db:
+            self.head_index, self.head_hash = await get_last_block(db)
+            self.head_hmac = await get_last_hmac(db)
+
+    async def _seal(self, entries: List[Dict[str, Any]]) -> Dict[str, Any]:
+        from app.db.database import session_scope
+        from app.ledger.ledger import insert_sealed_block, seal_block
+
+        if settings.ledger_backend in ("segments", "both"):
+            from app.ledger.segments import get_store
+            sealed = await asyncio.to_thread(get_store().append_block, entries)
+            if settings.ledger_backend == "both":
+                try:
+                    async with session_scope() as db:
+                        await insert_sealed_block(db, sealed)
+                except Exception:
+                    # segment files own the chain; the mirror can be backfilled
+                    logger.exception("MySQL mirror of block %s failed", sealed["block_index"])
+        else:
+            sealed = seal_block(self.head_index + 1, self.head_hash, self.head_hmac, entries)
+            async with session_scope() as db:
+                await insert_sealed_block(db, sealed)
+        self.head_index, self.head_hash = sealed["block_index"], sealed["block_hash"]
+        if sealed["entries"]:
+            self.head_hmac = sealed["entries"][-1]["hmac_chain"]
+        return sealed
+
+    async def _drop_sealed(self, items: List[_Pending]) -> None:
+        from app.db.database import session_scope
+        from app.ledger import pending
+
+        async with session_scope() as db:
+            for item in items:
+                item.entries = await pending.drop_sealed(db, item.entries)
+
+    async def run(self) -> None:
+        while True:
+            batch = [await self.queue.get()]
+            n = len(batch[0].entries)
+            while n < self.max_batch and not self.queue.empty():
+                item = self.queue.get_nowait()
+                batch.append(item)
+                n += len(item.entries)
+            try:
+                retried = [item for item in batch if item.retry]
+                if retried:
+                    await self._drop_sealed(retried)
+                entries = [e for item in batch for e in item.entries]
+                sealed = await self._seal(entries) if entries else None
+            except Exception as exc:
+                logger.exception("sealing a block of %d entries failed", n)
+                for item in batch:
+                    self._send(item.writer, {"id": item.id, "error": f"{type(exc).__name__}: {exc}"})
+                await self.load_head()
+                continue
+            if sealed is None:
+                for item in batch:
+                    self._send(item.writer, {"id": item.id, "receipt": {
+                        "block_index": None, "block_hash": None, "merkle_root": None, "entry_indexes": [],
+                    }})
+                continue
+
+            meta = {k: sealed[k] for k in ("block_index", "block_hash", "merkle_root")}
+            first = 1
+            for item in batch:
+                idx = list(range(first, first + len(item.entries)))
+                first += len(item.entries)
+                self._send(item.writer, {"id": item.id, "receipt": {**meta, "entry_indexes": idx}})
+            notice = _frame({
+                "block": {**meta, "entries_count": sealed["entries_count"]},
+                "payloads": [e["payload"] for e in entries],
+            })
+            for w in list(self.clients):
+                if w.transport.get_write_buffer_size() < BROADCAST_HIGH_WATER:
+                    w.write(notice)
+
+    def _send(self, writer: asyncio.StreamWriter, doc: Dict[str, Any]) -> None:
+        if not writer.is_closing():
+            writer.write(_frame(doc))
+
+    async def handle(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+        self.clients.add(writer)
+        try:
+            while True:
+                msg = await _read_frame(reader)
+                if msg is None:
+                    break
+                await self.queue.put(_Pending(msg["id"], msg["entries"], writer, msg.get("retry", False)))
+        except (ConnectionError, SequencerError) as exc:
+            logger.info("sequencer client dropped: %s", exc)
+        finally:
+            self.clients.discard(writer)
+            writer.close()
+
+
+async def serve(path: str, max_batch: int) -> None:
+    if os.path.exists(path):
+        try:
+            _, w = await asyncio.open_unix_connection(path)
+            w.close()
+            raise SystemExit(f"another sequencer is already listening on {path}")
+        except (ConnectionRefusedError, FileNotFoundError):
+            os.unlink(path)  # stale socket from a previous run
+
+    seq = Sequencer(max_batch)
+    await seq.load_head()
+    server = await asyncio.start_unix_server(seq.handle, path=path)
+    logger.info("ledger sequencer on %s, head block %s (%s backend)", path, seq.head_index, settings.ledger_backend)
+    try:
+        async with server:
+            await asyncio.gather(server.serve_forever(), seq.run())
+    finally:
+        if settings.ledger_backend != "mysql":
+            from app.ledger.segments import close_store
+            close_store()
+        from app.db.database import engine
+        await engine.dispose()
+
+
+# ------------------------------
+# Worker-side client
+# ------------------------------
+class SequencerClient:
+    def __init__(self, path: str, timeout: float = 10.0):
+        self.path = path
+        self.timeout = timeout
+        self._ids = itertools.count(1)
+        self._pending: Dict[int, asyncio.Future] = {}
+        self._writer: Optional[asyncio.StreamWriter] = None
+        self._reader_task: Optional[asyncio.Task] = None
+        self._lock = asyncio.Lock()
+
+    async def _connect(self) -> asyncio.StreamWriter:
+        async with self._lock:
+            if self._writer is None or self._writer.is_closing():
+                reader, self._writer = await asyncio.open_unix_connection(self.path)
+                self._reader_task = asyncio.create_task(self._read_loop(reader))
+            return self._writer
+
+    async def _read_loop(self, reader: asyncio.StreamReader) -> None:
+        try:
+            while True:
+                msg = await _read_frame(reader)
+                if msg is None:
+                    break
+                if "block" in msg:
+                    events.publish_block(msg["block"], msg["payloads"])
+                    continue
+                fut = self._pending.pop(msg["id"], None)
+                if fut is None or fut.done():
+                    continue
+                if "error" in msg:
+                    fut.set_exception(SequencerError(msg["error"]))
+                else:
+                    fut.set_result(msg["receipt"])
+        except Exception:
+            logger.exception("ledger sequencer connection failed")
+        finally:
+            if self._writer is not None:
+                self._writer.close()
+            self._writer = None
+            pending, self._pending = self._pending, {}
+            for fut in pending.values():
+                if not fut.done():
+                    fut.set_exception(SequencerError("connection to ledger sequencer lost"))
+
+    async def submit(self, entries: List[Dict[str, Any]], retry: bool = False) -> Dict[str, Any]:
+        """Send entries to the writer; returns the receipt once their block is durable."""
+        writer = await self._connect()
+        rid = next(self._ids)
+        fut = asyncio.get_running_loop().create_future()
+        self._pending[rid] = fut
+        writer.write(_frame({"id": rid, "entries": entries, "retry": retry}))
+        await writer.drain()
+        try:
+            return await asyncio.wait_for(fut, self.timeout)
+        finally:
+            self._pending.pop(rid, None)
+
+
+_client: Optional[SequencerClient] = None
+
+
+def get_client() -> SequencerClient:
+    global _client
+    if _client is None:
+        _client = SequencerClient(settings.ledger_sequencer_socket, settings.ledger_sequencer_timeout)
+    return _client
+
+
+# ------------------------------
+# CLI
+# ------------------------------
+def main():
+    parser = argparse.ArgumentParser(description="Run the single-writer ledger sequencer")
+    parser.add_argument("--socket", default=settings.ledger_sequencer_socket or "ledger.sock")
+    parser.add_argument("--max-batch", type=int, default=settings.ledger_sequencer_max_batch)
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO)
+    try:
+        asyncio.run(serve(args.socket, args.max_batch))
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
@@ -1,25 +1,110 @@
+from app.core import startup  # first: starts the startup clock
+import asyncio
+import importlib
+import sys
 from fastapi import FastAPI
 from contextlib import asynccontextmanager
+from app.core.config import settings
 from app.db.database import engine
 from app.db.init_schema import init_schema
+from app.db import sharding, slim
+from app.db.partitioning import maintenance_loop
+from app.ml import feedback
+from app.core import admission
+from app.core.serialization import FastJSONResponse
+from app.core.timing import StageTimingMiddleware
 from app.routers.health import router as health_router
 from app.routers.chain import router as chain_router
+from app.routers.metrics import router as metrics_router
+from app.routers.stream import router as stream_router
+from app.routers.monitoring import router as monitoring_router
+from app.routers.ingest import router as ingest_router
+from app.routers.graph import router as graph_router
 from app.routers import fraud  # 👈 import the fraud router
 from app.routers import auth as auth_router
+from app.routers import admin as admin_router
 from starlette.middleware.cors import CORSMiddleware
 
+startup.mark("import_app", startup.since_import())
+
+async def _load_entity_lists():
+    # imports numpy: keep it off the event loop, like the model warm-up
+    entity_lists = await asyncio.to_thread(importlib.import_module, "app.ml.entity_lists")
+    with startup.phase("entity_lists"):
+        await entity_lists.reload(engine)
+    if settings.entity_lists_reload_seconds > 0:
+        await entity_lists.reload_loop(engine, settings.entity_lists_reload_seconds)
+
+
+async def _build_similarity_index():
+    # needs the RF feature names: wait for the model warm-up instead of importing here
+    await startup.ensure_warm()
+    similarity = await asyncio.to_thread(importlib.import_module, "app.ml.similarity")
+    with startup.phase("similar_index"):
+        await similarity.build(sharding.engines())
+    await similarity.refresh_loop(sharding.engines(), settings.similar_refresh_seconds)
+
+
+async def _rebuild_graph():
+    from app.ml import graph
+    with startup.phase("graph_rebuild"):
+        await graph.rebuild(sharding.engines())
+
+
+async def _watch_models():
+    # swaps models that are already loaded: waits for the warm-up (or first request) instead of importing
+    while "app.ml.predictor" not in sys.modules:
+        await asyncio.sleep(settings.model_reload_seconds)
+    await sys.modules["app.ml.predictor"].model_reload_loop(settings.model_reload_seconds)
+
+
 @asynccontextmanager
 async def lifespan(app: FastAPI):
-    # On startup: initialize schema (idempotent)
-    await init_schema(engine)
+    # On startup: initialize schema (a single version check when already current)
+    with startup.phase("schema"):
+        applied = False
+        for shard_engine in [engine] + [e for e in sharding.engines() if e is not engine]:
+            if await init_schema(shard_engine):
+                # a new schema.sql: tables from before the slim columns get them (readers select them)
+                await slim.ensure_columns(shard_engine)
+                applied = True
+        if sharding.is_sharded():
+            await sharding.ensure_id_ranges()
+    startup.info["schema"] = "applied" if applied else "current"
+    tasks = []
+    if settings.warm_up_models:
+        tasks.append(startup.start_warm_up())
+    if settings.entity_lists:
+        tasks.append(asyncio.create_task(_load_entity_lists()))
+    if settings.similar_index:
+        tasks.append(asyncio.create_task(_build_similarity_index()))
+    if settings.graph_agent and settings.graph_rebuild_on_startup:
+        tasks.append(asyncio.create_task(_rebuild_graph()))
+    if settings.partition_maintenance and engine.dialect.name == "mysql":
+        tasks.append(asyncio.create_task(maintenance_loop(engine)))
+    if settings.model_reload_seconds > 0:
+        tasks.append(asyncio.create_task(_watch_models()))
+    tasks.append(asyncio.create_task(feedback.flush_loop(settings.feedback_flush_seconds)))
+    tasks.append(asyncio.create_task(admission.backlog_loop(settings.admission_ledger_flush_ms / 1000.0)))
+    if settings.feedback_update_seconds > 0:
+        tasks.append(asyncio.create_task(feedback.update_loop(settings.feedback_update_seconds)))
+    startup.ready()
     yield
-    # On shutdown: nothing special
+    # On shutdown: stop background maintenance
+    for t in tasks:
+        t.cancel()
+    await asyncio.to_thread(feedback.buffer.flush)
+    await admission.ledger_backlog.drain()  # deferred ledger entries of committed decisions
+    if settings.ledger_backend != "mysql":
+        from app.ledger.segments import close_store
+        close_store()
 
 app = FastAPI(
     title="FinFraud API",
     version="1.0.0",
     description="Fraud detection backend with verifiable audit ledger",
     lifespan=lifespan,
+    default_response_class=FastJSONResponse,
 )
 
 # Allow dev frontend origin
@@ -29,10 +114,18 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["Server-Timing"],
 )
+app.add_middleware(StageTimingMiddleware)
 
 # Include routers
 app.include_router(health_router)
 app.include_router(chain_router)
+app.include_router(metrics_router)
+app.include_router(stream_router)
+app.include_router(monitoring_router)
 app.include_router(fraud.router)  # 👈 register fraud endpoints
-app.include_router(auth_router.router)  # register auth router
\ No newline at end of file
+app.include_router(ingest_router)
+app.include_router(graph_router)
+app.include_router(auth_router.router)  # register auth router
+app.include_router(admin_router.router)
\ No newline at end of file
@@ -0,0 +1,420 @@
+# backend/app/ml/backtest.py
+"""
+Historical backtest / replay of predict_models() decisions.
+
+Streams past transactions in chunks and re-scores them through the
+RF / XGB agents:
+- from the database: transactions.payload with the stored
+  fraudresults.verdict, in id order across every shard
+- or from Parquet exports: a `payload` JSON column or flat TxnIn
+  columns, plus optional id / verdict / status columns
+
+Chunks are scored across a process pool. Each worker loads the
+candidate model files once and scores a whole chunk per call.
+
+Score vectors are cached under app/ml/.cache/backtest-<source>-<models>/
+as one .npz per chunk: rf and xgb probabilities plus the rule inputs
+(amount, device_risk_score) and the stored verdict / status. A rerun
+resumes after the last cached chunk. Sweeping the verdict threshold,
+the rule thresholds or the consensus vote count is numpy over the
+cache and never runs a model again.
+
+For each candidate configuration the report has:
+- flipped verdicts against the baseline (the stored decisions, or the
+  current constants in predictor.py with --baseline current)
+- fraud rate and its delta
+- per-agent fraud rate and agreement with the candidate consensus and
+  with the baseline
+- precision / recall against transactions.status where it is set
+
+Only the rf / xgb / rules vote is replayed. The fast tier, entity lists
+and fraud-ring graph depend on live state, so stored decisions made by
+them can show up as flips even for the current configuration.
+
+    python backend/app/ml/backtest.py --limit 200000 --workers 4
+    python backend/app/ml/backtest.py --sweep threshold=0.3:0.7:0.1 --sweep high_amount=30000,50000,80000
+    python backend/app/ml/backtest.py --parquet exports/2025-*.parquet --rf candidate_rf.joblib
+"""
+import argparse
+import asyncio
+import glob
+import hashlib
+import itertools
+import json
+import os
+import pathlib
+import sys
+import time
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from typing import Any, AsyncIterator, Dict, Iterable, Iterator, List, Optional
+
+import numpy as np
+
+ML_DIR = pathlib.Path(__file__).resolve().parent
+sys.path.insert(0, str(ML_DIR.parents[1]))
+
+CACHE_DIR = ML_DIR / ".cache"
+CHUNK_ROWS = 20000
+CONFIG_KEYS = ("threshold", "high_amount", "high_device_risk", "min_votes")
+AGENTS = ("rf", "xgb", "rules")
+_LABELS = {"fraud": 1, "legit": 0}
+
+
+def current_config() -> Dict[str, float]:
+    from app.ml import predictor
+    return {
+        "threshold": predictor.VERDICT_THRESHOLD,
+        "high_amount": predictor.HIGH_AMOUNT,
+        "high_device_risk": predictor.HIGH_DEVICE_RISK,
+        "min_votes": predictor.MIN_FRAUD_VOTES,
+    }
+
+
+def _file_key(paths: Iterable[pathlib.Path]) -> str:
+    parts = []
+    for p in paths:
+        st = p.stat()
+        parts.append(f"{p.resolve()}:{st.st_size}:{int(st.st_mtime)}")
+    return hashlib.sha1("|".join(parts).encode()).hexdigest()[:12]
+
+
+# ------------------------------
+# Sources: chunks of {ids, payloads, verdicts, statuses}
+# ------------------------------
+def _chunk(ids: List[int], payloads: List[Dict], verdicts: List[Any], statuses: List[Any]) -> Dict[str, Any]:
+    return {
+        "ids": np.asarray(ids, dtype=np.int64),
+        "payloads": payloads,
+        "verdict": np.asarray([_LABELS.get(v, -1) for v in verdicts], dtype=np.int8),
+        "status": np.asarray([_LABELS.get(s, -1) for s in statuses], dtype=np.int8),
+    }
+
+
+async def db_chunks(after: int, limit: Optional[int]) -> AsyncIterator[Dict[str, Any]]:
+    from sqlalchemy import text
+    from app.core.serialization import loads
+    from app.db import sharding, slim
+
+    sql = (
+        "SELECT t.id, t.payload, f.verdict, t.status, t.amount, t.location, t.device_risk_score, t.payload_z "
+        "FROM transactions t "
+        "LEFT JOIN fraudresults f ON f.transaction_id = t.id WHERE t.id > :after ORDER BY t.id"
+    )
+    remaining = limit or None
+    try:
+        # shard ID ranges ascend with the shard index, so this is global id order (and `after` resumes it)
+        for shard in sharding.shards:
+            if remaining is not None and remaining <= 0:
+                break
+            async with shard.engine.connect() as conn:
+                result = await conn.stream(
+                    text(sql + (f" LIMIT {int(remaining)}" if remaining else "")), {"after": after}
+                )
+                async for rows in result.partitions(CHUNK_ROWS):
+                    payloads = []
+                    for r in rows:
+                        if r[1] is None and r[7] is None:  # slim row: the columns are the payload
+                            payload = {"device_risk_score": r[6]}
+                        elif r[1] is None:
+                            payload = {"device_risk_score": r[6], **slim.unpack(r[7])}
+                        else:
+                            payload = (loads(r[1]) if isinstance(r[1], (str, bytes)) else r[1]) or {}
+                        # the table columns stand in for fields missing from the stored payload
+                        payload.setdefault("amount", float(r[4]))
+                        payload.setdefault("location", r[5])
+                        payloads.append(payload)
+                    if remaining is not None:
+                        remaining -= len(rows)
+                    yield _chunk([r[0] for r in rows], payloads, [r[2] for r in rows], [r[3] for r in rows])
+    finally:
+        for shard_engine in sharding.engines():
+            await shard_engine.dispose()
+
+
+def parquet_chunks(paths: List[pathlib.Path], skip: int) -> Iterator[Dict[str, Any]]:
+    """Chunks in file order; the first `skip` (already cached) are read past without decoding."""
+    import pyarrow.parquet as pq
+
+    n, offset = 0, 0
+    for path in paths:
+        for batch in pq.ParquetFile(path).iter_batches(batch_size=CHUNK_ROWS):
+            cols = batch.to_pydict()
+            size = batch.num_rows
+            ids = cols.get("id") or cols.get("transaction_id") or list(range(offset, offset + size))
+            offset += size
+            n += 1
+            if n <= skip:
+                continue
+            if "payload" in cols:
+                payloads = [json.loads(p) if isinstance(p, (str, bytes)) else p for p in cols["payload"]]
+            else:
+                payloads = [dict(zip(cols, values)) for values in zip(*cols.values())]
+            yield _chunk(ids, payloads, cols.get("verdict", [None] * size), cols.get("status", [None] * size))
+
+
+# ------------------------------
+# Scoring (process-pool workers)
+# ------------------------------
+_worker_models: Dict[str, Any] = {}
+
+
+def _init_worker(rf_path: str, xgb_path: str) -> None:
+    import joblib
+    from app.ml.predictor import get_feature_names
+
+    for name, path in (("rf", rf_path), ("xgb", xgb_path)):
+        model = joblib.load(path)
+        _worker_models[name] = (model, get_feature_names(model))
+
+
+def score_chunk(payloads: List[Dict]) -> Dict[str, np.ndarray]:
+    """RF / XGB fraud probabilities plus the rule inputs for one chunk (same encoding as preprocess_row)."""
+    from app.ml.predictor import encode_rows
+
+    encoded = encode_rows(payloads)
+    out = {
+        "amount": encoded["amount"].to_numpy(dtype=np.float64),
+        "device_risk_score": encoded["device_risk_score"].to_numpy(dtype=np.float64),
+    }
+    for name, (model, features) in _worker_models.items():
+        X = encoded.reindex(columns=features, fill_value=0)
+        proba = model.predict_proba(X)[:, 1] if hasattr(model, "predict_proba") else model.predict(X)
+        out[name] = np.asarray(proba, dtype=np.float32)
+    return out
+
+
+# ------------------------------
+# Score cache (one .npz per chunk)
+# ------------------------------
+class ScoreCache:
+    def __init__(self, directory: pathlib.Path):
+        self.dir = directory
+        self.dir.mkdir(parents=True, exist_ok=True)
+        self.manifest_path = self.dir / "manifest.json"
+        self.manifest = (
+            json.loads(self.manifest_path.read_text(encoding="utf-8"))
+            if self.manifest_path.exists() else {"parts": 0, "rows": 0, "last_id": 0, "complete": False}
+        )
+
+    def write(self, chunk: Dict[str, Any], scores: Dict[str, np.ndarray]) -> None:
+        part = self.manifest["parts"]
+        tmp = self.dir / f"part-{part:05d}.tmp.npz"
+        np.savez(tmp, ids=chunk["ids"], verdict=chunk["verdict"], status=chunk["status"], **scores)
+        os.replace(tmp, self.dir / f"part-{part:05d}.npz")
+        self.manifest.update(
+            parts=part + 1,
+            rows=self.manifest["rows"] + len(chunk["ids"]),
+            last_id=int(chunk["ids"][-1]) if len(chunk["ids"]) else self.manifest["last_id"],
+        )
+        self._save()
+
+    def finish(self) -> None:
+        self.manifest["complete"] = True
+        self._save()
+
+    def _save(self) -> None:
+        tmp = self.manifest_path.with_suffix(".tmp")
+        tmp.write_text(json.dumps(self.manifest), encoding="utf-8")
+        os.replace(tmp, self.manifest_path)
+
+    def load(self) -> Dict[str, np.ndarray]:
+        parts = []
+        for i in range(self.manifest["parts"]):
+            with np.load(self.dir / f"part-{i:05d}.npz") as z:
+                parts.append({k: z[k] for k in z.files})
+        if not parts:
+            return {}
+        return {k: np.concatenate([p[k] for p in parts]) for k in parts[0]}
+
+
+async def _as_async(it: Iterable) -> AsyncIterator:
+    for item in it:
+        yield item
+
+
+async def fill_cache(cache: ScoreCache, chunks: AsyncIterator[Dict[str, Any]], rf_path: str, xgb_path: str, workers: int) -> None:
+    """Score chunks across the pool, writing parts in source order (at most 2 chunks in flight per worker)."""
+    loop = asyncio.get_running_loop()
+    t0, done = time.perf_counter(), 0
+    with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker, initargs=(rf_path, xgb_path)) as pool:
+        pending: deque = deque()
+
+        async def drain_one():
+            nonlocal done
+            chunk, fut = pending.popleft()
+            cache.write(chunk, await fut)
+            done += len(chunk["ids"])
+            print(f"   {cache.manifest['rows']} rows cached ({done / (time.perf_counter() - t0):.0f} rows/s)")
+
+        async for chunk in chunks:
+            if not len(chunk["ids"]):
+                continue
+            pending.append((chunk, loop.run_in_executor(pool, score_chunk, chunk["payloads"])))
+            while len(pending) >= 2 * workers:
+                await drain_one()
+        while pending:
+            await drain_one()
+    cache.finish()
+
+
+# ------------------------------
+# Replay + diff report (numpy over the cache)
+# ------------------------------
+def decide(scores: Dict[str, np.ndarray], cfg: Dict[str, float]) -> Dict[str, np.ndarray]:
+    """Per-agent and consensus fraud verdicts, mirroring predict_models()."""
+    votes = {
+        "rf": scores["rf"] >= cfg["threshold"],
+        "xgb": scores["xgb"] >= cfg["threshold"],
+        "rules": (scores["amount"] > cfg["high_amount"]) | (scores["device_risk_score"] > cfg["high_device_risk"]),
+    }
+    votes["consensus"] = sum(v.astype(np.int8) for v in votes.values()) >= cfg["min_votes"]
+    return votes
+
+
+def diff_report(scores: Dict[str, np.ndarray], cfg: Dict[str, float], baseline: np.ndarray, sample: int = 20) -> Dict[str, Any]:
+    votes = decide(scores, cfg)
+    cand = votes["consensus"]
+    n = len(cand)
+    to_fraud = cand & ~baseline
+    to_legit = ~cand & baseline
+    report = {
+        "config": cfg,
+        "rows": n,
+        "baseline_fraud_rate": float(baseline.mean()) if n else 0.0,
+        "fraud_rate": float(cand.mean()) if n else 0.0,
+        "flipped_to_fraud": int(to_fraud.sum()),
+        "flipped_to_legit": int(to_legit.sum()),
+        "flipped_sample": {
+            "to_fraud": scores["ids"][to_fraud][:sample].tolist(),
+            "to_legit": scores["ids"][to_legit][:sample].tolist(),
+        },
+        "agents": {
+            name: {
+                "fraud_rate": float(votes[name].mean()) if n else 0.0,
+                "agrees_with_consensus": float((votes[name] == cand).mean()) if n else 0.0,
+                "agrees_with_baseline": float((votes[name] == baseline).mean()) if n else 0.0,
+            }
+            for name in AGENTS
+        },
+    }
+    report["fraud_rate_delta"] = report["fraud_rate"] - report["baseline_fraud_rate"]
+    labelled = scores["status"] >= 0
+    if labelled.any():
+        y, p = scores["status"][labelled] == 1, cand[labelled]
+        tp = int((y & p).sum())
+        report["vs_status"] = {
+            "labelled": int(labelled.sum()),
+            "precision": tp / int(p.sum()) if p.any() else None,
+            "recall": tp / int(y.sum()) if y.any() else None,
+        }
+    return report
+
+
+def parse_sweep(specs: List[str]) -> Dict[str, List[float]]:
+    """threshold=0.3:0.7:0.1 (inclusive range) or high_amount=30000,50000."""
+    grid = {}
+    for spec in specs:
+        key, _, values = spec.partition("=")
+        if key not in CONFIG_KEYS:
+            raise SystemExit(f"❌ unknown sweep key {key!r}; use one of {', '.join(CONFIG_KEYS)}")
+        if ":" in values:
+            start, stop, step = (float(v) for v in values.split(":"))
+            grid[key] = [round(v, 10) for v in np.arange(start, stop + step / 2, step)]
+        else:
+            grid[key] = [float(v) for v in values.split(",")]
+    return grid
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--parquet", nargs="*", default=None, help="Parquet exports (globs) instead of the database")
+    parser.add_argument("--after-id", type=int, default=0, help="database: start after this transaction id")
+    parser.add_argument("--limit", type=int, default=None, help="database: at most this many transactions")
+    parser.add_argument("--rf", default=None, help="candidate RF model file (default: the production one)")
+    parser.add_argument("--xgb", default=None, help="candidate XGB model file (default: the production one)")
+    parser.add_argument("--threshold", type=float, default=None)
+    parser.add_argument("--high-amount", type=float, default=None)
+    parser.add_argument("--high-device-risk", type=float, default=None)
+    parser.add_argument("--min-votes", type=int, default=None)
+    parser.add_argument("--sweep", action="append", default=[], help="key=start:stop:step or key=v1,v2 (repeatable)")
+    parser.add_argument("--baseline", choices=["stored", "current"], default="stored",
+                        help="compare with the stored verdicts (falls back to current where missing) or the current constants")
+    parser.add_argument("--workers", type=int, default=max(1, (os.cpu_count() or 2) - 1))
+    parser.add_argument("--refresh", action="store_true", help="drop the cached scores for this source")
+    parser.add_argument("--out", default=None, help="write the full report JSON here")
+    args = parser.parse_args()
+
+    from app.ml import predictor
+
+    rf_path = pathlib.Path(args.rf or predictor.RF_PATH)
+    xgb_path = pathlib.Path(args.xgb or predictor.XGB_PATH)
+    models_key = _file_key([rf_path, xgb_path])
+    if args.parquet:
+        paths = sorted(pathlib.Path(p) for pattern in args.parquet for p in glob.glob(pattern))
+        if not paths:
+            raise SystemExit("❌ no Parquet files matched")
+        source_key = "pq-" + _file_key(paths)
+    else:
+        from app.core.config import settings
+        urls = settings.shard_urls or [settings.sqlalchemy_url]
+        url = ",".join(u.split("@")[-1] for u in urls)  # host/db per shard, no credentials
+        source_key = "db-" + hashlib.sha1(f"{url}:{args.after_id}:{args.limit}".encode()).hexdigest()[:12]
+
+    cache_dir = CACHE_DIR / f"backtest-{source_key}-{models_key}"
+    if args.refresh and cache_dir.exists():
+        for f in cache_dir.iterdir():
+            f.unlink()
+    cache = ScoreCache(cache_dir)
+    print(f"📂 score cache: {cache_dir} ({cache.manifest['rows']} rows{', complete' if cache.manifest['complete'] else ''})")
+
+    if not cache.manifest["complete"]:
+        if args.parquet:
+            chunks = _as_async(parquet_chunks(paths, skip=cache.manifest["parts"]))
+        else:
+            after = max(args.after_id, cache.manifest["last_id"])
+            remaining = args.limit - cache.manifest["rows"] if args.limit else None
+            chunks = db_chunks(after, remaining)
+        asyncio.run(fill_cache(cache, chunks, str(rf_path), str(xgb_path), args.workers))
+
+    scores = cache.load()
+    if not scores:
+        raise SystemExit("❌ no transactions to replay")
+    base_cfg = current_config()
+    current = decide(scores, base_cfg)["consensus"]
+    if args.baseline == "stored":
+        known = scores["verdict"] >= 0
+        baseline = np.where(known, scores["verdict"] == 1, current)
+        print(f"📏 baseline: stored verdicts ({int(known.sum())} of {len(known)} rows; current constants for the rest)")
+    else:
+        baseline = current
+        print(f"📏 baseline: current constants {base_cfg}")
+
+    cand = dict(base_cfg)
+    for key in CONFIG_KEYS:
+        value = getattr(args, key)
+        if value is not None:
+            cand[key] = value
+    grid = parse_sweep(args.sweep)
+    configs = [dict(cand, **dict(zip(grid, combo))) for combo in itertools.product(*grid.values())] if grid else [cand]
+
+    t0 = time.perf_counter()
+    reports = [diff_report(scores, cfg, baseline) for cfg in configs]
+    elapsed = time.perf_counter() - t0
+    print(f"\n🔁 {len(configs)} configuration(s) over {len(baseline)} rows in {elapsed * 1000:.0f} ms (cached scores)")
+    print(f"   {'threshold':>9} {'amount':>9} {'risk':>6} {'votes':>5} {'fraud%':>8} {'delta':>8} {'->fraud':>8} {'->legit':>8}"
+          f"  agree rf/xgb/rules")
+    for r in reports:
+        c, a = r["config"], r["agents"]
+        print(f"   {c['threshold']:>9.3f} {c['high_amount']:>9.0f} {c['high_device_risk']:>6.2f} {int(c['min_votes']):>5d} "
+              f"{r['fraud_rate'] * 100:>7.2f}% {r['fraud_rate_delta'] * 100:>+7.2f}% {r['flipped_to_fraud']:>8d} "
+              f"{r['flipped_to_legit']:>8d}  "
+              + "/".join(f"{a[name]['agrees_with_consensus']:.3f}" for name in AGENTS))
+    if args.out:
+        pathlib.Path(args.out).write_text(json.dumps({"source": source_key, "models": models_key, "reports": reports},
+                                                     indent=2), encoding="utf-8")
+        print(f"\n💾 Report saved to {args.out}")
+
+
+if __name__ == "__main__":
+    main()
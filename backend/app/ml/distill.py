@@ -0,0 +1,179 @@
+# backend/app/ml/distill.py
+"""
+Fast latency-tier agent distilled from the RF + XGB + rules consensus.
+
+The student is a logistic regression over binned raw features:
+- amount and device_risk_score are cut at training quantiles (float32 edges)
+- location is one-hot, with a shared weight for unseen values
+
+It is fitted to the full ensemble's consensus verdict, not to the
+original labels. Scoring one transaction is then two bisects, a dict
+lookup and a sigmoid, with no pandas frame and no tree traversal. The
+per-feature weights double as exact reason codes.
+
+predictor.py routes low-amount, low-device-risk traffic to it when
+FAST_TIER is on (see FAST_TIER_MAX_AMOUNT / FAST_TIER_MAX_DEVICE_RISK).
+train_models.py fits and saves it after the main models and prints the
+accuracy / latency comparison from report().
+"""
+import math
+import pathlib
+import time
+from bisect import bisect_right
+from typing import Any, Dict, List, Tuple
+
+import numpy as np
+import pandas as pd
+
+BASE_DIR = pathlib.Path(__file__).resolve().parent
+FAST_PATH = BASE_DIR / "fast_model.joblib"
+NUMERIC = ["amount", "device_risk_score"]
+GROUPS = NUMERIC + ["location"]
+
+
+class FastModel:
+    """Binned logistic regression; weights and edges stored as float32."""
+
+    def __init__(self, edges: Dict[str, np.ndarray], weights: Dict[str, np.ndarray],
+                 locations: Dict[str, float], bias: float, threshold: float = 0.5):
+        self.edges = {k: np.asarray(v, dtype=np.float32) for k, v in edges.items()}
+        self.weights = {k: np.asarray(v, dtype=np.float32) for k, v in weights.items()}
+        self.locations = {k: float(np.float32(v)) for k, v in locations.items()}
+        self.bias = float(np.float32(bias))
+        self.threshold = threshold
+        self._lists()
+
+    def _lists(self) -> None:
+        # plain Python lists: bisect on a list beats numpy for a single value
+        self._edges = {k: v.tolist() for k, v in self.edges.items()}
+        self._weights = {k: v.tolist() for k, v in self.weights.items()}
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self._lists()
+
+    def __getstate__(self):
+        return {k: v for k, v in self.__dict__.items() if k not in ("_edges", "_weights")}
+
+    def score_row(self, row: Dict[str, Any]) -> Tuple[float, List[float]]:
+        """(fraud probability, log-odds contribution per GROUPS entry) for one payload."""
+        contribs = []
+        for name in NUMERIC:
+            v = row.get(name)
+            contribs.append(self._weights[name][bisect_right(self._edges[name], float(v or 0.0))])
+        contribs.append(self.locations.get(str(row.get("location")), 0.0))
+        margin = self.bias + sum(contribs)
+        return 1.0 / (1.0 + math.exp(-margin)), contribs
+
+    def score_frame(self, raw: pd.DataFrame) -> np.ndarray:
+        margin = np.full(len(raw), self.bias)
+        for name in NUMERIC:
+            x = raw[name].fillna(0.0).to_numpy(dtype=np.float64)
+            margin += self.weights[name][np.searchsorted(self.edges[name], x, side="right")]
+        margin += raw["location"].astype(str).map(self.locations).fillna(0.0).to_numpy()
+        return 1.0 / (1.0 + np.exp(-margin))
+
+
+# ------------------------------
+# Training
+# ------------------------------
+def _rules(raw: pd.DataFrame) -> np.ndarray:
+    from app.ml.predictor import HIGH_AMOUNT, HIGH_DEVICE_RISK
+
+    amount = raw["amount"].fillna(0.0).to_numpy()
+    risk = raw["device_risk_score"].fillna(0.0).to_numpy()
+    return ((amount > HIGH_AMOUNT) | (risk > HIGH_DEVICE_RISK)).astype(int)
+
+
+def teacher_verdicts(raw: pd.DataFrame, rf_scores, xgb_scores) -> np.ndarray:
+    """The ensemble's consensus verdict (1 = fraud) exactly as predict_models() votes."""
+    from app.ml.predictor import MIN_FRAUD_VOTES, VERDICT_THRESHOLD
+
+    votes = (
+        (np.asarray(rf_scores) >= VERDICT_THRESHOLD).astype(int)
+        + (np.asarray(xgb_scores) >= VERDICT_THRESHOLD)
+        + _rules(raw)
+    )
+    return (votes >= MIN_FRAUD_VOTES).astype(int)
+
+
+def _design(raw: pd.DataFrame, edges: Dict[str, np.ndarray], locations: List[str]) -> np.ndarray:
+    blocks = []
+    for name in NUMERIC:
+        idx = np.searchsorted(edges[name], raw[name].fillna(0.0).to_numpy(dtype=np.float64), side="right")
+        block = np.zeros((len(raw), len(edges[name]) + 1))
+        block[np.arange(len(raw)), idx] = 1.0
+        blocks.append(block)
+    loc = raw["location"].astype(str).to_numpy()
+    blocks.append(np.column_stack([loc == c for c in locations]).astype(float))
+    return np.hstack(blocks)
+
+
+def distill(raw: pd.DataFrame, teacher: np.ndarray, bins: int = 16, C: float = 1.0) -> FastModel:
+    """Fit the student on raw rows (amount / device_risk_score / location) against teacher verdicts."""
+    from sklearn.linear_model import LogisticRegression
+
+    edges = {}
+    for name in NUMERIC:
+        x = raw[name].fillna(0.0).to_numpy(dtype=np.float64)
+        edges[name] = np.unique(np.quantile(x, np.linspace(0, 1, bins + 1)[1:-1]).astype(np.float32))
+    locations = sorted(raw["location"].astype(str).unique())
+    clf = LogisticRegression(C=C, max_iter=1000)
+    clf.fit(_design(raw, edges, locations), teacher)
+
+    coef = clf.coef_[0]
+    weights, start = {}, 0
+    for name in NUMERIC:
+        n = len(edges[name]) + 1
+        weights[name] = coef[start:start + n]
+        start += n
+    return FastModel(edges, weights, dict(zip(locations, coef[start:])), float(clf.intercept_[0]))
+
+
+# ------------------------------
+# Accuracy / latency report
+# ------------------------------
+def report(fast: FastModel, raw: pd.DataFrame, y_true, rf, xgb, X: pd.DataFrame, n_latency: int = 500) -> Dict[str, Any]:
+    """Compare the fast tier with the full ensemble on held-out rows: quality vs the labels and per-row latency."""
+    from sklearn.metrics import average_precision_score, precision_score, recall_score
+    from app.core.config import settings
+    from app.ml.predictor import predict_models
+
+    y_true = np.asarray(y_true)
+    rf_p, xgb_p = rf.predict_proba(X)[:, 1], xgb.predict_proba(X)[:, 1]
+    ensemble = teacher_verdicts(raw, rf_p, xgb_p)
+    ensemble_score = (rf_p + xgb_p + _rules(raw)) / 3
+    fast_p = fast.score_frame(raw)
+    fast_v = (fast_p >= fast.threshold).astype(int)
+
+    def quality(verdict, score):
+        return {
+            "pr_auc": float(average_precision_score(y_true, score)),
+            "precision": float(precision_score(y_true, verdict, zero_division=0)),
+            "recall": float(recall_score(y_true, verdict, zero_division=0)),
+        }
+
+    rows = raw.head(n_latency).to_dict(orient="records")
+
+    def per_row_ms(fn) -> Dict[str, float]:
+        for r in rows[:20]:
+            fn(r)
+        samples = []
+        for r in rows:
+            t0 = time.perf_counter()
+            fn(r)
+            samples.append(time.perf_counter() - t0)
+        arr = np.asarray(samples) * 1000.0
+        return {"p50_ms": float(np.percentile(arr, 50)), "p99_ms": float(np.percentile(arr, 99))}
+
+    routed, settings.fast_tier = settings.fast_tier, False
+    try:
+        ensemble_ms = per_row_ms(predict_models)
+    finally:
+        settings.fast_tier = routed
+    return {
+        "rows": int(len(raw)),
+        "agreement": float((fast_v == ensemble).mean()),
+        "ensemble": {**quality(ensemble, ensemble_score), **ensemble_ms},
+        "fast": {**quality(fast_v, fast_p), **per_row_ms(fast.score_row)},
+    }
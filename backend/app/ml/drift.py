@@ -0,0 +1,335 @@
+# backend/app/ml/drift.py
+"""
+Constant-memory drift monitoring for model inputs and scores.
+
+Every predict_models() call feeds a handful of streaming sketches (a few
+microseconds in total):
+
+- amount, device_risk_score, rf and xgb scores:
+  - a KLL quantile sketch (live quantiles, KS against the reference CDF)
+  - a fixed histogram over the reference decile edges (PSI)
+- location:
+  - a count-min sketch over the reference categories, for PSI
+  - a small capped table of categories never seen in training
+
+train_models.py saves the reference snapshot (drift_reference.json next
+to the models) from the held-out split. Sketches cover a rolling window
+(DRIFT_WINDOW_SECONDS). Reports use the current window once it has
+DRIFT_MIN_COUNT observations, and the previous full window before that.
+"""
+import json
+import math
+import pathlib
+import random
+import threading
+import time
+import zlib
+from bisect import bisect_right
+from typing import Any, Dict, List, Optional
+
+import numpy as np
+
+from app.core import metrics
+from app.core.config import settings
+
+REFERENCE_PATH = pathlib.Path(__file__).resolve().parent / "drift_reference.json"
+NUMERIC = ["amount", "device_risk_score"]
+SCORES = ["rf", "xgb"]
+CATEGORICAL = ["location"]
+PSI_BINS = 10
+KS_POINTS = 99
+MAX_UNSEEN = 32
+_EPS = 1e-4
+
+
+# ------------------------------
+# Sketches
+# ------------------------------
+class KLL:
+    """KLL quantile sketch (Karnin, Lang, Liberty 2016); ~k * 3 stored items."""
+
+    def __init__(self, k: int = 200, c: float = 2.0 / 3.0, seed: Optional[int] = None):
+        self.k = k
+        self.c = c
+        self.n = 0
+        self.compactors: List[List[float]] = []
+        self.size = 0
+        self.max_size = 0
+        self._rng = random.Random(seed)
+        self._grow()
+
+    def _capacity(self, h: int) -> int:
+        depth = len(self.compactors) - h - 1
+        return int(math.ceil(self.k * self.c ** depth)) + 1
+
+    def _grow(self) -> None:
+        self.compactors.append([])
+        self.max_size = sum(self._capacity(h) for h in range(len(self.compactors)))
+
+    def update(self, x: float) -> None:
+        self.compactors[0].append(x)
+        self.size += 1
+        self.n += 1
+        if self.size >= self.max_size:
+            self._compress()
+
+    def _compress(self) -> None:
+        for h in range(len(self.compactors)):
+            buf = self.compactors[h]
+            if len(buf) >= self._capacity(h):
+                if h + 1 >= len(self.compactors):
+                    self._grow()
+                buf.sort()
+                keep = [buf.pop()] if len(buf) % 2 else []
+                self.compactors[h + 1].extend(buf[self._rng.random() < 0.5::2])
+                self.compactors[h] = keep
+                self.size = sum(len(b) for b in self.compactors)
+                if self.size < self.max_size:
+                    break
+
+    def _weighted(self):
+        items = sorted((x, 1 << h) for h, buf in enumerate(self.compactors) for x in buf)
+        if not items:
+            return np.empty(0), np.empty(0)
+        values = np.fromiter((x for x, _ in items), float, len(items))
+        cum = np.cumsum(np.fromiter((w for _, w in items), float, len(items)))
+        return values, cum
+
+    def cdf(self, points) -> np.ndarray:
+        values, cum = self._weighted()
+        if not len(values):
+            return np.zeros(len(points))
+        idx = np.searchsorted(values, np.asarray(points, float), side="right")
+        return np.where(idx > 0, cum[np.maximum(idx - 1, 0)], 0.0) / cum[-1]
+
+    def quantiles(self, qs) -> List[float]:
+        values, cum = self._weighted()
+        if not len(values):
+            return [None] * len(qs)
+        idx = np.searchsorted(cum / cum[-1], np.asarray(qs, float), side="left")
+        return [float(values[min(i, len(values) - 1)]) for i in idx]
+
+
+class CountMin:
+    """Count-min sketch with crc32-seeded rows (stable across processes)."""
+
+    def __init__(self, width: int = 512, depth: int = 4):
+        self.width = width
+        self.depth = depth
+        self.rows = [[0] * width for _ in range(depth)]
+        self.total = 0
+
+    def update(self, key: str, count: int = 1) -> None:
+        data = key.encode("utf-8")
+        for d, row in enumerate(self.rows):
+            row[zlib.crc32(data, d + 1) % self.width] += count
+        self.total += count
+
+    def estimate(self, key: str) -> int:
+        data = key.encode("utf-8")
+        return min(row[zlib.crc32(data, d + 1) % self.width] for d, row in enumerate(self.rows))
+
+
+class _Window:
+    def __init__(self, ref: Optional[Dict[str, Any]]):
+        self.started = time.time()
+        self.count = 0
+        self.kll = {name: KLL() for name in NUMERIC + SCORES}
+        self.bins: Dict[str, List[int]] = {}
+        self.edges: Dict[str, List[float]] = {}
+        for name in NUMERIC + SCORES:
+            edges = (ref or {}).get("numeric", {}).get(name, {}).get("edges")
+            if edges:
+                self.edges[name] = edges
+                self.bins[name] = [0] * (len(edges) + 1)
+        self.locations = CountMin()
+        self.known = set((ref or {}).get("categorical", {}).get("location", {}).get("proportions", {}))
+        self.unseen: Dict[str, int] = {}
+
+
+# ------------------------------
+# Monitor
+# ------------------------------
+class DriftMonitor:
+    def __init__(self, reference_path: pathlib.Path = REFERENCE_PATH, window_s: float = 3600, min_count: int = 200):
+        self.reference_path = reference_path
+        self.window_s = window_s
+        self.min_count = min_count
+        self.reference = load_reference(reference_path)
+        self._lock = threading.Lock()
+        self.current = _Window(self.reference)
+        self.previous: Optional[_Window] = None
+
+    def reload_reference(self) -> None:
+        with self._lock:
+            self.reference = load_reference(self.reference_path)
+            self.current, self.previous = _Window(self.reference), None
+
+    def observe(self, row: Dict[str, Any], rf_score: float, xgb_score: float) -> None:
+        values = (
+            ("amount", row.get("amount")),
+            ("device_risk_score", row.get("device_risk_score")),
+            ("rf", rf_score),
+            ("xgb", xgb_score),
+        )
+        location = row.get("location")
+        with self._lock:
+            w = self.current
+            if time.time() - w.started >= self.window_s:
+                self.previous, w = w, _Window(self.reference)
+                self.current = w
+            w.count += 1
+            for name, v in values:
+                if v is None:
+                    continue
+                v = float(v)
+                w.kll[name].update(v)
+                edges = w.edges.get(name)
+                if edges is not None:
+                    w.bins[name][bisect_right(edges, v)] += 1
+            if location is not None:
+                location = str(location)
+                w.locations.update(location)
+                if w.known and location not in w.known and (location in w.unseen or len(w.unseen) < MAX_UNSEEN):
+                    w.unseen[location] = w.unseen.get(location, 0) + 1
+
+    def _window(self) -> _Window:
+        if self.current.count >= self.min_count or self.previous is None:
+            return self.current
+        return self.previous
+
+    def report(self) -> Dict[str, Any]:
+        with self._lock:
+            w = self._window()
+            out: Dict[str, Any] = {
+                "window": {
+                    "started": int(w.started),
+                    "observations": w.count,
+                    "window_seconds": self.window_s,
+                    "sufficient": w.count >= self.min_count,
+                },
+                "reference": None if self.reference is None else {
+                    k: self.reference.get(k) for k in ("created_at", "rows", "source")
+                },
+                "features": {},
+            }
+            ref_num = (self.reference or {}).get("numeric", {})
+            for name in NUMERIC + SCORES:
+                sk = w.kll[name]
+                entry: Dict[str, Any] = {
+                    "count": sk.n,
+                    "quantiles": dict(zip(("p01", "p50", "p95", "p99"), sk.quantiles([0.01, 0.5, 0.95, 0.99]))),
+                }
+                ref = ref_num.get(name)
+                if ref and sk.n:
+                    entry["psi"] = psi(w.bins[name], ref["proportions"])
+                    entry["ks"] = float(np.max(np.abs(sk.cdf(ref["ks_points"]) - np.asarray(ref["ks_cdf"]))))
+                    entry["reference_quantiles"] = ref.get("quantiles")
+                out["features"][name] = entry
+
+            ref_cat = (self.reference or {}).get("categorical", {}).get("location")
+            loc: Dict[str, Any] = {"count": w.locations.total, "unseen": dict(w.unseen)}
+            if ref_cat and w.locations.total:
+                cats = list(ref_cat["proportions"])
+                est = [w.locations.estimate(c) for c in cats]
+                other = max(w.locations.total - sum(est), 0)
+                live = est + [other]
+                expected = [ref_cat["proportions"][c] for c in cats] + [0.0]
+                loc["psi"] = psi(live, expected)
+                loc["proportions"] = {c: n / w.locations.total for c, n in zip(cats + ["__other__"], live)}
+            out["features"]["location"] = loc
+            return out
+
+    def reset(self) -> None:
+        with self._lock:
+            self.current, self.previous = _Window(self.reference), None
+
+
+def psi(counts: List[int], expected: List[float]) -> float:
+    """Population stability index of observed counts against expected proportions."""
+    total = float(sum(counts))
+    if not total:
+        return 0.0
+    s = 0.0
+    for n, e in zip(counts, expected):
+        a = max(n / total, _EPS)
+        e = max(e, _EPS)
+        s += (a - e) * math.log(a / e)
+    return float(s)
+
+
+# ------------------------------
+# Reference snapshot (written by train_models.py)
+# ------------------------------
+def build_reference(raw, rf_scores, xgb_scores, source: str = "") -> Dict[str, Any]:
+    """raw: DataFrame with amount / device_risk_score / location of the held-out rows."""
+    numeric: Dict[str, Any] = {}
+    series = {name: np.asarray(raw[name], float) for name in NUMERIC if name in raw}
+    series["rf"] = np.asarray(rf_scores, float)
+    series["xgb"] = np.asarray(xgb_scores, float)
+    for name, x in series.items():
+        edges = _between(x, np.linspace(0, 1, PSI_BINS + 1)[1:-1])
+        counts = np.bincount(np.searchsorted(edges, x, side="right"), minlength=len(edges) + 1)
+        points = _between(x, np.linspace(0.01, 0.99, KS_POINTS))
+        numeric[name] = {
+            "edges": edges,
+            "proportions": (counts / counts.sum()).tolist(),
+            "ks_points": points,
+            "ks_cdf": (np.searchsorted(np.sort(x), points, side="right") / len(x)).tolist(),
+            "quantiles": dict(zip(("p01", "p50", "p95", "p99"), np.quantile(x, [0.01, 0.5, 0.95, 0.99]).tolist())),
+        }
+    categorical: Dict[str, Any] = {}
+    for name in CATEGORICAL:
+        if name in raw:
+            props = raw[name].astype(str).value_counts(normalize=True)
+            categorical[name] = {"proportions": {str(k): float(v) for k, v in props.items()}}
+    return {
+        "created_at": int(time.time()),
+        "rows": int(len(raw)),
+        "source": source,
+        "numeric": numeric,
+        "categorical": categorical,
+    }
+
+
+def _between(x: np.ndarray, qs) -> List[float]:
+    """
+    Cut points at the given quantiles, moved halfway to the next distinct
+    value: scores repeat exactly (identical leaf paths), and a cut sitting on
+    a repeated value would let float noise flip whole groups across it.
+    """
+    uniq = np.unique(x)
+    cuts = []
+    for v in np.quantile(x, qs):
+        i = np.searchsorted(uniq, v, side="right")
+        cut = (uniq[i - 1] + uniq[i]) / 2 if i < len(uniq) else float(uniq[-1])
+        if not cuts or cut > cuts[-1]:
+            cuts.append(float(cut))
+    return cuts
+
+
+def save_reference(ref: Dict[str, Any], path: pathlib.Path = REFERENCE_PATH) -> None:
+    path.write_text(json.dumps(ref, indent=1), encoding="utf-8")
+
+
+def load_reference(path: pathlib.Path = REFERENCE_PATH) -> Optional[Dict[str, Any]]:
+    if not path.exists():
+        return None
+    return json.loads(path.read_text(encoding="utf-8"))
+
+
+# ------------------------------
+# Process-wide monitor
+# ------------------------------
+monitor = DriftMonitor(window_s=settings.drift_window_seconds, min_count=settings.drift_min_count)
+
+
+def _gauge(key: str):
+    def read():
+        feats = monitor.report()["features"]
+        return {f'feature="{n}"': f[key] for n, f in feats.items() if key in f}
+    return read
+
+
+metrics.register_gauge("finfraud_drift_psi", "Population stability index vs the training reference.", _gauge("psi"))
+metrics.register_gauge("finfraud_drift_ks", "Approximate KS statistic vs the training reference.", _gauge("ks"))
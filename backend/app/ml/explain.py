@@ -0,0 +1,183 @@
+# backend/app/ml/explain.py
+"""
+Per-feature contributions for the RF and XGB agents, computed in the same
+pass as the score.
+
+XGB: the booster's native pred_contribs gives exact TreeSHAP values in log
+odds; bias + sum(contributions) is the margin, so the probability comes out
+of the same call.
+
+RF: Saabas tree-path contributions. For every node of every tree we
+precompute the running sum of probability changes along its root path,
+attributed to the split feature of each edge. Scoring a row is then one
+leaf lookup per tree plus a mean, and calling tree_.apply per tree avoids
+the forest's joblib dispatch, which dominates single-row latency. The
+score is the mean leaf probability (float64), exactly what predict_proba
+computes and always within [0, 1]. The contribution table is float32 to
+halve its size, so bias + sum(contributions) matches the score to ~1e-7:
+fine for reason codes, but never used as the score.
+
+One-hot columns (location_Delhi, ...) are summed back into their raw
+feature, so reason codes read "location" rather than a dummy column.
+"""
+import threading
+from functools import lru_cache
+from typing import Any, Dict, List, Optional, Tuple
+import numpy as np
+import pandas as pd
+
+from app.ml import predictor
+
+
+def _unwrap(model) -> Tuple[Any, Any]:
+    """(preprocessing steps or None, final estimator) for a bare model or a Pipeline."""
+    if hasattr(model, "named_steps"):
+        steps = model.steps
+        return (model[:-1] if len(steps) > 1 else None), steps[-1][1]
+    return None, model
+
+
+def _matrix(model, df: pd.DataFrame) -> np.ndarray:
+    pre, _ = _unwrap(model)
+    X = pre.transform(df) if pre is not None else df.to_numpy()
+    return np.ascontiguousarray(X, dtype=np.float32)
+
+
+def supports(model) -> bool:
+    _, clf = _unwrap(model)
+    name = type(clf).__name__
+    return name in ("RandomForestClassifier", "ExtraTreesClassifier", "XGBClassifier")
+
+
+# ------------------------------
+# Random forest: precomputed path contributions
+# ------------------------------
+_forest_lock = threading.Lock()
+_forest: Optional[Tuple[Any, np.ndarray, np.ndarray, np.ndarray, float]] = None
+
+
+def _path_table(clf) -> Tuple[np.ndarray, np.ndarray, np.ndarray, float]:
+    """
+    (contributions for every node of every tree stacked [total_nodes, n_features] (float32),
+     fraud probability of every node [total_nodes] (float64), per-tree row offsets,
+     mean root probability).
+    """
+    global _forest
+    cached = _forest
+    if cached is not None and cached[0] is clf:
+        return cached[1:]
+    with _forest_lock:
+        if _forest is not None and _forest[0] is clf:
+            return _forest[1:]
+        n_features = clf.n_features_in_
+        tables, probs, offsets, roots = [], [], [], []
+        offset = 0
+        for est in clf.estimators_:
+            t = est.tree_
+            v = t.value[:, 0, :]
+            p = v[:, 1] / v.sum(axis=1)
+            parent = np.full(t.node_count, -1)
+            for side in (t.children_left, t.children_right):
+                kids = np.flatnonzero(side != -1)
+                parent[side[kids]] = kids
+            table = np.zeros((t.node_count, n_features), dtype=np.float64)
+            # sklearn numbers children after their parent, so one forward pass suffices
+            for node in range(1, t.node_count):
+                up = parent[node]
+                table[node] = table[up]
+                table[node, t.feature[up]] += p[node] - p[up]
+            tables.append(table.astype(np.float32))
+            probs.append(p)
+            offsets.append(offset)
+            offset += t.node_count
+            roots.append(p[0])
+        _forest = (clf, np.vstack(tables), np.concatenate(probs), np.asarray(offsets), float(np.mean(roots)))
+        return _forest[1:]
+
+
+def rf_scores(model, df: pd.DataFrame) -> Tuple[np.ndarray, np.ndarray, float]:
+    """(fraud probability [n], contributions [n, n_features], bias) for a batch."""
+    _, clf = _unwrap(model)
+    X = _matrix(model, df)
+    table, probs, offsets, bias = _path_table(clf)
+    leaves = np.column_stack([est.tree_.apply(X) for est in clf.estimators_]) + offsets
+    contribs = table[leaves].mean(axis=1, dtype=np.float64)
+    return probs[leaves].mean(axis=1), contribs, bias
+
+
+def warm_up(model) -> None:
+    _, clf = _unwrap(model)
+    if type(clf).__name__ in ("RandomForestClassifier", "ExtraTreesClassifier"):
+        _path_table(clf)
+
+
+# ------------------------------
+# XGBoost: native TreeSHAP
+# ------------------------------
+def xgb_scores(model, df: pd.DataFrame) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """(fraud probability [n], contributions in log odds [n, n_features], bias [n]) for a batch."""
+    import xgboost
+
+    _, clf = _unwrap(model)
+    out = clf.get_booster().predict(xgboost.DMatrix(_matrix(model, df)), pred_contribs=True)
+    contribs, bias = out[:, :-1].astype(np.float64), out[:, -1].astype(np.float64)
+    margin = bias + contribs.sum(axis=1)
+    return 1.0 / (1.0 + np.exp(-margin)), contribs, bias
+
+
+# ------------------------------
+# Reason codes
+# ------------------------------
+@lru_cache(maxsize=16)
+def feature_groups(model_features: Tuple[str, ...]) -> Tuple[List[str], np.ndarray]:
+    """Raw feature names and a [n_model_features, n_groups] 0/1 matrix folding one-hot columns back."""
+    groups: List[str] = []
+    index = []
+    for f in model_features:
+        g = next((raw for raw in predictor.FEATURES if f == raw or f.startswith(raw + "_")), f)
+        if g not in groups:
+            groups.append(g)
+        index.append(groups.index(g))
+    G = np.zeros((len(model_features), len(groups)))
+    G[np.arange(len(model_features)), index] = 1.0
+    return groups, G
+
+
+def grouped(contribs: np.ndarray, model_features: List[str]) -> Tuple[List[str], np.ndarray]:
+    groups, G = feature_groups(tuple(model_features))
+    return groups, contribs @ G
+
+
+def top_reasons(contrib_row: np.ndarray, groups: List[str], row: Dict[str, Any], k: int) -> List[Dict[str, Any]]:
+    """Top-k features by absolute contribution; positive pushes toward fraud."""
+    order = np.argsort(-np.abs(contrib_row))[:k]
+    return [
+        {"feature": groups[i], "value": row.get(groups[i]), "contribution": round(float(contrib_row[i]), 6)}
+        for i in order
+    ]
+
+
+# ------------------------------
+# On-demand explanation (off the hot path)
+# ------------------------------
+def explain_row(row: Dict[str, Any]) -> Dict[str, Any]:
+    """Full contribution breakdown for one transaction payload, both agents."""
+    rf, xgb = predictor.load_models()
+    out: Dict[str, Any] = {}
+    for name, model, scorer, unit in (
+        ("rf", rf, rf_scores, "probability"),
+        ("xgb", xgb, xgb_scores, "log_odds"),
+    ):
+        if not supports(model):
+            continue
+        features = predictor.get_feature_names(model)
+        score, contribs, bias = scorer(model, predictor.preprocess_row(row, features))
+        groups, by_group = grouped(contribs, features)
+        out[name] = {
+            "score": float(score[0]),
+            "unit": unit,
+            "bias": float(np.ravel(bias)[0]),
+            "contributions": top_reasons(by_group[0], groups, row, len(groups)),
+            "columns": {f: round(float(c), 6) for f, c in zip(features, contribs[0])},
+        }
+    return out
@@ -0,0 +1,322 @@
+# backend/app/ml/feedback.py
+"""
+Analyst feedback loop: confirmed labels -> incremental XGB updates.
+
+POST /api/transactions/{id}/feedback records a confirmed fraud / legit
+label in feedback_labels, against the transaction's latest fraudresults
+row, and makes it the transaction's status. The worker also buffers the
+label with the model inputs (amount, device_risk_score, location) and
+writes the buffer out as an append-only Parquet part:
+
+    FEEDBACK_DIR/labels/part-<time_ns>-<pid>.parquet
+
+A part is written every FEEDBACK_FLUSH_ROWS labels or
+FEEDBACK_FLUSH_SECONDS, and at shutdown. Parts are never rewritten.
+feedback_labels stays the system of record. Labels a worker had
+buffered when it crashed are only missing from training.
+
+update() continues boosting the current XGB pipeline on the parts it
+has not consumed yet. It does not retrain from the CSV:
+- the fitted scaler is kept, and FEEDBACK_XGB_ROUNDS trees are added
+  on top of the existing booster (min_child_weight 0, see
+  CONTINUE_PARAMS)
+- every 5th new label is held out first. The candidate is published
+  only if the hold-out log loss does not get worse, and is then refit
+  on all the new labels
+- the previous file is copied to FEEDBACK_DIR/models/ for rollback,
+  and the new one is published with os.replace onto xgb_model.joblib
+- consumed parts are recorded in FEEDBACK_DIR/state.json. A rejected or
+  too small batch (under FEEDBACK_MIN_ROWS, or one class only) stays
+  pending and is retried together with later labels
+
+Updates run in their own process, holding an flock on
+FEEDBACK_DIR/train.lock so that one update runs at a time across
+workers and hosts sharing the directory. That process is either
+`python backend/app/ml/feedback.py update`, run from cron or by hand,
+or a child the API spawns every FEEDBACK_UPDATE_SECONDS (or on
+POST /admin/feedback/update). Serving workers pick the new file up
+through predictor.model_reload_loop (MODEL_RELOAD_SECONDS). The swap is
+one reference assignment, so no request waits on it.
+
+    python backend/app/ml/feedback.py status
+    python backend/app/ml/feedback.py update [--rounds 20] [--min-rows 200]
+"""
+import argparse
+import asyncio
+import copy
+import json
+import logging
+import os
+import pathlib
+import shutil
+import sys
+import threading
+import time
+from datetime import datetime, timezone
+from typing import Any, Dict, List, Optional
+
+ML_DIR = pathlib.Path(__file__).resolve().parent
+if __name__ == "__main__":
+    # make `app` importable when run as `python backend/app/ml/feedback.py`
+    sys.path.insert(0, str(ML_DIR.parents[1]))
+
+from app.core.config import settings
+
+logger = logging.getLogger(__name__)
+
+COLUMNS = (
+    "feedback_id", "transaction_id", "fraudresult_id", "label", "model_verdict", "labelled_by",
+    "amount", "device_risk_score", "location", "labelled_at",
+)
+VALIDATION_EVERY = 5  # every 5th new label is held out to check the candidate
+HISTORY = 20  # updates kept in state.json
+# rows the model already scores near 0 / 1 have tiny hessians, so the default
+# min_child_weight (1) would stop the added trees from splitting on them at all
+CONTINUE_PARAMS = {"min_child_weight": 0.0}
+
+
+def _paths() -> Dict[str, pathlib.Path]:
+    root = pathlib.Path(settings.feedback_dir)
+    return {"root": root, "labels": root / "labels", "models": root / "models", "state": root / "state.json"}
+
+
+def _schema():
+    import pyarrow as pa
+
+    return pa.schema([
+        ("feedback_id", pa.int64()),
+        ("transaction_id", pa.int64()),
+        ("fraudresult_id", pa.int64()),
+        ("label", pa.string()),
+        ("model_verdict", pa.string()),
+        ("labelled_by", pa.string()),
+        ("amount", pa.float64()),
+        ("device_risk_score", pa.float64()),
+        ("location", pa.string()),
+        ("labelled_at", pa.float64()),
+    ])
+
+
+# ------------------------------
+# Per-worker label buffer -> Parquet parts
+# ------------------------------
+class LabelBuffer:
+    def __init__(self):
+        self._rows: List[Dict[str, Any]] = []
+        self._lock = threading.Lock()
+        self.written = 0
+        self.parts = 0
+
+    def __len__(self) -> int:
+        return len(self._rows)
+
+    def add(self, record: Dict[str, Any]) -> bool:
+        """Buffer one label; True when the buffer is due a flush."""
+        with self._lock:
+            self._rows.append({**record, "labelled_at": time.time()})
+            return len(self._rows) >= settings.feedback_flush_rows
+
+    def flush(self) -> Optional[pathlib.Path]:
+        """Write the buffered labels as a new part (blocking: call from a thread)."""
+        with self._lock:
+            rows, self._rows = self._rows, []
+        if not rows:
+            return None
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+
+        labels = _paths()["labels"]
+        path = labels / f"part-{time.time_ns()}-{os.getpid()}.parquet"
+        tmp = path.with_suffix(".tmp")  # readers only glob *.parquet
+        try:
+            labels.mkdir(parents=True, exist_ok=True)
+            table = pa.table({c: [r.get(c) for r in rows] for c in COLUMNS}, schema=_schema())
+            pq.write_table(table, tmp, compression="zstd")
+            os.replace(tmp, path)
+        except Exception:
+            with self._lock:
+                self._rows[:0] = rows  # retried on the next flush
+            raise
+        self.written += len(rows)
+        self.parts += 1
+        return path
+
+    def summary(self) -> Dict[str, Any]:
+        return {"buffered": len(self), "written": self.written, "parts": self.parts}
+
+
+buffer = LabelBuffer()
+
+
+async def flush_loop(interval_s: float) -> None:
+    while True:
+        await asyncio.sleep(interval_s)
+        try:
+            await asyncio.to_thread(buffer.flush)
+        except Exception:
+            logger.exception("Feedback buffer flush failed; labels kept for the next flush")
+
+
+# ------------------------------
+# Incremental XGB update (runs in its own process)
+# ------------------------------
+def read_state() -> Dict[str, Any]:
+    path = _paths()["state"]
+    if not path.exists():
+        return {"consumed": [], "updates": 0, "history": []}
+    return json.loads(path.read_text(encoding="utf-8"))
+
+
+def _write_state(state: Dict[str, Any]) -> None:
+    path = _paths()["state"]
+    tmp = path.with_suffix(".tmp")
+    tmp.write_text(json.dumps(state, indent=2), encoding="utf-8")
+    os.replace(tmp, path)
+
+
+def pending_parts(state: Optional[Dict[str, Any]] = None) -> List[pathlib.Path]:
+    consumed = set((state or read_state())["consumed"])
+    return sorted(p for p in _paths()["labels"].glob("part-*.parquet") if p.name not in consumed)
+
+
+def _continue(pipeline, X, y, rounds: int):
+    """Copy of `pipeline` with `rounds` more trees boosted from its current booster."""
+    candidate = copy.deepcopy(pipeline)
+    steps = getattr(candidate, "steps", None)
+    clf = steps[-1][1] if steps else candidate
+    # the scaler keeps its training statistics; only the booster learns
+    Xt = candidate[:-1].transform(X) if steps and len(steps) > 1 else X
+    booster = clf.get_booster()
+    clf.set_params(n_estimators=rounds, **CONTINUE_PARAMS)
+    clf.fit(Xt, y, xgb_model=booster)
+    return candidate
+
+
+def _update(model_path: pathlib.Path, rounds: int, min_rows: int) -> Dict[str, Any]:
+    import joblib
+    import numpy as np
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+    from sklearn.metrics import log_loss
+    from app.ml.predictor import encode_rows, get_feature_names
+
+    paths = _paths()
+    state = read_state()
+    parts = pending_parts(state)
+    if not parts:
+        return {"status": "no_new_labels", "rows": 0}
+    rows = pa.concat_tables([pq.read_table(p) for p in parts]).to_pylist()
+    y = np.fromiter((r["label"] == "fraud" for r in rows), dtype=np.int8, count=len(rows))
+    summary: Dict[str, Any] = {"parts": len(parts), "rows": len(rows), "fraud": int(y.sum())}
+    if len(rows) < max(min_rows, VALIDATION_EVERY) or len(np.unique(y)) < 2:
+        return {**summary, "status": "waiting"}
+
+    t0 = time.perf_counter()
+    pipeline = joblib.load(model_path)
+    X = encode_rows(rows, get_feature_names(pipeline))
+    holdout = np.arange(len(rows)) % VALIDATION_EVERY == 0
+    trial = _continue(pipeline, X[~holdout], y[~holdout], rounds)
+    before = log_loss(y[holdout], pipeline.predict_proba(X[holdout])[:, 1], labels=[0, 1])
+    after = log_loss(y[holdout], trial.predict_proba(X[holdout])[:, 1], labels=[0, 1])
+    summary.update(holdout_logloss_before=round(float(before), 5), holdout_logloss_after=round(float(after), 5))
+    if after > before:
+        summary.update(status="rejected", seconds=round(time.perf_counter() - t0, 3))
+        logger.warning("Feedback update rejected: hold-out log loss %.4f -> %.4f", before, after)
+        return summary
+
+    updated = _continue(pipeline, X, y, rounds)
+    stamp = datetime.now(timezone.utc).strftime("%Y%m%dT%H%M%S")
+    paths["models"].mkdir(parents=True, exist_ok=True)
+    backup = paths["models"] / f"{model_path.stem}-{stamp}.joblib"
+    shutil.copy2(model_path, backup)
+    tmp = model_path.with_name(f".{model_path.name}.{os.getpid()}.tmp")
+    joblib.dump(updated, tmp)
+    os.replace(tmp, model_path)
+
+    steps = getattr(updated, "steps", None)
+    clf = steps[-1][1] if steps else updated
+    summary.update(
+        status="published",
+        trees=int(clf.get_booster().num_boosted_rounds()),
+        previous=str(backup),
+        seconds=round(time.perf_counter() - t0, 3),
+        at=stamp,
+    )
+    state["consumed"] += [p.name for p in parts]
+    state["updates"] += 1
+    state["history"] = (state["history"] + [summary])[-HISTORY:]
+    _write_state(state)
+    logger.info("Feedback update published: %d labels, %d trees", len(rows), summary["trees"])
+    return summary
+
+
+def update(model_path: Optional[pathlib.Path] = None, rounds: Optional[int] = None, min_rows: Optional[int] = None) -> Dict[str, Any]:
+    """One update over the pending parts; {"status": "busy"} if another process holds the lock."""
+    import fcntl
+    from app.ml.predictor import XGB_PATH
+
+    root = _paths()["root"]
+    root.mkdir(parents=True, exist_ok=True)
+    with open(root / "train.lock", "w") as lock:
+        try:
+            fcntl.flock(lock, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except BlockingIOError:
+            return {"status": "busy"}
+        return _update(
+            pathlib.Path(model_path or XGB_PATH),
+            rounds or settings.feedback_xgb_rounds,
+            settings.feedback_min_rows if min_rows is None else min_rows,
+        )
+
+
+async def run_update() -> Dict[str, Any]:
+    """update() in a child process, so training never competes with serving for this worker's GIL."""
+    env = {**os.environ, "FEEDBACK_DIR": str(_paths()["root"].resolve())}
+    proc = await asyncio.create_subprocess_exec(
+        sys.executable, str(pathlib.Path(__file__)), "update",
+        stdout=asyncio.subprocess.PIPE, stderr=asyncio.subprocess.PIPE, env=env,
+    )
+    out, err = await proc.communicate()
+    if proc.returncode != 0:
+        raise RuntimeError(f"feedback update exited with {proc.returncode}: {err.decode(errors='replace')[-2000:]}")
+    return json.loads(out.decode().strip().splitlines()[-1])
+
+
+async def update_loop(interval_s: float) -> None:
+    while True:
+        await asyncio.sleep(interval_s)
+        try:
+            await asyncio.to_thread(buffer.flush)
+            summary = await run_update()
+            if summary["status"] not in ("busy", "no_new_labels"):
+                logger.info("Feedback update: %s", summary)
+        except Exception:
+            logger.exception("Feedback update failed; the current model stays")
+
+
+# ------------------------------
+# CLI
+# ------------------------------
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    sub = parser.add_subparsers(dest="command", required=True)
+    p = sub.add_parser("update", help="continue XGB training on pending labels and publish")
+    p.add_argument("--model", default=None, help="model file to update (default: xgb_model.joblib)")
+    p.add_argument("--rounds", type=int, default=None, help="trees added (default FEEDBACK_XGB_ROUNDS)")
+    p.add_argument("--min-rows", type=int, default=None, help="pending labels needed (default FEEDBACK_MIN_ROWS)")
+    sub.add_parser("status", help="pending parts / rows and recent updates")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO, stream=sys.stderr)
+    if args.command == "update":
+        summary = update(args.model, args.rounds, args.min_rows)
+    else:
+        state = read_state()
+        parts = pending_parts(state)
+        summary = {"pending_parts": len(parts), "updates": state["updates"], "history": state["history"][-5:]}
+    # last stdout line is the JSON summary (run_update parses it)
+    print(json.dumps(summary))
+
+
+if __name__ == "__main__":
+    main()
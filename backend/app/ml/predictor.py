@@ -1,8 +1,16 @@
 import joblib
 import numpy as np
 import pandas as pd
-from typing import Dict, List, Tuple
+from typing import Dict, List, Optional, Tuple
+import logging
 import pathlib
+import time
+from app.core import timing
+from app.core.config import settings
+from app.core.log import payload_sampled
+from app.ml import distill, drift, entity_lists, explain, graph
+
+logger = logging.getLogger(__name__)
 
 # Resolve paths relative to this file's directory
 BASE_DIR = pathlib.Path(__file__).resolve().parent
@@ -12,22 +20,94 @@ XGB_PATH = BASE_DIR / "xgb_model.joblib"
 # lazy load
 _rf = None
 _xgb = None
+_xgb_mtime = None  # st_mtime_ns of the loaded XGB file (reload_xgb_if_changed)
+_fast = None  # False once we know there is no fast model on disk
 
 # Features used during training
 FEATURES = ["amount", "device_risk_score", "location"]
 
+# rule thresholds (also used to label the fast tier's training targets)
+HIGH_AMOUNT = 50000
+HIGH_DEVICE_RISK = 0.8
+# model verdict threshold and fraud votes needed for a fraud consensus (app/ml/backtest.py sweeps these)
+VERDICT_THRESHOLD = 0.5
+MIN_FRAUD_VOTES = 2
+
 
 def load_models():
-    global _rf, _xgb
+    global _rf, _xgb, _xgb_mtime
     if _rf is None:
-        print(f"🔎 Loading RF model from: {RF_PATH}")
-        _rf = joblib.load(RF_PATH)
+        with timing.stage(timing.MODEL_LOAD):
+            t0 = time.perf_counter()
+            _rf = joblib.load(RF_PATH)
+            if settings.explain_reason_codes:
+                explain.warm_up(_rf)
+        logger.info("Loaded RF model from %s in %.2fs", RF_PATH, time.perf_counter() - t0)
     if _xgb is None:
-        print(f"🔎 Loading XGB model from: {XGB_PATH}")
-        _xgb = joblib.load(XGB_PATH)
+        with timing.stage(timing.MODEL_LOAD):
+            t0 = time.perf_counter()
+            _xgb_mtime = XGB_PATH.stat().st_mtime_ns
+            _xgb = joblib.load(XGB_PATH)
+        logger.info("Loaded XGB model from %s in %.2fs", XGB_PATH, time.perf_counter() - t0)
     return _rf, _xgb
 
 
+def reload_xgb_if_changed() -> bool:
+    """
+    Swap in xgb_model.joblib when the file on disk has been replaced
+    (app/ml/feedback.py publishes updates with os.replace). The new model
+    is loaded before the module reference moves, so requests in flight
+    finish on the old one and nothing waits on the load.
+    """
+    global _xgb, _xgb_mtime
+    if _xgb is None:
+        return False
+    try:
+        mtime = XGB_PATH.stat().st_mtime_ns
+    except FileNotFoundError:
+        return False
+    if mtime == _xgb_mtime:
+        return False
+    t0 = time.perf_counter()
+    model = joblib.load(XGB_PATH)
+    _xgb, _xgb_mtime = model, mtime
+    logger.info("Reloaded XGB model from %s in %.2fs", XGB_PATH, time.perf_counter() - t0)
+    return True
+
+
+async def model_reload_loop(interval_s: float) -> None:
+    import asyncio
+
+    while True:
+        await asyncio.sleep(interval_s)
+        try:
+            await asyncio.to_thread(reload_xgb_if_changed)
+        except Exception:
+            logger.exception("XGB model reload failed; keeping the loaded model")
+
+
+def load_fast_model():
+    """Distilled fast agent, or None when fast_model.joblib has not been trained."""
+    global _fast
+    if _fast is None:
+        if not distill.FAST_PATH.exists():
+            logger.warning("FAST_TIER is on but %s is missing; using the full ensemble", distill.FAST_PATH)
+            _fast = False
+        else:
+            with timing.stage(timing.MODEL_LOAD):
+                t0 = time.perf_counter()
+                _fast = joblib.load(distill.FAST_PATH)
+            logger.info("Loaded fast model from %s in %.2fs", distill.FAST_PATH, time.perf_counter() - t0)
+    return _fast or None
+
+
+def in_fast_tier(row: Dict) -> bool:
+    return (
+        float(row.get("amount") or 0.0) <= settings.fast_tier_max_amount
+        and float(row.get("device_risk_score") or 0.0) <= settings.fast_tier_max_device_risk
+    )
+
+
 def get_feature_names(model) -> List[str]:
     """Extract feature names from model or pipeline."""
     if hasattr(model, "feature_names_in_"):
@@ -57,73 +137,211 @@ def preprocess_row(row: Dict, model_features: List[str]) -> pd.DataFrame:
     return df[model_features]
 
 
+def encode_rows(rows: List[Dict], model_features: Optional[List[str]] = None) -> pd.DataFrame:
+    """preprocess_row() for many transactions at once (same values; every seen column when model_features is None)."""
+    df = pd.DataFrame([{k: r.get(k) for k in FEATURES} for r in rows], columns=FEATURES)
+    df["amount"] = pd.to_numeric(df["amount"], errors="coerce").fillna(0.0)
+    df["device_risk_score"] = pd.to_numeric(df["device_risk_score"], errors="coerce").fillna(0.0)
+    encoded = pd.get_dummies(df, columns=["location"])
+    return encoded if model_features is None else encoded.reindex(columns=model_features, fill_value=0)
+
+
+def check_rules(row: Dict) -> Tuple[str, List[str]]:
+    with timing.stage(timing.RULES):
+        rule_reasons = []
+        rule_verdict = "legit"
+        amount = float(row.get("amount", 0.0))
+        if amount > HIGH_AMOUNT:
+            rule_verdict = "fraud"
+            rule_reasons.append("high_amount")
+        if row.get("device_risk_score", 0) > HIGH_DEVICE_RISK:
+            rule_verdict = "fraud"
+            rule_reasons.append("device_risk")
+    return rule_verdict, rule_reasons
+
+
+def _rules_agent(rule_verdict: str, rule_reasons: List[str]) -> Dict:
+    return {
+        "name": "rules",
+        "verdict": rule_verdict,
+        "score": 1.0 if rule_verdict == "fraud" else 0.0,
+        "reasons": rule_reasons,
+    }
+
+
+def predict_fast(fast, row: Dict) -> Tuple[Dict, List]:
+    """
+    Fast tier: the distilled agent was trained on the RF + XGB + rules
+    consensus, so its verdict stands in for that vote.
+    """
+    with timing.stage(timing.FAST):
+        score, contribs = fast.score_row(row)
+    if settings.drift_monitoring:
+        drift.monitor.observe(row, None, None)
+    verdict = "fraud" if score >= fast.threshold else "legit"
+    rule_verdict, rule_reasons = check_rules(row)
+
+    agents = [
+        {"name": "fast", "verdict": verdict, "score": float(score)},
+        _rules_agent(rule_verdict, rule_reasons),
+    ]
+    reason_codes = {"agents": agents, "rules": rule_reasons, "tier": "fast"}
+    if settings.explain_reason_codes:
+        reason_codes["features"] = {
+            "fast": explain.top_reasons(np.asarray(contribs), distill.GROUPS, row, settings.explain_top_k)
+        }
+    return {
+        "consensus_verdict": verdict,
+        "consensus_score": float(score),
+        "agents": agents,
+    }, reason_codes
+
+
+def predict_listed(row: Dict, hits: Dict) -> Tuple[Dict, List]:
+    """Short-circuit on a block / allow list hit: no model is scored."""
+    if settings.drift_monitoring:
+        drift.monitor.observe(row, None, None)
+    rule_verdict, rule_reasons = check_rules(row)
+    listed = entity_lists.agent(hits)
+    agents = [listed, _rules_agent(rule_verdict, rule_reasons)]
+    reason_codes = {"agents": agents, "rules": rule_reasons, "tier": "lists", "lists": hits}
+    return {
+        "consensus_verdict": listed["verdict"],
+        "consensus_score": listed["score"],
+        "agents": agents,
+    }, reason_codes
+
+
+def predict_rules(row: Dict) -> Tuple[Dict, List]:
+    """Rules agent only: the overload fallback (app/core/admission.py), no model or sketch is touched."""
+    rule_verdict, rule_reasons = check_rules(row)
+    rules = _rules_agent(rule_verdict, rule_reasons)
+    reason_codes = {"agents": [rules], "rules": rule_reasons, "tier": "rules"}
+    return {
+        "consensus_verdict": rule_verdict,
+        "consensus_score": rules["score"],
+        "agents": [rules],
+    }, reason_codes
+
+
 def predict_models(row: Dict) -> Tuple[Dict, List]:
     """
     row: single transaction dict
     returns: (consensus dict), list of per-agent reason_codes
     """
+    hits = None
+    if settings.entity_lists:
+        with timing.stage(timing.LISTS):
+            hits = entity_lists.current().check(row)
+
+    ring = None
+    if settings.graph_agent:
+        with timing.stage(timing.GRAPH):
+            ring = graph.rings.observe(row)
+
+    if hits and entity_lists.short_circuits(hits):
+        consensus, reason_codes = predict_listed(row, hits)
+        if ring:
+            consensus["graph_keys"] = ring["keys"]
+        return consensus, reason_codes
+
+    # listed entities and flagged rings always get the full ensemble
+    if settings.fast_tier and in_fast_tier(row) and not hits and not (ring and ring["verdict"] == "fraud"):
+        fast = load_fast_model()
+        if fast is not None:
+            consensus, reason_codes = predict_fast(fast, row)
+            if ring:
+                consensus["graph_keys"] = ring["keys"]
+            return consensus, reason_codes
+
     rf, xgb = load_models()
 
     # Get feature names dynamically
     rf_features = get_feature_names(rf)
     xgb_features = get_feature_names(xgb)
 
-    # --- DEBUG LOGS ---
-    print("🟢 Incoming payload:", row)
+    if payload_sampled():
+        logger.debug("Incoming payload: %s", row)
 
     # Preprocess
-    df_rf = preprocess_row(row, rf_features)
-    print("🟠 RF features:", df_rf.columns.tolist())
+    with timing.stage(timing.ENCODE):
+        df_rf = preprocess_row(row, rf_features)
+        df_xgb = preprocess_row(row, xgb_features)
 
-    df_xgb = preprocess_row(row, xgb_features)
-    print("🔵 XGB features:", df_xgb.columns.tolist())
+    # Predict fraud probability; with reason codes on, the explainers return
+    # the score and per-feature contributions from the same pass
+    explaining = settings.explain_reason_codes
+    rf_contribs = xgb_contribs = None
+    with timing.stage(timing.RF):
+        if explaining and explain.supports(rf):
+            proba, rf_contribs, _ = explain.rf_scores(rf, df_rf)
+            rf_proba = proba[0]
+        else:
+            rf_proba = (
+                rf.predict_proba(df_rf)[:, 1][0]
+                if hasattr(rf, "predict_proba")
+                else float(rf.predict(df_rf)[0])
+            )
+    with timing.stage(timing.XGB):
+        if explaining and explain.supports(xgb):
+            proba, xgb_contribs, _ = explain.xgb_scores(xgb, df_xgb)
+            xgb_proba = proba[0]
+        else:
+            xgb_proba = (
+                xgb.predict_proba(df_xgb)[:, 1][0]
+                if hasattr(xgb, "predict_proba")
+                else float(xgb.predict(df_xgb)[0])
+            )
 
-    # Predict fraud probability
-    rf_proba = (
-        rf.predict_proba(df_rf)[:, 1][0]
-        if hasattr(rf, "predict_proba")
-        else float(rf.predict(df_rf)[0])
-    )
-    xgb_proba = (
-        xgb.predict_proba(df_xgb)[:, 1][0]
-        if hasattr(xgb, "predict_proba")
-        else float(xgb.predict(df_xgb)[0])
-    )
+    if settings.drift_monitoring:
+        drift.monitor.observe(row, rf_proba, xgb_proba)
 
-    rf_verdict = "fraud" if rf_proba >= 0.5 else "legit"
-    xgb_verdict = "fraud" if xgb_proba >= 0.5 else "legit"
+    rf_verdict = "fraud" if rf_proba >= VERDICT_THRESHOLD else "legit"
+    xgb_verdict = "fraud" if xgb_proba >= VERDICT_THRESHOLD else "legit"
 
     # simple rules
-    rule_reasons = []
-    rule_verdict = "legit"
-    amount = float(row.get("amount", 0.0))
-    if amount > 50000:
-        rule_verdict = "fraud"
-        rule_reasons.append("high_amount")
-    if row.get("device_risk_score", 0) > 0.8:
-        rule_verdict = "fraud"
-        rule_reasons.append("device_risk")
+    rule_verdict, rule_reasons = check_rules(row)
 
     agents = [
         {"name": "rf", "verdict": rf_verdict, "score": float(rf_proba)},
         {"name": "xgb", "verdict": xgb_verdict, "score": float(xgb_proba)},
-        {
-            "name": "rules",
-            "verdict": rule_verdict,
-            "score": 1.0 if rule_verdict == "fraud" else 0.0,
-            "reasons": rule_reasons,
-        },
+        _rules_agent(rule_verdict, rule_reasons),
     ]
+    if hits:
+        agents.append(entity_lists.agent(hits))
+    if ring:
+        agents.append({k: ring[k] for k in ("name", "verdict", "score", "reasons")})
 
     # consensus
     votes = [1 if a["verdict"] == "fraud" else 0 for a in agents]
-    consensus_verdict = "fraud" if sum(votes) >= 2 else "legit"
+    consensus_verdict = "fraud" if sum(votes) >= MIN_FRAUD_VOTES else "legit"
     consensus_score = float(np.mean([a["score"] for a in agents]))
 
     reason_codes = {"agents": agents, "rules": rule_reasons}
+    if settings.fast_tier:
+        reason_codes["tier"] = "full"
+    if hits:
+        reason_codes["lists"] = hits
+    if ring:
+        reason_codes["graph"] = ring["component"]
+    if explaining:
+        with timing.stage(timing.EXPLAIN):
+            features = {}
+            for name, contribs, model_features in (
+                ("rf", rf_contribs, rf_features),
+                ("xgb", xgb_contribs, xgb_features),
+            ):
+                if contribs is not None:
+                    groups, by_group = explain.grouped(contribs, model_features)
+                    features[name] = explain.top_reasons(by_group[0], groups, row, settings.explain_top_k)
+            reason_codes["features"] = features
 
-    return {
+    consensus = {
         "consensus_verdict": consensus_verdict,
         "consensus_score": consensus_score,
         "agents": agents,
-    }, reason_codes
+    }
+    if ring:
+        # counted by graph.rings.record() once the transaction is committed
+        consensus["graph_keys"] = ring["keys"]
+    return consensus, reason_codes
@@ -0,0 +1,354 @@
+# backend/app/ml/search.py
+"""
+Hyperparameter search and evaluation harness for the RF / XGB agents.
+
+- The preprocessed, SMOTE-resampled training matrices and the untouched
+  held-out split are built once and cached under app/ml/.cache, keyed by
+  dataset file, row cap and seed.
+- Candidates (grid or successive halving over training-set size) run
+  across a process pool. Each is scored on the held-out split:
+  - PR-AUC
+  - recall at a fixed FPR
+  - single-row latency through the production scoring path
+    (app/ml/explain.py); candidates share the CPU with the rest of the
+    pool, so use --workers 1 when absolute latencies matter
+- Every finished candidate is appended to a JSONL log, and a rerun skips
+  what is already there, so an interrupted search resumes where it
+  stopped.
+- Selection maximises PR-AUC among candidates whose p99 latency fits the
+  budget (recall@FPR, then latency, break ties). --save-best refits the
+  winners on the full training set and writes the model files plus the
+  drift reference.
+
+    python backend/app/ml/search.py --fast --strategy halving --workers 4
+    python backend/app/ml/search.py --models xgb --latency-budget-ms 3 --save-best
+"""
+import argparse
+import hashlib
+import itertools
+import json
+import os
+import pathlib
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from typing import Any, Dict, List, Tuple
+
+import numpy as np
+import pandas as pd
+
+ML_DIR = pathlib.Path(__file__).resolve().parent
+sys.path.insert(0, str(ML_DIR.parents[1]))
+
+CACHE_DIR = ML_DIR / ".cache"
+COMBINED_PATH = ML_DIR / "fraud_data_combined.csv"
+SYNTHETIC_PATH = ML_DIR / "fraud_data.csv"
+MAX_ROWS_FAST = 20_000
+MAX_ROWS_FULL = 200_000
+
+# default search spaces; the fixed configs from train_models.py are included
+SPACES: Dict[str, Dict[str, List[Any]]] = {
+    "rf": {
+        "n_estimators": [50, 100, 200],
+        "max_depth": [None, 8, 16],
+        "min_samples_leaf": [1, 5],
+    },
+    "xgb": {
+        "n_estimators": [100, 200, 400],
+        "max_depth": [3, 5, 7],
+        "learning_rate": [0.05, 0.1],
+    },
+}
+
+
+# ------------------------------
+# Data: prepared once, cached
+# ------------------------------
+def dataset_path() -> pathlib.Path:
+    if COMBINED_PATH.exists():
+        return COMBINED_PATH
+    if SYNTHETIC_PATH.exists():
+        return SYNTHETIC_PATH
+    raise FileNotFoundError("❌ No dataset found! Run merge_datasets.py or generate_data.py first.")
+
+
+def prepare_matrices(max_rows: int, seed: int = 42, refresh: bool = False) -> pathlib.Path:
+    """Sample, one-hot, split, SMOTE the training part; returns the cached .npz path."""
+    src = dataset_path()
+    st = src.stat()
+    key = hashlib.sha1(f"{src.name}:{st.st_size}:{int(st.st_mtime)}:{max_rows}:{seed}".encode()).hexdigest()[:12]
+    path = CACHE_DIR / f"matrices-{key}.npz"
+    if path.exists() and not refresh:
+        return path
+
+    from imblearn.over_sampling import SMOTE
+    from sklearn.model_selection import train_test_split
+
+    df = pd.read_csv(src)
+    if len(df) > max_rows:
+        df = df.sample(n=max_rows, random_state=seed)
+    y = df["is_fraud"].to_numpy()
+    raw = df.drop("is_fraud", axis=1)
+    X = pd.get_dummies(raw)
+    idx_train, idx_test = train_test_split(np.arange(len(X)), test_size=0.2, stratify=y, random_state=seed)
+    X_res, y_res = SMOTE(random_state=seed).fit_resample(X.iloc[idx_train], y[idx_train])
+
+    CACHE_DIR.mkdir(parents=True, exist_ok=True)
+    tmp = path.with_suffix(".tmp.npz")
+    np.savez(
+        tmp,
+        X_train=X_res.to_numpy(dtype=np.float64), y_train=np.asarray(y_res),
+        X_test=X.iloc[idx_test].to_numpy(dtype=np.float64), y_test=y[idx_test],
+        features=np.asarray(X.columns, dtype=str),
+        test_raw=raw.iloc[idx_test].to_json(orient="records"),
+        source=str(src),
+    )
+    os.replace(tmp, path)
+    return path
+
+
+def load_matrices(path: pathlib.Path) -> Dict[str, Any]:
+    with np.load(path, allow_pickle=False) as z:
+        return {k: z[k] for k in z.files}
+
+
+# ------------------------------
+# Candidates
+# ------------------------------
+def build_model(model: str, params: Dict[str, Any], n_jobs: int = 1):
+    """Same pipeline shape as train_models.py (scaler + classifier)."""
+    from sklearn.pipeline import Pipeline
+    from sklearn.preprocessing import StandardScaler
+
+    if model == "rf":
+        from sklearn.ensemble import RandomForestClassifier
+        clf = RandomForestClassifier(random_state=42, n_jobs=n_jobs, **params)
+    elif model == "xgb":
+        from xgboost import XGBClassifier
+        clf = XGBClassifier(
+            subsample=0.8, colsample_bytree=0.8, eval_metric="logloss",
+            random_state=42, n_jobs=n_jobs, **params,
+        )
+    else:
+        raise ValueError(f"unknown model {model!r}")
+    return Pipeline([("scaler", StandardScaler(with_mean=False)), ("clf", clf)])
+
+
+def grid(space: Dict[str, List[Any]]) -> List[Dict[str, Any]]:
+    keys = sorted(space)
+    return [dict(zip(keys, values)) for values in itertools.product(*(space[k] for k in keys))]
+
+
+def candidate_key(model: str, params: Dict[str, Any], fraction: float, data_key: str) -> str:
+    doc = json.dumps({"m": model, "p": params, "f": round(fraction, 6), "d": data_key}, sort_keys=True)
+    return hashlib.sha1(doc.encode()).hexdigest()[:16]
+
+
+# ------------------------------
+# Evaluation
+# ------------------------------
+def recall_at_fpr(y_true: np.ndarray, scores: np.ndarray, max_fpr: float) -> float:
+    from sklearn.metrics import roc_curve
+    fpr, tpr, _ = roc_curve(y_true, scores)
+    ok = fpr <= max_fpr
+    return float(tpr[ok].max()) if ok.any() else 0.0
+
+
+def single_row_latency(model, name: str, X_test: np.ndarray, features: List[str], n: int = 200) -> Dict[str, float]:
+    """Per-row scoring latency through the production path (explain scorers when supported)."""
+    from app.ml import explain
+
+    rows = [pd.DataFrame(X_test[i:i + 1], columns=features) for i in range(min(n, len(X_test)))]
+    if explain.supports(model):
+        scorer = explain.rf_scores if name == "rf" else explain.xgb_scores
+        score = lambda df: scorer(model, df)
+    else:
+        score = lambda df: model.predict_proba(df)
+    for df in rows[:10]:
+        score(df)
+    samples = []
+    for df in rows:
+        t0 = time.perf_counter()
+        score(df)
+        samples.append(time.perf_counter() - t0)
+    arr = np.asarray(samples) * 1000.0
+    return {"p50_ms": float(np.percentile(arr, 50)), "p99_ms": float(np.percentile(arr, 99))}
+
+
+def evaluate(model, name: str, data: Dict[str, Any], max_fpr: float) -> Dict[str, float]:
+    from sklearn.metrics import average_precision_score, roc_auc_score
+
+    features = [str(f) for f in data["features"]]
+    X_test = pd.DataFrame(data["X_test"], columns=features)
+    scores = model.predict_proba(X_test)[:, 1]
+    y = data["y_test"]
+    return {
+        "pr_auc": float(average_precision_score(y, scores)),
+        "roc_auc": float(roc_auc_score(y, scores)),
+        "recall_at_fpr": recall_at_fpr(y, scores, max_fpr),
+        **single_row_latency(model, name, data["X_test"], features),
+    }
+
+
+def run_candidate(task: Dict[str, Any]) -> Dict[str, Any]:
+    """Process-pool entry point: fit one candidate on a fraction of the cached training set."""
+    data = load_matrices(pathlib.Path(task["data"]))
+    features = [str(f) for f in data["features"]]
+    X, y = data["X_train"], data["y_train"]
+    if task["fraction"] < 1.0:
+        rng = np.random.default_rng(42)
+        idx = rng.choice(len(X), max(int(len(X) * task["fraction"]), 100), replace=False)
+        X, y = X[idx], y[idx]
+    model = build_model(task["model"], task["params"])
+    t0 = time.perf_counter()
+    model.fit(pd.DataFrame(X, columns=features), y)
+    fit_s = time.perf_counter() - t0
+    metrics = evaluate(model, task["model"], data, task["max_fpr"])
+    return {**{k: task[k] for k in ("key", "model", "params", "fraction", "rung")}, "fit_s": fit_s, "metrics": metrics}
+
+
+# ------------------------------
+# Search driver
+# ------------------------------
+def load_log(path: pathlib.Path) -> Dict[str, Dict[str, Any]]:
+    done = {}
+    if path.exists():
+        for line in path.read_text(encoding="utf-8").splitlines():
+            try:
+                rec = json.loads(line)
+            except json.JSONDecodeError:
+                continue  # torn last line from an interrupted run
+            done[rec["key"]] = rec
+    return done
+
+
+def rank_key(rec: Dict[str, Any], budget_ms: float) -> Tuple:
+    m = rec["metrics"]
+    feasible = m["p99_ms"] <= budget_ms
+    return (feasible, m["pr_auc"], m["recall_at_fpr"], -m["p99_ms"])
+
+
+def run_tasks(tasks: List[Dict[str, Any]], done: Dict[str, Dict[str, Any]], log: pathlib.Path, workers: int) -> List[Dict[str, Any]]:
+    results = [done[t["key"]] for t in tasks if t["key"] in done]
+    todo = [t for t in tasks if t["key"] not in done]
+    if results:
+        print(f"↩️  {len(results)} candidates already in {log.name}, {len(todo)} to run")
+    if not todo:
+        return results
+    with ProcessPoolExecutor(max_workers=workers) as pool, open(log, "a", encoding="utf-8") as out:
+        futures = {pool.submit(run_candidate, t): t for t in todo}
+        for fut in as_completed(futures):
+            rec = fut.result()
+            out.write(json.dumps(rec, sort_keys=True) + "\n")
+            out.flush()
+            done[rec["key"]] = rec
+            results.append(rec)
+            m = rec["metrics"]
+            print(f"   {rec['model']:<4} {json.dumps(rec['params'], sort_keys=True):<60} f={rec['fraction']:.2f} "
+                  f"pr_auc={m['pr_auc']:.4f} recall@fpr={m['recall_at_fpr']:.4f} p99={m['p99_ms']:.2f}ms")
+    return results
+
+
+def search(
+    model: str, space: Dict[str, List[Any]], data_path: pathlib.Path, log: pathlib.Path, *,
+    strategy: str, eta: int, min_fraction: float, max_fpr: float, budget_ms: float, workers: int,
+) -> List[Dict[str, Any]]:
+    data_key = data_path.stem
+    done = load_log(log)
+    candidates = grid(space)
+
+    def tasks_for(params_list, fraction, rung):
+        return [{
+            "key": candidate_key(model, p, fraction, data_key), "model": model, "params": p,
+            "fraction": fraction, "rung": rung, "data": str(data_path), "max_fpr": max_fpr,
+        } for p in params_list]
+
+    if strategy == "grid":
+        return run_tasks(tasks_for(candidates, 1.0, 0), done, log, workers)
+
+    # successive halving over training-set size
+    rungs = max(int(np.ceil(np.log(1.0 / min_fraction) / np.log(eta))), 0)
+    survivors = candidates
+    results: List[Dict[str, Any]] = []
+    for rung in range(rungs + 1):
+        fraction = min(1.0, min_fraction * eta ** rung)
+        print(f"\n🪜 {model} rung {rung}: {len(survivors)} candidates on {fraction:.0%} of training rows")
+        results = run_tasks(tasks_for(survivors, fraction, rung), done, log, workers)
+        if fraction >= 1.0 or len(survivors) == 1:
+            break
+        ranked = sorted(results, key=lambda r: rank_key(r, budget_ms), reverse=True)
+        survivors = [r["params"] for r in ranked[:max(1, len(ranked) // eta)]]
+    return results
+
+
+def save_best(best: Dict[str, Dict[str, Any]], data_path: pathlib.Path) -> None:
+    import joblib
+    from app.ml.drift import REFERENCE_PATH, build_reference, save_reference
+
+    data = load_matrices(data_path)
+    features = [str(f) for f in data["features"]]
+    X = pd.DataFrame(data["X_train"], columns=features)
+    X_test = pd.DataFrame(data["X_test"], columns=features)
+    fitted = {}
+    for name, rec in best.items():
+        model = build_model(name, rec["params"], n_jobs=-1)
+        model.fit(X, data["y_train"])
+        joblib.dump(model, ML_DIR / f"{name}_model.joblib")
+        fitted[name] = model
+        print(f"✅ {name}_model.joblib <- {json.dumps(rec['params'], sort_keys=True)}")
+    if set(fitted) == {"rf", "xgb"}:
+        raw = pd.read_json(str(data["test_raw"]), orient="records")
+        save_reference(build_reference(
+            raw, fitted["rf"].predict_proba(X_test)[:, 1], fitted["xgb"].predict_proba(X_test)[:, 1],
+            source=str(data["source"]),
+        ), REFERENCE_PATH)
+        print(f"✅ Drift reference saved to {REFERENCE_PATH}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--fast", action="store_true", help=f"cap the dataset at {MAX_ROWS_FAST} rows")
+    parser.add_argument("--models", default="rf,xgb")
+    parser.add_argument("--space", default=None, help="JSON file overriding the search spaces ({model: {param: [values]}})")
+    parser.add_argument("--strategy", choices=["grid", "halving"], default="halving")
+    parser.add_argument("--eta", type=int, default=3, help="halving factor")
+    parser.add_argument("--min-fraction", type=float, default=0.1, help="training fraction of the first rung")
+    parser.add_argument("--max-fpr", type=float, default=0.01, help="FPR at which recall is reported")
+    parser.add_argument("--latency-budget-ms", type=float, default=5.0, help="single-row p99 budget")
+    parser.add_argument("--workers", type=int, default=max(1, (os.cpu_count() or 2) - 1))
+    parser.add_argument("--log", default=None, help="results JSONL (default: app/ml/.cache/search-<data>.jsonl)")
+    parser.add_argument("--refresh-data", action="store_true", help="rebuild the cached matrices")
+    parser.add_argument("--save-best", action="store_true", help="refit winners on all training rows and save them")
+    args = parser.parse_args()
+
+    spaces = dict(SPACES)
+    if args.space:
+        spaces.update(json.loads(pathlib.Path(args.space).read_text(encoding="utf-8")))
+
+    data_path = prepare_matrices(MAX_ROWS_FAST if args.fast else MAX_ROWS_FULL, refresh=args.refresh_data)
+    log = pathlib.Path(args.log) if args.log else CACHE_DIR / f"search-{data_path.stem}.jsonl"
+    print(f"📂 matrices: {data_path}\n📝 log: {log}")
+
+    best = {}
+    for model in [m.strip() for m in args.models.split(",") if m.strip()]:
+        results = search(
+            model, spaces[model], data_path, log,
+            strategy=args.strategy, eta=args.eta, min_fraction=args.min_fraction,
+            max_fpr=args.max_fpr, budget_ms=args.latency_budget_ms, workers=args.workers,
+        )
+        final = [r for r in results if r["fraction"] >= 1.0] or results
+        ranked = sorted(final, key=lambda r: rank_key(r, args.latency_budget_ms), reverse=True)
+        best[model] = ranked[0]
+        print(f"\n🏆 {model} (p99 budget {args.latency_budget_ms} ms, recall at FPR {args.max_fpr}):")
+        for r in ranked[:5]:
+            m = r["metrics"]
+            flag = "" if m["p99_ms"] <= args.latency_budget_ms else "  (over budget)"
+            print(f"   pr_auc={m['pr_auc']:.4f} recall@fpr={m['recall_at_fpr']:.4f} "
+                  f"p50={m['p50_ms']:.2f}ms p99={m['p99_ms']:.2f}ms {json.dumps(r['params'], sort_keys=True)}{flag}")
+
+    if args.save_best:
+        save_best(best, data_path)
+
+
+if __name__ == "__main__":
+    main()
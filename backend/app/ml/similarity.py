@@ -0,0 +1,373 @@
+# backend/app/ml/similarity.py
+"""
+Nearest historical transactions for analysts (/api/transactions/{id}/similar).
+
+Vectors are the RF model's encoded features: the same columns
+preprocess_row() produces (amount, device_risk_score, one-hot location).
+Amount is log1p-scaled and the numeric columns are standardised with the
+statistics of the first build, so one unit of distance means the same
+thing on every axis. SIMILAR_VELOCITY=1 appends two more numeric
+columns: the user's transaction count over the previous hour and day.
+
+The index is IVF-style:
+- k-means centroids (up to SIMILAR_MAX_LISTS) trained on a sample
+- every row lives in the inverted list of its nearest centroid
+- a query scans the SIMILAR_NPROBE closest lists only
+
+Vectors are stored once in arrival order (float32). The lists hold int32
+row positions. A stored transaction is found by binary search over a
+sorted (id, position) copy. Rows that arrive out of id order wait in a
+small unsorted tail, which is merged in once it grows.
+
+build() loads the whole table from every engine it is given (the
+shards, in shard order). refresh() then tails each one every
+SIMILAR_REFRESH_SECONDS, so each worker picks up rows written by any
+worker. IDs are allocated at insert but rows become visible at commit,
+so a lower ID can show up after a higher one. Each refresh therefore
+re-reads the last SIMILAR_RESCAN_IDS IDs below the highest one indexed
+from that engine, and skips rows already indexed. Centroids are
+retrained when the index has grown 4x since training.
+
+Labels are not stored: the endpoint reads the neighbours' current
+status and verdict from the database in one query.
+"""
+import asyncio
+import logging
+import math
+import threading
+import time
+from collections import defaultdict, deque
+from datetime import datetime
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+from app.core.config import settings
+
+logger = logging.getLogger(__name__)
+
+CHUNK = 50000
+TRAIN_SAMPLE = 50000
+TRAIN_MIN_ROWS = 2000  # below this a single list (exact search)
+KMEANS_ITERS = 8
+MERGE_MIN = 4096  # out-of-order rows kept unsorted until there are this many (or n / 256)
+VELOCITY_WINDOWS = (3600.0, 86400.0)
+
+_SELECT = (
+    "SELECT id, amount, location, COALESCE(device_risk_score, payload ->> '$.device_risk_score'), "
+    "COALESCE(user_external_id, payload ->> '$.user_external_id'), created_at "
+    "FROM transactions WHERE id > :after ORDER BY id"
+)
+
+
+def _timestamp(value: Any) -> float:
+    if isinstance(value, datetime):
+        return value.timestamp()
+    if value:
+        return datetime.fromisoformat(str(value)).timestamp()
+    return time.time()
+
+
+def _nearest(centroids: np.ndarray, vecs: np.ndarray) -> np.ndarray:
+    if len(centroids) == 1:
+        return np.zeros(len(vecs), dtype=np.int64)
+    return ((centroids * centroids).sum(axis=1)[None, :] - 2.0 * vecs @ centroids.T).argmin(axis=1)
+
+
+class _Grow:
+    """Append-only numpy buffer with amortised O(1) appends."""
+
+    def __init__(self, dtype, width: int = 0):
+        self.width = width
+        self.data = np.empty((64, width) if width else 64, dtype=dtype)
+        self.n = 0
+
+    def extend(self, values: np.ndarray) -> None:
+        need = self.n + len(values)
+        if need > len(self.data):
+            grown = np.empty((max(need, 2 * len(self.data)),) + self.data.shape[1:], dtype=self.data.dtype)
+            grown[:self.n] = self.data[:self.n]
+            self.data = grown
+        self.data[self.n:need] = values
+        self.n = need
+
+    def view(self) -> np.ndarray:
+        return self.data[:self.n]
+
+
+class SimilarityIndex:
+    def __init__(self, features: Sequence[str], velocity: bool = False):
+        self.features = list(features)
+        self.velocity = velocity
+        self._locations = {f[len("location_"):]: i for i, f in enumerate(self.features) if f.startswith("location_")}
+        self.numeric = [i for i, f in enumerate(self.features) if not f.startswith("location_")]
+        if velocity:
+            self.features += ["velocity_1h", "velocity_24h"]
+            self.numeric += [len(self.features) - 2, len(self.features) - 1]
+        self.dim = len(self.features)
+        self.mean = np.zeros(self.dim, dtype=np.float32)
+        self.scale = np.ones(self.dim, dtype=np.float32)
+        self._lock = threading.Lock()
+        self._vecs = _Grow(np.float32, self.dim)
+        self._ids = _Grow(np.int64)  # arrival order, parallel to _vecs
+        self._sorted_ids = _Grow(np.int64)  # ids of rows [0, _merged) in id order ...
+        self._sorted_pos = _Grow(np.int32)  # ... and their positions
+        self._merged = 0
+        self._centroids = np.zeros((1, self.dim), dtype=np.float32)
+        self._lists: List[_Grow] = [_Grow(np.int32)]
+        self._trained_at = 0
+        self._recent: Dict[str, deque] = defaultdict(deque)  # user -> timestamps (velocity)
+        self.last_ids: Dict[int, int] = {}  # source (shard) -> highest id indexed from it
+
+    def __len__(self) -> int:
+        return self._ids.n
+
+    @property
+    def last_id(self) -> int:
+        return max(self.last_ids.values(), default=0)
+
+    # ------------------------------
+    # Encoding
+    # ------------------------------
+    def encode(self, rows: Sequence[Sequence[Any]]) -> np.ndarray:
+        """(id, amount, location, device_risk_score, user, created_at) rows -> scaled vectors."""
+        out = np.zeros((len(rows), self.dim), dtype=np.float32)
+        amount_i = self.features.index("amount") if "amount" in self.features else None
+        risk_i = self.features.index("device_risk_score") if "device_risk_score" in self.features else None
+        for r, (_, amount, location, risk, user, created_at) in enumerate(rows):
+            if amount_i is not None:
+                out[r, amount_i] = math.log1p(max(float(amount or 0.0), 0.0))
+            if risk_i is not None:
+                out[r, risk_i] = float(risk or 0.0)
+            col = self._locations.get(location)
+            if col is not None:
+                out[r, col] = 1.0
+            if self.velocity:
+                out[r, -2:] = self._velocity(user, _timestamp(created_at))
+        out[:, self.numeric] = (out[:, self.numeric] - self.mean[self.numeric]) / self.scale[self.numeric]
+        return out
+
+    def _velocity(self, user: Optional[str], ts: float) -> Tuple[float, float]:
+        if not user:
+            return 0.0, 0.0
+        seen = self._recent[user]
+        while seen and seen[0] < ts - VELOCITY_WINDOWS[-1]:
+            seen.popleft()
+        last_hour = sum(1 for t in seen if t >= ts - VELOCITY_WINDOWS[0])
+        day = len(seen)
+        seen.append(ts)
+        return math.log1p(last_hour), math.log1p(day)
+
+    def fit_scaling(self, rows: Sequence[Sequence[Any]]) -> None:
+        """Standardise numeric columns with the first batch's statistics."""
+        recent = self._recent
+        self._recent = defaultdict(deque)
+        raw = self.encode(rows)
+        self._recent = recent
+        cols = self.numeric
+        self.mean[cols] = raw[:, cols].mean(axis=0)
+        self.scale[cols] = np.maximum(raw[:, cols].std(axis=0), 1e-6)
+
+    # ------------------------------
+    # IVF maintenance
+    # ------------------------------
+    def _assign(self, vecs: np.ndarray) -> np.ndarray:
+        return _nearest(self._centroids, vecs)
+
+    def _locate(self, ids: np.ndarray) -> np.ndarray:
+        """Row positions of ids, -1 where not indexed (caller holds the lock)."""
+        out = np.full(len(ids), -1, dtype=np.int64)
+        keys = self._sorted_ids.view()
+        if len(keys):
+            i = np.minimum(np.searchsorted(keys, ids), len(keys) - 1)
+            hit = keys[i] == ids
+            out[hit] = self._sorted_pos.view()[i[hit]]
+        tail = self._ids.data[self._merged:self._ids.n]
+        miss = np.flatnonzero(out < 0)
+        if len(tail) and len(miss):
+            order = np.argsort(tail, kind="stable")
+            i = np.minimum(np.searchsorted(tail[order], ids[miss]), len(tail) - 1)
+            hit = tail[order[i]] == ids[miss]
+            out[miss[hit]] = self._merged + order[i[hit]]
+        return out
+
+    def _merge(self) -> None:
+        """Fold rows [_merged, n) into the sorted lookup (caller holds the lock)."""
+        n = self._ids.n
+        ids = self._ids.data[self._merged:n]
+        positions = np.arange(self._merged, n, dtype=np.int32)
+        keys = self._sorted_ids.view()
+        if len(ids) > 1 and (ids[1:] < ids[:-1]).any():
+            order = np.argsort(ids, kind="stable")
+            ids, positions = ids[order], positions[order]
+        if not len(keys) or ids[0] > keys[-1]:
+            self._sorted_ids.extend(ids)
+            self._sorted_pos.extend(positions)
+        else:
+            at = np.searchsorted(keys, ids)
+            merged_ids, merged_pos = _Grow(np.int64), _Grow(np.int32)
+            merged_ids.extend(np.insert(keys, at, ids))
+            merged_pos.extend(np.insert(self._sorted_pos.view(), at, positions))
+            self._sorted_ids, self._sorted_pos = merged_ids, merged_pos
+        self._merged = n
+
+    def add(self, rows: Sequence[Sequence[Any]], source: int = 0) -> int:
+        """Index rows not indexed yet; returns how many were added."""
+        if not rows:
+            return 0
+        ids = np.fromiter((r[0] for r in rows), dtype=np.int64, count=len(rows))
+        with self._lock:
+            self.last_ids[source] = max(self.last_ids.get(source, 0), int(ids.max()))
+            new = self._locate(ids) < 0
+        if not new.all():
+            rows = [r for r, keep in zip(rows, new) if keep]
+            ids = ids[new]
+            if not rows:
+                return 0
+        vecs = self.encode(rows)
+        with self._lock:
+            start = self._vecs.n
+            self._vecs.extend(vecs)
+            self._ids.extend(ids)
+            lists = self._assign(vecs)
+            positions = np.arange(start, start + len(rows), dtype=np.int32)
+            for li in np.unique(lists):
+                self._lists[li].extend(positions[lists == li])
+            n = self._vecs.n
+            keys = self._sorted_ids.view()
+            in_order = self._merged == start and (not len(keys) or ids[0] > keys[-1])
+            if in_order or n - self._merged >= max(MERGE_MIN, self._merged >> 8):
+                self._merge()
+        if n >= TRAIN_MIN_ROWS and n >= 4 * max(self._trained_at, TRAIN_MIN_ROWS // 4):
+            self.train()
+        return len(rows)
+
+    def train(self) -> None:
+        """k-means on a sample, then re-bucket every row (runs in a worker thread; queries keep the old lists)."""
+        with self._lock:
+            n = self._vecs.n
+            vecs = self._vecs.data[:n]  # rows < n never change, even if the buffer is reallocated
+        nlist = int(min(settings.similar_max_lists, max(1, round(math.sqrt(n)))))
+        rng = np.random.default_rng(0)
+        sample = vecs[rng.choice(n, size=min(n, TRAIN_SAMPLE), replace=False)]
+        centroids = sample[rng.choice(len(sample), size=nlist, replace=False)].copy()
+        for _ in range(KMEANS_ITERS):
+            labels = ((centroids * centroids).sum(axis=1)[None, :] - 2.0 * sample @ centroids.T).argmin(axis=1)
+            for k in range(nlist):
+                members = sample[labels == k]
+                if len(members):
+                    centroids[k] = members.mean(axis=0)
+        lists = np.concatenate([_nearest(centroids, vecs[i:i + CHUNK]) for i in range(0, n, CHUNK)])
+        order = np.argsort(lists, kind="stable").astype(np.int32)
+        bounds = np.searchsorted(lists[order], np.arange(nlist + 1))
+        buckets = []
+        for k in range(nlist):
+            g = _Grow(np.int32)
+            g.extend(order[bounds[k]:bounds[k + 1]])
+            buckets.append(g)
+        with self._lock:
+            # rows added while training
+            extra = self._vecs.data[n:self._vecs.n]
+            for offset, li in enumerate(_nearest(centroids, extra)):
+                buckets[li].extend(np.array([n + offset], dtype=np.int32))
+            self._centroids, self._lists, self._trained_at = centroids, buckets, self._vecs.n
+        logger.info("Similarity index: %d rows in %d lists", self._trained_at, nlist)
+
+    # ------------------------------
+    # Queries
+    # ------------------------------
+    def vector_of(self, txn_id: int) -> Optional[np.ndarray]:
+        with self._lock:
+            i = int(self._locate(np.array([txn_id], dtype=np.int64))[0])
+            if i >= 0:
+                return self._vecs.data[i].copy()
+        return None
+
+    def search(self, query: np.ndarray, k: int = 10, nprobe: int = 8, exclude: Optional[int] = None) -> List[Tuple[int, float]]:
+        with self._lock:
+            c = self._centroids
+            probe = min(nprobe, len(c))
+            near = np.argpartition(((c - query) ** 2).sum(axis=1), probe - 1)[:probe]
+            positions = np.concatenate([self._lists[li].view() for li in near])
+            if not len(positions):
+                return []
+            vecs = self._vecs.data[positions]
+            ids = self._ids.data[positions]
+        dist = ((vecs - query) ** 2).sum(axis=1)
+        if exclude is not None:
+            dist[ids == exclude] = np.inf
+        top = min(k, len(dist))
+        best = np.argpartition(dist, top - 1)[:top]
+        best = best[np.argsort(dist[best])]
+        return [(int(ids[i]), float(math.sqrt(dist[i]))) for i in best if np.isfinite(dist[i])]
+
+    def summary(self) -> Dict[str, Any]:
+        return {
+            "rows": len(self),
+            "lists": len(self._lists),
+            "trained_rows": self._trained_at,
+            "last_id": self.last_id,
+            "last_ids": {str(k): v for k, v in sorted(self.last_ids.items())},
+            "features": self.features,
+            "bytes": int(self._vecs.n * self.dim * 4 + self._ids.n * 8 + self._sorted_ids.n * 12
+                         + sum(g.n for g in self._lists) * 4),
+        }
+
+
+# ------------------------------
+# Process-wide index, built at startup and tailed in the background
+# ------------------------------
+index: Optional[SimilarityIndex] = None
+_refresh_lock = asyncio.Lock()
+
+
+async def _tail(engines: Sequence[Any], idx: SimilarityIndex) -> int:
+    from sqlalchemy import text
+
+    n = 0
+    for source, engine in enumerate(engines):
+        # rows below the last id may still commit: re-read a window, add() skips the ones already indexed
+        last = idx.last_ids.get(source, 0)
+        after = max(0, last - settings.similar_rescan_ids) if last else 0
+        async with engine.connect() as conn:
+            result = await conn.stream(text(_SELECT), {"after": after})
+            async for rows in result.partitions(CHUNK):
+                rows = [tuple(r) for r in rows]
+                if not len(idx) and not idx._trained_at:
+                    idx.fit_scaling(rows)
+                n += await asyncio.to_thread(idx.add, rows, source)
+    return n
+
+
+async def build(engines: Sequence[Any]) -> Dict[str, Any]:
+    """Fresh index over the whole table on every engine (shard order); swapped in when complete."""
+    global index
+    from app.ml import predictor
+
+    t0 = time.perf_counter()
+    rf, _ = await asyncio.to_thread(predictor.load_models)
+    fresh = SimilarityIndex(predictor.get_feature_names(rf), velocity=settings.similar_velocity)
+    async with _refresh_lock:
+        n = await _tail(engines, fresh)
+        if n and not fresh._trained_at:
+            await asyncio.to_thread(fresh.train)
+        index = fresh
+    logger.info("Similarity index built from %d transactions in %.2fs", n, time.perf_counter() - t0)
+    return fresh.summary()
+
+
+async def refresh(engines: Sequence[Any]) -> int:
+    """Index rows added since the last build / refresh (same engines, same order as build())."""
+    if index is None:
+        return 0
+    async with _refresh_lock:
+        return await _tail(engines, index)
+
+
+async def refresh_loop(engines: Sequence[Any], interval_s: float) -> None:
+    while True:
+        await asyncio.sleep(interval_s)
+        try:
+            await refresh(engines)
+        except Exception:
+            logger.exception("Similarity index refresh failed")
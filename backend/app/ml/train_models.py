@@ -2,6 +2,8 @@
 import pandas as pd
 import joblib
 import os
+import sys
+import pathlib
 import argparse
 from sklearn.model_selection import train_test_split
 from sklearn.preprocessing import StandardScaler
@@ -11,11 +13,17 @@ from imblearn.over_sampling import SMOTE
 from xgboost import XGBClassifier
 import numpy as np
 
+# make `app` importable when run as `python backend/app/ml/train_models.py`
+sys.path.insert(0, str(pathlib.Path(__file__).resolve().parents[2]))
+from app.ml.drift import REFERENCE_PATH, build_reference, save_reference
+from app.ml import distill
+
 # ==============================
 # Parse arguments
 # ==============================
 parser = argparse.ArgumentParser()
 parser.add_argument("--fast", action="store_true", help="Use small subset (20k rows) for quick testing")
+parser.add_argument("--no-distill", action="store_true", help="Skip the distilled fast-tier model")
 args = parser.parse_args()
 
 # ==============================
@@ -108,3 +116,36 @@ joblib.dump(rf, f"{MODEL_DIR}/rf_model.joblib")
 joblib.dump(xgb, f"{MODEL_DIR}/xgb_model.joblib")
 
 print("✅ Models trained and saved to rf_model.joblib and xgb_model.joblib")
+
+# ==============================
+# Drift reference (held-out rows, real class balance)
+# ==============================
+reference = build_reference(
+    df.loc[X_test.index],
+    rf.predict_proba(X_test)[:, 1],
+    xgb.predict_proba(X_test)[:, 1],
+    source=DATA_PATH,
+)
+save_reference(reference, REFERENCE_PATH)
+print(f"✅ Drift reference saved to {REFERENCE_PATH}")
+
+# ==============================
+# Fast tier: distill the ensemble consensus (real class balance, no SMOTE)
+# ==============================
+if not args.no_distill:
+    raw_train = df.loc[X_train.index]
+    teacher = distill.teacher_verdicts(
+        raw_train,
+        rf.predict_proba(X_train)[:, 1],
+        xgb.predict_proba(X_train)[:, 1],
+    )
+    fast = distill.distill(raw_train, teacher)
+    joblib.dump(fast, distill.FAST_PATH)
+    print(f"✅ Fast-tier model saved to {distill.FAST_PATH}")
+
+    tradeoff = distill.report(fast, df.loc[X_test.index], y_test, rf, xgb, X_test)
+    print(f"\n📊 Held-out rows: {tradeoff['rows']}, fast agrees with the ensemble on {tradeoff['agreement']:.2%}")
+    print(f"   {'tier':<10}{'PR-AUC':>8}{'prec':>8}{'recall':>8}{'p50 ms':>9}{'p99 ms':>9}")
+    for tier in ("ensemble", "fast"):
+        m = tradeoff[tier]
+        print(f"   {tier:<10}{m['pr_auc']:>8.4f}{m['precision']:>8.4f}{m['recall']:>8.4f}{m['p50_ms']:>9.3f}{m['p99_ms']:>9.3f}")
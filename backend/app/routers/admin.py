@@ -0,0 +1,133 @@
+# backend/app/routers/admin.py
+import asyncio
+from fastapi import APIRouter, Depends, HTTPException, Query
+from fastapi.responses import PlainTextResponse
+from app.core import profiler, startup
+from app.core.security import require_admin
+
+router = APIRouter(prefix="/admin", tags=["admin"], dependencies=[Depends(require_admin)])
+
+
+# ------------------------------
+# Sampling CPU profile of this worker
+# ------------------------------
+@router.get("/profile")
+async def profile(
+    seconds: float = Query(10.0, gt=0, le=profiler.MAX_DURATION_S),
+    interval_ms: float = Query(10.0, ge=profiler.MIN_INTERVAL_S * 1000, le=1000),
+    format: str = Query("collapsed", pattern="^(collapsed|speedscope)$"),
+    idle: bool = Query(False, description="keep samples of parked threads (selector/queue waits)"),
+):
+    interval = interval_ms / 1000.0
+    try:
+        # sample from a worker thread so the event loop keeps serving (and gets sampled)
+        stacks, ticks = await asyncio.to_thread(profiler.sample_stacks, seconds, interval, idle)
+    except profiler.ProfilerBusy as exc:
+        raise HTTPException(status_code=409, detail=str(exc))
+
+    if format == "speedscope":
+        return profiler.to_speedscope(stacks, interval)
+    return PlainTextResponse(
+        profiler.to_collapsed(stacks),
+        headers={
+            "Content-Disposition": 'attachment; filename="profile.collapsed"',
+            "X-Profile-Ticks": str(ticks),
+        },
+    )
+
+
+# ------------------------------
+# Drift monitor control
+# ------------------------------
+@router.post("/drift/reset")
+async def drift_reset():
+    from app.ml import drift
+    drift.monitor.reset()
+    return {"status": "reset"}
+
+
+@router.post("/drift/reload-reference")
+async def drift_reload_reference():
+    from app.ml import drift
+    drift.monitor.reload_reference()
+    return {"status": "reloaded", "reference": drift.monitor.reference is not None}
+
+
+# ------------------------------
+# Fraud-ring graph
+# ------------------------------
+@router.post("/graph/rebuild")
+async def graph_rebuild():
+    from app.db import sharding
+    from app.ml import graph
+    return await graph.rebuild(sharding.engines())
+
+
+# ------------------------------
+# Entity block / allow lists
+# ------------------------------
+@router.get("/lists")
+async def lists_summary():
+    from app.ml import entity_lists
+    return entity_lists.current().summary()
+
+
+@router.post("/lists/reload")
+async def lists_reload():
+    from app.db.database import engine
+    from app.ml import entity_lists
+    return await entity_lists.reload(engine)
+
+
+# ------------------------------
+# Similar-transaction index
+# ------------------------------
+@router.get("/similar")
+async def similar_summary():
+    from app.ml import similarity
+    if similarity.index is None:
+        raise HTTPException(status_code=404, detail="Similarity index is not built")
+    return similarity.index.summary()
+
+
+@router.post("/similar/rebuild")
+async def similar_rebuild():
+    from app.db import sharding
+    from app.ml import similarity
+    await startup.ensure_warm()
+    return await similarity.build(sharding.engines())
+
+
+# ------------------------------
+# Analyst feedback / incremental XGB updates
+# ------------------------------
+@router.get("/feedback")
+async def feedback_summary():
+    from app.ml import feedback
+    state = await asyncio.to_thread(feedback.read_state)
+    pending = await asyncio.to_thread(feedback.pending_parts, state)
+    return {
+        "buffer": feedback.buffer.summary(),
+        "pending_parts": len(pending),
+        "updates": state["updates"],
+        "history": state["history"],
+    }
+
+
+@router.post("/feedback/update")
+async def feedback_update():
+    from app.ml import feedback
+    await asyncio.to_thread(feedback.buffer.flush)
+    try:
+        summary = await feedback.run_update()
+    except RuntimeError as exc:
+        raise HTTPException(status_code=500, detail=str(exc))
+    if summary["status"] == "busy":
+        raise HTTPException(status_code=409, detail="A feedback update is already running")
+    if summary["status"] == "published":
+        # this worker swaps now; the others within MODEL_RELOAD_SECONDS
+        import sys
+        predictor = sys.modules.get("app.ml.predictor")
+        if predictor is not None:
+            await asyncio.to_thread(predictor.reload_xgb_if_changed)
+    return summary
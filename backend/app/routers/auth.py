@@ -1,32 +1,18 @@
-from datetime import datetime, timedelta
 from fastapi import APIRouter, Depends, HTTPException, status
 from sqlalchemy import select
 from sqlalchemy.ext.asyncio import AsyncSession
-from passlib.context import CryptContext
-import jwt
 
 from app.db.database import get_db
 from app.db.user import User                     # SQLAlchemy model
 from app.schemas.user import UserCreate, UserLogin, UserResponse  # Pydantic schemas
-from app.core.config import settings
 from app.core.security import (
-    hash_password,
-    verify_password,
+    create_access_token,
+    hash_password_async,
+    verify_password_async,
     get_current_user,
 )
 
 router = APIRouter(prefix="/auth", tags=["auth"])
-pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
-
-
-def create_access_token(data: dict, expires_minutes: int | None = None):
-    to_encode = data.copy()
-    expire = datetime.utcnow() + timedelta(
-        minutes=expires_minutes or settings.access_token_expire_minutes
-    )
-    to_encode.update({"exp": expire})
-    encoded = jwt.encode(to_encode, settings.secret_key, algorithm="HS256")
-    return encoded
 
 
 @router.post("/signup", response_model=UserResponse)
@@ -37,7 +23,7 @@ async def signup(payload: UserCreate, db: AsyncSession = Depends(get_db)):
     if existing:
         raise HTTPException(status_code=400, detail="Email already registered")
 
-    hashed_pw = pwd_context.hash(payload.password)
+    hashed_pw = await hash_password_async(payload.password)
     new_user = User(
         name=payload.name,
         email=payload.email,
@@ -55,7 +41,7 @@ async def login(payload: UserLogin, db: AsyncSession = Depends(get_db)):
     result = await db.execute(select(User).where(User.email == payload.email))
     user = result.scalars().first()
 
-    if not user or not pwd_context.verify(payload.password, user.hashed_password):
+    if not user or not await verify_password_async(payload.password, user.hashed_password):
         raise HTTPException(status_code=401, detail="Invalid credentials")
 
     token = create_access_token({"sub": str(user.id), "email": user.email})
@@ -1,11 +1,19 @@
-from fastapi import APIRouter, Depends
+from fastapi import APIRouter, Depends, HTTPException
 from sqlalchemy import text
+from app.core.config import settings
 from app.db.database import get_session
 
 router = APIRouter(prefix="/chain", tags=["chain"])
 
 @router.get("/latest")
 async def chain_latest(db=Depends(get_session)):
+    if settings.ledger_backend != "mysql":
+        from app.ledger.segments import get_store
+        store = get_store()
+        if store.head_index < 0:
+            return {}
+        block = store.get_block(store.head_index)
+        return {k: block[k] for k in ("block_index", "block_hash", "merkle_root", "entries_count", "timestamp")}
     r = await db.execute(
         text(
             """
@@ -26,4 +34,15 @@ async def chain_latest(db=Depends(get_session)):
         "merkle_root": row[2],
         "entries_count": row[3],
         "created_at": str(row[4])
-    }
\ No newline at end of file
+    }
+
+@router.get("/proof/{tx_reference}")
+async def chain_proof(tx_reference: str):
+    """Inclusion proof for one ledger entry (segment ledger only)."""
+    if settings.ledger_backend == "mysql":
+        raise HTTPException(status_code=404, detail="Proofs require LEDGER_BACKEND=segments or both")
+    from app.ledger.segments import get_store
+    proof = get_store().proof(tx_reference)
+    if proof is None:
+        raise HTTPException(status_code=404, detail="Entry not found")
+    return proof
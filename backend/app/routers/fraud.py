@@ -1,13 +1,21 @@
 # backend/app/routers/fraud.py
-import json
-from fastapi import APIRouter, Depends, HTTPException
+import asyncio
+import logging
+from datetime import datetime
+from typing import Any, List, Literal, Optional, Sequence
+from fastapi import APIRouter, Depends, HTTPException, Query, Response
+from starlette.concurrency import run_in_threadpool
 from pydantic import BaseModel
-from sqlalchemy import text
-from app.ml.predictor import predict_models
-from app.ledger.ledger import append_block
-from app.db.database import get_session
+from app.ledger import pending
+from app.db import ops, sharding
+from app.recommendations.engine import generate_recommendations
+from app.core import admission, cache, startup, timing
+from app.core.config import settings
+from app.core.log import payload_sampled
+from app.core.security import require_role
 
 router = APIRouter(prefix="/api", tags=["fraud"])
+logger = logging.getLogger(__name__)
 
 
 # ------------------------------
@@ -28,202 +36,342 @@ class TxnIn(BaseModel):
 # Fraud Prediction Endpoint
 # ------------------------------
 @router.post("/predict")
-async def predict(txn: TxnIn, db=Depends(get_session)):
+async def predict(txn: TxnIn, response: Response):
     payload = txn.dict()
+    # past ADMISSION_STAGES thresholds: fewer steps per request, then 503 + Retry-After
+    with admission.controller.admit() as degraded:
+        # the ML stack is loaded by the background warm-up, not at import
+        await startup.ensure_warm()
 
-    # -----------------------------------
-    # 1) Normalize + One-hot location
-    # -----------------------------------
-    # 1) Debug raw payload (predictor.py will handle encoding)
-    print("🟢 Raw payload received in /predict:", payload)
-    # -----------------------------------
-    # 2) Persist transaction as before
-    # -----------------------------------
-    await db.execute(text("""
-        INSERT INTO transactions (
-            external_txn_id, amount, currency, merchant_id, device_id, location, payload
-        )
-        VALUES (:external_txn_id, :amount, :currency, :merchant_id, :device_id, :location, :payload)
-    """), {
-        "external_txn_id": payload.get("external_txn_id"),
-        "amount": payload["amount"],
-        "currency": payload.get("currency"),
-        "merchant_id": payload.get("merchant_id"),
-        "device_id": payload.get("device_id"),
-        "location": payload.get("location"),
-        "payload": json.dumps(payload)
-    })
-    await db.commit()
+        # -----------------------------------
+        # 1) Debug raw payload, sampled (predictor.py will handle encoding)
+        # -----------------------------------
+        if payload_sampled():
+            logger.debug("Raw payload received in /predict: %s", payload)
 
-    txn_row = await db.execute(text("SELECT LAST_INSERT_ID()"))
-    txn_id = txn_row.scalar() or None
+        # -----------------------------------
+        # 2) Run ML models + recommendations (no DB connection held)
+        # -----------------------------------
+        if admission.RULES_ONLY in degraded:
+            decision = score_payload(payload, degraded)  # microseconds: stays on the loop
+        else:
+            decision = await admission.controller.run(score_payload, payload, degraded)
+
+        # -----------------------------------
+        # 3) Persistence phase: the user's shard, a session checked out only now
+        # -----------------------------------
+        persisted, block_meta = await store_decisions(
+            [payload], [decision], defer_ledger=admission.LEDGER_DEFERRED in degraded
+        )
+        txn_id, user_view, entry = persisted[0]
 
     # -----------------------------------
-    # 3) Run ML models
+    # 4) Populate read caches (committed), so the dashboard's follow-up reads skip MySQL
     # -----------------------------------
-    consensus, reason_codes = predict_models(payload)
-    verdict = consensus["consensus_verdict"]
-    consensus_score = consensus["consensus_score"]
-    fraud_score = max(a["score"] for a in consensus["agents"])
+    cache_decision(txn_id, payload, decision, user_view)
 
-    # 3) Persist fraud result
-    await db.execute(text("""
-        INSERT INTO fraudresults (
-            transaction_id, verdict, fraud_score, consensus_score, reason_codes, decided_by
-        )
-        VALUES (:transaction_id, :verdict, :fraud_score, :consensus_score, :reason_codes, :decided_by)
-    """), {
+    result = {
         "transaction_id": txn_id,
+        "verdict": decision["verdict"],
+        "fraud_score": decision["fraud_score"],
+        "consensus_score": decision["consensus_score"],
+        "risk_score": entry["payload"]["risk_score"],
+        "block": block_meta,
+        "recs": decision["recs"]
+    }
+    if degraded:
+        result["degraded"] = degraded
+        response.headers[admission.DEGRADED_HEADER] = ",".join(degraded)
+    return result
+
+
+def score_payload(payload: dict, degraded: Sequence[str] = ()) -> dict:
+    """Models + recommendations for one validated payload (CPU only, no DB)."""
+    from app.ml.predictor import predict_models, predict_rules
+
+    if admission.RULES_ONLY in degraded:
+        consensus, reason_codes = predict_rules(payload)
+    else:
+        consensus, reason_codes = predict_models(payload)
+    verdict = consensus["consensus_verdict"]
+    if admission.NO_RECS in degraded:
+        recs = []
+    else:
+        with timing.stage(timing.RECS):
+            recs = generate_recommendations(verdict, {"agents": consensus.get("agents", [])})
+    if degraded:
+        reason_codes["degraded"] = list(degraded)
+    return {
         "verdict": verdict,
-        "fraud_score": fraud_score,
-        "consensus_score": consensus_score,
-        "reason_codes": json.dumps(reason_codes),
-        "decided_by": "consensus"
-    })
+        "fraud_score": max(a["score"] for a in consensus["agents"]),
+        "consensus_score": consensus["consensus_score"],
+        "reason_codes": reason_codes,
+        "recs": recs,
+        "graph_keys": consensus.get("graph_keys"),
+    }
+
+
+async def persist_decision(db, payload: dict, decision: dict):
+    """Insert the transaction and its result, update user risk; returns (txn_id, user_view, ledger entry)."""
+    txn_id = await ops.insert_transaction(db, payload)
+    await ops.insert_fraud_result(
+        db, txn_id, decision["verdict"], decision["fraud_score"], decision["consensus_score"], decision["reason_codes"]
+    )
 
-    # 4) Update user risk score (cumulative with decay)
+    # Update user risk score (cumulative with decay)
     new_risk = None
+    user_view = None
     if payload.get("user_external_id"):
-        u = await db.execute(
-            text("SELECT id, risk_score FROM users WHERE external_id=:eid"),
-            {"eid": payload["user_external_id"]}
-        )
-        row = u.first()
-        if row:
-            uid, current = row
-            new_risk = float((current or 0.0) * 0.8 + consensus_score * 0.2)
-            await db.execute(
-                text("UPDATE users SET risk_score=:rs WHERE id=:id"),
-                {"rs": new_risk, "id": uid}
-            )
-        else:
-            new_risk = consensus_score
-            await db.execute(
-                text("INSERT INTO users (external_id, risk_score) VALUES (:eid, :rs)"),
-                {"eid": payload["user_external_id"], "rs": new_risk}
-            )
-
-    # 5) Append to blockchain
-    entries = [{
+        user_view = await ops.update_user_risk(db, payload["user_external_id"], decision["consensus_score"])
+        new_risk = user_view["risk_score"]
+
+    entry = {
         "tx_reference": txn_id,
         "payload": {
             "txn_id": txn_id,
-            "verdict": verdict,
-            "fraud_score": fraud_score,
-            "consensus_score": consensus_score,
+            "verdict": decision["verdict"],
+            "fraud_score": decision["fraud_score"],
+            "consensus_score": decision["consensus_score"],
             "user_external_id": payload.get("user_external_id"),
             "risk_score": new_risk
         }
-    }]
-    block_meta = await append_block(db, entries)
+    }
+    return txn_id, user_view, entry
 
-    # 6) Update transaction status
-    await db.execute(
-        text("UPDATE transactions SET status=:status WHERE id=:id"),
-        {"status": verdict, "id": txn_id}
-    )
 
-    # 7) Generate recommendations
-    from app.recommendation.engine import generate_recommendations
-    recs = generate_recommendations(verdict, {"agents": consensus.get("agents", [])})
-    await db.execute(text("""
-        INSERT INTO recommendations (transaction_id, recs, confidence)
-        VALUES (:txid, :recs, :conf)
-    """), {
-        "txid": txn_id,
-        "recs": json.dumps(recs),
-        "conf": max((r["confidence"] for r in recs), default=0.0)
-    })
-    await db.commit()
+async def finalize_decision(db, txn_id: int, decision: dict) -> None:
+    """Final status and recommendations (none stored when they were skipped)."""
+    await ops.update_transaction_status(db, txn_id, decision["verdict"])
+    if admission.NO_RECS not in decision["reason_codes"].get("degraded", ()):
+        await ops.insert_recommendations(db, txn_id, decision["recs"], decision["reason_codes"].get("agents"))
 
-    return {
+
+def record_graph(persisted: List[Any], decisions: List[dict], positions: Sequence[int]) -> None:
+    """Count committed decisions on the fraud-ring graph (skipped for ones that failed to persist)."""
+    if not any(decisions[i].get("graph_keys") for i in positions):
+        return
+    from app.ml import graph
+    for i in positions:
+        keys = decisions[i].get("graph_keys")
+        if keys:
+            graph.rings.record(keys, decisions[i]["verdict"] == "fraud", persisted[i][0])
+
+
+async def store_decisions(payloads: List[dict], decisions: List[dict], defer_ledger: bool = False):
+    """
+    Persist decisions on their shards and their ledger entries as one block.
+    Returns ([(txn_id, user_view, entry)] in input order, block meta or None if deferred).
+    Committed decisions are then counted on the fraud-ring graph.
+
+    Each shard commits its decisions (final status and recommendations
+    included) with their ledger_pending rows in one transaction. Those rows
+    are then sealed as one block under sharding.ledger_lock
+    (app/ledger/pending.py), with no session held while waiting for it.
+    Deferred, or if the seal fails, they stay pending for the backlog, so
+    every committed decision is still sealed.
+    """
+    persisted: List[Any] = [None] * len(payloads)
+    block_meta = None
+    groups = sharding.group_by_shard(payloads)
+
+    async def one(shard: int, positions: List[int]) -> None:
+        async with sharding.session_scope(shard) as db:
+            for i in positions:
+                persisted[i] = await persist_decision(db, payloads[i], decisions[i])
+                await finalize_decision(db, persisted[i][0], decisions[i])
+            await pending.add(db, [persisted[i][2] for i in positions])
+
+    outcomes = await asyncio.gather(*(one(s, pos) for s, pos in groups.items()), return_exceptions=True)
+    # shards that did commit still get their ledger entries, even if another one failed
+    claims = {s: [persisted[i][0] for i in pos] for (s, pos), exc in zip(groups.items(), outcomes) if exc is None}
+    committed = [i for (_, pos), exc in zip(groups.items(), outcomes) if exc is None for i in pos]
+    record_graph(persisted, decisions, committed)
+    if committed and not defer_ledger:
+        try:
+            async with sharding.ledger_lock:
+                with timing.stage(timing.LEDGER):
+                    block_meta, _, _ = await pending.seal(claims)
+        except Exception:
+            logger.exception("Ledger append for %d decisions failed; deferred", len(committed))
+            defer_ledger = True
+    if defer_ledger:
+        admission.ledger_backlog.add(len(committed))
+    for exc in outcomes:
+        if exc is not None:
+            raise exc
+    return persisted, block_meta
+
+
+def cache_decision(txn_id, payload, decision, user_view):
+    """Write-time population; mirrors the shapes returned by ops.fetch_*."""
+    verdict, recs = decision["verdict"], decision["recs"]
+    # created_at is the DB server default; the app clock (UTC, like the schema's session tz) stands in
+    now = str(datetime.utcnow().replace(microsecond=0))
+    confidence = max((r["confidence"] for r in recs), default=0.0)
+    cache.transactions.set(txn_id, {
         "transaction_id": txn_id,
+        "external_txn_id": payload.get("external_txn_id"),
+        "amount": round(float(payload["amount"]), 2),
+        "currency": payload.get("currency"),
+        "status": verdict,
+        "created_at": now,
         "verdict": verdict,
-        "fraud_score": fraud_score,
-        "consensus_score": consensus_score,
-        "risk_score": new_risk,
-        "block": block_meta,
-        "recs": recs
-    }
+        "fraud_score": decision["fraud_score"],
+        "consensus_score": decision["consensus_score"],
+        "reason_codes": decision["reason_codes"],
+        "recommendations": recs,
+        "confidence": confidence,
+    })
+    if admission.NO_RECS not in decision["reason_codes"].get("degraded", ()):
+        cache.recommendations.set(txn_id, {
+            "transaction_id": txn_id,
+            "recommendations": recs,
+            "confidence": confidence,
+            "created_at": now,
+        })
+    if user_view is not None:
+        cache.user_risk.set(user_view["external_id"], {**user_view, "created_at": user_view["created_at"] or now})
 
 
 # ------------------------------
 # Fetch Recommendations by Transaction
 # ------------------------------
 @router.get("/recommendations/{txn_id}")
-async def get_recommendations(txn_id: int, db=Depends(get_session)):
-    res = await db.execute(
-        text("SELECT recs, confidence, created_at FROM recommendations WHERE transaction_id=:txid"),
-        {"txid": txn_id}
-    )
-    row = res.first()
-    if not row:
+async def get_recommendations(txn_id: int, db=Depends(sharding.get_txn_session)):
+    result = cache.recommendations.get(txn_id)
+    if result is not None:
+        return result
+    result = await ops.fetch_recommendations(db, txn_id)
+    if result is None:
         raise HTTPException(status_code=404, detail=f"No recommendations found for txn_id={txn_id}")
-
-    recs, confidence, created_at = row
-    return {
-        "transaction_id": txn_id,
-        "recommendations": json.loads(recs),
-        "confidence": confidence,
-        "created_at": str(created_at),
-    }
+    cache.recommendations.set(txn_id, result)
+    return result
 
 
 # ------------------------------
 # Fetch Transaction with Fraud Result + Recs
 # ------------------------------
 @router.get("/transactions/{txn_id}")
-async def get_transaction(txn_id: int, db=Depends(get_session)):
-    res = await db.execute(text("""
-        SELECT t.id, t.external_txn_id, t.amount, t.currency, t.status, t.created_at,
-               f.verdict, f.fraud_score, f.consensus_score, f.reason_codes,
-               r.recs, r.confidence
-        FROM transactions t
-        LEFT JOIN fraudresults f ON t.id = f.transaction_id
-        LEFT JOIN recommendations r ON t.id = r.transaction_id
-        WHERE t.id = :txid
-    """), {"txid": txn_id})
-    row = res.first()
-    if not row:
+async def get_transaction(txn_id: int, db=Depends(sharding.get_txn_session)):
+    result = cache.transactions.get(txn_id)
+    if result is not None:
+        return result
+    result = await ops.fetch_transaction(db, txn_id)
+    if result is None:
         raise HTTPException(status_code=404, detail=f"No transaction found for txn_id={txn_id}")
+    cache.transactions.set(txn_id, result)
+    return result
 
-    (
-        id, external_txn_id, amount, currency, status, created_at,
-        verdict, fraud_score, consensus_score, reason_codes,
-        recs, confidence
-    ) = row
 
+# ------------------------------
+# Analyst Review Queue (unlabelled decisions, newest first, across all shards)
+# ------------------------------
+@router.get("/queue")
+async def review_queue(
+    verdict: Literal["fraud", "legit"] = "fraud",
+    limit: int = Query(50, ge=1, le=500),
+    before: Optional[str] = Query(None, description="created_at of the last item seen (next page)"),
+    before_id: int = Query(0, description="transaction_id of the last item seen"),
+    user=Depends(require_role("admin", "analyst")),
+):
+    parts = await sharding.gather(ops.fetch_review_queue, verdict, limit, before, before_id)
+    items = sorted(
+        (row for part in parts for row in part),
+        key=lambda r: (r["created_at"], r["transaction_id"]),
+        reverse=True,
+    )[:limit]
     return {
-        "transaction_id": id,
-        "external_txn_id": external_txn_id,
-        "amount": float(amount),
-        "currency": currency,
-        "status": status,
-        "created_at": str(created_at),
         "verdict": verdict,
-        "fraud_score": fraud_score,
-        "consensus_score": consensus_score,
-        "reason_codes": json.loads(reason_codes) if reason_codes else None,
-        "recommendations": json.loads(recs) if recs else None,
-        "confidence": confidence,
+        "items": items,
+        "next": {"before": items[-1]["created_at"], "before_id": items[-1]["transaction_id"]}
+        if len(items) == limit else None,
     }
 
 
 # ------------------------------
-# Fetch User Risk Profile
+# Explain a Stored Decision (on demand, off the hot path)
 # ------------------------------
-@router.get("/users/{external_id}/risk")
-async def get_user_risk(external_id: str, db=Depends(get_session)):
-    res = await db.execute(
-        text("SELECT external_id, risk_score, created_at FROM users WHERE external_id=:eid"),
-        {"eid": external_id}
-    )
-    row = res.first()
-    if not row:
-        raise HTTPException(status_code=404, detail="User not found")
+@router.get("/transactions/{txn_id}/explain")
+async def explain_transaction(txn_id: int, db=Depends(sharding.get_txn_session)):
+    payload = await ops.fetch_transaction_payload(db, txn_id)
+    if payload is None:
+        raise HTTPException(status_code=404, detail=f"No transaction found for txn_id={txn_id}")
+    await startup.ensure_warm()
+    from app.ml.explain import explain_row
+    with timing.stage(timing.EXPLAIN):
+        explanation = await run_in_threadpool(explain_row, payload)
+    return {"transaction_id": txn_id, **explanation}
 
+
+# ------------------------------
+# Nearest Historical Transactions (analyst review)
+# ------------------------------
+@router.get("/transactions/{txn_id}/similar")
+async def similar_transactions(
+    txn_id: int,
+    k: int = Query(10, ge=1, le=100),
+    user=Depends(require_role("admin", "analyst")),
+):
+    from app.ml import similarity
+    index = similarity.index
+    if index is None:
+        raise HTTPException(status_code=503, detail="Similarity index is not built (SIMILAR_INDEX=0 or still loading)")
+    query = index.vector_of(txn_id)
+    shard = sharding.shard_for_id(txn_id)
+    if query is None and shard is not None and txn_id > index.last_ids.get(shard, 0) - settings.similar_rescan_ids:
+        await similarity.refresh(sharding.engines())
+        query = index.vector_of(txn_id)
+    if query is None:
+        raise HTTPException(status_code=404, detail=f"No transaction found for txn_id={txn_id}")
+
+    neighbors = await run_in_threadpool(index.search, query, k, settings.similar_nprobe, txn_id)
+    labels = await sharding.gather_by_id(ops.fetch_transaction_labels, [i for i, _ in neighbors])
+    similar = [{**labels[i], "distance": d} for i, d in neighbors if i in labels]
+    counts = {}
+    for row in similar:
+        counts[row["status"]] = counts.get(row["status"], 0) + 1
+    return {"transaction_id": txn_id, "labels": counts, "similar": similar}
+
+
+# ------------------------------
+# Analyst Feedback (confirmed label -> feedback_labels + training buffer)
+# ------------------------------
+class FeedbackIn(BaseModel):
+    label: Literal["fraud", "legit"]
+
+
+@router.post("/transactions/{txn_id}/feedback")
+async def transaction_feedback(
+    txn_id: int,
+    body: FeedbackIn,
+    user=Depends(require_role("admin", "analyst")),
+    db=Depends(sharding.get_txn_session),
+):
+    from app.ml import feedback
+    record = await ops.insert_feedback(db, txn_id, body.label, user.email or str(user.id))
+    if record is None:
+        raise HTTPException(status_code=404, detail=f"No decision found for txn_id={txn_id}")
+    await db.commit()
+    if feedback.buffer.add(record):
+        await run_in_threadpool(feedback.buffer.flush)
     return {
-        "external_id": row[0],
-        "risk_score": row[1],
-        "created_at": str(row[2]),
+        "transaction_id": txn_id,
+        "feedback_id": record["feedback_id"],
+        "label": body.label,
+        "model_verdict": record["model_verdict"],
     }
+
+
+# ------------------------------
+# Fetch User Risk Profile
+# ------------------------------
+@router.get("/users/{external_id}/risk")
+async def get_user_risk(external_id: str, db=Depends(sharding.get_user_session)):
+    result = cache.user_risk.get(external_id)
+    if result is not None:
+        return result
+    result = await ops.fetch_user_risk(db, external_id)
+    if result is None:
+        raise HTTPException(status_code=404, detail="User not found")
+    cache.user_risk.set(external_id, result)
+    return result
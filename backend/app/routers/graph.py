@@ -0,0 +1,40 @@
+# backend/app/routers/graph.py
+from fastapi import APIRouter, Depends, HTTPException, Query
+from app.core.security import require_role
+from app.ml import graph
+
+router = APIRouter(
+    prefix="/api/graph",
+    tags=["graph"],
+    dependencies=[Depends(require_role("admin", "analyst"))],
+)
+
+
+# ------------------------------
+# Fraud-ring components (analyst views)
+# ------------------------------
+@router.get("/summary")
+async def graph_summary():
+    return graph.rings.summary()
+
+
+@router.get("/components")
+async def risky_components(
+    limit: int = Query(20, ge=1, le=500),
+    min_users: int = Query(2, ge=1),
+):
+    return {"components": graph.rings.top(limit, min_users)}
+
+
+@router.get("/components/{kind}/{entity_id}")
+async def entity_component(
+    kind: str,
+    entity_id: str,
+    members: int = Query(100, ge=1, le=5000),
+):
+    if kind not in graph.KINDS:
+        raise HTTPException(status_code=400, detail=f"kind must be one of {', '.join(graph.KINDS)}")
+    component = graph.rings.component(kind, entity_id, members)
+    if component is None:
+        raise HTTPException(status_code=404, detail=f"{kind} {entity_id} is not in the graph")
+    return component
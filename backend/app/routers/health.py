@@ -1,15 +1,30 @@
 from fastapi import APIRouter
 from sqlalchemy import text
-from app.db.database import engine
+from app.core import admission, startup
+from app.db import sharding
 
 router = APIRouter()
 
 @router.get("/health", tags=["system"])
 async def health():
     # Verify DB connectivity and a trivial query for readiness
+    # every shard: a write can land on any of them
     try:
-        async with engine.connect() as conn:
-            await conn.execute(text("SELECT 1"))
-        return {"status": "ok", "db": "up"}
+        for shard_engine in sharding.engines():
+            async with shard_engine.connect() as conn:
+                await conn.execute(text("SELECT 1"))
+        return {"status": "ok", "db": "up", "shards": len(sharding.shards)}
     except Exception as exc:
         return {"status": "degraded", "db": f"down: {type(exc).__name__}"}
+
+
+@router.get("/health/startup", tags=["system"])
+async def startup_report():
+    # Per-phase cold-start timings (imports, schema check, model warm-up)
+    return startup.snapshot()
+
+
+@router.get("/health/admission", tags=["system"])
+async def admission_report():
+    # Overload pressure per signal and the degradation stage new requests get
+    return admission.controller.snapshot()
@@ -0,0 +1,246 @@
+# backend/app/routers/ingest.py
+"""
+Streaming ingest: POST /api/ingest with an NDJSON or msgpack body.
+
+    Content-Type: application/x-ndjson   one TxnIn object per line
+    Content-Type: application/msgpack    a stream of TxnIn maps (needs msgpack)
+
+The body is parsed as it arrives and never held whole. A reader task
+validates records and feeds them through a bounded queue, so a slow
+scorer throttles the upload instead of buffering it. Validation has a
+plain type-check fast path and only falls back to TxnIn for values
+pydantic would coerce.
+
+The response streams in the request's format:
+- one decision per record, written as soon as its micro-batch commits:
+  {"index", "external_txn_id", "transaction_id", "verdict", "fraud_score",
+  "consensus_score", "risk_score", "block_index"}
+- {"index", "error"} for records that fail validation
+- a final {"done": true, ...} summary
+
+A micro-batch closes at INGEST_BATCH_SIZE records or INGEST_BATCH_MS
+after its first record. It is scored through predict_models() in one
+threadpool hop and persisted in one session per shard it touches
+(app/db/sharding.py), with one ledger block.
+Recommendations are stored as usual but not echoed; fetch them from
+/api/recommendations/{id}.
+"""
+import asyncio
+import logging
+import time
+from typing import Any, AsyncIterator, Dict, List, Optional, Tuple
+
+from fastapi import APIRouter, HTTPException, Request
+from pydantic import ValidationError
+from starlette.concurrency import run_in_threadpool
+from starlette.requests import ClientDisconnect
+from starlette.responses import StreamingResponse
+
+from app.core import startup
+from app.core.config import settings
+from app.core.serialization import dumps_bytes, loads
+from app.routers.fraud import TxnIn, cache_decision, score_payload, store_decisions
+
+router = APIRouter(prefix="/api", tags=["ingest"])
+logger = logging.getLogger(__name__)
+
+NDJSON_TYPES = ("application/x-ndjson", "application/ndjson", "application/jsonl", "application/json-seq")
+MSGPACK_TYPES = ("application/msgpack", "application/x-msgpack", "application/vnd.msgpack")
+_END = object()
+
+
+# ------------------------------
+# Validation (fast path, TxnIn fallback)
+# ------------------------------
+_STR_FIELDS = ("external_txn_id", "user_external_id", "currency", "merchant_id", "device_id", "location")
+_DEFAULTS = {"currency": "INR", "merchant_id": None, "device_id": None, "location": None, "device_risk_score": 0.0}
+
+
+def _is_number(v: Any) -> bool:
+    return (type(v) is float or type(v) is int) and v == v
+
+
+def validate_record(obj: Any) -> Tuple[Optional[Dict[str, Any]], Optional[str]]:
+    """(payload shaped like TxnIn.dict(), None) or (None, error message)."""
+    if type(obj) is dict:
+        amount = obj.get("amount")
+        risk = obj.get("device_risk_score", 0.0)
+        if (
+            _is_number(amount)
+            and (risk is None or _is_number(risk))
+            and all(obj.get(f) is None or type(obj.get(f)) is str for f in _STR_FIELDS)
+            and "external_txn_id" in obj and "user_external_id" in obj
+        ):
+            payload = {f: obj.get(f, _DEFAULTS.get(f)) for f in _STR_FIELDS}
+            payload["amount"] = float(amount)
+            payload["device_risk_score"] = None if risk is None else float(risk)
+            return payload, None
+    try:
+        return TxnIn.model_validate(obj).model_dump(), None
+    except ValidationError as exc:
+        err = exc.errors()[0]
+        return None, f"{'.'.join(str(x) for x in err['loc']) or 'record'}: {err['msg']}"
+
+
+# ------------------------------
+# Body decoders (incremental)
+# ------------------------------
+async def _ndjson_records(chunks: AsyncIterator[bytes]) -> AsyncIterator[Tuple[Any, Optional[str]]]:
+    """Yields (object, None) per line, or (None, error) for lines that don't decode."""
+    limit = settings.ingest_max_record_bytes
+    buf = bytearray()
+    skipping = False  # inside an oversized line, drop bytes until its newline
+    async for chunk in chunks:
+        buf += chunk
+        start = 0
+        while True:
+            nl = buf.find(b"\n", start)
+            if nl < 0:
+                break
+            line = bytes(buf[start:nl]).strip()
+            start = nl + 1
+            if skipping:
+                skipping = False
+                continue
+            if line:
+                yield _decode_line(line)
+        del buf[:start]
+        if len(buf) > limit:
+            if not skipping:
+                yield None, f"record exceeds {limit} bytes"
+            skipping = True
+            buf.clear()
+    line = bytes(buf).strip()
+    if line and not skipping:
+        yield _decode_line(line)
+
+
+def _decode_line(line: bytes) -> Tuple[Any, Optional[str]]:
+    try:
+        return loads(line), None
+    except ValueError as exc:
+        return None, f"invalid JSON: {str(exc)[:80]}"
+
+
+async def _msgpack_records(chunks: AsyncIterator[bytes]) -> AsyncIterator[Tuple[Any, Optional[str]]]:
+    import msgpack
+
+    unpacker = msgpack.Unpacker(raw=False, max_buffer_size=settings.ingest_max_record_bytes + 65536)
+    async for chunk in chunks:
+        try:
+            unpacker.feed(chunk)
+        except msgpack.BufferFull:
+            yield None, f"record exceeds {settings.ingest_max_record_bytes} bytes"
+            return
+        try:
+            for obj in unpacker:
+                yield obj, None
+        except (msgpack.ExtraData, msgpack.FormatError, msgpack.StackError, ValueError) as exc:
+            yield None, f"invalid msgpack: {exc}"
+            return
+
+
+# ------------------------------
+# Micro-batch scoring + persistence
+# ------------------------------
+async def _process_batch(batch: List[Tuple[int, Dict[str, Any]]]) -> List[Dict[str, Any]]:
+    payloads = [p for _, p in batch]
+    decisions = await run_in_threadpool(lambda: [score_payload(p) for p in payloads])
+    # one unit of work per shard the batch touches; one ledger block for the batch
+    persisted, block_meta = await store_decisions(payloads, decisions)
+    out = []
+    for (index, payload), decision, (txn_id, user_view, entry) in zip(batch, decisions, persisted):
+        cache_decision(txn_id, payload, decision, user_view)
+        out.append({
+            "index": index,
+            "external_txn_id": payload.get("external_txn_id"),
+            "transaction_id": txn_id,
+            "verdict": decision["verdict"],
+            "fraud_score": decision["fraud_score"],
+            "consensus_score": decision["consensus_score"],
+            "risk_score": entry["payload"]["risk_score"],
+            "block_index": block_meta["block_index"] if block_meta else None,
+        })
+    return out
+
+
+class _DuplexResponse(StreamingResponse):
+    """
+    StreamingResponse without the disconnect listener: that listener calls
+    receive() and would swallow request body chunks still being read.
+    A disconnect surfaces as ClientDisconnect in the body reader instead.
+    """
+
+    async def __call__(self, scope, receive, send) -> None:
+        await self.stream_response(send)
+
+
+@router.post("/ingest")
+async def ingest(request: Request):
+    ctype = request.headers.get("content-type", "").split(";")[0].strip().lower()
+    if ctype in MSGPACK_TYPES:
+        try:
+            import msgpack
+        except ImportError:  # optional dependency
+            raise HTTPException(status_code=415, detail="msgpack bodies need the msgpack package")
+        decode, encode, media_type = _msgpack_records, msgpack.packb, "application/msgpack"
+    elif ctype in NDJSON_TYPES:
+        decode, encode, media_type = _ndjson_records, (lambda o: dumps_bytes(o) + b"\n"), "application/x-ndjson"
+    else:
+        raise HTTPException(status_code=415, detail=f"Use one of {', '.join(NDJSON_TYPES + MSGPACK_TYPES)}")
+
+    await startup.ensure_warm()
+    batch_size = max(1, settings.ingest_batch_size)
+    queue: asyncio.Queue = asyncio.Queue(maxsize=batch_size * 4)
+    counts = {"records": 0, "accepted": 0, "rejected": 0}
+
+    async def reader() -> None:
+        index = 0
+        try:
+            async for obj, error in decode(request.stream()):
+                payload = None
+                if error is None:
+                    payload, error = validate_record(obj)
+                await queue.put((index, payload, error))
+                index += 1
+        except ClientDisconnect:
+            logger.info("Ingest client disconnected after %d records", index)
+        except Exception:
+            logger.exception("Ingest body reader failed after %d records", index)
+        await queue.put(_END)
+
+    async def results() -> AsyncIterator[bytes]:
+        task = asyncio.create_task(reader())
+        batch: List[Tuple[int, Dict[str, Any]]] = []
+        deadline = 0.0
+        try:
+            while True:
+                timeout = max(deadline - time.monotonic(), 0.0) if batch else None
+                try:
+                    item = await asyncio.wait_for(queue.get(), timeout)
+                except asyncio.TimeoutError:
+                    item = None
+                if item is not None and item is not _END:
+                    index, payload, error = item
+                    counts["records"] += 1
+                    if error is not None:
+                        counts["rejected"] += 1
+                        yield encode({"index": index, "error": error})
+                        continue
+                    if not batch:
+                        deadline = time.monotonic() + settings.ingest_batch_ms / 1000.0
+                    batch.append((index, payload))
+                    if len(batch) < batch_size:
+                        continue
+                if batch:
+                    for decision in await _process_batch(batch):
+                        counts["accepted"] += 1
+                        yield encode(decision)
+                    batch = []
+                if item is _END:
+                    break
+            yield encode({"done": True, **counts})
+        finally:
+            task.cancel()
+
+    return _DuplexResponse(results(), media_type=media_type)
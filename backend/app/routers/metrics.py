@@ -0,0 +1,12 @@
+# backend/app/routers/metrics.py
+from fastapi import APIRouter
+from fastapi.responses import PlainTextResponse
+from app.core.metrics import render_prometheus
+
+router = APIRouter()
+
+
+@router.get("/metrics", tags=["system"], response_class=PlainTextResponse)
+async def metrics():
+    # Prometheus text exposition format
+    return PlainTextResponse(render_prometheus(), media_type="text/plain; version=0.0.4")
@@ -0,0 +1,13 @@
+# backend/app/routers/monitoring.py
+from fastapi import APIRouter
+
+router = APIRouter(prefix="/monitoring", tags=["monitoring"])
+
+
+# ------------------------------
+# Input / score drift vs the training reference
+# ------------------------------
+@router.get("/drift")
+async def drift_report():
+    from app.ml import drift
+    return drift.monitor.report()
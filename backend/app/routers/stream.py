@@ -0,0 +1,126 @@
+# backend/app/routers/stream.py
+"""
+Server-Sent Events change feed of decisions and sealed ledger blocks, for
+admins and analysts (it carries user_external_id and risk scores).
+
+    GET /stream/decisions?verdict=fraud&user=u1&events=decision,block
+    Last-Event-ID: 41          (or ?since_block=41) resumes after block 41
+"""
+import asyncio
+from typing import AsyncIterator, List, Optional
+from fastapi import APIRouter, Depends, Header, Query, Request
+from fastapi.responses import StreamingResponse
+from app.core import events
+from app.core.config import settings
+from app.core.security import require_role
+from app.core.serialization import loads
+
+router = APIRouter(
+    prefix="/stream",
+    tags=["stream"],
+    dependencies=[Depends(require_role("admin", "analyst"))],
+)
+
+REPLAY_PAGE = 500
+
+
+def _split(value: Optional[str]) -> Optional[List[str]]:
+    if not value:
+        return None
+    return [v.strip() for v in value.split(",") if v.strip()]
+
+
+async def _ledger_replay(since: int) -> AsyncIterator[events.Event]:
+    """Events after `since` rebuilt from the ledger itself, paged."""
+    if settings.ledger_backend != "mysql":
+        from app.ledger.segments import get_store
+        blocks = (
+            {**b, "entries": [loads(e["payload_bytes"]) for e in b["entries"]]}
+            for b in get_store().iter_blocks(since + 1)
+        )
+        for ev in events.ledger_events(blocks):
+            yield ev
+        return
+
+    from app.db.database import session_scope
+    from app.ledger.ledger import fetch_blocks_since
+    while True:
+        async with session_scope() as db:
+            blocks = await fetch_blocks_since(db, since, REPLAY_PAGE)
+        for ev in events.ledger_events(blocks):
+            yield ev
+        if len(blocks) < REPLAY_PAGE:
+            return
+        since = blocks[-1]["block_index"]
+
+
+async def _ring_replay(recent: List[events.Event]) -> AsyncIterator[events.Event]:
+    for ev in recent:
+        yield ev
+
+
+def _frame(sub: events.Subscription, ev: events.Event) -> bytes:
+    if sub.wants(ev):
+        return events.sse_format(ev)
+    # filtered-out block: an id-only message still advances the client's Last-Event-ID
+    return f"id: {ev.id}\n\n".encode("utf-8") if ev.kind == events.BLOCK else b""
+
+
+async def _feed(request: Request, sub: events.Subscription, since: Optional[int]) -> AsyncIterator[bytes]:
+    # subscribe before replaying so nothing sealed in between is missed;
+    # live copies of replayed blocks are then skipped by block index
+    events.hub.subscribe(sub)
+    try:
+        last = -1 if since is None else since
+        replayed = last
+        if since is not None:
+            recent = events.hub.recent_since(since)
+            replay = _ring_replay(recent) if recent is not None else _ledger_replay(since)
+            async for ev in replay:
+                yield _frame(sub, ev)
+                if ev.kind == events.BLOCK:
+                    last = replayed = ev.id
+
+        while True:
+            try:
+                ev = await asyncio.wait_for(sub.queue.get(), timeout=settings.stream_heartbeat_seconds)
+            except asyncio.TimeoutError:
+                if await request.is_disconnected():
+                    return
+                yield b": keep-alive\n\n"
+                continue
+            if ev.kind == events.OVERFLOW:
+                # Last-Event-ID stays at the last complete block, so a reconnect resumes cleanly
+                yield events.sse_format(events.Event(last, events.OVERFLOW, {"resume_after_block": last}))
+                return
+            if ev.id <= replayed:
+                continue
+            yield _frame(sub, ev)
+            if ev.kind == events.BLOCK:
+                last = ev.id
+    finally:
+        events.hub.unsubscribe(sub)
+
+
+@router.get("/decisions")
+async def stream_decisions(
+    request: Request,
+    verdict: Optional[str] = Query(None, description="Comma-separated verdicts to include (fraud, legit)"),
+    user: Optional[str] = Query(None, description="Only decisions for this user_external_id"),
+    events_: Optional[str] = Query(None, alias="events", description="decision,block (default both)"),
+    since_block: Optional[int] = Query(None, description="Replay everything after this block index"),
+    last_event_id: Optional[str] = Header(None),
+):
+    if since_block is None and last_event_id and last_event_id.lstrip("-").isdigit():
+        since_block = int(last_event_id)
+    sub = events.Subscription(
+        kinds=_split(events_) or (events.DECISION, events.BLOCK),
+        verdicts=_split(verdict),
+        user=user,
+        maxsize=settings.stream_queue_size,
+    )
+    return StreamingResponse(
+        _feed(request, sub, since_block),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
@@ -0,0 +1,131 @@
+# backend/bench/auth.py
+"""
+Auth benchmark: concurrent signup / login throughput, event-loop stalls
+while bcrypt runs, and the per-request cost of token validation.
+
+Runs the FastAPI app in-process (httpx ASGI transport) against a SQLite
+stand-in or a real MySQL URL. A ticker task sleeps 1 ms in a loop during
+the signup/login phases; its lateness is the time the event loop was
+blocked. GET /auth/me is then timed with the token cache on and off.
+
+    cd backend
+    python -m bench.auth --users 32 --logins 200 --concurrency 16 --requests 2000
+"""
+import argparse
+import asyncio
+import time
+
+from bench.common import prepare_database, print_table, save_results, summarize, use_database
+
+
+async def _ticker(lags: list, stop: asyncio.Event) -> None:
+    while not stop.is_set():
+        t0 = time.perf_counter()
+        await asyncio.sleep(0.001)
+        lags.append(max(time.perf_counter() - t0 - 0.001, 0.0))
+
+
+async def _phase(jobs, concurrency: int, fn) -> dict:
+    """Run fn(job) over jobs at `concurrency`; returns latencies, elapsed, loop lag."""
+    queue: asyncio.Queue = asyncio.Queue()
+    for j in jobs:
+        queue.put_nowait(j)
+    latencies, lags, errors = [], [], 0
+    stop = asyncio.Event()
+
+    async def worker():
+        nonlocal errors
+        while True:
+            try:
+                job = queue.get_nowait()
+            except asyncio.QueueEmpty:
+                return
+            t0 = time.perf_counter()
+            ok = await fn(job)
+            latencies.append(time.perf_counter() - t0)
+            errors += not ok
+
+    ticker = asyncio.create_task(_ticker(lags, stop))
+    t0 = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    elapsed = time.perf_counter() - t0
+    stop.set()
+    await ticker
+    return {"latencies": latencies, "elapsed": elapsed, "lags": lags, "errors": errors}
+
+
+async def run(args) -> dict:
+    import httpx
+    from app.core import security
+    from app.db.database import engine
+    from app.main import app
+
+    await prepare_database(engine)
+    users = [{"name": f"bench {i}", "email": f"bench{i}@example.com", "password": f"pw-{i}-secret"}
+             for i in range(args.users)]
+
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench", timeout=120) as client:
+        async def signup(u):
+            return (await client.post("/auth/signup", json=u)).status_code == 200
+
+        tokens = []
+
+        async def login(i):
+            u = users[i % len(users)]
+            r = await client.post("/auth/login", json={"email": u["email"], "password": u["password"]})
+            if r.status_code == 200 and len(tokens) < len(users):
+                tokens.append(r.json()["access_token"])
+            return r.status_code == 200
+
+        async def me(i):
+            r = await client.get("/auth/me", headers={"Authorization": f"Bearer {tokens[i % len(tokens)]}"})
+            return r.status_code == 200
+
+        signups = await _phase(users, args.concurrency, signup)
+        logins = await _phase(range(args.logins), args.concurrency, login)
+
+        cached_size = security.token_cache.maxsize
+        security.token_cache.maxsize = 0
+        security.token_cache.clear()
+        await _phase(range(50), args.concurrency, me)
+        uncached = await _phase(range(args.requests), args.concurrency, me)
+        security.token_cache.maxsize = cached_size
+        await _phase(range(len(tokens)), args.concurrency, me)
+        cached = await _phase(range(args.requests), args.concurrency, me)
+
+    await engine.dispose()
+    phases = {"signup": signups, "login": logins, "me uncached": uncached, "me cached": cached}
+    return {
+        "config": vars(args),
+        "throughput_rps": {k: len(p["latencies"]) / p["elapsed"] for k, p in phases.items()},
+        "errors": {k: p["errors"] for k, p in phases.items()},
+        "loop_lag": {k: summarize(p["lags"]) for k, p in phases.items()},
+        "stages": {k: summarize(p["latencies"]) for k, p in phases.items()},
+        "token_cache": security.token_cache.stats(),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--users", type=int, default=32, help="accounts created in the signup phase")
+    parser.add_argument("--logins", type=int, default=200)
+    parser.add_argument("--requests", type=int, default=2000, help="authenticated GET /auth/me per cache mode")
+    parser.add_argument("--concurrency", type=int, default=16)
+    parser.add_argument("--db", default=None, help="SQLAlchemy async URL (default: fresh SQLite file)")
+    parser.add_argument("--out", default=None)
+    args = parser.parse_args()
+
+    use_database(args.db, name="auth")
+    results = asyncio.run(run(args))
+    print_table("Request latency", results["stages"])
+    print_table("Event-loop lag (1 ms ticker)", results["loop_lag"])
+    print()
+    for phase, rps in results["throughput_rps"].items():
+        print(f"🚀 {phase:<12} {rps:8.1f} req/s   errors: {results['errors'][phase]}")
+    path = save_results("auth", results, args.out)
+    print(f"\n💾 Results saved to {path}")
+
+
+if __name__ == "__main__":
+    main()
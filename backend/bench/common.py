@@ -0,0 +1,176 @@
+# backend/bench/common.py
+"""
+Shared helpers for the benchmark scripts: SQLite stand-in schema, synthetic
+transaction replay, latency summaries and JSON result files.
+
+Benchmarks are run from the backend/ directory, e.g.
+    python -m bench.pipeline --n 2000 --concurrency 16
+"""
+import json
+import os
+import pathlib
+import platform
+import re
+import subprocess
+import tempfile
+import time
+from typing import Any, Dict, Iterable, List
+
+import numpy as np
+
+BENCH_DIR = pathlib.Path(__file__).resolve().parent
+RESULTS_DIR = BENCH_DIR / "results"
+SCHEMA_PATH = BENCH_DIR.parents[1] / "database" / "schema.sql"
+
+
+# ------------------------------
+# Database stand-in
+# ------------------------------
+def use_database(url: str | None, name: str = "bench") -> str:
+    """
+    Point the app at `url` (or a fresh SQLite file) via DATABASE_URL.
+    Must run before anything imports app.db.database.
+    """
+    if not url:
+        path = pathlib.Path(tempfile.gettempdir()) / f"finfraud-{name}.sqlite3"
+        if path.exists():
+            path.unlink()
+        url = f"sqlite+aiosqlite:///{path}"
+    os.environ["DATABASE_URL"] = url
+    return url
+
+
+def sqlite_schema(sql: str) -> List[str]:
+    """Translate database/schema.sql (MySQL dialect) into SQLite statements."""
+    out = []
+    for stmt in [s.strip() for s in sql.split(";") if s.strip()]:
+        stmt = "\n".join(l for l in stmt.splitlines() if not l.strip().startswith("--"))
+        if not stmt.strip().upper().startswith("CREATE TABLE"):
+            continue  # SET NAMES / time_zone etc.
+        stmt = re.sub(r"--[^\n]*", "", stmt)
+        stmt = re.sub(r"BIGINT AUTO_INCREMENT PRIMARY KEY", "INTEGER PRIMARY KEY AUTOINCREMENT", stmt)
+        stmt = re.sub(r"ENUM\([^)]*\)", "VARCHAR(16)", stmt)
+        stmt = re.sub(r"\)\s*ENGINE=\w+", ")", stmt)
+        stmt = re.sub(r"UNIQUE KEY \w+ \(", "UNIQUE (", stmt)
+        stmt = re.sub(r"DATETIME\(6\)", "DATETIME", stmt)
+        stmt = re.sub(r"CURRENT_TIMESTAMP\(6\)", "CURRENT_TIMESTAMP", stmt)
+        # plain secondary indexes become separate CREATE INDEX statements
+        table = re.search(r"CREATE TABLE IF NOT EXISTS (\w+)", stmt).group(1)
+        indexes = re.findall(r",\s*KEY (\w+) \(([^)]*)\)", stmt)
+        stmt = re.sub(r",\s*KEY \w+ \([^)]*\)", "", stmt)
+        out.append(stmt)
+        for name, cols in indexes:
+            out.append(f"CREATE INDEX IF NOT EXISTS {name} ON {table} ({cols})")
+    return out
+
+
+async def prepare_database(engine) -> None:
+    """Create the schema on the bench database (MySQL uses the app's own init)."""
+    if engine.dialect.name == "sqlite":
+        from sqlalchemy import text
+        from app.db.init_schema import schema_version
+        sql = SCHEMA_PATH.read_text(encoding="utf-8")
+        async with engine.begin() as conn:
+            for stmt in sqlite_schema(sql):
+                await conn.execute(text(stmt))
+            # mark it current so the app lifespan's init_schema skips the MySQL dialect file
+            await conn.execute(text("INSERT INTO schema_version (version) VALUES (:v)"), {"v": schema_version(sql)})
+    else:
+        from app.db.init_schema import init_schema
+        await init_schema(engine)
+
+
+# ------------------------------
+# Synthetic workload
+# ------------------------------
+def synthetic_transactions(n: int, users: int = 500, seed: int = 42) -> List[Dict[str, Any]]:
+    """TxnIn-shaped payloads replayed from generate_data.py's distribution."""
+    from app.ml.generate_data import generate_synthetic_fraud_data
+
+    df = generate_synthetic_fraud_data(n_samples=n, random_state=seed)
+    rng = np.random.default_rng(seed)
+    user_ids = rng.integers(0, users, n)
+    devices = rng.integers(0, users * 2, n)
+    merchants = rng.integers(0, 200, n)
+    txns = []
+    for i, rec in enumerate(df.to_dict("records")):
+        txns.append({
+            "external_txn_id": f"bench-{seed}-{i}",
+            "user_external_id": f"user-{user_ids[i]}",
+            "amount": round(float(rec["amount"]), 2),
+            "currency": "INR",
+            "merchant_id": f"m-{merchants[i]}",
+            "device_id": f"d-{devices[i]}",
+            "location": rec["location"],
+            "device_risk_score": float(rec["device_risk_score"]),
+        })
+    return txns
+
+
+# ------------------------------
+# Reporting
+# ------------------------------
+def summarize(samples: Iterable[float]) -> Dict[str, float]:
+    """Latency summary in milliseconds."""
+    arr = np.asarray(list(samples), dtype=float) * 1000.0
+    if arr.size == 0:
+        return {"count": 0}
+    p50, p95, p99 = np.percentile(arr, [50, 95, 99])
+    return {
+        "count": int(arr.size),
+        "mean_ms": float(arr.mean()),
+        "p50_ms": float(p50),
+        "p95_ms": float(p95),
+        "p99_ms": float(p99),
+        "max_ms": float(arr.max()),
+    }
+
+
+def _git_commit() -> str | None:
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, cwd=BENCH_DIR, timeout=5
+        ).stdout.strip() or None
+    except Exception:
+        return None
+
+
+def save_results(name: str, results: Dict[str, Any], out: str | None = None) -> pathlib.Path:
+    """Write results JSON with run metadata; returns the file path."""
+    path = pathlib.Path(out) if out else RESULTS_DIR / f"{name}-{time.strftime('%Y%m%d-%H%M%S')}.json"
+    path.parent.mkdir(parents=True, exist_ok=True)
+    doc = {
+        "benchmark": name,
+        "timestamp": int(time.time()),
+        "git_commit": _git_commit(),
+        "python": platform.python_version(),
+        "machine": platform.machine(),
+        "cpu_count": os.cpu_count(),
+        **results,
+    }
+    path.write_text(json.dumps(doc, indent=2, sort_keys=True), encoding="utf-8")
+    return path
+
+
+def print_table(title: str, rows: Dict[str, Dict[str, float]]) -> None:
+    print(f"\n📊 {title}")
+    print(f"   {'stage':<12}{'count':>8}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}{'max ms':>10}")
+    for stage, s in rows.items():
+        if not s.get("count"):
+            continue
+        print(f"   {stage:<12}{s['count']:>8}{s['p50_ms']:>10.3f}{s['p95_ms']:>10.3f}{s['p99_ms']:>10.3f}{s['max_ms']:>10.3f}")
+
+
+def compare(current: Dict[str, Any], baseline_path: str) -> None:
+    """Print p50/p99 deltas against a previous results file."""
+    baseline = json.loads(pathlib.Path(baseline_path).read_text(encoding="utf-8"))
+    print(f"\n🔁 Compared with {baseline_path} ({baseline.get('git_commit')})")
+    for stage, cur in current.get("stages", {}).items():
+        old = baseline.get("stages", {}).get(stage)
+        if not old or not old.get("count") or not cur.get("count"):
+            continue
+        d50 = cur["p50_ms"] - old["p50_ms"]
+        d99 = cur["p99_ms"] - old["p99_ms"]
+        print(f"   {stage:<12} p50 {d50:+9.3f} ms   p99 {d99:+9.3f} ms")
+    if "throughput_rps" in current and "throughput_rps" in baseline:
+        print(f"   throughput  {current['throughput_rps'] - baseline['throughput_rps']:+.1f} req/s")
@@ -0,0 +1,109 @@
+# backend/bench/explain.py
+"""
+Latency overhead of per-feature reason codes.
+
+Runs predict_models() over synthetic transactions with EXPLAIN_REASON_CODES
+off (predict_proba) and on (score + contributions in one pass), then times
+batch explanation and the on-demand explain_row(). It also checks that
+bias + sum(contributions) reproduces predict_proba for both agents.
+
+    cd backend
+    python -m bench.explain --n 2000
+"""
+import argparse
+import sys
+import time
+
+import numpy as np
+import pandas as pd
+
+from bench.common import print_table, save_results, summarize, synthetic_transactions
+
+
+def _time_predict(rows, stages) -> dict:
+    from app.core import timing
+    from app.ml.predictor import predict_models
+
+    samples = {s: [] for s in stages}
+    for row in rows:
+        with timing.collect_stages() as st:
+            t0 = time.perf_counter()
+            predict_models(row)
+            st["total"] = time.perf_counter() - t0
+        for s in stages:
+            if s in st:
+                samples[s].append(st[s])
+    return {s: summarize(v) for s, v in samples.items()}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--n", type=int, default=1000, help="transactions per mode")
+    parser.add_argument("--batch", type=int, default=256, help="rows per batch for batch explanation")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--out", default=None)
+    args = parser.parse_args()
+
+    from app.core.config import settings
+    from app.ml import explain
+    from app.ml.predictor import RF_PATH, XGB_PATH, get_feature_names, load_models, preprocess_row
+
+    if not (RF_PATH.exists() and XGB_PATH.exists()):
+        print("❌ Model files missing. Run `python backend/app/ml/train_models.py --fast` first.")
+        sys.exit(1)
+
+    rf, xgb = load_models()
+    explain.warm_up(rf)
+    rows = synthetic_transactions(args.n, seed=args.seed)
+    stages = ["rf", "xgb", "explain", "total"]
+
+    settings.explain_reason_codes = False
+    _time_predict(rows[:50], stages)
+    off = _time_predict(rows, stages)
+    settings.explain_reason_codes = True
+    _time_predict(rows[:50], stages)
+    on = _time_predict(rows, stages)
+
+    # batch explanation and exactness
+    batch = rows[:args.batch]
+    rf_features, xgb_features = get_feature_names(rf), get_feature_names(xgb)
+    df_rf = pd.concat([preprocess_row(r, rf_features) for r in batch], ignore_index=True)
+    df_xgb = pd.concat([preprocess_row(r, xgb_features) for r in batch], ignore_index=True)
+    t0 = time.perf_counter()
+    rf_p, _, _ = explain.rf_scores(rf, df_rf)
+    xgb_p, _, _ = explain.xgb_scores(xgb, df_xgb)
+    batch_s = time.perf_counter() - t0
+    rf_err = float(np.abs(rf_p - rf.predict_proba(df_rf)[:, 1]).max())
+    rf_outside = int(((rf_p < 0.0) | (rf_p > 1.0)).sum())
+    xgb_err = float(np.abs(xgb_p - xgb.predict_proba(df_xgb)[:, 1]).max())
+
+    on_demand = []
+    for row in rows[:200]:
+        t0 = time.perf_counter()
+        explain.explain_row(row)
+        on_demand.append(time.perf_counter() - t0)
+
+    results = {
+        "config": vars(args),
+        "stages_off": off,
+        "stages_on": on,
+        "stages": {"total": on["total"], "explain_row": summarize(on_demand)},
+        "batch_rows_per_s": len(batch) / batch_s if batch_s else 0.0,
+        "max_abs_error": {"rf": rf_err, "xgb": xgb_err},
+        "rf_outside_unit_interval": rf_outside,
+    }
+    print_table("predict_models, reason codes OFF", off)
+    print_table("predict_models, reason codes ON", on)
+    print_table("On-demand explain_row", {"explain_row": results["stages"]["explain_row"]})
+    d50 = on["total"]["p50_ms"] - off["total"]["p50_ms"]
+    d99 = on["total"]["p99_ms"] - off["total"]["p99_ms"]
+    print(f"\n⏱️ overhead: p50 {d50:+.3f} ms, p99 {d99:+.3f} ms")
+    print(f"📦 batch of {len(batch)}: {results['batch_rows_per_s']:.0f} rows/s (both agents)")
+    print(f"🎯 max |score - predict_proba|: rf {rf_err:.2e}, xgb {xgb_err:.2e}; "
+          f"rf scores outside [0, 1]: {results['rf_outside_unit_interval']}")
+    path = save_results("explain", results, args.out)
+    print(f"\n💾 Results saved to {path}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,197 @@
+# backend/bench/feedback.py
+"""
+Analyst feedback loop: incremental XGB update vs a full retrain, and
+serving latency across the hot model swap.
+
+Labels follow generate_data.py's distribution plus a pattern the
+shipped models have never seen: mid-sized, low device-risk Mumbai
+payments confirmed as fraud (--drift of them). --labels of these go
+through feedback.LabelBuffer into Parquet parts. Two candidates are
+then built from a copy of xgb_model.joblib:
+- feedback.update(): FEEDBACK_XGB_ROUNDS trees boosted on the labels
+- a from-scratch retrain: train_models.py's XGB pipeline (SMOTE
+  included) on --base rows plus the labels
+
+Both are scored on a fresh sample with the same drift: log loss and
+recall on the new pattern, and precision / recall overall. Last,
+predict_models() is timed while the updated file is published and
+reload_xgb_if_changed() swaps it in from another thread.
+
+    cd backend
+    python -m bench.feedback --labels 2000 --base 200000
+"""
+import argparse
+import os
+import pathlib
+import shutil
+import tempfile
+import threading
+import time
+
+import numpy as np
+
+from bench.common import print_table, save_results, summarize, synthetic_transactions
+
+
+def _labelled(n: int, drift: float, seed: int):
+    """generate_data.py rows with a share relabelled as the new fraud pattern."""
+    from app.ml.generate_data import generate_synthetic_fraud_data
+
+    df = generate_synthetic_fraud_data(n_samples=n, random_state=seed)
+    rng = np.random.default_rng(seed)
+    new = rng.random(n) < drift
+    df.loc[new, "amount"] = rng.uniform(3000, 6000, new.sum())
+    df.loc[new, "device_risk_score"] = rng.uniform(0.05, 0.3, new.sum())
+    df.loc[new, "location"] = "Mumbai"
+    df.loc[new, "is_fraud"] = 1
+    df["pattern"] = new
+    return df
+
+
+def _score(model, df) -> dict:
+    from sklearn.metrics import log_loss, precision_score, recall_score
+    from app.ml.predictor import encode_rows, get_feature_names
+
+    X = encode_rows(df.to_dict("records"), get_feature_names(model))
+    p = model.predict_proba(X)[:, 1]
+    y = df["is_fraud"].to_numpy()
+    pattern = df["pattern"].to_numpy()
+    return {
+        "logloss": float(log_loss(y, p, labels=[0, 1])),
+        "precision": float(precision_score(y, p >= 0.5, zero_division=0)),
+        "recall": float(recall_score(y, p >= 0.5, zero_division=0)),
+        "pattern_recall": float((p[pattern] >= 0.5).mean()) if pattern.any() else None,
+    }
+
+
+def _retrain(df):
+    """train_models.py's XGB pipeline, from scratch."""
+    import pandas as pd
+    from imblearn.over_sampling import SMOTE
+    from sklearn.pipeline import Pipeline
+    from sklearn.preprocessing import StandardScaler
+    from xgboost import XGBClassifier
+
+    X = pd.get_dummies(df[["amount", "device_risk_score", "location"]])
+    X_res, y_res = SMOTE(random_state=42).fit_resample(X, df["is_fraud"])
+    xgb = Pipeline([
+        ("scaler", StandardScaler(with_mean=False)),
+        ("clf", XGBClassifier(
+            n_estimators=200, max_depth=5, learning_rate=0.1, subsample=0.8,
+            colsample_bytree=0.8, eval_metric="logloss", random_state=42,
+        )),
+    ])
+    xgb.fit(X_res, y_res)
+    return xgb
+
+
+def _serve_during_swap(rows, publish) -> tuple:
+    """predict_models() latency before and while the published file is reloaded."""
+    from app.ml import predictor
+
+    steady = []
+    for row in rows:
+        t0 = time.perf_counter()
+        predictor.predict_models(row)
+        steady.append(time.perf_counter() - t0)
+
+    publish()
+    swapped = {}
+    reloader = threading.Thread(target=lambda: swapped.update(ok=predictor.reload_xgb_if_changed()))
+    during = []
+    reloader.start()
+    for row in rows:
+        t0 = time.perf_counter()
+        predictor.predict_models(row)
+        during.append(time.perf_counter() - t0)
+    reloader.join()
+    return steady, during, swapped.get("ok", False)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--labels", type=int, default=2000, help="analyst-confirmed labels in the buffer")
+    parser.add_argument("--drift", type=float, default=0.1, help="share of labels from the new fraud pattern")
+    parser.add_argument("--base", type=int, default=200000, help="rows for the from-scratch retrain")
+    parser.add_argument("--eval", type=int, default=20000, help="evaluation rows (same drift)")
+    parser.add_argument("--rounds", type=int, default=None, help="FEEDBACK_XGB_ROUNDS override")
+    parser.add_argument("--serve", type=int, default=500, help="predict_models() calls per latency phase")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--out", default=None)
+    args = parser.parse_args()
+
+    from app.core.config import settings
+    from app.ml import feedback, predictor
+
+    settings.explain_reason_codes = False
+    settings.entity_lists = False
+    rf, current = predictor.load_models()
+    workdir = pathlib.Path(tempfile.mkdtemp(prefix="finfraud-feedback-"))
+    try:
+        settings.feedback_dir = str(workdir / "feedback")
+        settings.feedback_flush_rows = 500
+        labels = _labelled(args.labels, args.drift, args.seed)
+        for i, r in enumerate(labels.to_dict("records"), 1):
+            record = {
+                "feedback_id": i, "transaction_id": i, "fraudresult_id": i,
+                "label": "fraud" if r["is_fraud"] else "legit", "model_verdict": "legit",
+                "labelled_by": "bench", "amount": r["amount"],
+                "device_risk_score": r["device_risk_score"], "location": r["location"],
+            }
+            if feedback.buffer.add(record):
+                feedback.buffer.flush()
+        feedback.buffer.flush()
+        evaluation = _labelled(args.eval, args.drift, args.seed + 1)
+
+        candidate = workdir / "xgb_model.joblib"
+        shutil.copy2(predictor.XGB_PATH, candidate)
+        t0 = time.perf_counter()
+        update = feedback.update(candidate, args.rounds, min_rows=0)
+        update_s = time.perf_counter() - t0
+        if update["status"] != "published":
+            print(f"❌ update not published: {update}")
+            return
+
+        import joblib
+        import pandas as pd
+        t0 = time.perf_counter()
+        retrained = _retrain(pd.concat([_labelled(args.base, 0.0, args.seed + 2), labels], ignore_index=True))
+        retrain_s = time.perf_counter() - t0
+
+        quality = {
+            "current": _score(current, evaluation),
+            "incremental": _score(joblib.load(candidate), evaluation),
+            "retrain": _score(retrained, evaluation),
+        }
+
+        # hot swap: point the predictor at a copy so the shipped file is untouched
+        served = workdir / "served.joblib"
+        shutil.copy2(predictor.XGB_PATH, served)
+        predictor.XGB_PATH = served
+        predictor._xgb_mtime = served.stat().st_mtime_ns
+        rows = synthetic_transactions(args.serve, seed=args.seed)
+        steady, during, swapped = _serve_during_swap(rows, lambda: os.replace(candidate, served))
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+    results = {
+        "config": vars(args),
+        "update": update,
+        "update_s": update_s,
+        "retrain_s": retrain_s,
+        "quality": quality,
+        "swapped": swapped,
+        "stages": {"predict": summarize(steady), "during swap": summarize(during)},
+    }
+    print_table("predict_models() across the hot swap", results["stages"])
+    print(f"\n🔁 incremental update: {update['rows']} labels, {update['trees']} trees in {update_s:.2f}s "
+          f"(full retrain on {args.base} rows: {retrain_s:.2f}s)")
+    print(f"   {'model':<13}{'logloss':>9}{'prec':>8}{'recall':>8}{'new pattern':>13}")
+    for name, q in quality.items():
+        print(f"   {name:<13}{q['logloss']:>9.4f}{q['precision']:>8.4f}{q['recall']:>8.4f}{q['pattern_recall']:>13.4f}")
+    path = save_results("feedback", results, args.out)
+    print(f"\n💾 Results saved to {path}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,199 @@
+# backend/bench/ingest.py
+"""
+Streaming ingest benchmark for POST /api/ingest.
+
+Starts uvicorn as a subprocess (SQLite stand-in unless --db is given) and
+uploads --n synthetic transactions as one chunked NDJSON or msgpack body
+over a raw HTTP/1.1 socket. Reading the response runs concurrently with
+the upload. Reports:
+- time to the first decision vs time the upload finished (decisions should
+  arrive long before the body ends)
+- end-to-end records/s and per-record latency (sent -> decision received)
+- server RSS sampled during the run (should stay flat as --n grows)
+
+    cd backend
+    python -m bench.ingest --n 20000 --format ndjson
+    python -m bench.ingest --n 20000 --format msgpack --rate 2000
+"""
+import argparse
+import asyncio
+import json
+import os
+import socket
+import subprocess
+import sys
+import time
+
+from bench.common import prepare_database, print_table, save_results, summarize, synthetic_transactions, use_database
+
+
+def _free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def _rss_mb(pid: int) -> float:
+    try:
+        with open(f"/proc/{pid}/status", encoding="ascii") as f:
+            for line in f:
+                if line.startswith("VmRSS:"):
+                    return int(line.split()[1]) / 1024.0
+    except OSError:
+        pass
+    return 0.0
+
+
+async def _wait_ready(port: int, proc) -> None:
+    deadline = time.monotonic() + 60
+    while time.monotonic() < deadline:
+        if proc.poll() is not None:
+            raise RuntimeError("uvicorn exited")
+        try:
+            r, w = await asyncio.open_connection("127.0.0.1", port)
+            w.write(b"GET /health/startup HTTP/1.1\r\nHost: bench\r\nConnection: close\r\n\r\n")
+            body = await r.read()
+            w.close()
+            if b'"warm":true' in body.replace(b" ", b""):
+                return
+        except OSError:
+            pass
+        await asyncio.sleep(0.2)
+    raise RuntimeError("server did not become ready")
+
+
+async def run(args, port: int, pid: int) -> dict:
+    txns = synthetic_transactions(args.n, seed=args.seed)
+    if args.format == "msgpack":
+        import msgpack
+        encode, ctype = msgpack.packb, "application/msgpack"
+    else:
+        encode, ctype = (lambda o: json.dumps(o).encode() + b"\n"), "application/x-ndjson"
+
+    reader, writer = await asyncio.open_connection("127.0.0.1", port)
+    writer.write(
+        f"POST /api/ingest HTTP/1.1\r\nHost: bench\r\nContent-Type: {ctype}\r\n"
+        f"Transfer-Encoding: chunked\r\nConnection: close\r\n\r\n".encode()
+    )
+    sent_at = [0.0] * args.n
+    received_at = {}
+    marks = {"upload_done": None, "first_decision": None}
+    rss = []
+    t0 = time.perf_counter()
+
+    async def upload():
+        per_chunk = max(1, args.chunk)
+        for i in range(0, args.n, per_chunk):
+            body = b"".join(encode(t) for t in txns[i:i + per_chunk])
+            now = time.perf_counter()
+            for j in range(i, min(i + per_chunk, args.n)):
+                sent_at[j] = now
+            writer.write(b"%x\r\n%s\r\n" % (len(body), body))
+            await writer.drain()
+            if args.rate:
+                await asyncio.sleep(per_chunk / args.rate)
+        writer.write(b"0\r\n\r\n")
+        await writer.drain()
+        marks["upload_done"] = time.perf_counter() - t0
+
+    async def download():
+        head = await reader.readuntil(b"\r\n\r\n")
+        if b" 200 " not in head.split(b"\r\n")[0]:
+            raise RuntimeError(head.decode(errors="replace") + (await reader.read(2000)).decode(errors="replace"))
+        if args.format == "msgpack":
+            import msgpack
+            unpacker = msgpack.Unpacker(raw=False)
+            feed, items = unpacker.feed, lambda: list(unpacker)
+        else:
+            buf = bytearray()
+
+            def feed(data):
+                buf.extend(data)
+
+            def items():
+                out = []
+                while (nl := buf.find(b"\n")) >= 0:
+                    out.append(json.loads(bytes(buf[:nl])))
+                    del buf[:nl + 1]
+                return out
+        summary = None
+        while True:
+            size = int((await reader.readline()).strip(), 16)
+            if size == 0:
+                break
+            feed(await reader.readexactly(size))
+            await reader.readexactly(2)
+            now = time.perf_counter()
+            for obj in items():
+                if obj.get("done"):
+                    summary = obj
+                elif "index" in obj and "error" not in obj:
+                    received_at[obj["index"]] = now
+                    if marks["first_decision"] is None:
+                        marks["first_decision"] = now - t0
+        return summary
+
+    async def sample_rss():
+        while True:
+            rss.append(_rss_mb(pid))
+            await asyncio.sleep(0.25)
+
+    sampler = asyncio.create_task(sample_rss())
+    _, summary = await asyncio.gather(upload(), download())
+    sampler.cancel()
+    writer.close()
+    elapsed = time.perf_counter() - t0
+    return {
+        "config": vars(args),
+        "elapsed_s": elapsed,
+        "throughput_rps": len(received_at) / elapsed if elapsed else 0.0,
+        "upload_done_s": marks["upload_done"],
+        "first_decision_s": marks["first_decision"],
+        "summary": summary,
+        "server_rss_mb": {"start": rss[0] if rss else 0.0, "max": max(rss, default=0.0), "end": rss[-1] if rss else 0.0},
+        "stages": {"record": summarize(received_at[i] - sent_at[i] for i in received_at)},
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--n", type=int, default=5000, help="records in the upload")
+    parser.add_argument("--format", choices=["ndjson", "msgpack"], default="ndjson")
+    parser.add_argument("--chunk", type=int, default=64, help="records per HTTP chunk")
+    parser.add_argument("--rate", type=float, default=0, help="upload rate limit in records/s (0 = as fast as possible)")
+    parser.add_argument("--db", default=None, help="SQLAlchemy async URL (default: fresh SQLite file)")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--out", default=None)
+    args = parser.parse_args()
+
+    use_database(args.db, name="ingest")
+    from app.db.database import engine
+
+    async def prep():
+        await prepare_database(engine)
+        await engine.dispose()
+    asyncio.run(prep())
+
+    port = _free_port()
+    proc = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "app.main:app", "--port", str(port), "--log-level", "warning"],
+        env=os.environ,
+    )
+    try:
+        asyncio.run(_wait_ready(port, proc))
+        results = asyncio.run(run(args, port, proc.pid))
+    finally:
+        proc.terminate()
+        proc.wait(timeout=30)
+
+    print_table("Per-record latency (sent -> decision)", results["stages"])
+    print(f"\n🚀 {args.n} records ({args.format}): {results['throughput_rps']:.1f} records/s, summary {results['summary']}")
+    print(f"⏱️ first decision after {results['first_decision_s']:.3f}s, upload finished after {results['upload_done_s']:.3f}s")
+    r = results["server_rss_mb"]
+    print(f"🧠 server RSS: start {r['start']:.0f} MB, max {r['max']:.0f} MB, end {r['end']:.0f} MB")
+    path = save_results("ingest", results, args.out)
+    print(f"\n💾 Results saved to {path}")
+
+
+if __name__ == "__main__":
+    main()
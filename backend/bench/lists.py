@@ -0,0 +1,116 @@
+# backend/bench/lists.py
+"""
+Entity list lookups: in-memory Bloom + sorted-hash lists vs a plain Python
+set of ids and vs one indexed query per check against entity_lists.
+
+Writes --entries blocked device ids to list files, loads them through
+entity_lists.reload() (files + the SQLite entity_lists table) and times
+EntityLists.check() on transactions that miss and that hit. Reports the
+list memory and load time, and checks that no unlisted row is reported.
+
+    cd backend
+    python -m bench.lists --entries 1000000 --checks 200000
+"""
+import argparse
+import asyncio
+import os
+import random
+import sys
+import tempfile
+import time
+
+from bench.common import prepare_database, print_table, save_results, summarize, use_database
+
+
+def _timed(fn, items):
+    out = []
+    for item in items:
+        t0 = time.perf_counter()
+        fn(item)
+        out.append(time.perf_counter() - t0)
+    return out
+
+
+async def _load(directory: str, table_rows: int) -> tuple:
+    from sqlalchemy import text
+    from app.core.config import settings
+    from app.db.database import engine
+    from app.ml import entity_lists
+
+    await prepare_database(engine)
+    async with engine.begin() as conn:
+        await conn.execute(
+            text("INSERT INTO entity_lists (list_name, entity_kind, entity_id) VALUES ('block', 'device', :id)"),
+            [{"id": f"dev-blocked-{i}"} for i in range(table_rows)],
+        )
+    settings.entity_lists_dir = directory
+    summary = await entity_lists.reload(engine)
+
+    # baseline: one indexed lookup per check
+    samples = []
+    async with engine.connect() as conn:
+        stmt = text("SELECT 1 FROM entity_lists WHERE list_name = 'block' AND entity_kind = 'device' AND entity_id = :id")
+        for i in range(2000):
+            t0 = time.perf_counter()
+            (await conn.execute(stmt, {"id": f"dev-{i}"})).first()
+            samples.append(time.perf_counter() - t0)
+    await engine.dispose()
+    return summary, samples
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--entries", type=int, default=1000000, help="blocked device ids (list file)")
+    parser.add_argument("--table-rows", type=int, default=100000, help="blocked device ids in the entity_lists table")
+    parser.add_argument("--checks", type=int, default=100000)
+    parser.add_argument("--db", default=None, help="SQLAlchemy async URL (default: fresh SQLite file)")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--out", default=None)
+    args = parser.parse_args()
+
+    use_database(args.db, name="lists")
+    from app.ml import entity_lists
+
+    rng = random.Random(args.seed)
+    with tempfile.TemporaryDirectory() as directory:
+        with open(os.path.join(directory, "block_device.txt"), "w", encoding="utf-8") as f:
+            f.writelines(f"dev-listed-{i}\n" for i in range(args.entries))
+        t0 = time.perf_counter()
+        summary, db_samples = asyncio.run(_load(directory, args.table_rows))
+        load_s = time.perf_counter() - t0
+        plain = {f"dev-listed-{i}" for i in range(args.entries)}
+
+    lists = entity_lists.current()
+    misses = [{"user_external_id": f"user-{i}", "device_id": f"dev-{i}", "merchant_id": f"m-{i}"}
+              for i in range(args.checks)]
+    hits = [{"user_external_id": f"user-{i}", "device_id": f"dev-listed-{rng.randrange(args.entries)}"}
+            for i in range(min(args.checks, 20000))]
+    false_pos = sum(1 for row in misses if lists.check(row))
+    if any(not lists.check(row) for row in hits[:1000]):
+        print("❌ listed device not found")
+        sys.exit(1)
+
+    stages = {
+        "check miss": summarize(_timed(lists.check, misses)),
+        "check hit": summarize(_timed(lists.check, hits)),
+        "py set": summarize(_timed(lambda row: row["device_id"] in plain, misses)),
+        "db query": summarize(db_samples),
+    }
+    list_bytes = sum(v["bytes"] for v in summary["lists"].values())
+    results = {
+        "config": vars(args),
+        "load_s": load_s,
+        "lists": summary,
+        "list_mb": list_bytes / 1e6,
+        "false_hits": false_pos,
+        "stages": stages,
+    }
+    print_table("Per-transaction list check", stages)
+    print(f"\n🧱 {args.entries + args.table_rows} entries in {results['list_mb']:.1f} MB, loaded in {load_s:.2f}s")
+    print(f"🎯 unlisted rows reported as listed: {false_pos} of {len(misses)}")
+    path = save_results("lists", results, args.out)
+    print(f"\n💾 Results saved to {path}")
+
+
+if __name__ == "__main__":
+    main()
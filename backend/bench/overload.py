@@ -0,0 +1,195 @@
+# backend/bench/overload.py
+"""
+POST /api/predict under overload, with and without admission control.
+
+Runs the app in-process (httpx ASGI transport) like bench/pipeline.py.
+First a closed-loop run at --concurrency measures capacity (req/s).
+Then requests arrive open-loop (Poisson) at --factor x that capacity
+for --seconds, once with ADMISSION_CONTROL=0 and once with it on.
+Arrivals don't wait for responses, as with real clients.
+
+The report gives, per run:
+- latency of the 200s, and of the 503s returned by shedding
+- the share of responses at each degradation stage (X-FinFraud-Degraded)
+- goodput (200s per second) and the deferred ledger backlog sealed after
+  the run
+
+Exits non-zero when the admission-on run serves nothing, or when the p99
+of its 200s exceeds the bound: --max-p99-ms if given, else --max-p99-x
+times the p99 of the closed-loop capacity run.
+
+    cd backend
+    python -m bench.overload --factor 10 --seconds 5
+    python -m bench.overload --skip-off --max-p99-ms 1500
+    python -m bench.overload --max-in-flight 32 --max-queue 8 --skip-off
+"""
+import argparse
+import asyncio
+import sys
+import time
+from collections import Counter
+from typing import List, Tuple
+
+import numpy as np
+
+from bench.common import prepare_database, print_table, save_results, summarize, synthetic_transactions, use_database
+
+
+async def _closed_loop(client, txns, concurrency: int) -> Tuple[float, List[float]]:
+    """Throughput (req/s) and per-request latencies (s)."""
+    queue: asyncio.Queue = asyncio.Queue()
+    for t in txns:
+        queue.put_nowait(t)
+    latencies = []
+
+    async def worker():
+        while not queue.empty():
+            t0 = time.perf_counter()
+            await client.post("/api/predict", json=queue.get_nowait())
+            latencies.append(time.perf_counter() - t0)
+
+    t0 = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    return len(txns) / (time.perf_counter() - t0), latencies
+
+
+async def _open_loop(client, txns, rate: float, seconds: float, seed: int) -> dict:
+    rng = np.random.default_rng(seed)
+    arrivals = np.cumsum(rng.exponential(1.0 / rate, int(rate * seconds * 1.5) + 1))
+    arrivals = arrivals[arrivals < seconds]
+    results = []
+
+    async def one(txn, at):
+        t0 = time.perf_counter()
+        try:
+            r = await client.post("/api/predict", json=txn)
+            status, stage = r.status_code, r.headers.get("x-finfraud-degraded", "")
+        except Exception as exc:  # client timeout
+            status, stage = type(exc).__name__, ""
+        results.append((status, stage.split(",")[-1] if stage else "normal", time.perf_counter() - t0))
+
+    start = time.perf_counter()
+    tasks = []
+    for i, at in enumerate(arrivals):
+        delay = start + at - time.perf_counter()
+        if delay > 0:
+            await asyncio.sleep(delay)
+        tasks.append(asyncio.create_task(one(txns[i % len(txns)], at)))
+    offered_s = time.perf_counter() - start
+    await asyncio.gather(*tasks)
+    elapsed = time.perf_counter() - start
+
+    ok = [lat for status, _, lat in results if status == 200]
+    shed = [lat for status, _, lat in results if status == 503]
+    return {
+        "offered": len(arrivals),
+        "offered_rps": len(arrivals) / offered_s,
+        "elapsed_s": elapsed,
+        "goodput_rps": len(ok) / elapsed,
+        "status": {str(k): v for k, v in Counter(s for s, _, _ in results).items()},
+        "stages_share": {k: v / len(results) for k, v in Counter(st for _, st, _ in results).items()},
+        "latency": {"ok": summarize(ok), "shed": summarize(shed)},
+        "latency_by_stage": {
+            stage: summarize(lat for status, st, lat in results if status == 200 and st == stage)
+            for stage in ("normal", "no_recs", "ledger_deferred", "rules_only")
+        },
+    }
+
+
+async def run(args) -> dict:
+    import httpx
+    from app.core import admission
+    from app.core.config import settings
+    from app.db.database import engine
+    from app.main import app
+    from app.ml.predictor import load_models
+
+    await prepare_database(engine)
+    load_models()
+    settings.admission_max_in_flight = args.max_in_flight
+    settings.admission_max_queue = args.max_queue
+    settings.admission_max_pool_wait_ms = args.max_pool_wait_ms
+
+    txns = synthetic_transactions(max(args.capacity_n, 2000), seed=args.seed)
+    out = {}
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench", timeout=args.timeout) as client:
+        settings.admission_control = False
+        await _closed_loop(client, txns[:50], args.concurrency)
+        capacity, latencies = await _closed_loop(client, txns[:args.capacity_n], args.concurrency)
+        out["capacity_rps"] = capacity
+        out["capacity_latency"] = summarize(latencies)
+        rate = capacity * args.factor
+        print(f"⚙️  capacity {capacity:.1f} req/s at concurrency {args.concurrency}; offering {rate:.1f} req/s")
+
+        for name, enabled in (("off", False), ("on", True)):
+            if name == "off" and args.skip_off:
+                continue
+            settings.admission_control = enabled
+            out[name] = await _open_loop(client, txns, rate, args.seconds, args.seed)
+            if enabled:
+                out[name]["backlog_after"] = len(admission.ledger_backlog)
+                await admission.ledger_backlog.drain()
+                out[name]["sealed"] = {"blocks": admission.ledger_backlog.sealed_blocks,
+                                       "entries": admission.ledger_backlog.sealed_entries}
+            await asyncio.sleep(1.0)  # let the pool wait average decay between runs
+    await engine.dispose()
+    return out
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--factor", type=float, default=10.0, help="offered load as a multiple of capacity")
+    parser.add_argument("--seconds", type=float, default=5.0, help="open-loop arrival window")
+    parser.add_argument("--concurrency", type=int, default=8, help="closed-loop concurrency for the capacity run")
+    parser.add_argument("--capacity-n", type=int, default=300)
+    parser.add_argument("--max-in-flight", type=int, default=16, help="ADMISSION_MAX_IN_FLIGHT")
+    parser.add_argument("--max-queue", type=int, default=4, help="ADMISSION_MAX_QUEUE")
+    parser.add_argument("--max-pool-wait-ms", type=float, default=500, help="ADMISSION_MAX_POOL_WAIT_MS")
+    parser.add_argument("--timeout", type=float, default=120.0, help="client timeout (s)")
+    parser.add_argument("--skip-off", action="store_true", help="skip the ADMISSION_CONTROL=0 run")
+    parser.add_argument("--max-p99-ms", type=float, default=None,
+                        help="fail if the admission-on p99 of 200s exceeds this (default: --max-p99-x)")
+    parser.add_argument("--max-p99-x", type=float, default=3.0,
+                        help="fail if the admission-on p99 of 200s exceeds this multiple of the capacity run's p99")
+    parser.add_argument("--db", default=None, help="SQLAlchemy async URL (default: fresh SQLite file)")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--out", default=None)
+    args = parser.parse_args()
+
+    use_database(args.db, name="overload")
+    results = {"config": vars(args), **asyncio.run(run(args))}
+    for name in ("off", "on"):
+        if name not in results:
+            continue
+        r = results[name]
+        print_table(f"ADMISSION_CONTROL {name}: {r['offered']} requests at {r['offered_rps']:.1f} req/s", {
+            "200": r["latency"]["ok"], **r["latency_by_stage"], "503": r["latency"]["shed"],
+        })
+        stages = ", ".join(f"{k} {v:.0%}" for k, v in sorted(r["stages_share"].items()))
+        print(f"   status {r['status']}; stages {stages}; goodput {r['goodput_rps']:.1f} req/s")
+    if "on" in results and "off" in results:
+        on, off = results["on"]["latency"]["ok"], results["off"]["latency"]["ok"]
+        if on.get("count") and off.get("count"):
+            print(f"\n🎯 p99 of served requests: {off['p99_ms']:.0f} ms without admission control, {on['p99_ms']:.0f} ms with it")
+    failed = False
+    if "on" in results:
+        on = results["on"]["latency"]["ok"]
+        bound = args.max_p99_ms or args.max_p99_x * results["capacity_latency"]["p99_ms"]
+        results["p99_bound_ms"] = bound
+        if not on.get("count"):
+            print("\n❌ admission control served no requests")
+            failed = True
+        else:
+            failed = on["p99_ms"] > bound
+            print(f"\n{'❌' if failed else '✅'} p99 of served requests under {args.factor:g}x load: "
+                  f"{on['p99_ms']:.0f} ms (bound {bound:.0f} ms; closed-loop p99 "
+                  f"{results['capacity_latency']['p99_ms']:.0f} ms)")
+    path = save_results("overload", results, args.out)
+    print(f"\n💾 Results saved to {path}")
+    if failed:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
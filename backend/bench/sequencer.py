@@ -0,0 +1,199 @@
+# backend/bench/sequencer.py
+"""
+Multi-worker ledger check: N worker processes append concurrently and the
+resulting chain must be gap-free and valid.
+
+Starts the single-writer sequencer (app/ledger/sequencer.py) as a
+subprocess, spawns --workers processes that each append --per-worker
+entries through append_block() at --concurrency, then verifies the chain:
+block indexes 0..n-1 with no gaps, every entry present exactly once and
+verify_chain() (or SegmentStore.verify() for segment files) clean. With
+the sequencer, each worker then resubmits its first --resubmit acknowledged
+entries as a backlog retry (retry=True, as after a lost receipt); the
+writer must drop them rather than seal them twice.
+Exits non-zero on any problem.
+
+    cd backend
+    python -m bench.sequencer --workers 4 --per-worker 500 --concurrency 16
+    python -m bench.sequencer --backend segments
+    python -m bench.sequencer --no-sequencer      # the old per-worker race, for comparison
+"""
+import argparse
+import asyncio
+import multiprocessing as mp
+import os
+import pathlib
+import signal
+import subprocess
+import sys
+import tempfile
+import time
+
+from bench.common import print_table, save_results, summarize, use_database
+
+
+def _worker(args) -> dict:
+    """One API worker process: append entries through the normal ledger entry point."""
+    worker_id, per_worker, concurrency, resubmit = args
+
+    async def go():
+        from app.db.database import engine, session_scope
+        from app.ledger.ledger import append_block
+
+        latencies, errors, acked = [], [], []
+        sent = {}
+        queue: asyncio.Queue = asyncio.Queue()
+        for i in range(per_worker):
+            queue.put_nowait(i)
+
+        async def one():
+            while True:
+                try:
+                    i = queue.get_nowait()
+                except asyncio.QueueEmpty:
+                    return
+                ref = f"w{worker_id}-{i}"
+                entry = {"tx_reference": ref, "payload": {"txn_id": ref, "verdict": "legit", "fraud_score": 0.01 * (i % 50)}}
+                sent[ref] = entry
+                t0 = time.perf_counter()
+                try:
+                    async with session_scope() as db:
+                        await append_block(db, [entry])
+                    latencies.append(time.perf_counter() - t0)
+                    acked.append(ref)
+                except Exception as exc:
+                    errors.append(f"{type(exc).__name__}: {str(exc)[:120]}")
+
+        try:
+            await asyncio.gather(*(one() for _ in range(concurrency)))
+            if resubmit and acked:
+                try:
+                    await append_block(None, [sent[ref] for ref in acked[:resubmit]], retry=True)
+                except Exception as exc:
+                    errors.append(f"retry: {type(exc).__name__}: {str(exc)[:120]}")
+        finally:
+            await engine.dispose()
+        return {"latencies": latencies, "errors": errors, "acked": acked}
+
+    return asyncio.run(go())
+
+
+async def _verify(expected_refs: set) -> dict:
+    from sqlalchemy import text
+    from app.core.config import settings
+
+    if settings.ledger_backend in ("segments", "both"):
+        from app.ledger.segments import SegmentStore
+        store = SegmentStore(settings.ledger_dir, settings.ledger_segment_max_bytes, fsync=False)
+        problems = store.verify()
+        indexes = [b["block_index"] for b in store.iter_blocks(0)]
+        refs = [e["tx_reference"] for b in store.iter_blocks(0) for e in b["entries"]]
+        store.close()
+    else:
+        from app.db.database import engine
+        from app.ledger.ledger import verify_chain
+        async with engine.connect() as conn:
+            blocks = [dict(r._mapping) for r in await conn.execute(text(
+                "SELECT block_index, prev_block_hash, block_hash, merkle_root, entries_count FROM chain_blocks"
+            ))]
+            entries = [dict(r._mapping) for r in await conn.execute(text(
+                "SELECT block_index, entry_index, tx_reference, entry_payload, entry_hash, hmac_chain FROM chain_entries"
+            ))]
+        await engine.dispose()
+        problems = verify_chain(blocks, entries)
+        indexes = sorted(b["block_index"] for b in blocks)
+        refs = [e["tx_reference"] for e in entries]
+
+    if indexes != list(range(len(indexes))):
+        problems.append("block indexes are not contiguous from 0")
+    if len(refs) != len(set(refs)):
+        problems.append(f"{len(refs) - len(set(refs))} duplicated entries")
+    missing = expected_refs - set(refs)
+    if missing:
+        problems.append(f"{len(missing)} acknowledged entries missing from the chain")
+    return {"blocks": len(indexes), "entries": len(refs), "problems": problems}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--workers", type=int, default=4, help="worker processes")
+    parser.add_argument("--per-worker", type=int, default=300, help="appends per worker")
+    parser.add_argument("--concurrency", type=int, default=16, help="in-flight appends per worker")
+    parser.add_argument("--backend", choices=["mysql", "segments", "both"], default="mysql",
+                        help="LEDGER_BACKEND for the run (mysql = SQL tables, SQLite by default)")
+    parser.add_argument("--db", default=None, help="SQLAlchemy async URL (default: fresh SQLite file)")
+    parser.add_argument("--no-sequencer", action="store_true", help="let every worker seal its own blocks")
+    parser.add_argument("--resubmit", type=int, default=20,
+                        help="acknowledged entries each worker resubmits as a retry (sequencer only)")
+    parser.add_argument("--out", default=None)
+    args = parser.parse_args()
+
+    tmp = pathlib.Path(tempfile.mkdtemp(prefix="finfraud-seq-"))
+    use_database(args.db, name="sequencer")
+    os.environ["LEDGER_BACKEND"] = args.backend
+    os.environ["LEDGER_DIR"] = str(tmp / "ledger")
+    os.environ["LEDGER_FSYNC"] = "0"
+    sock = str(tmp / "ledger.sock")
+    os.environ["LEDGER_SEQUENCER_SOCKET"] = "" if args.no_sequencer else sock
+
+    from bench.common import prepare_database
+    from app.db.database import engine
+
+    async def prep():
+        await prepare_database(engine)
+        await engine.dispose()
+    asyncio.run(prep())
+
+    proc = None
+    if not args.no_sequencer:
+        proc = subprocess.Popen([sys.executable, "-m", "app.ledger.sequencer", "--socket", sock])
+        deadline = time.monotonic() + 30
+        while not os.path.exists(sock):
+            if proc.poll() is not None or time.monotonic() > deadline:
+                print("❌ sequencer did not start")
+                sys.exit(1)
+            time.sleep(0.05)
+
+    t0 = time.perf_counter()
+    try:
+        with mp.get_context("spawn").Pool(args.workers) as pool:
+            out = pool.map(_worker, [(w, args.per_worker, args.concurrency, 0 if args.no_sequencer else args.resubmit)
+                                       for w in range(args.workers)])
+    finally:
+        if proc is not None:
+            proc.send_signal(signal.SIGINT)
+            proc.wait(timeout=30)
+    elapsed = time.perf_counter() - t0
+
+    latencies = [x for o in out for x in o["latencies"]]
+    errors = [x for o in out for x in o["errors"]]
+    acked = {ref for o in out for ref in o["acked"]}
+    check = asyncio.run(_verify(acked))
+
+    total = args.workers * args.per_worker
+    results = {
+        "config": {**vars(args), "sequencer": not args.no_sequencer},
+        "elapsed_s": elapsed,
+        "throughput_aps": total / elapsed if elapsed else 0.0,
+        "errors": len(errors),
+        "chain": check,
+        "stages": {"append": summarize(latencies)},
+    }
+    mode = "per-worker sealing" if args.no_sequencer else "sequencer"
+    print(f"\n🚀 {total} appends from {args.workers} workers ({mode}, {args.backend}): "
+          f"{results['throughput_aps']:.1f} appends/s, {len(errors)} errors")
+    for e in sorted(set(errors))[:3]:
+        print(f"⚠️ {e}")
+    print_table("Append latency", results["stages"])
+    print(f"\n🔗 {check['blocks']} blocks, {check['entries']} entries")
+    for p in check["problems"][:10]:
+        print(f"❌ {p}")
+    path = save_results("sequencer", results, args.out)
+    print(f"\n💾 Results saved to {path}")
+    ok = not errors and not check["problems"] and check["entries"] == total
+    print("✅ chain is gap-free and valid" if ok else "❌ chain check failed")
+    sys.exit(0 if ok else 1)
+
+
+if __name__ == "__main__":
+    main()
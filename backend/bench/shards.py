@@ -0,0 +1,228 @@
+# backend/bench/shards.py
+"""
+Hash-sharded storage (app/db/sharding.py) on local SQLite files.
+
+For each --shards count, a child process runs the app in-process (httpx
+ASGI transport) with DB_SHARD_URLS pointing at that many fresh SQLite
+files. A separate process per count is needed because shard engines are
+built at import. Each child:
+- replays --n transactions through POST /api/predict at --concurrency
+  and reports throughput and latency
+- streams --ingest more through /api/ingest, whose micro-batches span
+  shards
+- checks that transaction IDs are unique and each lives on the shard its
+  user hashes to, that GET /api/transactions/{id} finds a sample of them,
+  that the ledger sits on LEDGER_SHARD only with one entry per decision,
+  and that the scatter / gather analyst queue matches a merge of every
+  shard's full table
+- checks that the readers that load every shard see every decision: the
+  similarity index, the fraud-ring graph rebuild and the DB backtest
+  stream (in ascending id order)
+- reports rows per shard (balance)
+
+With --db-dir the SQLite files go there instead of a temp directory.
+
+    cd backend
+    python -m bench.shards --shards 1 4 --n 2000 --concurrency 8
+"""
+import argparse
+import asyncio
+import json
+import os
+import pathlib
+import subprocess
+import sys
+import tempfile
+import time
+
+from bench.common import prepare_database, print_table, save_results, summarize, synthetic_transactions
+
+
+async def _child(args) -> dict:
+    from app.db import sharding
+    try:
+        return await _measure(args)
+    finally:
+        for shard_engine in sharding.engines():
+            await shard_engine.dispose()  # aiosqlite threads would keep the process alive
+
+
+async def _measure(args) -> dict:
+    import httpx
+    from sqlalchemy import text
+    from app.core.config import settings
+    from app.db import ops, sharding
+    from app.main import app
+    from app.ml.predictor import load_models
+
+    for shard_engine in sharding.engines():
+        await prepare_database(shard_engine)
+    await sharding.ensure_id_ranges()
+    load_models()
+    settings.admission_control = False
+
+    txns = synthetic_transactions(args.n + args.ingest, users=args.users, seed=args.seed)
+    predict_txns, ingest_txns = txns[:args.n], txns[args.n:]
+    latencies, ids = [], {}
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench", timeout=120) as client:
+        queue: asyncio.Queue = asyncio.Queue()
+        for t in predict_txns:
+            queue.put_nowait(t)
+
+        async def worker():
+            while not queue.empty():
+                txn = queue.get_nowait()
+                t0 = time.perf_counter()
+                r = await client.post("/api/predict", json=txn)
+                latencies.append(time.perf_counter() - t0)
+                r.raise_for_status()
+                ids[r.json()["transaction_id"]] = txn
+
+        t0 = time.perf_counter()
+        await asyncio.gather(*(worker() for _ in range(args.concurrency)))
+        elapsed = time.perf_counter() - t0
+
+        body = "".join(json.dumps(t) + "\n" for t in ingest_txns)
+        r = await client.post("/api/ingest", content=body, headers={"content-type": "application/x-ndjson"})
+        r.raise_for_status()
+        ingested = [json.loads(line) for line in r.text.splitlines() if line.strip()]
+        for rec in ingested:
+            if "transaction_id" in rec:
+                ids[rec["transaction_id"]] = ingest_txns[rec["index"]]
+
+        sample = list(ids)[:: max(1, len(ids) // 200)]
+        found = 0
+        for txn_id in sample:
+            r = await client.get(f"/api/transactions/{txn_id}")
+            found += r.status_code == 200 and r.json()["external_txn_id"] == ids[txn_id]["external_txn_id"]
+
+    misplaced = sum(sharding.shard_for_id(i) != sharding.shard_for_payload(t) for i, t in ids.items())
+
+    async def counts(db):
+        out = {}
+        for table in ("transactions", "fraudresults", "users", "chain_entries"):
+            out[table] = (await db.execute(text(f"SELECT COUNT(*) FROM {table}"))).scalar()
+        return out
+
+    rows = await sharding.gather(counts)
+    queue_items = [r["transaction_id"] for r in await ops_queue(ops, sharding, args.queue_limit)]
+    full = await sharding.gather(ops.fetch_review_queue, "fraud", 10 ** 9)
+    expected = [r["transaction_id"] for r in sorted(
+        (r for part in full for r in part), key=lambda r: (r["created_at"], r["transaction_id"]), reverse=True,
+    )[:args.queue_limit]]
+
+    t0 = time.perf_counter()
+    for _ in range(20):
+        await ops_queue(ops, sharding, args.queue_limit)
+    queue_ms = (time.perf_counter() - t0) / 20 * 1000.0
+
+    from app.ml import graph, similarity
+    from app.ml.backtest import db_chunks
+    await similarity.build(sharding.engines())
+    indexed = sum(similarity.index.vector_of(i) is not None for i in ids)
+    graph_rows = (await graph.rebuild(sharding.engines()))["rebuild"]["rows"]
+    streamed = [int(i) async for chunk in db_chunks(0, None) for i in chunk["ids"]]
+
+    decisions = args.n + sum("transaction_id" in rec for rec in ingested)
+    return {
+        "shards": len(sharding.shards),
+        "throughput_rps": args.n / elapsed,
+        "predict": summarize(latencies),
+        "decisions": decisions,
+        "unique_ids": len(ids),
+        "misplaced": misplaced,
+        "lookup_found": f"{found}/{len(sample)}",
+        "ledger_entries": [r["chain_entries"] for r in rows],
+        "rows": [r["transactions"] for r in rows],
+        "users": [r["users"] for r in rows],
+        "queue_ok": queue_items == expected,
+        "queue_ms": queue_ms,
+        "all_shards": {
+            "similar_indexed": indexed,
+            "graph_rows": graph_rows,
+            "backtest_rows": len(streamed),
+            "backtest_ordered": streamed == sorted(streamed),
+        },
+        "id_ranges": [s.id_range for s in sharding.shards],
+    }
+
+
+async def ops_queue(ops, sharding, limit: int):
+    """The /api/queue handler's scatter / gather, minus auth."""
+    parts = await sharding.gather(ops.fetch_review_queue, "fraud", limit)
+    return sorted(
+        (r for part in parts for r in part), key=lambda r: (r["created_at"], r["transaction_id"]), reverse=True,
+    )[:limit]
+
+
+def _run_child(args, n_shards: int, db_dir: pathlib.Path) -> dict:
+    paths = [db_dir / f"finfraud-shard{n_shards}-{i}.sqlite3" for i in range(n_shards)]
+    for p in paths:
+        if p.exists():
+            p.unlink()
+    env = {
+        **os.environ,
+        "DB_SHARD_URLS": ",".join(f"sqlite+aiosqlite:///{p}" for p in paths),
+        "LEDGER_SHARD": "0",
+        "GRAPH_REBUILD_ON_STARTUP": "0",
+    }
+    cmd = [sys.executable, "-m", "bench.shards", "--child",
+           "--n", str(args.n), "--ingest", str(args.ingest), "--concurrency", str(args.concurrency),
+           "--users", str(args.users), "--queue-limit", str(args.queue_limit), "--seed", str(args.seed)]
+    proc = subprocess.run(cmd, env=env, capture_output=True, text=True)
+    if proc.returncode != 0:
+        raise RuntimeError(f"{n_shards} shards: exit {proc.returncode}\n{proc.stderr[-3000:]}")
+    return json.loads(proc.stdout.strip().splitlines()[-1])
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--shards", type=int, nargs="+", default=[1, 4], help="shard counts to compare")
+    parser.add_argument("--n", type=int, default=2000, help="/api/predict requests per run")
+    parser.add_argument("--ingest", type=int, default=500, help="records streamed through /api/ingest")
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--users", type=int, default=500)
+    parser.add_argument("--queue-limit", type=int, default=50)
+    parser.add_argument("--db-dir", default=None, help="directory for the SQLite shard files")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--out", default=None)
+    parser.add_argument("--child", action="store_true", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        print(json.dumps(asyncio.run(_child(args))))
+        return
+
+    db_dir = pathlib.Path(args.db_dir or tempfile.gettempdir())
+    runs = {}
+    for n in args.shards:
+        print(f"⚙️  {n} shard(s)...")
+        runs[n] = _run_child(args, n, db_dir)
+
+    print_table("POST /api/predict", {f"{n} shards": r["predict"] for n, r in runs.items()})
+    failed = False
+    for n, r in runs.items():
+        readers = r["all_shards"]
+        ok = (r["unique_ids"] == r["decisions"] and r["misplaced"] == 0 and r["queue_ok"]
+              and r["ledger_entries"][0] == r["decisions"] and not any(r["ledger_entries"][1:])
+              and readers["similar_indexed"] == readers["graph_rows"] == readers["backtest_rows"] == r["decisions"]
+              and readers["backtest_ordered"])
+        failed |= not ok
+        print(f"\n{'✅' if ok else '❌'} {n} shard(s): {r['throughput_rps']:.1f} req/s; "
+              f"{r['unique_ids']}/{r['decisions']} unique IDs, {r['misplaced']} misplaced, "
+              f"lookups {r['lookup_found']}")
+        print(f"   rows per shard {r['rows']}, users {r['users']}, ledger entries {r['ledger_entries']}")
+        print(f"   analyst queue (scatter / gather) {'matches' if r['queue_ok'] else 'DIFFERS from'} "
+              f"the merged tables; {r['queue_ms']:.2f} ms")
+        print(f"   all-shard readers: similarity index {readers['similar_indexed']}, graph rebuild "
+              f"{readers['graph_rows']}, backtest stream {readers['backtest_rows']} rows"
+              f"{'' if readers['backtest_ordered'] else ' (OUT OF ORDER)'}")
+    path = save_results("shards", {"config": vars(args), "runs": runs}, args.out)
+    print(f"\n💾 Results saved to {path}")
+    if failed:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,155 @@
+# backend/bench/slim.py
+"""
+Full vs slim row format (app/db/slim.py, STORAGE_FORMAT).
+
+Runs the app in-process (httpx ASGI transport) like bench/pipeline.py,
+on one fresh database:
+- replays --n transactions through POST /api/predict in --blocks
+  blocks, alternating STORAGE_FORMAT=full and slim so both see the same
+  table sizes. Reports total latency and the db stage per format
+- converts every row to full and reports bytes per transaction. Then
+  slim, then full again (app.db.slim.migrate, --batch rows per commit),
+  timing each pass
+- after each conversion, checks that fetch_transaction,
+  fetch_recommendations and fetch_transaction_payload return exactly what
+  they returned before (lossless both ways)
+
+    cd backend
+    python -m bench.slim --n 1000 --concurrency 8
+"""
+import argparse
+import asyncio
+import sys
+import time
+
+from bench.common import prepare_database, print_table, save_results, summarize, synthetic_transactions, use_database
+
+
+async def _snapshot(ops, session_scope, ids):
+    out = {}
+    async with session_scope() as db:
+        for txn_id in ids:
+            out[txn_id] = (
+                await ops.fetch_transaction(db, txn_id),
+                await ops.fetch_recommendations(db, txn_id),
+                await ops.fetch_transaction_payload(db, txn_id),
+            )
+    return out
+
+
+async def run(args) -> dict:
+    import httpx
+    from app.core import timing
+    from app.core.config import settings
+    from app.db import ops, slim
+    from app.db.database import engine, session_scope
+    from app.main import app
+    from app.ml.predictor import load_models
+
+    await prepare_database(engine)
+    await slim.ensure_columns(engine)
+    load_models()
+    settings.admission_control = False
+
+    txns = synthetic_transactions(args.n + args.warmup, users=args.users, seed=args.seed)
+    records = {slim.FULL: [], slim.SLIM: []}
+    ids = []
+
+    async def instrumented(scope, receive, send):
+        if scope["type"] != "http":
+            return await app(scope, receive, send)
+        fmt = settings.storage_format
+        with timing.collect_stages() as stages:
+            t0 = time.perf_counter()
+            await app(scope, receive, send)
+            stages["total"] = time.perf_counter() - t0
+        records[fmt].append(stages)
+
+    async def replay(client, batch):
+        queue: asyncio.Queue = asyncio.Queue()
+        for t in batch:
+            queue.put_nowait(t)
+
+        async def worker():
+            while not queue.empty():
+                r = await client.post("/api/predict", json=queue.get_nowait())
+                r.raise_for_status()
+                ids.append(r.json()["transaction_id"])
+
+        await asyncio.gather(*(worker() for _ in range(args.concurrency)))
+
+    transport = httpx.ASGITransport(app=instrumented)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench", timeout=120) as client:
+        await replay(client, txns[:args.warmup])
+        for fmt in records:
+            records[fmt].clear()
+        size = max(1, args.n // args.blocks)
+        for b, start in enumerate(range(args.warmup, len(txns), size)):
+            settings.storage_format = (slim.FULL, slim.SLIM)[b % 2]
+            await replay(client, txns[start:start + size])
+    settings.storage_format = slim.FULL
+
+    sample = sorted(ids)[:: max(1, len(ids) // args.sample)]
+    before = await _snapshot(ops, session_scope, sample)
+    out = {"latency": {}, "db_stage": {}, "passes": {}}
+    for fmt, recs in records.items():
+        out["latency"][fmt] = summarize(r["total"] for r in recs)
+        out["db_stage"][fmt] = summarize(r[timing.DB] for r in recs if timing.DB in r)
+
+    for to in (slim.FULL, slim.SLIM, slim.FULL):
+        t0 = time.perf_counter()
+        converted = await slim.migrate(engine, to, args.batch)
+        elapsed = time.perf_counter() - t0
+        after = await _snapshot(ops, session_scope, sample)
+        mismatched = [i for i in sample if after[i] != before[i]]
+        out["passes"][f"{len(out['passes']) + 1}:{to}"] = {
+            "converted": converted,
+            "elapsed_s": elapsed,
+            "rows_per_s": sum(converted.values()) / elapsed if elapsed else 0.0,
+            "report": await slim.report(engine),
+            "checked": len(sample),
+            "mismatched": mismatched[:10],
+        }
+
+    await engine.dispose()
+    return out
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--n", type=int, default=1000, help="transactions to replay (after warmup)")
+    parser.add_argument("--blocks", type=int, default=10, help="alternating full / slim blocks")
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--warmup", type=int, default=50)
+    parser.add_argument("--users", type=int, default=500)
+    parser.add_argument("--batch", type=int, default=500, help="rows per migration batch")
+    parser.add_argument("--sample", type=int, default=300, help="transactions compared after each conversion")
+    parser.add_argument("--db", default=None, help="SQLAlchemy async URL (default: fresh SQLite file)")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--out", default=None)
+    args = parser.parse_args()
+
+    use_database(args.db, name="slim")
+    results = {"config": vars(args), **asyncio.run(run(args))}
+
+    print_table("POST /api/predict", {f"{k} total": v for k, v in results["latency"].items()}
+                | {f"{k} db": v for k, v in results["db_stage"].items()})
+    failed = False
+    for name, p in results["passes"].items():
+        r = p["report"]
+        ok = not p["mismatched"]
+        failed |= not ok
+        tables = ", ".join(f"{t} {r[t]['bytes'] / max(1, r['transactions_count']):.0f}"
+                           for t in ("transactions", "fraudresults", "recommendations", "chain_entries"))
+        print(f"\n{'✅' if ok else '❌'} pass {name}: {sum(p['converted'].values())} rows in {p['elapsed_s']:.2f} s "
+              f"({p['rows_per_s']:.0f} rows/s); {p['checked'] - len(p['mismatched'])}/{p['checked']} reads unchanged")
+        print(f"   {r['bytes_per_transaction']:.0f} bytes per transaction "
+              f"({r['bytes_per_transaction_excl_ledger']:.0f} without the ledger): {tables}")
+    path = save_results("slim", results, args.out)
+    print(f"\n💾 Results saved to {path}")
+    if failed:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,127 @@
+# backend/bench/startup.py
+"""
+Cold-start benchmark: how long a fresh worker takes to import the app, pass
+the schema check and finish the background model warm-up.
+
+Each run is a new interpreter:
+- `python -X importtime -c "import app.main"` gives the import total and a
+  per-package breakdown of self time (fastapi, sqlalchemy, app, ...)
+- a child process then runs the app lifespan against a prepared database
+  and reports the phases from app/core/startup.py
+
+    cd backend
+    python -m bench.startup --runs 5
+    python -m bench.startup --compare bench/results/startup-20250101-120000.json
+"""
+import argparse
+import asyncio
+import json
+import os
+import re
+import subprocess
+import sys
+from collections import defaultdict
+
+from bench.common import compare, print_table, save_results, summarize, use_database
+
+_LINE = re.compile(r"import time:\s+(\d+) \|\s+(\d+) \|(\s*)(\S+)")
+
+
+def import_breakdown() -> dict:
+    """One cold `import app.main`: total seconds and self time per top-level package."""
+    proc = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", "import app.main"],
+        capture_output=True, text=True, env=os.environ,
+    )
+    if proc.returncode:
+        raise RuntimeError(proc.stderr[-2000:])
+    per_package = defaultdict(float)
+    total = 0.0
+    for line in proc.stderr.splitlines():
+        m = _LINE.match(line)
+        if not m:
+            continue
+        self_us, cum_us, indent, module = int(m.group(1)), int(m.group(2)), m.group(3), m.group(4)
+        per_package[module.split(".")[0]] += self_us / 1e6
+        if module == "app.main" and len(indent) == 1:
+            total = cum_us / 1e6
+    return {"total": total, "packages": dict(per_package)}
+
+
+async def _child() -> None:
+    """Runs in a fresh interpreter: lifespan up to ready, then wait for warm-up."""
+    from app.core import startup
+    from app.db.database import engine
+    from app.main import app
+
+    async with app.router.lifespan_context(app):
+        await startup.ensure_warm()
+        print(json.dumps(startup.snapshot()))
+    await engine.dispose()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--runs", type=int, default=5, help="cold interpreters per measurement")
+    parser.add_argument("--top", type=int, default=12, help="packages shown in the import breakdown")
+    parser.add_argument("--db", default=None, help="SQLAlchemy async URL (default: fresh SQLite file)")
+    parser.add_argument("--compare", default=None, help="previous results JSON to diff against")
+    parser.add_argument("--out", default=None)
+    parser.add_argument("--child", action="store_true", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        asyncio.run(_child())
+        return
+
+    use_database(args.db, name="startup")
+    from bench.common import prepare_database
+    from app.db.database import engine
+
+    async def prep():
+        await prepare_database(engine)
+        await engine.dispose()
+    asyncio.run(prep())
+
+    imports = [import_breakdown() for _ in range(args.runs)]
+    snapshots = []
+    for _ in range(args.runs):
+        proc = subprocess.run([sys.executable, "-m", "bench.startup", "--child"],
+                              capture_output=True, text=True, env=os.environ)
+        if proc.returncode:
+            print(proc.stderr[-2000:])
+            sys.exit(1)
+        snapshots.append(json.loads(proc.stdout.strip().splitlines()[-1]))
+
+    phase_names = ["import_app", "schema", "ready", "import_ml", "model_load", "warm_up"]
+    stages = {"import": summarize(i["total"] for i in imports)}
+    for name in phase_names:
+        stages[name] = summarize(s["phases"][name] for s in snapshots if name in s["phases"])
+    packages = defaultdict(list)
+    for i in imports:
+        for pkg, sec in i["packages"].items():
+            packages[pkg].append(sec)
+    breakdown = sorted(((pkg, sum(v) / len(imports)) for pkg, v in packages.items()), key=lambda kv: -kv[1])
+
+    results = {
+        "config": vars(args),
+        "schema": snapshots[-1].get("schema"),
+        "warm_up_error": snapshots[-1].get("warm_up_error"),
+        "import_packages_s": dict(breakdown),
+        "stages": stages,
+    }
+    print_table("Cold start (per phase)", stages)
+    print(f"\n📦 import app.main, self time by package (mean of {len(imports)}):")
+    for pkg, sec in breakdown[:args.top]:
+        print(f"   {pkg:<20}{sec * 1000:>9.1f} ms")
+    print(f"\n🗄️ schema on boot: {results['schema']}")
+    if results["warm_up_error"]:
+        print(f"⚠️ warm-up: {results['warm_up_error']}")
+    path = save_results("startup", results, args.out)
+    print(f"\n💾 Results saved to {path}")
+    if args.compare:
+        compare(results, args.compare)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,84 @@
+# backend/bench/tiers.py
+"""
+Latency-tier trade-off: predict_models() with FAST_TIER off and on.
+
+Replays the same synthetic transactions through both configurations. It
+reports the share of traffic routed to the distilled fast agent, latency
+per tier and how often the routed verdicts match what the full ensemble
+decides for the same rows.
+
+    cd backend
+    python -m bench.tiers --n 2000 --max-amount 5000 --max-device-risk 0.5
+"""
+import argparse
+import sys
+import time
+
+from bench.common import print_table, save_results, summarize, synthetic_transactions
+
+
+def _run(rows):
+    from app.ml.predictor import predict_models
+
+    out = []
+    for row in rows:
+        t0 = time.perf_counter()
+        consensus, reason_codes = predict_models(row)
+        out.append((time.perf_counter() - t0, consensus["consensus_verdict"], reason_codes.get("tier", "full")))
+    return out
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--n", type=int, default=1000)
+    parser.add_argument("--max-amount", type=float, default=None, help="FAST_TIER_MAX_AMOUNT override")
+    parser.add_argument("--max-device-risk", type=float, default=None, help="FAST_TIER_MAX_DEVICE_RISK override")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--out", default=None)
+    args = parser.parse_args()
+
+    from app.core.config import settings
+    from app.ml.predictor import load_fast_model, load_models
+
+    if args.max_amount is not None:
+        settings.fast_tier_max_amount = args.max_amount
+    if args.max_device_risk is not None:
+        settings.fast_tier_max_device_risk = args.max_device_risk
+    load_models()
+    if load_fast_model() is None:
+        print("❌ fast_model.joblib missing. Run `python backend/app/ml/train_models.py --fast` first.")
+        sys.exit(1)
+
+    rows = synthetic_transactions(args.n, seed=args.seed)
+    settings.fast_tier = False
+    _run(rows[:50])
+    full = _run(rows)
+    settings.fast_tier = True
+    _run(rows[:50])
+    tiered = _run(rows)
+
+    routed = [i for i, (_, _, tier) in enumerate(tiered) if tier == "fast"]
+    agree = sum(1 for i in routed if tiered[i][1] == full[i][1])
+    stages = {
+        "off": summarize(s for s, _, _ in full),
+        "on": summarize(s for s, _, _ in tiered),
+        "on: fast": summarize(tiered[i][0] for i in routed),
+        "on: full": summarize(s for s, _, tier in tiered if tier != "fast"),
+    }
+    results = {
+        "config": {**vars(args), "max_amount": settings.fast_tier_max_amount,
+                   "max_device_risk": settings.fast_tier_max_device_risk},
+        "routed_share": len(routed) / len(rows) if rows else 0.0,
+        "routed_agreement": agree / len(routed) if routed else None,
+        "stages": stages,
+    }
+    print_table("predict_models latency, FAST_TIER off / on", stages)
+    print(f"\n🚦 {results['routed_share']:.1%} of traffic routed to the fast tier")
+    if routed:
+        print(f"🎯 fast-tier verdicts match the full ensemble on {results['routed_agreement']:.2%} of routed rows")
+    path = save_results("tiers", results, args.out)
+    print(f"\n💾 Results saved to {path}")
+
+
+if __name__ == "__main__":
+    main()
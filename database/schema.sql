@@ -27,7 +27,10 @@ CREATE TABLE IF NOT EXISTS transactions (
   device_id VARCHAR(128),
   merchant_id VARCHAR(128),
   status ENUM('pending','legit','fraud') DEFAULT 'pending',
-  payload JSON,                                -- raw request
+  payload JSON,                                -- raw request (NULL in the slim format, app/db/slim.py)
+  user_external_id VARCHAR(64) NULL,           -- slim format: TxnIn fields without a column above
+  device_risk_score DOUBLE NULL,
+  payload_z BLOB NULL,                         -- slim format: compressed fields the columns can't hold
   created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
   FOREIGN KEY (user_id) REFERENCES users(id),
   KEY idx_tx_user_time (user_id, occurred_at),
@@ -42,6 +45,11 @@ CREATE TABLE IF NOT EXISTS fraudresults (
   fraud_score DOUBLE NOT NULL,
   consensus_score DOUBLE DEFAULT 0.0,         -- ✅ added for multi-agent consensus
   reason_codes JSON NULL,
+  rf_score DOUBLE NULL,                       -- slim format: agent scores, rest compressed in reason_z
+  xgb_score DOUBLE NULL,
+  rules_score DOUBLE NULL,
+  fast_score DOUBLE NULL,
+  reason_z BLOB NULL,
   decided_by VARCHAR(64) NOT NULL,            -- e.g., 'xgboost', 'rf', 'rules', 'consensus'
   created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
   FOREIGN KEY (transaction_id) REFERENCES transactions(id),
@@ -53,7 +61,8 @@ CREATE TABLE IF NOT EXISTS fraudresults (
 CREATE TABLE IF NOT EXISTS recommendations (
   id BIGINT AUTO_INCREMENT PRIMARY KEY,
   transaction_id BIGINT NOT NULL,
-  recs JSON NOT NULL,             -- array of recommendation objects
+  recs JSON NULL,                 -- array of recommendation objects (full format)
+  recs_z BLOB NULL,               -- slim format: compressed, meta.agents left to fraudresults
   confidence DOUBLE DEFAULT 0.0,  -- highest confidence among recs
   created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
   FOREIGN KEY (transaction_id) REFERENCES transactions(id),
@@ -85,3 +94,43 @@ CREATE TABLE IF NOT EXISTS chain_entries (
   UNIQUE KEY uq_block_entry (block_index, entry_index),
   FOREIGN KEY (block_index) REFERENCES chain_blocks(block_index)
 ) ENGINE=InnoDB;
+
+-- Entity block / allow lists (loaded into memory by app/ml/entity_lists.py)
+CREATE TABLE IF NOT EXISTS entity_lists (
+  list_name ENUM('block','allow') NOT NULL,
+  entity_kind ENUM('user','device','merchant') NOT NULL,
+  entity_id VARCHAR(255) NOT NULL,
+  reason VARCHAR(255),
+  created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+  PRIMARY KEY (list_name, entity_kind, entity_id)
+) ENGINE=InnoDB;
+
+-- Analyst-confirmed labels (app/ml/feedback.py). No foreign keys: fraudresults
+-- and transactions may be partitioned (app/db/partitioning.py)
+CREATE TABLE IF NOT EXISTS feedback_labels (
+  id BIGINT AUTO_INCREMENT PRIMARY KEY,
+  fraudresult_id BIGINT NOT NULL,
+  transaction_id BIGINT NOT NULL,
+  label ENUM('legit','fraud') NOT NULL,
+  model_verdict ENUM('legit','fraud') NOT NULL,
+  labelled_by VARCHAR(255) NOT NULL,
+  created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+  KEY idx_feedback_tx (transaction_id),
+  KEY idx_feedback_result (fraudresult_id)
+) ENGINE=InnoDB;
+
+-- Ledger entries of committed decisions not sealed yet (app/ledger/pending.py),
+-- written in the decision's transaction. On every shard, no foreign keys
+CREATE TABLE IF NOT EXISTS ledger_pending (
+  id BIGINT AUTO_INCREMENT PRIMARY KEY,
+  tx_reference VARCHAR(64) NOT NULL,
+  entry_payload JSON NOT NULL,
+  created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+  UNIQUE KEY uq_ledger_pending_tx (tx_reference)
+) ENGINE=InnoDB;
+
+-- Applied schema.sql checksums (init_schema skips the file when current)
+CREATE TABLE IF NOT EXISTS schema_version (
+  version VARCHAR(64) PRIMARY KEY,
+  applied_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+) ENGINE=InnoDB;